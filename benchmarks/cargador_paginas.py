@@ -0,0 +1,100 @@
+# ======================================================================================
+# ARCHIVO: benchmarks/cargador_paginas.py
+# Carga las funciones de una página de Streamlit sin ejecutar su interfaz.
+# Las páginas llaman st.set_page_config / st.stop y dibujan widgets al importarse,
+# así que se toman solo los imports, funciones, clases y constantes en MAYÚSCULAS.
+# ======================================================================================
+
+import os
+import ast
+import logging
+from types import SimpleNamespace
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGINAS = {
+    'tablero': "📈_Tablero_Principal.py",
+    'motor': os.path.join("pages", "2_Motor_Conciliacion.py"),
+    'historico': os.path.join("pages", "📊_Análisis_Histórico.py"),
+    'masiva': os.path.join("pages", "📬_Centro_Conciliacion_Masiva.py"),
+    'covinoc': os.path.join("pages", "🧑‍💼_Covinoc.py"),
+    'perfil': os.path.join("pages", "🧑‍💼_Perfil_de_Cliente.py"),
+}
+
+def silenciar_streamlit():
+    """Sin servidor, Streamlit avisa en cada llamada que no hay ScriptRunContext"""
+    from streamlit import config, logger
+    # Se fuerza la lectura de la configuración primero: al leerla Streamlit vuelve a fijar el nivel
+    config.get_config_options()
+    config._set_option('logger.level', 'error', 'benchmarks')
+    config._set_option('global.showWarningOnDirectExecution', False, 'benchmarks')
+    logger.set_log_level(logging.ERROR)
+
+class _DropboxLocal:
+    """Cliente con la interfaz mínima de dropbox.Dropbox que sirve archivos de un directorio local"""
+    def __init__(self, directorio):
+        self.directorio = directorio
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+    def files_download(self, path):
+        ruta = os.path.join(self.directorio, os.path.basename(path))
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+        return SimpleNamespace(name=os.path.basename(path)), SimpleNamespace(content=contenido)
+
+class _StreamlitLocal:
+    """Delegado de `st` con secretos de prueba; todo lo demás va al módulo real"""
+    def __init__(self, st):
+        self._st = st
+        self.secrets = {'dropbox': {'app_key': 'local', 'app_secret': 'local', 'refresh_token': 'local'}}
+
+    def __getattr__(self, nombre):
+        return getattr(self._st, nombre)
+
+def dropbox_local(directorio):
+    """Sustitutos de `dropbox` y `st` para que los cargadores de las páginas lean de `directorio`"""
+    import streamlit as st
+    modulo = SimpleNamespace(Dropbox=lambda *a, **kw: _DropboxLocal(directorio))
+    return {'dropbox': modulo, 'st': _StreamlitLocal(st)}
+
+def _es_decorador_cache(nodo):
+    """@st.cache_data, @st.cache_data(ttl=...), @st.cache_resource"""
+    objetivo = nodo.func if isinstance(nodo, ast.Call) else nodo
+    return isinstance(objetivo, ast.Attribute) and objetivo.attr.startswith('cache')
+
+def _es_constante(nodo):
+    objetivos = nodo.targets if isinstance(nodo, ast.Assign) else [nodo.target]
+    return all(isinstance(t, ast.Name) and t.id.isupper() for t in objetivos)
+
+def _solo_imports(nodo):
+    return all(isinstance(n, (ast.Import, ast.ImportFrom)) for n in nodo.body)
+
+def cargar_pagina(clave, reemplazos=None):
+    """
+    Devuelve un dict con las funciones/constantes de la página. Los decoradores de caché se
+    quitan para medir el trabajo real; `reemplazos` sustituye nombres (p.ej. cargadores de Dropbox).
+    """
+    silenciar_streamlit()
+    ruta = os.path.join(RAIZ_REPO, PAGINAS[clave])
+    with open(ruta, encoding='utf-8') as f:
+        arbol = ast.parse(f.read(), filename=ruta)
+
+    cuerpo = []
+    for nodo in arbol.body:
+        if isinstance(nodo, (ast.Import, ast.ImportFrom)):
+            cuerpo.append(nodo)
+        elif isinstance(nodo, ast.Try) and _solo_imports(nodo):
+            cuerpo.append(nodo)
+        elif isinstance(nodo, (ast.FunctionDef, ast.ClassDef)):
+            nodo.decorator_list = [d for d in nodo.decorator_list if not _es_decorador_cache(d)]
+            cuerpo.append(nodo)
+        elif isinstance(nodo, (ast.Assign, ast.AnnAssign)) and _es_constante(nodo):
+            cuerpo.append(nodo)
+
+    espacio = {'__name__': f"pagina_{clave}", '__file__': ruta}
+    modulo = ast.Module(body=cuerpo, type_ignores=[])
+    exec(compile(modulo, ruta, 'exec'), espacio)
+    espacio.update(reemplazos or {})
+    return espacio
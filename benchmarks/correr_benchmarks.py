@@ -0,0 +1,335 @@
+# ======================================================================================
+# ARCHIVO: benchmarks/correr_benchmarks.py
+# Mide las rutas calientes de las páginas sobre datos sintéticos y las compara
+# contra una línea base guardada.
+#
+#   python -m benchmarks.correr_benchmarks --filas 100000
+#   python -m benchmarks.correr_benchmarks --filas 100000 --guardar-base
+#   python -m benchmarks.correr_benchmarks --casos motor,covinoc --repeticiones 5
+#   python -m benchmarks.correr_benchmarks --casos motor --procesos 1,2,4,8   (escalado)
+#
+# Se ejecuta desde la raíz del repo (el logo de los PDF/Excel se busca ahí).
+# ======================================================================================
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import warnings
+import statistics
+from io import BytesIO
+from datetime import datetime
+
+import pandas as pd
+
+from benchmarks.cargador_paginas import RAIZ_REPO, cargar_pagina, dropbox_local
+from benchmarks.datos_sinteticos import escribir_escenario
+from comun.antiguedad import ESCALA_EDAD, aplicar_antiguedad
+from comun.cubo_kpi import clientes_pareto, construir_cubo, filtrar_cubo, importe_por_edad, kpis_cubo, vencido_por_cliente
+
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ_REPO, "benchmarks", "resultados")
+RUTA_LINEA_BASE = os.path.join(RAIZ_REPO, "benchmarks", "linea_base.json")
+TOLERANCIA_REGRESION = 0.25  # 25% más lento que la base se reporta como regresión
+MARGEN_ABSOLUTO = 0.05       # ...siempre que además sean más de 50 ms (casos cortos son ruido)
+
+# ======================================================================================
+# --- 1. CASOS ---
+# Cada preparador recibe el escenario y devuelve {nombre_caso: callable sin argumentos}.
+# La preparación (lecturas previas, filtros) queda fuera de la medición.
+# ======================================================================================
+
+def _cliente_mayor(df, col_cliente='nombrecliente'):
+    """Filas del cliente con más facturas (el peor caso de un estado de cuenta)"""
+    return df[df[col_cliente] == df[col_cliente].value_counts().idxmax()]
+
+def _consultar_cubo(cubo, **filtros):
+    """Lo que el tablero pide al cubo en cada cambio de filtro"""
+    sub = filtrar_cubo(cubo, **filtros)
+    deuda = vencido_por_cliente(sub)
+    return kpis_cubo(sub), importe_por_edad(sub), clientes_pareto(deuda)
+
+def casos_tablero(esc):
+    pag = cargar_pagina('tablero', dropbox_local(esc['directorio']))
+    df = pag['cargar_y_procesar_datos']()
+    crudo = pag['cargar_datos_desde_dropbox']()
+    crudo = crudo.rename(columns=lambda x: pag['normalizar_nombre'](x).lower().replace(' ', '_'))
+    vendedor = df[df['nomvendedor'] == df['nomvendedor'].value_counts().idxmax()]
+    cliente = _cliente_mayor(df)
+    cubo = construir_cubo(df)
+    filtro_vendedor = vendedor['nomvendedor_norm'].iloc[0]
+    return {
+        'tablero.cargar_y_procesar_datos': pag['cargar_y_procesar_datos'],
+        'tablero.construir_cubo': lambda: construir_cubo(df),
+        'tablero.kpis_desde_cubo': lambda: _consultar_cubo(cubo, nomvendedor_norm=filtro_vendedor),
+        'tablero.procesar_cartera': lambda: pag['procesar_cartera'](crudo),
+        # Vista de antigüedad que el tablero recalcula por fecha sobre el snapshot en caché
+        'tablero.aplicar_antiguedad': lambda: aplicar_antiguedad(df, pd.Timestamp.now(), {'edad_cartera': ESCALA_EDAD}),
+        'tablero.generar_excel_formateado': lambda: pag['generar_excel_formateado'](vendedor),
+        'tablero.generar_pdf_estado_cuenta': lambda: pag['generar_pdf_estado_cuenta'].__wrapped__(
+            cliente, cliente.loc[cliente['dias_vencido'] > 0, 'importe'].sum()),
+        # Solo Excel: los PDF del paquete pasan por el caché en disco y falsearían las repeticiones
+        'tablero.generar_paquete_vendedores': lambda: pag['generar_paquete_vendedores'](
+            df, BytesIO(), n_procesos=esc['procesos']),
+    }
+
+def casos_historico(esc):
+    pag = cargar_pagina('historico')
+    df = pag['cargar_datos_historicos']()
+    return {
+        'historico.cargar_datos_historicos': pag['cargar_datos_historicos'],
+        'historico.calcular_rfm': lambda: pag['calcular_rfm'](df),
+    }
+
+def casos_motor(esc):
+    pag = cargar_pagina('motor', {**dropbox_local(esc['directorio']), 'registrar_corrida': lambda *a, **kw: None})
+    df_cartera = pag['cargar_cartera_dropbox']()
+    df_historico = pag['cargar_historico_dropbox']()
+    with open(os.path.join(esc['directorio'], 'extracto_banco.xlsx'), 'rb') as f:
+        extracto = BytesIO(f.read())
+    df_manual = pag['procesar_archivo_manual'](extracto)
+
+    def leer_extracto():
+        extracto.seek(0)
+        return pag['procesar_archivo_manual'](extracto)
+
+    casos = {
+        'motor.cargar_cartera_dropbox': pag['cargar_cartera_dropbox'],
+        'motor.procesar_archivo_manual': leer_extracto,
+        'motor.motor_omnisciente': lambda: pag['motor_omnisciente'](df_manual, df_cartera, df_historico, pd.DataFrame()),
+    }
+    for n in esc['escalado']:
+        if n > 1:
+            casos[f"motor.motor_omnisciente[{n}p]"] = lambda n=n: pag['motor_omnisciente'](
+                df_manual, df_cartera, df_historico, pd.DataFrame(), n_procesos=n)
+    return casos
+
+def casos_covinoc(esc):
+    pag = cargar_pagina('covinoc', dropbox_local(esc['directorio']))
+    return {'covinoc.cargar_y_comparar_datos': pag['cargar_y_comparar_datos']}
+
+def casos_masiva(esc):
+    pag = cargar_pagina('masiva', dropbox_local(esc['directorio']))
+    df, _ = pag['cargar_cartera_dropbox']()
+    cliente = _cliente_mayor(df, 'cliente_key')
+    vencido = cliente.loc[cliente['dias_vencido'] > 0, 'importe'].sum()
+    filas_resumen = [fila for _, fila in pag['construir_resumen_clientes'](df).iterrows()]
+    # Los generadores de PDF van con caché en disco: __wrapped__ mide el render real
+    return {
+        'masiva.cargar_cartera_dropbox': pag['cargar_cartera_dropbox'],
+        'masiva.construir_resumen_clientes': lambda: pag['construir_resumen_clientes'](df),
+        'masiva.crear_pdf_cliente': lambda: pag['crear_pdf_cliente'].__wrapped__(cliente, vencido),
+        'masiva.crear_pdf_cliente[cache]': lambda: pag['crear_pdf_cliente'](cliente, vencido),
+        'masiva.renderizar_correo_conciliacion[todos]': lambda: [
+            pag['renderizar_correo_conciliacion'](fila, 'Seguimiento prioritario') for fila in filas_resumen],
+    }
+
+def casos_perfil(esc):
+    pag = cargar_pagina('perfil', dropbox_local(esc['directorio']))
+    df, _ = pag['cargar_datos_automaticos_dropbox']()
+    df = df.rename(columns={'e-mail': 'email', 'e_mail': 'email'})
+    cliente = _cliente_mayor(df)
+    vencido = df.loc[df['dias_vencido'] > 0, 'importe'].sum()
+    total = df['importe'].sum()
+    return {
+        'perfil.cargar_datos_automaticos_dropbox': pag['cargar_datos_automaticos_dropbox'],
+        'perfil.crear_pdf': lambda: pag['crear_pdf'].__wrapped__(cliente, cliente.loc[cliente['dias_vencido'] > 0, 'importe'].sum()),
+        'perfil.crear_excel_gerencial': lambda: pag['crear_excel_gerencial'](
+            df, total, vencido, vencido / total * 100 if total else 0,
+            df.loc[df['dias_vencido'] > 0, 'nombrecliente'].nunique(), 0.0, 0.0),
+        'perfil.crear_excel_cobranza_vencida': lambda: pag['crear_excel_cobranza_vencida'](df),
+    }
+
+PREPARADORES = {
+    'tablero': casos_tablero,
+    'historico': casos_historico,
+    'motor': casos_motor,
+    'covinoc': casos_covinoc,
+    'masiva': casos_masiva,
+    'perfil': casos_perfil,
+}
+
+# ======================================================================================
+# --- 2. MEDICIÓN ---
+# ======================================================================================
+
+def medir(funcion, repeticiones):
+    """Tiempos de pared por repetición (la primera ya calienta imports y cachés de disco)"""
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return {
+        'mediana': statistics.median(tiempos),
+        'minimo': min(tiempos),
+        'maximo': max(tiempos),
+        'repeticiones': repeticiones,
+    }
+
+def correr(grupos, esc, repeticiones):
+    """
+    Devuelve (resultados, fallos). Un grupo o caso que falla no detiene a los demás, pero
+    queda en `fallos` ({nombre: error}) para que la corrida termine con código de error.
+    """
+    resultados, fallos = {}, {}
+    for grupo in grupos:
+        try:
+            casos = PREPARADORES[grupo](esc)
+        except Exception as e:
+            print(f"  ✗ {grupo}: no se pudo preparar ({e})")
+            fallos[grupo] = repr(e)
+            continue
+        for nombre, funcion in casos.items():
+            try:
+                resultados[nombre] = medir(funcion, repeticiones)
+                print(f"  {nombre:<45} {resultados[nombre]['mediana']:>9.3f} s")
+            except Exception as e:
+                print(f"  ✗ {nombre}: {e}")
+                fallos[nombre] = repr(e)
+    return resultados, fallos
+
+def reportar_escalado(resultados):
+    """Aceleración y eficiencia de motor_omnisciente con N procesos frente al serial"""
+    serial = resultados.get('motor.motor_omnisciente')
+    filas = [(int(caso.rsplit('[', 1)[1][:-2]), medida['mediana']) for caso, medida in resultados.items()
+             if caso.startswith('motor.motor_omnisciente[')]
+    if not serial or not filas: return
+    print(f"\n{'Procesos':>8} {'Mediana':>9} {'Acel.':>7} {'Efic.':>7}   (máquina con {os.cpu_count()} CPU)")
+    for n, mediana in [(1, serial['mediana'])] + sorted(filas):
+        aceleracion = serial['mediana'] / mediana
+        print(f"{n:>8} {mediana:>9.3f} {aceleracion:>6.2f}x {aceleracion / n:>7.0%}")
+
+# ======================================================================================
+# --- 3. LÍNEA BASE ---
+# ======================================================================================
+
+def comparar_con_base(resultados, parametros, tolerancia):
+    """
+    Lista de (caso, base, actual, variación, regresión) para los casos medidos con los mismos
+    parámetros. Se compara el mínimo de las repeticiones: es el menos sensible a la carga de la máquina.
+    """
+    if not os.path.exists(RUTA_LINEA_BASE): return None
+    with open(RUTA_LINEA_BASE, encoding='utf-8') as f:
+        base = json.load(f)
+    clave = _clave_parametros(parametros)
+    if clave not in base:
+        print(f"\nLa línea base no tiene mediciones para {clave}.")
+        return None
+
+    filas = []
+    for caso, actual in resultados.items():
+        previo = base[clave]['casos'].get(caso)
+        if not previo: continue
+        variacion = actual['minimo'] / previo['minimo'] - 1 if previo['minimo'] else 0.0
+        regresion = variacion > tolerancia and actual['minimo'] - previo['minimo'] > MARGEN_ABSOLUTO
+        filas.append((caso, previo['minimo'], actual['minimo'], variacion, regresion))
+    return filas
+
+def _clave_parametros(parametros):
+    return f"filas={parametros['filas']},movimientos={parametros['movimientos']},meses={parametros['meses']}"
+
+def guardar_base(registro):
+    """La línea base guarda una entrada por tamaño de escenario (con el entorno en que se midió)"""
+    base = {}
+    if os.path.exists(RUTA_LINEA_BASE):
+        with open(RUTA_LINEA_BASE, encoding='utf-8') as f:
+            base = json.load(f)
+    base[_clave_parametros(registro['parametros'])] = registro
+    with open(RUTA_LINEA_BASE, 'w', encoding='utf-8') as f:
+        json.dump(base, f, indent=2, ensure_ascii=False, sort_keys=True)
+
+# ======================================================================================
+# --- 4. CLI ---
+# ======================================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de las páginas de cartera sobre datos sintéticos.")
+    parser.add_argument('--filas', type=int, default=10_000, help="Facturas de cartera (10k a 5M)")
+    parser.add_argument('--movimientos', type=int, default=1_000, help="Líneas del extracto bancario del motor")
+    parser.add_argument('--meses', type=int, default=12, help="Archivos Cartera_YYYY_MM.xlsx del histórico")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--procesos', default='1',
+                        help="Procesos del motor separados por coma (1,2,4,8 mide el escalado); el paquete del tablero usa el mayor")
+    parser.add_argument('--casos', default=','.join(PREPARADORES), help="Grupos separados por coma")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_REGRESION)
+    parser.add_argument('--guardar-base', action='store_true', help="Reemplaza la línea base para este tamaño")
+    parser.add_argument('--datos', help="Directorio con un escenario ya generado (se reutiliza)")
+    args = parser.parse_args()
+
+    try:
+        procesos = sorted({int(p) for p in args.procesos.split(',') if p.strip()}) or [1]
+    except ValueError:
+        parser.error(f"--procesos debe ser una lista de enteros: {args.procesos}")
+    grupos = [g.strip() for g in args.casos.split(',') if g.strip()]
+    desconocidos = [g for g in grupos if g not in PREPARADORES]
+    if desconocidos:
+        parser.error(f"Casos desconocidos: {', '.join(desconocidos)}")
+
+    # Avisos de pandas/openpyxl propios de las páginas: ensucian la tabla y no cambian la medición
+    warnings.simplefilter('ignore', FutureWarning)
+    warnings.simplefilter('ignore', UserWarning)
+
+    directorio = args.datos or tempfile.mkdtemp(prefix='cartera_bench_')
+    cwd = os.getcwd()
+    try:
+        if not args.datos:
+            t0 = time.perf_counter()
+            escribir_escenario(directorio, args.filas, args.movimientos, args.meses)
+            print(f"Escenario sintético: {args.filas:,} facturas, {args.movimientos:,} movimientos "
+                  f"({time.perf_counter() - t0:.1f} s)")
+
+        # Los históricos se buscan con glob relativo (Cartera_*.xlsx) y el logo con ruta
+        # relativa a la raíz: se copia el logo al escenario y se trabaja desde ahí.
+        for archivo in os.listdir(RAIZ_REPO):
+            if archivo.lower().endswith('.png') and not os.path.exists(os.path.join(directorio, archivo)):
+                shutil.copy(os.path.join(RAIZ_REPO, archivo), directorio)
+        os.chdir(directorio)
+
+        esc = {'directorio': directorio, 'procesos': max(procesos), 'escalado': procesos}
+        resultados, fallos = correr(grupos, esc, args.repeticiones)
+        reportar_escalado(resultados)
+    finally:
+        os.chdir(cwd)
+        if not args.datos:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    parametros = {'filas': args.filas, 'movimientos': args.movimientos, 'meses': args.meses}
+    registro = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'parametros': parametros,
+        'entorno': {'python': platform.python_version(), 'pandas': pd.__version__,
+                    'cpus': os.cpu_count(), 'maquina': platform.machine()},
+        'casos': resultados,
+        'fallos': fallos,
+    }
+    os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+    ruta = os.path.join(DIRECTORIO_RESULTADOS, f"bench_{datetime.now():%Y%m%d_%H%M%S}_{args.filas}.json")
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(registro, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados: {ruta}")
+
+    if fallos:
+        print(f"\n✗ {len(fallos)} grupo(s)/caso(s) fallaron: {', '.join(fallos)}")
+
+    if args.guardar_base:
+        if fallos:
+            print("La línea base no se actualiza con casos fallidos.")
+            return 1
+        guardar_base(registro)
+        print(f"Línea base actualizada: {RUTA_LINEA_BASE}")
+        return 0
+
+    comparacion = comparar_con_base(resultados, parametros, args.tolerancia)
+    if comparacion:
+        print(f"\n{'Caso':<45} {'Base':>9} {'Actual':>9} {'Var.':>8}")
+        for caso, base, actual, variacion, regresion in comparacion:
+            marca = '  ⚠️ REGRESIÓN' if regresion else ''
+            print(f"{caso:<45} {base:>9.3f} {actual:>9.3f} {variacion:>+8.1%}{marca}")
+    return 1 if fallos or any(c[4] for c in (comparacion or [])) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
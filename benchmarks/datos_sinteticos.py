@@ -0,0 +1,345 @@
+# ======================================================================================
+# ARCHIVO: benchmarks/datos_sinteticos.py
+# Generador de datos sintéticos con la forma de producción:
+#   - cartera_detalle.csv (18 columnas, separador '|', latin-1, sin encabezado)
+#   - Cartera_YYYY_MM.xlsx (históricos mensuales con fila "Total")
+#   - Extractos bancarios con ruido de texto, NITs, abonos parciales y retenciones
+#   - reporteTransacciones.xlsx (Covinoc)
+# Uso: python -m benchmarks.datos_sinteticos --filas 100000 --salida /tmp/sintetico
+# ======================================================================================
+
+import os
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_CARTERA = [
+    'Serie', 'Numero', 'Fecha Documento', 'Fecha Vencimiento', 'Cod Cliente',
+    'NombreCliente', 'Nit', 'Poblacion', 'Provincia', 'Telefono1', 'Telefono2',
+    'NomVendedor', 'Entidad Autoriza', 'E-Mail', 'Importe', 'Descuento',
+    'Cupo Aprobado', 'Dias Vencido'
+]
+
+SERIES = ['155G', '189G', '158Y', '439G', '157G', '238G', '156G', '160G', '161Y', '155W', '157X']
+PESOS_SERIES = [0.16, 0.12, 0.08, 0.05, 0.14, 0.07, 0.14, 0.1, 0.1, 0.02, 0.02]
+POBLACIONES = [
+    ('PEREIRA', 'RISARALDA'), ('DOSQUEBRADAS', 'RISARALDA'), ('MANIZALES', 'CALDAS'),
+    ('AGUADAS', 'CALDAS'), ('ARMENIA', 'QUINDIO'), ('CALARCA', 'QUINDIO'),
+    ('CARTAGO', 'VALLE'), ('TULUA', 'VALLE'), ('SANTA ROSA DE CABAL', 'RISARALDA'),
+]
+VENDEDORES = [
+    'HUGO NELSON ZAPATA RAYO', 'TANIA RESTREPO BENJUMEA', 'DIEGO MAURICIO GARCIA RENGIFO',
+    'PABLO CESAR MAFLA BAÑOL', 'PEREZ SANTA GUSTAVO ADOLFO', 'ELISABETH CAROLINA IBARRA MANSO',
+    'CARLOS ALBERTO CASTRILLON LOPEZ', 'LEIVYN GRABIEL GARCIA MUNOZ', 'LEDUYN MELGAREJO ARIAS',
+    'JERSON ATEHORTUA OLARTE', 'GESTION INTERNA', 'JULIAN MAURICIO ORTIZ GOMEZ',
+]
+PREFIJOS = [
+    'FERRETERIA', 'DEPOSITO', 'PINTURAS', 'CONSTRUCTORA', 'ALMACEN', 'DISTRIBUIDORA',
+    'MATERIALES', 'COMERCIALIZADORA', 'FERRO', 'INVERSIONES', 'HOGAR Y', 'ACABADOS',
+]
+NUCLEOS = [
+    'EL CLAVO', 'LA ROCA', 'ANDES', 'DEL VALLE', 'EL TORNILLO', 'SAN JOSE', 'LA ESPERANZA',
+    'CENTRAL', 'EL CONSTRUCTOR', 'LOS PINOS', 'COLOR', 'LA 14', 'EJE CAFETERO', 'EL PROGRESO',
+    'SANTA FE', 'LA MONTAÑA', 'BOLIVAR', 'CALDAS', 'EL MAESTRO', 'MUNDIAL', 'NACIONAL',
+    'ORIENTE', 'GUADUAL', 'LOS ALPES', 'PALERMO', 'VICTORIA', 'LA PRIMAVERA', 'EL DORADO',
+]
+SUFIJOS = ['S.A.S.', 'SAS', 'LTDA', 'S.A.', '', '', 'E.U.', 'Y CIA']
+NOMBRES_PERSONA = ['JUAN', 'MARIA', 'CARLOS', 'LUZ', 'JORGE', 'ANDREA', 'LUIS', 'PAOLA', 'ANDRES', 'DIANA']
+APELLIDOS = ['GOMEZ', 'RESTREPO', 'LOPEZ', 'GARCIA', 'OSORIO', 'CARDONA', 'MARIN', 'RIOS', 'ZAPATA', 'MEJIA']
+DOMINIOS = ['gmail.com', 'hotmail.com', 'yahoo.es', 'outlook.com', 'ferreteria.com.co']
+PLANTILLAS_BANCO = [
+    'PAGO PSE {nombre}',
+    'TRANSF {nombre} NIT {nit}',
+    'CONSIGNACION NAL {nombre_corto}',
+    'ABONO FACT {numero} {nombre_corto}',
+    'TRANSFERENCIA DESDE NEQUI {nombre_corto}',
+    'PAGO PROVEEDOR {nit}',
+    'ACH BANCOLOMBIA {nombre} REF {numero}',
+    'RECAUDO {nombre_corto} OFI 0{oficina}',
+]
+
+# ======================================================================================
+# --- 1. CARTERA ---
+# ======================================================================================
+
+def _clientes(rng, n_clientes):
+    """Maestro de clientes: nombre, NIT, contacto, ubicación, vendedor y cupo"""
+    idx = np.arange(n_clientes)
+    es_persona = rng.random(n_clientes) < 0.25
+    empresa = (
+        pd.Series(rng.choice(PREFIJOS, n_clientes)) + ' ' + pd.Series(rng.choice(NUCLEOS, n_clientes))
+        + ' ' + pd.Series(rng.choice(SUFIJOS, n_clientes))
+    ).str.strip()
+    persona = (
+        pd.Series(rng.choice(NOMBRES_PERSONA, n_clientes)) + ' ' + pd.Series(rng.choice(APELLIDOS, n_clientes))
+        + ' ' + pd.Series(rng.choice(APELLIDOS, n_clientes))
+    )
+    # Sufijo numérico para que los nombres sean únicos incluso con muchos clientes
+    nombre = pd.Series(np.where(es_persona, persona, empresa)) + pd.Series(np.where(idx % 7 == 0, ' ' + (idx // 7 + 1).astype(str), ''))
+
+    nit_base = np.where(es_persona, 10_000_000 + idx * 37, 800_000_000 + idx * 53)
+    dv = nit_base % 10
+    formato = rng.integers(0, 3, n_clientes)
+    nit = np.where(formato == 0, nit_base.astype(str),
+          np.where(formato == 1, pd.Series(nit_base).astype(str) + '-' + pd.Series(dv).astype(str),
+                   pd.Series(nit_base).map('{:,}'.format).str.replace(',', '.')))
+
+    usuario = nombre.str.lower().str.replace(r'[^a-z]', '', regex=True).str[:14]
+    email = usuario + '@' + pd.Series(rng.choice(DOMINIOS, n_clientes))
+    calidad = rng.random(n_clientes)
+    email = np.where(calidad < 0.12, '', np.where(calidad < 0.18, usuario + '.sin.arroba.com', email))
+    # Algunos clientes comparten correo (contador externo)
+    compartidos = rng.random(n_clientes) < 0.05
+    email = np.where(compartidos, 'contabilidad@asesorescontables.com', email)
+
+    celular = pd.Series(rng.integers(3_000_000_000, 3_249_999_999, n_clientes)).astype(str)
+    fijo = '(606) ' + pd.Series(rng.integers(3_000_000, 3_999_999, n_clientes)).astype(str)
+    tipo_tel = rng.random(n_clientes)
+    telefono1 = np.where(tipo_tel < 0.6, celular, np.where(tipo_tel < 0.85, fijo, np.where(tipo_tel < 0.93, '57' + celular, '')))
+
+    lugar = rng.integers(0, len(POBLACIONES), n_clientes)
+    return pd.DataFrame({
+        'Cod Cliente': 1000 + idx,
+        'NombreCliente': nombre.values,
+        'Nit': nit,
+        'Poblacion': [POBLACIONES[i][0] for i in lugar],
+        'Provincia': [POBLACIONES[i][1] for i in lugar],
+        'Telefono1': telefono1,
+        'Telefono2': np.where(rng.random(n_clientes) < 0.3, fijo, ''),
+        'NomVendedor': rng.choice(VENDEDORES, n_clientes),
+        'Entidad Autoriza': np.where(rng.random(n_clientes) < 0.4, 'COVINOC', ''),
+        'E-Mail': email,
+        'Cupo Aprobado': rng.choice([0, 2_000_000, 5_000_000, 10_000_000, 20_000_000, 50_000_000], n_clientes),
+    })
+
+def generar_cartera(n_filas=10_000, n_clientes=None, fecha_corte=None, semilla=42, max_facturas_cliente=40):
+    """DataFrame con las 18 columnas de cartera_detalle.csv (facturas agrupadas por cliente)"""
+    rng = np.random.default_rng(semilla)
+    n_clientes = n_clientes or max(10, n_filas // 8)
+    fecha_corte = pd.Timestamp(fecha_corte or datetime.now().date())
+
+    clientes = _clientes(rng, n_clientes)
+    # Pocos clientes concentran muchas facturas (distribución de cola larga)
+    pesos = rng.pareto(1.5, n_clientes) + 1
+    cliente_idx = rng.choice(n_clientes, n_filas, p=pesos / pesos.sum())
+    # Tope de facturas abiertas por cliente: el excedente se reparte al azar (la combinatoria
+    # del motor es C(n, 4) sobre las facturas del cliente y un cliente irreal la dispara)
+    excedente = pd.Series(cliente_idx).groupby(cliente_idx).cumcount().values >= max_facturas_cliente
+    cliente_idx[excedente] = rng.integers(0, n_clientes, excedente.sum())
+    cliente_idx = np.sort(cliente_idx)
+
+    df = clientes.iloc[cliente_idx].reset_index(drop=True)
+    antiguedad = rng.integers(0, 240, n_filas)
+    plazo = rng.choice([30, 45, 60, 90], n_filas)
+    fecha_doc = fecha_corte - pd.to_timedelta(antiguedad, unit='D')
+    fecha_venc = fecha_doc + pd.to_timedelta(plazo, unit='D')
+
+    importe = np.round(rng.lognormal(13.2, 1.1, n_filas), 0)
+    numero = 10_000 + np.arange(n_filas)
+    nota_credito = rng.random(n_filas) < 0.03
+    numero = np.where(nota_credito, -numero, numero)
+
+    df['Serie'] = rng.choice(SERIES, n_filas, p=PESOS_SERIES)
+    df['Numero'] = numero
+    df['Fecha Documento'] = fecha_doc.strftime('%Y-%m-%d')
+    df['Fecha Vencimiento'] = fecha_venc.strftime('%Y-%m-%d')
+    df['Importe'] = importe
+    df['Descuento'] = 0
+    df['Dias Vencido'] = (fecha_corte - fecha_venc).days
+    return df[COLUMNAS_CARTERA]
+
+def escribir_cartera_csv(df_cartera, ruta):
+    """Escribe el CSV con el formato exacto de Dropbox (sin encabezado, '|', latin-1)"""
+    df_cartera.to_csv(ruta, sep='|', header=False, index=False, encoding='latin-1', errors='replace')
+    return ruta
+
+# ======================================================================================
+# --- 2. HISTÓRICOS MENSUALES ---
+# ======================================================================================
+
+def generar_historico_mensual(df_cartera, anio, mes, semilla=0):
+    """Un mes de histórico con las columnas de Cartera_YYYY_MM.xlsx y la fila final 'Total'"""
+    rng = np.random.default_rng(semilla + anio * 100 + mes)
+    corte = pd.Timestamp(anio, mes, 1) + pd.offsets.MonthEnd(0)
+    base = df_cartera.sample(frac=0.85, random_state=int(rng.integers(0, 2**31 - 1))).reset_index(drop=True)
+    desfase = pd.Timestamp(datetime.now().date()) - corte
+    fecha_doc = pd.to_datetime(base['Fecha Documento']) - desfase
+    fecha_venc = pd.to_datetime(base['Fecha Vencimiento']) - desfase
+    saldado = fecha_doc + pd.to_timedelta(rng.integers(1, 120, len(base)), unit='D')
+    saldado = saldado.where(rng.random(len(base)) < 0.7)
+
+    df = pd.DataFrame({
+        'Serie': base['Serie'],
+        'Número': base['Numero'] + (anio * 100 + mes) * 1_000_000,
+        'Fecha Documento': fecha_doc,
+        'Fecha Vencimiento': fecha_venc,
+        'Fecha Saldado': saldado,
+        'NOMBRECLIENTE': base['NombreCliente'],
+        'Población': base['Poblacion'],
+        'Provincia': base['Provincia'],
+        'IMPORTE': base['Importe'],
+        'RIESGOCONCEDIDO': base['Cupo Aprobado'],
+        'NOMVENDEDOR': base['NomVendedor'],
+        'DIAS_VENCIDO': (corte - fecha_venc).dt.days,
+        'Estado': np.where(saldado.notna(), 'S', 'N'),
+    })
+    total = pd.DataFrame([{'Serie': 'Total', 'IMPORTE': df['IMPORTE'].sum()}])
+    return pd.concat([df, total], ignore_index=True)
+
+def escribir_historicos(df_cartera, directorio, meses=12, semilla=0):
+    """Escribe Cartera_YYYY_MM.xlsx para los últimos `meses` meses y devuelve las rutas"""
+    os.makedirs(directorio, exist_ok=True)
+    rutas = []
+    hoy = pd.Timestamp(datetime.now().date())
+    for k in range(meses, 0, -1):
+        periodo = hoy - pd.DateOffset(months=k)
+        ruta = os.path.join(directorio, f"Cartera_{periodo.year}_{periodo.month:02d}.xlsx")
+        generar_historico_mensual(df_cartera, periodo.year, periodo.month, semilla).to_excel(ruta, index=False)
+        rutas.append(ruta)
+    return rutas
+
+# ======================================================================================
+# --- 3. EXTRACTO BANCARIO ---
+# ======================================================================================
+
+def _ruido(textos, rng, prob=0.2):
+    """Errores de digitación: se pierde un carácter o se cambia el orden de dos"""
+    textos = list(textos)
+    for i in np.flatnonzero(rng.random(len(textos)) < prob):
+        t = textos[i]
+        if len(t) < 6: continue
+        p = int(rng.integers(1, len(t) - 2))
+        textos[i] = t[:p] + t[p + 1:] if rng.random() < 0.5 else t[:p] + t[p + 1] + t[p] + t[p + 2:]
+    return textos
+
+def generar_extracto_bancario(df_cartera, n_movimientos=2_000, semilla=7):
+    """
+    Movimientos de banco con la mezcla de casos que ve el motor:
+    factura exacta, varias facturas, descuento pronto pago, retenciones, abono parcial y ruido.
+    Devuelve columnas FECHA, DESCRIPCION, REFERENCIA, CUENTA, VALOR (como el archivo manual diario).
+    """
+    rng = np.random.default_rng(semilla)
+    facturas = df_cartera[pd.to_numeric(df_cartera['Numero']) > 0].reset_index(drop=True)
+    n_fact = len(facturas)
+
+    i = rng.integers(0, n_fact, n_movimientos)
+    j = np.minimum(i + 1, n_fact - 1)
+    mismo_cliente = facturas['Cod Cliente'].values[i] == facturas['Cod Cliente'].values[j]
+    imp_i = facturas['Importe'].values[i].astype(float)
+    imp_j = facturas['Importe'].values[j].astype(float)
+
+    tipo = rng.choice(
+        ['exacto', 'dos_facturas', 'descuento', 'retenciones', 'parcial', 'desconocido'],
+        n_movimientos, p=[0.4, 0.15, 0.1, 0.1, 0.15, 0.1]
+    )
+    tipo = np.where((tipo == 'dos_facturas') & ~mismo_cliente, 'exacto', tipo)
+    base_ret = imp_i / 1.19
+    valor = np.select(
+        [tipo == 'exacto', tipo == 'dos_facturas', tipo == 'descuento', tipo == 'retenciones', tipo == 'parcial'],
+        [imp_i, imp_i + imp_j, np.round(imp_i * 0.97), np.round(imp_i - base_ret * 0.025 - base_ret * 0.19 * 0.15),
+         np.round(imp_i * rng.uniform(0.2, 0.8, n_movimientos), -3)],
+        default=np.round(rng.lognormal(13, 1.2, n_movimientos), -2)
+    )
+
+    nombres = facturas['NombreCliente'].values[i]
+    nombre_corto = pd.Series(nombres).str.split().str[:2].str.join(' ')
+    nit = pd.Series(facturas['Nit'].values[i]).astype(str).str.replace(r'[^0-9]', '', regex=True)
+    plantillas = rng.choice(PLANTILLAS_BANCO, n_movimientos)
+    textos = [
+        p.format(nombre=n, nombre_corto=c, nit=t, numero=num, oficina=int(o))
+        for p, n, c, t, num, o in zip(plantillas, nombres, nombre_corto, nit,
+                                      facturas['Numero'].values[i], rng.integers(10, 99, n_movimientos))
+    ]
+    textos = np.where(tipo == 'desconocido', 'CONSIGNACION EFECTIVO OFI ' + pd.Series(rng.integers(100, 999, n_movimientos)).astype(str), textos)
+    textos = _ruido(textos, rng)
+
+    fecha = pd.Timestamp(datetime.now().date()) - pd.to_timedelta(rng.integers(0, 30, n_movimientos), unit='D')
+    return pd.DataFrame({
+        'FECHA': fecha,
+        'DESCRIPCION': textos,
+        'REFERENCIA': rng.integers(10**7, 10**8, n_movimientos).astype(str),
+        'CUENTA': rng.choice(['BANCOLOMBIA 0612', 'DAVIVIENDA 4471', 'BOGOTA 2290'], n_movimientos),
+        'VALOR': valor,
+    }).sort_values('FECHA', kind='stable').reset_index(drop=True)
+
+def generar_planilla_bancos(df_cartera, n_filas=5_000, semilla=13):
+    """planilla_bancos.xlsx: movimientos ya identificados (memoria histórica del motor)"""
+    extracto = generar_extracto_bancario(df_cartera, n_filas, semilla)
+    rng = np.random.default_rng(semilla)
+    facturas = df_cartera.drop_duplicates('Cod Cliente').reset_index(drop=True)
+    cliente = facturas['NombreCliente'].values[rng.integers(0, len(facturas), n_filas)]
+    return pd.DataFrame({
+        'FECHA': extracto['FECHA'],
+        'VALOR': extracto['VALOR'],
+        'TIPO DE TRANSACCION': extracto['DESCRIPCION'],
+        'BANCO REFRENCIA INTERNA': extracto['REFERENCIA'],
+        'DESTINO': extracto['CUENTA'],
+        'EMPRESA': cliente,
+    })
+
+# ======================================================================================
+# --- 4. COVINOC ---
+# ======================================================================================
+
+def generar_reporte_transacciones(df_cartera, fraccion=0.35, semilla=11):
+    """reporteTransacciones.xlsx: títulos garantizados en Covinoc (con algunos ya saldados en cartera)"""
+    rng = np.random.default_rng(semilla)
+    base = df_cartera.sample(frac=fraccion, random_state=semilla).reset_index(drop=True)
+    n = len(base)
+    nit = base['Nit'].astype(str).str.replace(r'[^0-9]', '', regex=True)
+    # Covinoc a veces reporta el NIT con dígito de verificación pegado
+    documento = np.where(rng.random(n) < 0.5, nit + (pd.Series(rng.integers(0, 9, n)).astype(str)), nit)
+    titulo = base['Serie'].astype(str) + base['Numero'].abs().astype(str)
+    # Títulos que ya no existen en cartera (pagados) para la pestaña de exoneraciones
+    titulo = np.where(rng.random(n) < 0.1, titulo + '9', titulo)
+    return pd.DataFrame({
+        'DOCUMENTO': documento,
+        'NOMBRES': base['NombreCliente'],
+        'TITULO_VALOR': titulo,
+        'VALOR': base['Importe'],
+        'SALDO': np.round(base['Importe'] * rng.choice([1.0, 1.0, 1.0, 1.05], n)),
+        'VENCIMIENTO': base['Fecha Vencimiento'],
+        'ESTADO': rng.choice(['AL DIA', 'AVISO NO PAGO', 'EFECTIVA', 'NEGADA', 'EXONERADA', 'RECLAMADA'], n,
+                             p=[0.5, 0.15, 0.1, 0.05, 0.1, 0.1]),
+    })
+
+# ======================================================================================
+# --- 5. ESCENARIO COMPLETO ---
+# ======================================================================================
+
+def escribir_escenario(directorio, n_filas=10_000, n_movimientos=2_000, meses=12, semilla=42):
+    """
+    Escribe en `directorio` todos los archivos con los nombres que usan las páginas
+    (los de Dropbox por su nombre base) y devuelve el DataFrame de cartera generado.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    cartera = generar_cartera(n_filas, semilla=semilla)
+    escribir_cartera_csv(cartera, os.path.join(directorio, 'cartera_detalle.csv'))
+    generar_extracto_bancario(cartera, n_movimientos, semilla).to_excel(os.path.join(directorio, 'extracto_banco.xlsx'), index=False)
+    generar_planilla_bancos(cartera, max(n_movimientos, 1_000), semilla).to_excel(os.path.join(directorio, 'planilla_bancos.xlsx'), index=False)
+    generar_reporte_transacciones(cartera, semilla=semilla).to_excel(os.path.join(directorio, 'reporteTransacciones.xlsx'), index=False)
+    if meses:
+        escribir_historicos(cartera, directorio, meses, semilla)
+    return cartera
+
+# ======================================================================================
+# --- 6. CLI ---
+# ======================================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos de cartera, históricos y bancos.")
+    parser.add_argument('--filas', type=int, default=10_000, help="Facturas de cartera (10k a 5M)")
+    parser.add_argument('--movimientos', type=int, default=2_000, help="Líneas del extracto bancario")
+    parser.add_argument('--meses', type=int, default=12, help="Archivos Cartera_YYYY_MM.xlsx a generar (0 = ninguno)")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', default='datos_sinteticos')
+    args = parser.parse_args()
+
+    t0 = datetime.now()
+    cartera = escribir_escenario(args.salida, args.filas, args.movimientos, args.meses, args.semilla)
+    print(f"Datos generados en {args.salida} ({len(cartera):,} facturas) en {(datetime.now() - t0).total_seconds():.1f} s")
+
+if __name__ == '__main__':
+    main()
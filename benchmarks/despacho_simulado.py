@@ -0,0 +1,129 @@
+# ======================================================================================
+# ARCHIVO: benchmarks/despacho_simulado.py
+# Prueba el despachador de SendGrid contra un servidor HTTP local que imita la API:
+# latencia por petición, 429 con Retry-After y 503 intermitentes.
+#
+#   python -m benchmarks.despacho_simulado --envios 300 --conexiones 4 --tasa 20
+# ======================================================================================
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from urllib import request as urllib_request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from comun.despacho_sendgrid import despachar, payload_sendgrid
+
+class _ServidorSimulado(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latencia, prob_429, prob_503):
+        super().__init__(('127.0.0.1', 0), _ManejadorSendGrid)
+        self.latencia, self.prob_429, self.prob_503 = latencia, prob_429, prob_503
+        self.lock = threading.Lock()
+        self.conexiones = 0
+        self.peticiones = 0
+        self.aceptados = set()
+
+class _ManejadorSendGrid(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.conexiones += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, cuerpo=b"", encabezados=None):
+        self.send_response(status)
+        for k, v in (encabezados or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_POST(self):
+        datos = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        destino = datos["personalizations"][0]["to"][0]["email"]
+        time.sleep(self.server.latencia)
+        with self.server.lock:
+            self.server.peticiones += 1
+        azar = random.random()
+        if azar < self.server.prob_429:
+            self._responder(429, b'{"errors":[{"message":"too many requests"}]}', {"Retry-After": "1"})
+        elif azar < self.server.prob_429 + self.server.prob_503:
+            self._responder(503, b'{"errors":[{"message":"service unavailable"}]}')
+        else:
+            with self.server.lock:
+                self.server.aceptados.add(destino)
+            self._responder(202)
+
+def _payloads(n):
+    for i in range(n):
+        yield i, payload_sendgrid(
+            "cartera@ferreinox.co", "Ferreinox", f"cliente{i}@correo.com", f"Cliente {i}",
+            "Estado de cuenta", "<p>Hola</p>", "Hola", b"%PDF-1.4 simulado" * 200, "estado.pdf",
+        )
+
+def envio_secuencial(url, n):
+    """Referencia: una conexión nueva por correo, sin reintentos (el comportamiento anterior)"""
+    enviados = 0
+    for _, payload in _payloads(n):
+        req = urllib_request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib_request.urlopen(req, timeout=45) as resp:
+                enviados += 200 <= resp.getcode() < 300
+        except Exception:
+            pass
+    return enviados
+
+def main():
+    parser = argparse.ArgumentParser(description="Despachador SendGrid contra un servidor simulado.")
+    parser.add_argument('--envios', type=int, default=200)
+    parser.add_argument('--conexiones', type=int, default=4)
+    parser.add_argument('--tasa', type=float, default=20, help="Envíos por segundo (token bucket)")
+    parser.add_argument('--latencia', type=float, default=0.15, help="Segundos por petición en el servidor")
+    parser.add_argument('--prob-429', type=float, default=0.03)
+    parser.add_argument('--prob-503', type=float, default=0.03)
+    parser.add_argument('--sin-secuencial', action='store_true', help="Omite la medición de referencia")
+    args = parser.parse_args()
+
+    servidor = _ServidorSimulado(args.latencia, args.prob_429, args.prob_503)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/v3/mail/send"
+
+    try:
+        if not args.sin_secuencial:
+            t0 = time.perf_counter()
+            ok = envio_secuencial(url, args.envios)
+            t = time.perf_counter() - t0
+            print(f"Secuencial : {ok}/{args.envios} aceptados en {t:.1f} s "
+                  f"({args.envios / t:.1f} envíos/s, {servidor.conexiones} conexiones)")
+            servidor.conexiones = servidor.peticiones = 0
+            servidor.aceptados.clear()
+
+        t0 = time.perf_counter()
+        resultados = list(despachar(_payloads(args.envios), "SG.simulado", n_trabajadores=args.conexiones,
+                                    envios_por_segundo=args.tasa, url=url))
+        t = time.perf_counter() - t0
+        ok = sum(r[1] for r in resultados)
+        reintentos = sum(r[3] - 1 for r in resultados)
+        print(f"Despachador: {ok}/{args.envios} aceptados en {t:.1f} s ({args.envios / t:.1f} envíos/s, "
+              f"{servidor.conexiones} conexiones, {reintentos} reintentos, {servidor.peticiones} peticiones)")
+
+        # Cada destinatario debe quedar aceptado exactamente una vez y reportado una vez
+        claves = [r[0] for r in resultados]
+        correcto = len(set(claves)) == args.envios and ok == len(servidor.aceptados)
+        print("Consistencia:", "OK" if correcto else "FALLA")
+        return 0 if correcto else 1
+    finally:
+        servidor.shutdown()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,6 @@
+"""Lógica compartida entre las páginas del tablero (sin dependencias de Streamlit)."""
+
+import os
+
+# Carpeta local (no versionada) para índices, bitácoras y cachés persistentes
+DIRECTORIO_DATOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "_datos_locales")
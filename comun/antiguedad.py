@@ -0,0 +1,81 @@
+# ======================================================================================
+# ARCHIVO: comun/antiguedad.py
+# Antigüedad de cartera calculada contra una fecha de consulta ("al día de"): los días
+# vencidos salen de fecha_vencimiento y no del valor congelado en el CSV, así que un
+# snapshot en caché sigue siendo correcto después de medianoche y se puede proyectar
+# a otra fecha sin volver a descargarlo.
+# ======================================================================================
+
+import numpy as np
+import pandas as pd
+
+# Escalas (cortes superiores incluidos, etiquetas): (-inf, 0], (0, 15], (15, 30], ...
+ESCALA_EDAD = ((0, 15, 30, 60),
+               ('Al día', '1-15 días', '16-30 días', '31-60 días', 'Más de 60 días'))
+ESCALA_RANGO = ((0, 15, 30, 60, 90),
+                ("🟢 Al Día", "🟡 Prev. (1-15)", "🟠 Riesgo (16-30)", "🔴 Crítico (31-60)",
+                 "🚨 Alto Riesgo (61-90)", "⚫ Legal (+90)"))
+ESCALA_RANGO_MORA = ((0, 15, 30, 60, 90),
+                     ("Al Dia", "1-15 dias", "16-30 dias", "31-60 dias", "61-90 dias", "+90 dias"))
+
+def clasificar(dias, escala):
+    """
+    Categórico ordenado con la etiqueta de la escala para cada valor de `dias` (igual que
+    pd.cut right=True). Sin días (NaN) queda sin categoría, no en el rango más vencido.
+    """
+    cortes, etiquetas = escala
+    dias = np.asarray(dias, dtype=float)
+    codigos = np.searchsorted(np.asarray(cortes), dias, side='left')
+    codigos[np.isnan(dias)] = -1
+    return pd.Categorical.from_codes(codigos, categories=list(etiquetas), ordered=True)
+
+def dias_vencido_al(df, al_dia):
+    """
+    Días vencidos de cada factura a `al_dia`: al_dia - fecha_vencimiento. Sin fecha de
+    vencimiento se conserva el dias_vencido del archivo, corrido los días transcurridos
+    desde snapshot_date cuando la columna existe.
+    """
+    al_dia = pd.Timestamp(al_dia).normalize()
+    dias_archivo = pd.to_numeric(df['dias_vencido'], errors='coerce').fillna(0)
+    if 'snapshot_date' in df.columns:
+        corrimiento = (al_dia - pd.to_datetime(df['snapshot_date'], errors='coerce')).dt.days
+        dias_archivo = dias_archivo + corrimiento.fillna(0)
+    if 'fecha_vencimiento' not in df.columns:
+        return dias_archivo.astype(int)
+    vencimiento = pd.to_datetime(df['fecha_vencimiento'], errors='coerce').dt.normalize()
+    return (al_dia - vencimiento).dt.days.fillna(dias_archivo).astype(int)
+
+def fecha_corte_inferida(df):
+    """
+    Fecha a la que el archivo calculó sus dias_vencido: la más frecuente de
+    fecha_vencimiento + dias_vencido (NaT si ninguna fila trae ambos datos).
+    """
+    vencimiento = pd.to_datetime(df['fecha_vencimiento'], errors='coerce').dt.normalize()
+    dias = pd.to_numeric(df['dias_vencido'], errors='coerce')
+    fechas = (vencimiento + pd.to_timedelta(dias, unit='D')).dropna()
+    return fechas.mode().iloc[0] if not fechas.empty else pd.NaT
+
+def corregir_fechas_corte(df):
+    """
+    snapshot_date de cada corte reemplazado por su fecha_corte_inferida; la fecha de origen
+    (nombre del archivo, Dropbox) queda solo si no se puede inferir. Modifica `df` en sitio.
+    """
+    if df.empty or not {'snapshot_date', 'fecha_vencimiento', 'dias_vencido'} <= set(df.columns):
+        return df
+    inferidas = {corte: fecha_corte_inferida(grupo) for corte, grupo in df.groupby('snapshot_date')}
+    df['snapshot_date'] = df['snapshot_date'].map(inferidas).fillna(df['snapshot_date'])
+    return df
+
+def aplicar_antiguedad(df, al_dia=None, escalas=None):
+    """
+    Copia de `df` con dias_vencido recalculado a `al_dia` (hoy si es None) y cada columna
+    de `escalas` ({columna: escala}) reclasificada. Solo toca esas columnas.
+    """
+    al_dia = pd.Timestamp.now() if al_dia is None else al_dia
+    vista = df.copy()
+    if vista.empty:
+        return vista
+    vista['dias_vencido'] = dias_vencido_al(vista, al_dia)
+    for columna, escala in (escalas or {}).items():
+        vista[columna] = clasificar(vista['dias_vencido'], escala)
+    return vista
@@ -0,0 +1,112 @@
+# ======================================================================================
+# ARCHIVO: comun/cache_pdf.py
+# Caché en disco de los PDF de estado de cuenta. La llave es un hash de las facturas
+# del cliente, la plantilla (nombre + versión), los argumentos y el día: vista previa,
+# descarga y envío masivo reutilizan los mismos bytes mientras la cartera no cambie.
+#
+# Cada plantilla declara su VERSION_PDF_*: se sube al cambiar el diseño y así deja de
+# servirse lo ya generado. Como un PDF cacheado vale todo el día, las plantillas solo
+# imprimen la fecha de generación, nunca la hora.
+# ======================================================================================
+
+import os
+import hashlib
+import functools
+from datetime import date
+
+import pandas as pd
+
+from comun import DIRECTORIO_DATOS
+
+DIRECTORIO_PDFS = os.path.join(DIRECTORIO_DATOS, "pdf_cache")
+# Tope del directorio; al superarlo se borran los PDF menos usados hasta quedar en el 80 %
+MAX_BYTES_CACHE = 200 * 1024 * 1024
+
+_ESTADO = {'bytes': None}
+
+def huella_pdf(df_cliente, plantilla, version, *extras):
+    """Hash de filas + columnas + plantilla/versión + extras + día. None si no se puede hashear"""
+    try:
+        filas = pd.util.hash_pandas_object(df_cliente, index=False).values.tobytes()
+    except TypeError:
+        return None
+    h = hashlib.sha1(filas)
+    h.update(repr((list(df_cliente.columns), plantilla, version, [str(x) for x in extras], date.today().isoformat())).encode("utf-8"))
+    return h.hexdigest()
+
+def _ruta(huella, directorio):
+    return os.path.join(directorio, f"{huella}.pdf")
+
+def _bytes_en_directorio(directorio):
+    try:
+        return sum(e.stat().st_size for e in os.scandir(directorio) if e.name.endswith(".pdf"))
+    except OSError:
+        return 0
+
+def desalojar(directorio=DIRECTORIO_PDFS, max_bytes=MAX_BYTES_CACHE):
+    """Borra los PDF con acceso más antiguo (mtime) hasta quedar por debajo del 80 % del tope"""
+    try:
+        archivos = [e for e in os.scandir(directorio) if e.name.endswith(".pdf")]
+    except OSError:
+        return 0
+    datos = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in archivos))
+    total = sum(tam for _, tam, _ in datos)
+    objetivo = max_bytes * 0.8
+    borrados = 0
+    for _, tam, ruta in datos:
+        if total <= objetivo: break
+        try:
+            os.remove(ruta)
+            total -= tam
+            borrados += 1
+        except OSError:
+            pass
+    _ESTADO['bytes'] = total
+    return borrados
+
+def leer(huella, directorio=DIRECTORIO_PDFS):
+    ruta = _ruta(huella, directorio)
+    try:
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+        os.utime(ruta)  # Marca de uso para el desalojo LRU
+        return contenido
+    except OSError:
+        return None
+
+def guardar(huella, contenido, directorio=DIRECTORIO_PDFS, max_bytes=MAX_BYTES_CACHE):
+    """Escritura atómica (tmp + replace): los procesos del pool pueden escribir a la vez"""
+    ruta = _ruta(huella, directorio)
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        if _ESTADO['bytes'] is None:
+            _ESTADO['bytes'] = _bytes_en_directorio(directorio)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(contenido)
+        os.replace(tmp, ruta)
+    except OSError:
+        return  # Sin disco escribible el PDF se sigue entregando, solo que sin caché
+    _ESTADO['bytes'] += len(contenido)
+    if _ESTADO['bytes'] > max_bytes:
+        desalojar(directorio, max_bytes)
+
+def cachear_pdf(plantilla, version):
+    """
+    Decorador para generadores `f(df_cliente, *args) -> bytes`. Subir `version` al
+    cambiar el diseño del PDF invalida lo ya generado. La función original queda en
+    `__wrapped__` (los benchmarks la usan para medir el render real).
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(df_cliente, *args):
+            huella = huella_pdf(df_cliente, plantilla, version, *args)
+            if huella is None:
+                return funcion(df_cliente, *args)
+            contenido = leer(huella)
+            if contenido is None:
+                contenido = funcion(df_cliente, *args)
+                guardar(huella, contenido)
+            return contenido
+        return envoltura
+    return decorador
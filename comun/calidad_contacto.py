@@ -0,0 +1,89 @@
+# ======================================================================================
+# ARCHIVO: comun/calidad_contacto.py
+# Calidad de los datos de contacto (correo y celular), vectorizada y compartida por las
+# páginas. Se calcula una vez por snapshot de cartera y se reutiliza desde memoria.
+# ======================================================================================
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+PATRON_EMAIL = r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}"
+CODIGO_PAIS = "57"
+
+ESTADO_SIN_CORREO = "Sin correo"
+ESTADO_INVALIDO = "Correo invalido"
+ESTADO_COMPARTIDO = "Correo compartido"
+ESTADO_LISTO = "Listo"
+
+_MAX_SNAPSHOTS = 4
+_SNAPSHOTS = OrderedDict()
+
+def _como_texto(serie):
+    return serie.astype(object).where(serie.notna(), "").astype(str)
+
+def normalizar_emails(serie):
+    """Minúsculas, sin espacios; nulos -> ''"""
+    return _como_texto(serie).str.strip().str.lower().str.replace(" ", "", regex=False)
+
+def emails_validos(emails_normalizados):
+    return emails_normalizados.str.fullmatch(PATRON_EMAIL).fillna(False).astype(bool)
+
+def normalizar_telefonos(serie, codigo_pais=CODIGO_PAIS):
+    """
+    E.164 ('+573001234567'); '' si no alcanza 10 dígitos. Un celular colombiano de 10
+    dígitos (empieza por 3) recibe el indicativo; lo demás se toma tal cual.
+    """
+    digitos = _como_texto(serie).str.replace(r"\D", "", regex=True)
+    # '3001234567.0' de columnas leídas como float: el '.0' final no es parte del número
+    digitos = digitos.where(~_como_texto(serie).str.fullmatch(r"\d+\.0"), digitos.str[:-1])
+    largo = digitos.str.len()
+    celular_local = (largo == 10) & digitos.str.startswith("3")
+    e164 = np.where(celular_local, "+" + codigo_pais + digitos, "+" + digitos)
+    return pd.Series(np.where(largo >= 10, e164, ""), index=serie.index)
+
+def telefonos_whatsapp(telefonos_e164):
+    """wa.me espera solo dígitos"""
+    return telefonos_e164.str.lstrip("+")
+
+def estado_correo(emails_normalizados):
+    """Sin correo / Correo invalido / Correo compartido (lo tiene más de un cliente) / Listo"""
+    no_vacios = emails_normalizados[emails_normalizados != ""]
+    conteo = no_vacios.value_counts()
+    compartido = emails_normalizados.map(conteo).fillna(0).gt(1)
+    valido = emails_validos(emails_normalizados)
+    return pd.Series(np.select(
+        [emails_normalizados == "", ~valido, compartido],
+        [ESTADO_SIN_CORREO, ESTADO_INVALIDO, ESTADO_COMPARTIDO],
+        default=ESTADO_LISTO,
+    ), index=emails_normalizados.index)
+
+def _huella(*series):
+    h = hashlib.sha1()
+    for serie in series:
+        h.update(pd.util.hash_pandas_object(_como_texto(serie), index=False).values.tobytes())
+    return h.hexdigest()
+
+def calidad_contacto(emails, telefonos):
+    """
+    Columnas email_normalizado, email_valido y telefono_e164 alineadas con `emails`.
+    El resultado se memoriza por contenido: otra página (u otro rerun) con la misma
+    cartera lo lee sin recalcular.
+    """
+    huella = _huella(emails, telefonos)
+    valores = _SNAPSHOTS.get(huella)
+    if valores is None:
+        normalizados = normalizar_emails(emails)
+        valores = {
+            'email_normalizado': normalizados.to_numpy(),
+            'email_valido': emails_validos(normalizados).to_numpy(),
+            'telefono_e164': normalizar_telefonos(telefonos).to_numpy(),
+        }
+        _SNAPSHOTS[huella] = valores
+        while len(_SNAPSHOTS) > _MAX_SNAPSHOTS:
+            _SNAPSHOTS.popitem(last=False)
+    else:
+        _SNAPSHOTS.move_to_end(huella)
+    return pd.DataFrame(valores, index=emails.index)
@@ -0,0 +1,361 @@
+# ======================================================================================
+# ARCHIVO: comun/campanas_envio.py
+# Campañas de envío masivo en segundo plano. La cola y el estado de cada destinatario
+# viven en SQLite: un refresh del navegador o un reinicio del servidor no pierden el
+# avance y una campaña interrumpida se retoma sin reenviar a quien ya se le envió.
+#
+# Estados del destinatario:
+#   pendiente -> enviando -> enviado | error
+#   enviando sin respuesta (caída a mitad de envío) -> revisar (no se reenvía solo)
+# ======================================================================================
+
+import os
+import time
+import uuid
+import pickle
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from comun import DIRECTORIO_DATOS
+from comun.despacho_sendgrid import URL_SENDGRID, despachar, resultado_envio
+from comun.historial_envios import registrar_envios
+from comun.pdf_conciliacion import generar_pdfs
+from comun.sqlite_local import transaccion
+
+RUTA_CAMPANAS = os.path.join(DIRECTORIO_DATOS, "campanas_envio.sqlite")
+# Sin latido en este tiempo la campaña se considera huérfana y otro ejecutor la retoma
+SEGUNDOS_ARRIENDO = 300
+# Cada cuánto renueva el latido el ejecutor mientras trabaja (PDFs, esperas por 429/5xx)
+SEGUNDOS_LATIDO = SEGUNDOS_ARRIENDO / 5
+LOTE_HISTORIAL = 25
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS campanas (
+    id TEXT PRIMARY KEY,
+    nombre TEXT,
+    estado TEXT NOT NULL,
+    parametros BLOB,
+    total INTEGER,
+    creada TEXT,
+    actualizada TEXT,
+    propietario TEXT,
+    latido REAL,
+    ultimo_error TEXT
+);
+CREATE TABLE IF NOT EXISTS destinatarios (
+    campana_id TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    orden INTEGER,
+    cliente TEXT,
+    correo TEXT,
+    fila BLOB,
+    facturas BLOB,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    detalle TEXT,
+    intentos INTEGER DEFAULT 0,
+    actualizado TEXT,
+    PRIMARY KEY (campana_id, clave)
+);
+CREATE INDEX IF NOT EXISTS ix_destinatarios_estado ON destinatarios (campana_id, estado, orden);
+CREATE INDEX IF NOT EXISTS ix_campanas_estado ON campanas (estado, creada);
+"""
+
+def _transaccion(ruta=RUTA_CAMPANAS, escritura=True):
+    """Las escrituras usan BEGIN IMMEDIATE: reclamos atómicos entre ejecutores"""
+    return transaccion(ruta, _ESQUEMA, inmediata=escritura)
+
+def _ahora():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+# ======================================================================================
+# --- 1. COLA ---
+# ======================================================================================
+
+def crear_campana(nombre, parametros, elegibles, grupos, ruta=RUTA_CAMPANAS):
+    """
+    Encola una campaña con una foto de cada destinatario (fila del resumen + sus facturas),
+    así el envío no depende de que la cartera siga cargada en la sesión.
+    """
+    campana_id = uuid.uuid4().hex[:12]
+    ahora = _ahora()
+    filas = [
+        (campana_id, str(clave), orden, str(fila["nombrecliente"]), str(fila["correo"]),
+         pickle.dumps(fila, protocol=pickle.HIGHEST_PROTOCOL),
+         pickle.dumps(grupos.get(fila["cliente_key"], pd.DataFrame()), protocol=pickle.HIGHEST_PROTOCOL),
+         ahora)
+        for orden, (clave, fila) in enumerate(elegibles.iterrows())
+    ]
+    with _transaccion(ruta) as con:
+        con.execute(
+            "INSERT INTO campanas (id, nombre, estado, parametros, total, creada, actualizada) VALUES (?, ?, 'pendiente', ?, ?, ?, ?)",
+            (campana_id, nombre, pickle.dumps(parametros), len(filas), ahora, ahora)
+        )
+        con.executemany(
+            "INSERT INTO destinatarios (campana_id, clave, orden, cliente, correo, fila, facturas, actualizado) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", filas
+        )
+    return campana_id
+
+def cancelar_campana(campana_id, ruta=RUTA_CAMPANAS):
+    """El ejecutor deja de tomar destinatarios; los que ya están en vuelo terminan"""
+    with _transaccion(ruta) as con:
+        con.execute(
+            "UPDATE campanas SET estado = 'cancelada', actualizada = ? WHERE id = ? AND estado IN ('pendiente', 'en_curso')",
+            (_ahora(), campana_id)
+        )
+        con.execute(
+            "UPDATE destinatarios SET estado = 'cancelado', actualizado = ? WHERE campana_id = ? AND estado = 'pendiente'",
+            (_ahora(), campana_id)
+        )
+
+def reintentar_revisados(campana_id, estados=('revisar',), ruta=RUTA_CAMPANAS):
+    """Vuelve a la cola los destinatarios indicados (decisión del operador) y reabre la campaña"""
+    marcas = ", ".join("?" * len(estados))
+    with _transaccion(ruta) as con:
+        n = con.execute(
+            f"UPDATE destinatarios SET estado = 'pendiente', actualizado = ? WHERE campana_id = ? AND estado IN ({marcas})",
+            (_ahora(), campana_id, *estados)
+        ).rowcount
+        if n:
+            con.execute(
+                "UPDATE campanas SET estado = 'pendiente', actualizada = ?, ultimo_error = NULL WHERE id = ?",
+                (_ahora(), campana_id)
+            )
+    return n
+
+# ======================================================================================
+# --- 2. CONSULTAS PARA LA INTERFAZ ---
+# ======================================================================================
+
+def listar_campanas(limite=10, ruta=RUTA_CAMPANAS):
+    with _transaccion(ruta, escritura=False) as con:
+        return pd.read_sql_query(
+            "SELECT c.id, c.nombre, c.estado, c.total, c.creada, c.actualizada, c.ultimo_error, "
+            "SUM(d.estado = 'enviado') AS enviados, SUM(d.estado = 'error') AS errores, "
+            "SUM(d.estado = 'revisar') AS revisar, SUM(d.estado IN ('pendiente', 'enviando')) AS pendientes "
+            "FROM campanas c LEFT JOIN destinatarios d ON d.campana_id = c.id "
+            "GROUP BY c.id ORDER BY c.creada DESC LIMIT ?",
+            con, params=(int(limite),)
+        )
+
+def progreso_campana(campana_id, ruta=RUTA_CAMPANAS):
+    """Conteo por estado de destinatario + estado de la campaña (para el sondeo de la página)"""
+    with _transaccion(ruta, escritura=False) as con:
+        fila = con.execute("SELECT estado, total, ultimo_error FROM campanas WHERE id = ?", (campana_id,)).fetchone()
+        conteos = dict(con.execute(
+            "SELECT estado, COUNT(*) FROM destinatarios WHERE campana_id = ? GROUP BY estado", (campana_id,)
+        ).fetchall())
+    if fila is None: return None
+    return {'estado': fila[0], 'total': fila[1], 'ultimo_error': fila[2], **conteos}
+
+def detalle_campana(campana_id, ruta=RUTA_CAMPANAS):
+    with _transaccion(ruta, escritura=False) as con:
+        return pd.read_sql_query(
+            'SELECT cliente AS "Cliente", correo AS "Correo", estado AS "Estado", detalle AS "Detalle", '
+            'intentos AS "Intentos", actualizado AS "Actualizado" '
+            "FROM destinatarios WHERE campana_id = ? ORDER BY orden",
+            con, params=(campana_id,)
+        )
+
+# ======================================================================================
+# --- 3. EJECUTOR EN SEGUNDO PLANO ---
+# ======================================================================================
+
+def _tomar_campana(propietario, ruta):
+    """
+    Reclama la campaña más antigua sin dueño vivo. Lo que quedó 'enviando' pudo o no salir
+    hacia SendGrid: pasa a 'revisar' en vez de reenviarse.
+    """
+    ahora = time.time()
+    with _transaccion(ruta) as con:
+        fila = con.execute(
+            "SELECT id, nombre, parametros FROM campanas WHERE estado IN ('pendiente', 'en_curso') "
+            "AND (propietario IS NULL OR propietario = ? OR latido < ?) ORDER BY creada LIMIT 1",
+            (propietario, ahora - SEGUNDOS_ARRIENDO)
+        ).fetchone()
+        if fila is None: return None
+        con.execute(
+            "UPDATE destinatarios SET estado = 'revisar', actualizado = ?, "
+            "detalle = 'Envio interrumpido: confirmar en SendGrid antes de reintentar' "
+            "WHERE campana_id = ? AND estado = 'enviando'",
+            (_ahora(), fila[0])
+        )
+        con.execute(
+            "UPDATE campanas SET estado = 'en_curso', propietario = ?, latido = ?, actualizada = ? WHERE id = ?",
+            (propietario, ahora, _ahora(), fila[0])
+        )
+    return {'id': fila[0], 'nombre': fila[1], 'parametros': pickle.loads(fila[2])}
+
+def _reclamar_destinatario(campana_id, clave, propietario, ruta):
+    """pendiente -> enviando solo si la campaña sigue activa y es nuestra (a lo sumo un envío)"""
+    with _transaccion(ruta) as con:
+        activa = con.execute(
+            "SELECT 1 FROM campanas WHERE id = ? AND estado = 'en_curso' AND propietario = ?",
+            (campana_id, propietario)
+        ).fetchone()
+        if not activa: return False
+        con.execute("UPDATE campanas SET latido = ? WHERE id = ?", (time.time(), campana_id))
+        return con.execute(
+            "UPDATE destinatarios SET estado = 'enviando', actualizado = ? WHERE campana_id = ? AND clave = ? AND estado = 'pendiente'",
+            (_ahora(), campana_id, clave)
+        ).rowcount == 1
+
+def _renovar_latido(campana_id, propietario, ruta):
+    with _transaccion(ruta) as con:
+        con.execute(
+            "UPDATE campanas SET latido = ? WHERE id = ? AND propietario = ?",
+            (time.time(), campana_id, propietario)
+        )
+
+def _registrar_resultado(campana_id, clave, estado, detalle, intentos, ruta):
+    with _transaccion(ruta) as con:
+        con.execute(
+            "UPDATE destinatarios SET estado = ?, detalle = ?, intentos = ?, actualizado = ? WHERE campana_id = ? AND clave = ?",
+            (estado, detalle, intentos, _ahora(), campana_id, clave)
+        )
+        con.execute("UPDATE campanas SET latido = ? WHERE id = ?", (time.time(), campana_id))
+
+def _cerrar_campana(campana_id, propietario, ruta):
+    with _transaccion(ruta) as con:
+        quedan = con.execute(
+            "SELECT COUNT(*) FROM destinatarios WHERE campana_id = ? AND estado IN ('pendiente', 'enviando')",
+            (campana_id,)
+        ).fetchone()[0]
+        estado = con.execute("SELECT estado FROM campanas WHERE id = ?", (campana_id,)).fetchone()[0]
+        if estado == 'en_curso' and quedan == 0:
+            estado = 'terminada'
+        con.execute(
+            "UPDATE campanas SET estado = ?, propietario = NULL, actualizada = ? WHERE id = ? AND propietario = ?",
+            (estado, _ahora(), campana_id, propietario)
+        )
+
+def _fila_historial(campana, fila, ok, detalle):
+    return {
+        "Fecha": _ahora(),
+        "Campana": campana['nombre'],
+        "Modo": "Produccion",
+        "Cliente": fila["nombrecliente"],
+        "Destino": fila["correo"],
+        "Correo Cliente": fila["correo"],
+        "Estado Correo": fila["estado_correo"],
+        "Saldo Vencido": float(fila["saldo_vencido"]),
+        "Resultado": resultado_envio(ok),
+        "Detalle": detalle,
+        "Vendedor": fila["nomvendedor"],
+        "Zona": fila["zona"],
+        "Estrategia": campana['parametros'].get("estrategia", ""),
+    }
+
+class EjecutorCampanas:
+    """
+    Hilo de fondo que consume la cola de campañas. La página lo crea con st.cache_resource
+    (uno por proceso del servidor); `construir_payload(parametros, fila, pdf_bytes)` arma el
+    correo con las plantillas de la página.
+    """
+    def __init__(self, api_key, construir_payload, ruta=RUTA_CAMPANAS, intervalo=2.0, procesos_pdf=None,
+                 url=URL_SENDGRID):
+        self.api_key = api_key
+        self.url = url
+        self.construir_payload = construir_payload
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self.procesos_pdf = procesos_pdf or min(4, os.cpu_count() or 1)
+        self.propietario = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="campanas-envio", daemon=True)
+                self._hilo.start()
+        return self
+
+    def despertar(self):
+        """Evita esperar el intervalo de sondeo tras encolar una campaña"""
+        self._despertar.set()
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def _bucle(self):
+        while True:
+            campana = None
+            try:
+                campana = _tomar_campana(self.propietario, self.ruta)
+                if campana is not None:
+                    self._ejecutar(campana)
+                    continue
+            except Exception as exc:
+                # El error queda visible en la página; la campaña se retoma en el siguiente ciclo
+                if campana is not None:
+                    try:
+                        with _transaccion(self.ruta) as con:
+                            con.execute("UPDATE campanas SET ultimo_error = ? WHERE id = ?", (str(exc)[:500], campana['id']))
+                    except Exception:
+                        pass
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+
+    def _ejecutar(self, campana):
+        parametros = campana['parametros']
+        with _transaccion(self.ruta, escritura=False) as con:
+            pendientes = con.execute(
+                "SELECT clave, fila, facturas FROM destinatarios WHERE campana_id = ? AND estado = 'pendiente' ORDER BY orden",
+                (campana['id'],)
+            ).fetchall()
+        filas = {clave: pickle.loads(fila) for clave, fila, _ in pendientes}
+        # Las facturas de cada destinatario se indexan por su clave para el productor de PDFs
+        grupos = {clave: pickle.loads(facturas) for clave, _, facturas in pendientes}
+        pedidos = [(clave, clave, float(fila["saldo_vencido"])) for clave, fila in filas.items()]
+
+        def trabajos():
+            for clave, pdf_bytes in generar_pdfs(pedidos, grupos, n_procesos=self.procesos_pdf):
+                if not _reclamar_destinatario(campana['id'], clave, self.propietario, self.ruta):
+                    if progreso_campana(campana['id'], self.ruta)['estado'] != 'en_curso': return
+                    continue
+                try:
+                    payload = self.construir_payload(parametros, filas[clave], pdf_bytes)
+                except Exception as exc:
+                    _registrar_resultado(campana['id'], clave, 'error', f"Error armando el correo: {exc}", 0, self.ruta)
+                    continue
+                yield clave, payload
+
+        # Un lote de PDFs o un backoff largo pueden pasar sin resultados que registrar:
+        # el latido se renueva aparte para que otro ejecutor no retome la campaña viva
+        detener_latido = threading.Event()
+
+        def latir():
+            while not detener_latido.wait(SEGUNDOS_LATIDO):
+                try:
+                    _renovar_latido(campana['id'], self.propietario, self.ruta)
+                except Exception:
+                    pass
+
+        threading.Thread(target=latir, name="campanas-latido", daemon=True).start()
+        historial = []
+        try:
+            envios = despachar(
+                trabajos(), self.api_key,
+                n_trabajadores=int(parametros.get("conexiones", 4)),
+                envios_por_segundo=float(parametros.get("envios_por_segundo", 10)),
+                url=self.url,
+            )
+            for clave, ok, detalle, intentos in envios:
+                if intentos > 1:
+                    detalle = f"{detalle} ({intentos} intentos)"
+                estado = 'enviado' if ok else ('revisar' if ok is None else 'error')
+                _registrar_resultado(campana['id'], clave, estado, detalle, intentos, self.ruta)
+                historial.append(_fila_historial(campana, filas[clave], ok, detalle))
+                if len(historial) >= LOTE_HISTORIAL:
+                    registrar_envios(pd.DataFrame(historial))
+                    historial = []
+        finally:
+            detener_latido.set()
+            if historial:
+                registrar_envios(pd.DataFrame(historial))
+        _cerrar_campana(campana['id'], self.propietario, self.ruta)
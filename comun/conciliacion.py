@@ -0,0 +1,373 @@
+# ======================================================================================
+# ARCHIVO: comun/conciliacion.py
+# Núcleo del Motor de Conciliación: índices de cartera + clasificación por movimiento.
+# Vive fuera de pages/ para que los procesos hijos puedan importar sus funciones.
+# ======================================================================================
+
+import re
+import time
+import unicodedata
+import itertools
+from bisect import bisect_left, bisect_right
+
+from fuzzywuzzy import fuzz, process
+
+from comun.indice_tokens import cargar_o_construir_indice, rankear_candidatos, elegir_candidato
+from comun.metricas_motor import nuevas_metricas, combinar_metricas
+from comun.procesos import contexto_pool
+
+# Por debajo de este número de movimientos no compensa levantar procesos
+MIN_FILAS_PARALELO = 500
+# Bloques por proceso: más bloques = mejor balanceo, más coste de serialización
+BLOQUES_POR_PROCESO = 4
+TAM_BLOQUE_SERIAL = 200
+
+PALABRAS_BASURA = [
+    'PAGO', 'TRANSF', 'TRANSFERENCIA', 'CONSIGNACION', 'ABONO', 'CTA', 'NIT',
+    'REF', 'FACTURA', 'OFI', 'SUC', 'ACH', 'PSE', 'NOMINA', 'PROVEEDOR',
+    'COMPRA', 'VENTA', 'VALOR', 'NETO', 'PLANILLA', 'S A', 'SAS', 'LTDA',
+    'COLOMBIA', 'BANCOLOMBIA', 'DAVIVIENDA', 'BBVA', 'BOGOTA', 'OCCIDENTE',
+    'NEQUI', 'DAVIPLATA', 'TRANSACCION', 'ELECTRONICA', 'RECIBIDO', 'DESDE', 'TERCERO',
+    'CONSORCIO', 'UNION', 'TEMPORAL', 'GRP', 'GROUP'
+]
+
+# ======================================================================================
+# --- 1. NORMALIZACIÓN ---
+# ======================================================================================
+
+def normalizar_texto_avanzado(texto):
+    """Limpieza profunda para IA y Fuzzy Matching"""
+    if not isinstance(texto, str): return ""
+    texto = texto.upper().strip()
+    texto = ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+    texto = re.sub(r'[^A-Z0-9\s]', ' ', texto)
+    for p in PALABRAS_BASURA:
+        texto = re.sub(r'\b' + p + r'\b', ' ', texto)
+    return ' '.join(texto.split())
+
+def extraer_posibles_nits(texto):
+    if not isinstance(texto, str): return []
+    clean_txt = texto.replace('.', '').replace('-', '')
+    return re.findall(r'\b\d{7,11}\b', clean_txt)
+
+# ======================================================================================
+# --- 2. ANÁLISIS DE DEUDA ---
+# ======================================================================================
+
+# Resultados de clasificar_pago que sí cruzan facturas (los demás quedan abiertos)
+ESTADOS_CONCILIADOS = (
+    '✅ MATCH EXACTO (TOTAL)', '✅ FACTURAS ESPECÍFICAS', '💎 CONCILIADO C/DCTO', '🏢 CONCILIADO (IMPUESTOS)'
+)
+
+def clasificar_pago(facturas_list, valor_pago, metricas=None):
+    """Cruza un pago contra las facturas abiertas de un cliente (lista de {Numero, Importe})"""
+    res = {
+        'Estado': '⚠️ SIN COINCIDENCIA VALOR',
+        'Facturas_Conciliadas': '',
+        'Detalle_Operacion': '',
+        'Diferencia': 0,
+        'Tipo_Ajuste': 'Ninguno',
+        'Impuesto_Est': 0
+    }
+
+    if not facturas_list:
+        res['Detalle_Operacion'] = "Cliente identificado por Nombre/NIT, pero no tiene facturas abiertas en cartera."
+        res['Diferencia'] = valor_pago * -1
+        return res
+
+    total_deuda = sum(f['Importe'] for f in facturas_list)
+
+    # 1. MATCH EXACTO TOTAL
+    if abs(valor_pago - total_deuda) < 1000:
+        res['Estado'] = '✅ MATCH EXACTO (TOTAL)'
+        res['Facturas_Conciliadas'] = 'TODAS'
+        res['Detalle_Operacion'] = f"Pago total de {len(facturas_list)} facturas pendientes."
+        return res
+
+    # 2. MATCH FACTURAS ESPECÍFICAS (Combinatoria)
+    found = False
+    nodos = 0
+    # Probamos combinaciones de 1 a 4 facturas
+    for r in range(1, 5):
+        if found: break
+        for combo in itertools.combinations(facturas_list, r):
+            nodos += 1
+            suma_combo = sum(c['Importe'] for c in combo)
+            numeros = ", ".join([str(c['Numero']) for c in combo])
+
+            # Match Exacto de Subconjunto
+            if abs(valor_pago - suma_combo) < 500:
+                res['Estado'] = '✅ FACTURAS ESPECÍFICAS'
+                res['Facturas_Conciliadas'] = numeros
+                res['Detalle_Operacion'] = f"Suma exacta de: {numeros}"
+                found = True
+                break
+
+            # Match con Descuento Pronto Pago (~3%)
+            if abs(valor_pago - (suma_combo * 0.97)) < 2000:
+                res['Estado'] = '💎 CONCILIADO C/DCTO'
+                res['Facturas_Conciliadas'] = numeros
+                res['Detalle_Operacion'] = f"Posible Dcto Pronto Pago sobre: {numeros}"
+                res['Tipo_Ajuste'] = "Descuento Pronto Pago"
+                found = True
+                break
+
+    if metricas is not None: metricas['nodos_combinatoria'] += nodos
+    if found: return res
+
+    # 3. IMPUESTOS
+    base_est = total_deuda / 1.19
+    rete_fuente = base_est * 0.025
+    rete_iva = (base_est * 0.19) * 0.15
+    pago_imptos = total_deuda - rete_fuente - rete_iva
+
+    if abs(valor_pago - pago_imptos) < 5000:
+        res['Estado'] = '🏢 CONCILIADO (IMPUESTOS)'
+        res['Impuesto_Est'] = rete_fuente + rete_iva
+        res['Detalle_Operacion'] = "Coincide monto total menos retenciones estimadas."
+        res['Facturas_Conciliadas'] = 'TODAS (Probable)'
+        return res
+
+    # 4. ABONO PARCIAL
+    res['Estado'] = '⚠️ ABONO / PARCIAL'
+    res['Diferencia'] = total_deuda - valor_pago
+    res['Detalle_Operacion'] = f"No cruza exacto. Deuda Total: ${total_deuda:,.0f}. Diferencia: ${res['Diferencia']:,.0f}"
+
+    return res
+
+def analizar_deuda_cliente(nombre_cliente, nit_cliente, valor_pago, df_cartera, metricas=None):
+    facturas = df_cartera[df_cartera['nit_norm'] == nit_cliente]
+    if facturas.empty:
+        facturas = df_cartera[df_cartera['NombreCliente'].str.contains(nombre_cliente, case=False, na=False)]
+    if metricas is not None: metricas['candidatos']['facturas_cliente'] += len(facturas)
+    return clasificar_pago(facturas[['Numero', 'Importe']].to_dict('records'), valor_pago, metricas)
+
+# ======================================================================================
+# --- 3. ÍNDICES (se construyen una vez por corrida y se comparten con los procesos) ---
+# ======================================================================================
+
+def construir_memoria(df_historico, df_kb):
+    """Memoria unificada texto normalizado -> cliente (KB primero, el histórico sobrescribe)"""
+    memoria_unificada = {}
+
+    if not df_kb.empty and df_kb.shape[1] >= 2:
+        kb = df_kb.iloc[:, :2].dropna(how='all').astype(str)
+        memoria_unificada.update(zip(kb.iloc[:, 0].str.strip(), kb.iloc[:, 1].str.strip()))
+
+    if not df_historico.empty and 'HISTORIA_TEXTO' in df_historico.columns and 'HISTORIA_CLIENTE' in df_historico.columns:
+        txt = df_historico['HISTORIA_TEXTO'].astype(str)
+        cli = df_historico['HISTORIA_CLIENTE'].astype(str)
+        mask = (txt.str.len() > 5) & (cli != '') & (cli.str.lower() != 'nan')
+        memoria_unificada.update(zip(txt[mask], cli[mask]))
+
+    return memoria_unificada
+
+def construir_indices(df_cartera, df_historico, df_kb):
+    """Empaqueta todos los índices de solo lectura que necesita conciliar_fila"""
+    cartera = df_cartera.reset_index(drop=True)
+
+    primeros_nombre = cartera.drop_duplicates('nombre_norm')
+    primeros_cliente = cartera.drop_duplicates('NombreCliente')
+
+    # Radar Monto: importes ordenados + posición original para respetar el orden de cartera
+    importes = cartera['Importe'].astype(float).tolist()
+    orden = sorted(range(len(importes)), key=importes.__getitem__)
+
+    return {
+        'df_cartera': cartera,
+        'memoria': construir_memoria(df_historico, df_kb),
+        'mapa_nit_nombre': cartera.groupby('nit_norm')['NombreCliente'].first().to_dict(),
+        'nit_por_cliente': dict(zip(primeros_cliente['NombreCliente'], primeros_cliente['nit_norm'])),
+        # Palabras clave: índice invertido con IDF, persistido por snapshot de cartera
+        'indice_tokens': cargar_o_construir_indice(cartera),
+        'nombres_norm': primeros_nombre['nombre_norm'].tolist(),
+        'cliente_por_nombre_norm': dict(zip(
+            primeros_nombre['nombre_norm'],
+            zip(primeros_nombre['NombreCliente'], primeros_nombre['nit_norm'])
+        )),
+        'facturas_por_nit': {
+            nit: g[['Numero', 'Importe']].to_dict('records')
+            for nit, g in cartera.groupby('nit_norm', sort=False)
+        },
+        'importes_ordenados': [importes[i] for i in orden],
+        'posicion_importe': orden,
+        'filas_radar': cartera[['Numero', 'NombreCliente', 'nit_norm']].to_dict('records'),
+    }
+
+def _radar_monto(valor_pago, indices, tolerancia=100, metricas=None):
+    """Primera factura (en orden de cartera) cuyo importe está a ±tolerancia del pago"""
+    if valor_pago != valor_pago: return None  # NaN
+    imp = indices['importes_ordenados']
+    lo = bisect_left(imp, valor_pago - tolerancia)
+    hi = bisect_right(imp, valor_pago + tolerancia)
+    if metricas is not None: metricas['candidatos']['radar_monto'] += hi - lo
+    if lo >= hi: return None
+    return indices['filas_radar'][min(indices['posicion_importe'][lo:hi])]
+
+# ======================================================================================
+# --- 4. CLASIFICACIÓN DE UN MOVIMIENTO ---
+# ======================================================================================
+
+def conciliar_fila(item, indices, metricas=None):
+    """Aplica la cascada Memoria -> NIT -> Palabra Clave -> Fuzzy -> Deuda/Radar a un movimiento"""
+    m = metricas if metricas is not None else nuevas_metricas()
+    reloj = time.perf_counter
+    m['filas'] += 1
+
+    item = dict(item)
+    item['Candidatos_Clave'] = ""
+    txt_norm = item['Texto_Norm']
+    val_pago = item['Valor_Banco']
+
+    cliente_detectado = None
+    nit_detectado = None
+    metodo_deteccion = ""
+
+    # A. MEMORIA (Prioridad Absoluta)
+    t0 = reloj()
+    m['evaluados']['memoria'] += 1
+    if txt_norm in indices['memoria']:
+        cliente_detectado = indices['memoria'][txt_norm]
+        metodo_deteccion = "🧠 Memoria / KB"
+        nit_detectado = indices['nit_por_cliente'].get(cliente_detectado)
+        m['aciertos']['memoria'] += 1
+    m['tiempos']['memoria'] += reloj() - t0
+
+    # B. CARTERA (Si no hay memoria)
+    if not cliente_detectado:
+        mapa_nit_nombre = indices['mapa_nit_nombre']
+
+        # B1. NIT en Texto
+        t0 = reloj()
+        m['evaluados']['nit_texto'] += 1
+        nits_found = extraer_posibles_nits(item['Texto_Completo'])
+        m['candidatos']['nits_en_texto'] += len(nits_found)
+        for n in nits_found:
+            if n in mapa_nit_nombre:
+                nit_detectado = n
+                cliente_detectado = mapa_nit_nombre[n]
+                metodo_deteccion = "🆔 NIT encontrado en Texto"
+                m['aciertos']['nit_texto'] += 1
+                break
+        m['tiempos']['nit_texto'] += reloj() - t0
+
+        # B2. Palabra Clave (ranking por IDF sumado sobre los tokens compartidos)
+        if not cliente_detectado:
+            t0 = reloj()
+            m['evaluados']['palabra_clave'] += 1
+            ranking = rankear_candidatos(txt_norm, indices['indice_tokens'])
+            m['candidatos']['palabra_clave'] += len(ranking)
+            item['Candidatos_Clave'] = " | ".join(
+                f"{mapa_nit_nombre.get(nit, nit)} ({puntaje:.1f})" for nit, puntaje, _ in ranking[:3]
+            )
+            elegido = elegir_candidato(ranking, indices['indice_tokens'])
+            if elegido:
+                nit_detectado, puntaje, tokens = elegido
+                cliente_detectado = mapa_nit_nombre[nit_detectado]
+                metodo_deteccion = f"🔑 Palabra Clave '{' '.join(tokens)}' (IDF {puntaje:.1f})"
+                m['aciertos']['palabra_clave'] += 1
+            m['tiempos']['palabra_clave'] += reloj() - t0
+
+        # B3. Fuzzy
+        if not cliente_detectado and indices['nombres_norm']:
+            t0 = reloj()
+            m['evaluados']['similitud'] += 1
+            m['candidatos']['similitud'] += len(indices['nombres_norm'])
+            match, score = process.extractOne(txt_norm, indices['nombres_norm'], scorer=fuzz.token_set_ratio)
+            if score >= 85:
+                cliente_detectado, nit_detectado = indices['cliente_por_nombre_norm'][match]
+                metodo_deteccion = f"≈ Similitud Nombre ({score}%)"
+                m['aciertos']['similitud'] += 1
+            m['tiempos']['similitud'] += reloj() - t0
+
+    # C. RESULTADO
+    item['Cliente_Identificado'] = cliente_detectado if cliente_detectado else ""
+    item['NIT'] = nit_detectado if nit_detectado else ""
+    item['Sugerencia_IA'] = metodo_deteccion
+    item['Status_Gestion'] = 'PENDIENTE'
+
+    t0 = reloj()
+    if cliente_detectado and nit_detectado:
+        m['evaluados']['analisis_deuda'] += 1
+        facturas_list = indices['facturas_por_nit'].get(nit_detectado)
+        if facturas_list is None:
+            analisis = analizar_deuda_cliente(cliente_detectado, nit_detectado, val_pago, indices['df_cartera'], m)
+        else:
+            m['candidatos']['facturas_cliente'] += len(facturas_list)
+            analisis = clasificar_pago(facturas_list, val_pago, m)
+        if analisis['Estado'] in ESTADOS_CONCILIADOS:
+            m['aciertos']['analisis_deuda'] += 1
+        item.update(analisis)
+        m['tiempos']['analisis_deuda'] += reloj() - t0
+    else:
+        # Radar Monto (Último recurso)
+        m['evaluados']['radar_monto'] += 1
+        cand = _radar_monto(val_pago, indices, metricas=m)
+        if cand is not None:
+            m['aciertos']['radar_monto'] += 1
+            item['Estado'] = '💡 SUGERENCIA MONTO'
+            item['Sugerencia_IA'] = "Coincidencia solo por Valor"
+            item['Cliente_Identificado'] = cand['NombreCliente'] # Sugerencia visual
+            item['NIT'] = cand['nit_norm']
+            item['Detalle_Operacion'] = f"Monto coincide con Factura {cand['Numero']} de {cand['NombreCliente']}"
+            item['Facturas_Conciliadas'] = str(cand['Numero'])
+        else:
+            item['Estado'] = '❓ NO IDENTIFICADO'
+            item['Detalle_Operacion'] = "Sin coincidencias claras."
+        m['tiempos']['radar_monto'] += reloj() - t0
+
+    return item
+
+# ======================================================================================
+# --- 5. EJECUCIÓN PARTICIONADA (process pool, índices enviados una vez por proceso) ---
+# ======================================================================================
+
+# Índices de solo lectura dentro de cada proceso hijo: llegan una sola vez, por el
+# initializer del pool. Por pipe solo viajan los movimientos de cada bloque y los resultados.
+_INDICES_HIJO = None
+
+def _iniciar_hijo(indices):
+    global _INDICES_HIJO
+    _INDICES_HIJO = indices
+
+def _conciliar_bloque(filas, indices, inicio, fin):
+    metricas = nuevas_metricas()
+    return [conciliar_fila(filas[i], indices, metricas) for i in range(inicio, fin)], metricas
+
+def _conciliar_bloque_hijo(filas):
+    return _conciliar_bloque(filas, _INDICES_HIJO, 0, len(filas))
+
+def _particionar(total, tam_bloque):
+    return [(i, min(i + tam_bloque, total)) for i in range(0, total, tam_bloque)]
+
+def conciliar_movimientos(filas, indices, n_procesos=1, al_avanzar=None, metricas=None):
+    """
+    Concilia una lista de movimientos (dicts) y devuelve los resultados en el mismo orden.
+    Con n_procesos > 1 reparte bloques contiguos en un pool forkserver/spawn (se llama desde
+    el hilo de una sesión de Streamlit: nada de fork, ver comun.procesos).
+    al_avanzar(fraccion) se llama al terminar cada bloque; metricas acumula la instrumentación.
+    """
+    total = len(filas)
+    if total == 0: return []
+
+    paralelo = n_procesos > 1 and total >= MIN_FILAS_PARALELO
+    tam_bloque = -(-total // (n_procesos * BLOQUES_POR_PROCESO)) if paralelo else TAM_BLOQUE_SERIAL
+    bloques = _particionar(total, tam_bloque)
+
+    resultados = []
+    if paralelo:
+        with contexto_pool().Pool(processes=n_procesos, initializer=_iniciar_hijo, initargs=(indices,)) as pool:
+            # imap respeta el orden de los bloques: el merge queda en el orden original
+            trabajos = (filas[inicio:fin] for inicio, fin in bloques)
+            for parcial, metricas_bloque in pool.imap(_conciliar_bloque_hijo, trabajos):
+                resultados.extend(parcial)
+                if metricas is not None: combinar_metricas(metricas, metricas_bloque)
+                if al_avanzar: al_avanzar(len(resultados) / total)
+    else:
+        for inicio, fin in bloques:
+            parcial, metricas_bloque = _conciliar_bloque(filas, indices, inicio, fin)
+            resultados.extend(parcial)
+            if metricas is not None: combinar_metricas(metricas, metricas_bloque)
+            if al_avanzar: al_avanzar(len(resultados) / total)
+
+    return resultados
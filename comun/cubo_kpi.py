@@ -0,0 +1,67 @@
+# ======================================================================================
+# ARCHIVO: comun/cubo_kpi.py
+# Cubo preagregado de cartera: importes sumados por vendedor x zona x población x edad x
+# cliente. Se construye una vez por snapshot y los KPI / gráficos de cualquier
+# combinación de filtros salen del cubo (miles de celdas) y no de las facturas.
+# ======================================================================================
+
+import pandas as pd
+
+DIMENSIONES = ['nomvendedor_norm', 'zona', 'poblacion', 'edad_cartera', 'nombrecliente']
+
+def construir_cubo(df, dimensiones=DIMENSIONES):
+    """
+    Una fila por combinación presente de las dimensiones (más `vencido`, dias_vencido > 0)
+    con importe, importe x días y número de facturas. Dimensiones como category: filtrar
+    es comparar códigos enteros.
+    """
+    base = df[dimensiones].copy()
+    base['vencido'] = df['dias_vencido'] > 0
+    base['importe'] = df['importe']
+    base['importe_x_dias'] = df['importe'] * df['dias_vencido']
+    cubo = (
+        base.groupby(dimensiones + ['vencido'], observed=True, dropna=False, sort=False)
+        .agg(importe=('importe', 'sum'), importe_x_dias=('importe_x_dias', 'sum'), facturas=('importe', 'size'))
+        .reset_index()
+    )
+    for col in dimensiones:
+        if not isinstance(cubo[col].dtype, pd.CategoricalDtype):
+            cubo[col] = cubo[col].astype('category')
+    return cubo
+
+def filtrar_cubo(cubo, **filtros):
+    """filtrar_cubo(cubo, zona='PEREIRA', poblacion=None): None = sin filtro en esa dimensión"""
+    mascara = pd.Series(True, index=cubo.index)
+    for col, valor in filtros.items():
+        if valor is not None:
+            mascara &= cubo[col] == valor
+    return cubo[mascara]
+
+def kpis_cubo(sub):
+    """Cartera total, vencida, % vencido, CSI y antigüedad promedio ponderada de lo vencido"""
+    total_cartera = sub['importe'].sum()
+    vencido = sub[sub['vencido']]
+    total_vencido = vencido['importe'].sum()
+    ponderado = vencido['importe_x_dias'].sum()
+    return {
+        'total_cartera': total_cartera,
+        'total_vencido': total_vencido,
+        'porcentaje_vencido': (total_vencido / total_cartera) * 100 if total_cartera > 0 else 0,
+        'csi': ponderado / total_cartera if total_cartera > 0 else 0,
+        'antiguedad_prom_vencida': ponderado / total_vencido if total_vencido > 0 else 0,
+    }
+
+def importe_por_edad(sub, col_edad='edad_cartera'):
+    """Importe por rango de edad (solo rangos presentes, en el orden de la categoría)"""
+    return sub.groupby(col_edad, observed=True)['importe'].sum().reset_index()
+
+def vencido_por_cliente(sub, col_cliente='nombrecliente'):
+    """Importe vencido por cliente, de mayor a menor (índice de texto, no category)"""
+    deuda = sub[sub['vencido']].groupby(col_cliente, observed=True)['importe'].sum().sort_values(ascending=False)
+    deuda.index = deuda.index.astype(object)
+    return deuda
+
+def clientes_pareto(deuda, proporcion=0.80):
+    """Clientes (de `vencido_por_cliente`) que suman hasta la proporción, más el que la cruza"""
+    acumulado = deuda.cumsum()
+    return deuda.iloc[0:int((acumulado <= deuda.sum() * proporcion).sum()) + 1]
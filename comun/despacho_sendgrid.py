@@ -0,0 +1,259 @@
+# ======================================================================================
+# ARCHIVO: comun/despacho_sendgrid.py
+# Despacho concurrente a SendGrid: pool acotado de hilos, conexiones keep-alive por hilo,
+# limitador de tasa (token bucket) y reintentos con backoff para 429 / 5xx. Un envío
+# que salió sin respuesta no se repite: SendGrid pudo haberlo aceptado.
+# ======================================================================================
+
+import json
+import time
+import base64
+import random
+import threading
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+URL_SENDGRID = "https://api.sendgrid.com/v3/mail/send"
+TIMEOUT_SEGUNDOS = 45
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+# status de publicar() cuando no hay respuesta HTTP
+SIN_ENVIO = 0         # falló antes de terminar de enviar la petición: reintentar es seguro
+SIN_RESPUESTA = -1    # la petición salió y no volvió respuesta: pudo haberse entregado
+# Una conexión keep-alive ociosa más de esto se reabre antes de enviar (el servidor suele cerrarla)
+SEGUNDOS_OCIOSA = 15
+# Tope de SendGrid: personalizations por petición a /v3/mail/send
+MAX_PERSONALIZACIONES = 1000
+
+# ======================================================================================
+# --- 1. PAYLOAD ---
+# ======================================================================================
+
+def payload_sendgrid(from_email, from_name, to_email, to_name, subject, html_content, plain_content,
+                     attachment_bytes=None, attachment_name=None, custom_args=None, categories=None):
+    """Cuerpo JSON de /v3/mail/send para un destinatario (adjunto PDF opcional)"""
+    personalizacion = {"to": [{"email": to_email, "name": to_name}]}
+    if custom_args:
+        personalizacion["custom_args"] = {k: str(v) for k, v in custom_args.items()}
+    payload = {
+        "personalizations": [personalizacion],
+        "from": {"email": from_email, "name": from_name},
+        "subject": subject,
+        "content": [
+            {"type": "text/plain", "value": plain_content},
+            {"type": "text/html", "value": html_content},
+        ],
+        "tracking_settings": {
+            "open_tracking": {"enable": True},
+            "click_tracking": {"enable": True, "enable_text": False},
+        },
+    }
+    if attachment_bytes:
+        payload["attachments"] = [{
+            "content": base64.b64encode(attachment_bytes).decode("utf-8"),
+            "type": "application/pdf",
+            "filename": attachment_name,
+            "disposition": "attachment",
+        }]
+    if categories:
+        payload["categories"] = list(categories)
+    return payload
+
+def payload_lote(from_email, from_name, subject, html_content, plain_content, destinatarios, categories=None):
+    """
+    Un solo cuerpo para varios destinatarios sin adjunto: una personalization por destinatario
+    (cada uno ve solo su dirección) con `substitutions` que reemplazan las etiquetas del
+    asunto y del contenido. `destinatarios`: dicts con email, name, sustituciones y custom_args.
+    """
+    if len(destinatarios) > MAX_PERSONALIZACIONES:
+        raise ValueError(f"SendGrid admite hasta {MAX_PERSONALIZACIONES} destinatarios por peticion")
+    personalizaciones = []
+    for d in destinatarios:
+        personalizacion = {"to": [{"email": d["email"], "name": d.get("name", "")}]}
+        if d.get("sustituciones"):
+            personalizacion["substitutions"] = {k: str(v) for k, v in d["sustituciones"].items()}
+        if d.get("custom_args"):
+            personalizacion["custom_args"] = {k: str(v) for k, v in d["custom_args"].items()}
+        personalizaciones.append(personalizacion)
+    payload = payload_sendgrid(from_email, from_name, "", "", subject, html_content, plain_content,
+                               categories=categories)
+    payload["personalizations"] = personalizaciones
+    return payload
+
+def en_lotes(elementos, tamano=MAX_PERSONALIZACIONES):
+    """Parte una lista en bloques de a lo sumo `tamano` (uno por petición)"""
+    elementos = list(elementos)
+    for inicio in range(0, len(elementos), tamano):
+        yield elementos[inicio:inicio + tamano]
+
+# ======================================================================================
+# --- 2. LIMITADOR DE TASA ---
+# ======================================================================================
+
+class LimitadorTasa:
+    """
+    Token bucket compartido por los hilos: `tasa` envíos por segundo sostenidos
+    con ráfagas de hasta `capacidad`. tasa <= 0 desactiva el límite.
+    """
+    def __init__(self, tasa, capacidad=None):
+        self.tasa = float(tasa)
+        self.capacidad = float(capacidad or max(1.0, self.tasa))
+        self._fichas = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def tomar(self):
+        if self.tasa <= 0: return
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.tasa
+            time.sleep(espera)
+
+# ======================================================================================
+# --- 3. CLIENTE HTTP KEEP-ALIVE ---
+# ======================================================================================
+
+class ClienteSendGrid:
+    """Una conexión HTTP/1.1 persistente por hilo; se reabre sola si el servidor la cierra"""
+    def __init__(self, api_key, url=URL_SENDGRID, timeout=TIMEOUT_SEGUNDOS):
+        partes = urlsplit(url)
+        self._https = partes.scheme == "https"
+        self._host = partes.hostname
+        self._puerto = partes.port
+        self._ruta = partes.path or "/"
+        self._timeout = timeout
+        self._headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Connection": "keep-alive",
+        }
+        self._local = threading.local()
+        self._abiertas = []
+        self._lock = threading.Lock()
+
+    def _conexion(self):
+        con = getattr(self._local, "con", None)
+        if con is not None and time.monotonic() - self._local.ultimo_uso > SEGUNDOS_OCIOSA:
+            self._descartar()
+            con = None
+        if con is None:
+            clase = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            con = clase(self._host, self._puerto, timeout=self._timeout)
+            self._local.con = con
+            self._local.ultimo_uso = time.monotonic()
+            with self._lock:
+                self._abiertas.append(con)
+        return con
+
+    def _descartar(self):
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+    def publicar(self, payload):
+        """
+        POST del payload; devuelve (status, cuerpo, retry_after). Sin respuesta HTTP el status
+        es SIN_ENVIO (la petición no alcanzó a salir) o SIN_RESPUESTA (salió y no volvió nada).
+        """
+        cuerpo = json.dumps(payload).encode("utf-8")
+        con = self._conexion()
+        try:
+            con.request("POST", self._ruta, body=cuerpo, headers=self._headers)
+        except Exception as exc:
+            self._descartar()
+            return SIN_ENVIO, str(exc), None
+        try:
+            resp = con.getresponse()
+            datos = resp.read()
+        except Exception as exc:
+            self._descartar()
+            return SIN_RESPUESTA, str(exc), None
+        self._local.ultimo_uso = time.monotonic()
+        if resp.getheader("Connection", "").lower() == "close":
+            self._descartar()
+        return resp.status, datos.decode("utf-8", errors="ignore"), resp.getheader("Retry-After")
+
+    def cerrar(self):
+        """Cierra las conexiones de todos los hilos (al terminar el lote)"""
+        with self._lock:
+            for con in self._abiertas:
+                con.close()
+            self._abiertas.clear()
+
+# ======================================================================================
+# --- 4. DESPACHADOR ---
+# ======================================================================================
+
+def _espera_backoff(intento, retry_after, base=1.0, maximo=30.0):
+    """Backoff exponencial con jitter; Retry-After del servidor manda si viene"""
+    if retry_after:
+        try: return min(float(retry_after), maximo)
+        except ValueError: pass
+    return min(maximo, base * (2 ** intento)) * random.uniform(0.5, 1.5)
+
+def resultado_envio(ok):
+    """Texto del historial para el ok de enviar_con_reintentos"""
+    return "Enviado" if ok else ("Revisar" if ok is None else "Error")
+
+def enviar_con_reintentos(cliente, limitador, payload, max_reintentos=4):
+    """
+    Un envío con reintentos en 429/5xx y en fallas antes de enviar. Devuelve (ok, detalle,
+    intentos); ok es None si la petición salió sin respuesta: se revisa a mano, no se reenvía.
+    """
+    for intento in range(max_reintentos + 1):
+        limitador.tomar()
+        status, cuerpo, retry_after = cliente.publicar(payload)
+        if 200 <= status < 300:
+            return True, f"HTTP {status}", intento + 1
+        if status == SIN_RESPUESTA:
+            return None, f"Sin confirmacion de SendGrid ({cuerpo[:160]}): revisar antes de reenviar", intento + 1
+        reintentable = status == SIN_ENVIO or status in ESTADOS_REINTENTABLES
+        if not reintentable or intento == max_reintentos:
+            detalle = f"HTTP {status}: {cuerpo[:220]}" if status else cuerpo[:220]
+            return False, detalle, intento + 1
+        time.sleep(_espera_backoff(intento, retry_after))
+    return False, "Sin respuesta", max_reintentos + 1
+
+def despachar(trabajos, api_key, n_trabajadores=4, envios_por_segundo=10, max_reintentos=4,
+              url=URL_SENDGRID, max_en_vuelo=None):
+    """
+    Envía los payloads de `trabajos` (iterable de (clave, payload)) con un pool de hilos.
+    Genera (clave, ok, detalle, intentos) a medida que terminan, para que la interfaz
+    avance desde el hilo principal. Se consumen a lo sumo `max_en_vuelo` trabajos por
+    adelantado: el iterable puede ser perezoso (p.ej. PDFs que se están generando).
+    """
+    cliente = ClienteSendGrid(api_key, url=url)
+    limitador = LimitadorTasa(envios_por_segundo)
+    max_en_vuelo = max_en_vuelo or n_trabajadores * 2
+    iterador = iter(trabajos)
+    pendientes = {}
+
+    def encolar(pool):
+        while len(pendientes) < max_en_vuelo:
+            try: clave, payload = next(iterador)
+            except StopIteration: return
+            futuro = pool.submit(enviar_con_reintentos, cliente, limitador, payload, max_reintentos)
+            pendientes[futuro] = clave
+
+    try:
+        with ThreadPoolExecutor(max_workers=n_trabajadores, thread_name_prefix="sendgrid") as pool:
+            encolar(pool)
+            while pendientes:
+                listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    clave = pendientes.pop(futuro)
+                    try:
+                        ok, detalle, intentos = futuro.result()
+                    except Exception as exc:
+                        ok, detalle, intentos = False, str(exc), 1
+                    yield clave, ok, detalle, intentos
+                encolar(pool)
+    finally:
+        cliente.cerrar()
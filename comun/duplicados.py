@@ -0,0 +1,83 @@
+# ======================================================================================
+# ARCHIVO: comun/duplicados.py
+# Registro persistente de movimientos bancarios ya procesados (detección entre cargas).
+# ======================================================================================
+
+import os
+import csv
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+
+from comun import DIRECTORIO_DATOS
+
+RUTA_REGISTRO = os.path.join(DIRECTORIO_DATOS, "movimientos_registrados.csv")
+COLUMNAS_REGISTRO = ['huella', 'fecha_registro', 'archivo']
+
+# Caché en memoria del registro: se recarga solo si el archivo cambió en disco
+_REGISTRO = {'ruta': None, 'mtime': None, 'huellas': {}}
+
+def detectar_columna_cuenta(columnas):
+    """Columna con la cuenta bancaria del extracto, si existe"""
+    for c in columnas:
+        if 'CUENTA' in c or c in ('BANCO', 'NRO CUENTA', 'NO CUENTA'):
+            return c
+    return None
+
+def calcular_huellas(df, col_cuenta=None):
+    """
+    Huella de contenido por movimiento: FECHA + Valor_Banco + texto normalizado + cuenta.
+    Movimientos idénticos dentro del mismo archivo se distinguen por su ordinal de aparición,
+    así dos pagos iguales el mismo día no se confunden, y el mismo par en otro extracto sí cruza.
+    """
+    fecha = pd.to_datetime(df['FECHA'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('')
+    valor = pd.to_numeric(df['Valor_Banco'], errors='coerce').fillna(0).round(2).map('{:.2f}'.format)
+    cuenta = df[col_cuenta].fillna('').astype(str).str.strip() if col_cuenta else ''
+    base = fecha + '|' + valor + '|' + df['Texto_Norm'].fillna('').astype(str) + '|' + cuenta
+    ordinal = base.groupby(base).cumcount().astype(str)
+    return (base + '|' + ordinal).map(lambda s: hashlib.md5(s.encode('utf-8')).hexdigest())
+
+def cargar_registro(ruta=RUTA_REGISTRO):
+    """Diccionario huella -> (fecha_registro, archivo)"""
+    if not os.path.exists(ruta):
+        _REGISTRO.update(ruta=ruta, mtime=None, huellas={})
+        return _REGISTRO['huellas']
+
+    mtime = os.path.getmtime(ruta)
+    if _REGISTRO['ruta'] == ruta and _REGISTRO['mtime'] == mtime:
+        return _REGISTRO['huellas']
+
+    huellas = {}
+    with open(ruta, newline='', encoding='utf-8') as f:
+        for fila in csv.DictReader(f):
+            huellas.setdefault(fila['huella'], (fila['fecha_registro'], fila['archivo']))
+    _REGISTRO.update(ruta=ruta, mtime=mtime, huellas=huellas)
+    return huellas
+
+def marcar_duplicados(df, huella_col='ID_Unico', ruta=RUTA_REGISTRO):
+    """Agrega Duplicado (bool) y Visto_En (texto) con una consulta O(1) por movimiento"""
+    huellas = cargar_registro(ruta)
+    vistos = df[huella_col].map(huellas.get)
+    df['Duplicado'] = vistos.notna()
+    df['Visto_En'] = vistos.map(lambda v: f"{v[1]} ({v[0]})" if isinstance(v, tuple) else '')
+    return df
+
+def registrar_movimientos(huellas_nuevas, archivo, ruta=RUTA_REGISTRO):
+    """Agrega al registro (append) las huellas que aún no existen; devuelve cuántas se guardaron"""
+    registradas = cargar_registro(ruta)
+    ahora = datetime.now().strftime('%Y-%m-%d %H:%M')
+    nuevas = [h for h in dict.fromkeys(huellas_nuevas) if h not in registradas]
+    if not nuevas: return 0
+
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    escribir_encabezado = not os.path.exists(ruta)
+    with open(ruta, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if escribir_encabezado: writer.writerow(COLUMNAS_REGISTRO)
+        writer.writerows([h, ahora, archivo] for h in nuevas)
+
+    for h in nuevas:
+        registradas[h] = (ahora, archivo)
+    _REGISTRO['mtime'] = os.path.getmtime(ruta)
+    return len(nuevas)
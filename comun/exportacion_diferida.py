@@ -0,0 +1,114 @@
+# ======================================================================================
+# ARCHIVO: comun/exportacion_diferida.py
+# Descargas bajo demanda: el archivo (Excel, etc.) se construye solo cuando el usuario
+# lo pide y queda en la sesión con la llave filtros + versión de los datos. Un rerun
+# con los mismos filtros reutiliza los bytes; si cambian, se vuelve a pedir. Los
+# archivos grandes (paquete ZIP) quedan en disco y la sesión guarda solo la ruta.
+# ======================================================================================
+
+import os
+import time
+import hashlib
+import tempfile
+from pathlib import Path
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+# Archivos que se conservan por sesión (los más recientes)
+MAX_EXPORTES_SESION = 6
+_LLAVE_SESION = "_exportes_diferidos"
+_LLAVE_DISCO = "_exportes_en_disco"
+
+def huella_datos(df, columnas=None):
+    """
+    Versión de los datos: forma, nombres de columna e índice + hash de `columnas` (todas por
+    defecto). Con columnas clave (número, importe, días) cuesta milisegundos.
+    """
+    h = hashlib.sha1(repr((df.shape, list(df.columns))).encode("utf-8"))
+    parte = df if columnas is None else df[[c for c in columnas if c in df.columns]]
+    try:
+        filas = pd.util.hash_pandas_object(parte, index=True)
+    except TypeError:
+        # Celdas no hasheables (listas, dicts): se hashea su texto
+        filas = pd.util.hash_pandas_object(parte.astype(str), index=True)
+    h.update(filas.values.tobytes())
+    return h.hexdigest()
+
+def _almacen():
+    if _LLAVE_SESION not in st.session_state:
+        st.session_state[_LLAVE_SESION] = OrderedDict()
+    return st.session_state[_LLAVE_SESION]
+
+def descarga_diferida(etiqueta, generar, nombre_archivo, mime, clave, version, etiqueta_preparar=None, **kwargs_boton):
+    """
+    Botón en dos pasos. `generar()` (sin argumentos) devuelve los bytes y solo se llama al
+    pulsar "Preparar"; `version` identifica filtros y datos. Devuelve True si el archivo
+    está listo para descargar.
+    """
+    almacen = _almacen()
+    llave = (clave, version)
+    listo = almacen.get(llave)
+    if listo is None:
+        if st.button(etiqueta_preparar or f"⚙️ Preparar: {etiqueta}", key=f"preparar_{clave}",
+                     use_container_width=kwargs_boton.get("use_container_width", False)):
+            with st.spinner("Generando archivo..."):
+                t0 = time.perf_counter()
+                datos = generar()
+                listo = (datos, time.perf_counter() - t0)
+            # Una sola versión por botón: la anterior ya no corresponde a los filtros
+            for vieja in [k for k in almacen if k[0] == clave]:
+                del almacen[vieja]
+            almacen[llave] = listo
+            while len(almacen) > MAX_EXPORTES_SESION:
+                almacen.popitem(last=False)
+    else:
+        almacen.move_to_end(llave)
+    if listo is None:
+        return False
+    datos, segundos = listo
+    st.download_button(etiqueta, data=datos, file_name=nombre_archivo, mime=mime, key=f"descargar_{clave}", **kwargs_boton)
+    st.caption(f"⏱️ Generado en {segundos:.2f} s · {len(datos) / 1024:,.0f} KB")
+    return True
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+def descarga_diferida_en_disco(etiqueta, escribir, nombre_archivo, mime, clave, version, etiqueta_preparar=None, **kwargs_boton):
+    """
+    Como descarga_diferida, para archivos que no deben vivir en memoria: `escribir(archivo)`
+    vuelca el contenido en un temporal en disco y la sesión guarda solo su ruta (uno por
+    botón; el anterior se borra). Los bytes se leen al pulsar descargar, no en cada rerun.
+    """
+    almacen = st.session_state.setdefault(_LLAVE_DISCO, {})
+    listo = almacen.get(clave)
+    if listo is not None and (listo[0] != version or not os.path.exists(listo[1])):
+        _borrar(listo[1])
+        del almacen[clave]
+        listo = None
+    if listo is None:
+        if st.button(etiqueta_preparar or f"⚙️ Preparar: {etiqueta}", key=f"preparar_{clave}",
+                     use_container_width=kwargs_boton.get("use_container_width", False)):
+            with st.spinner("Generando archivo..."):
+                t0 = time.perf_counter()
+                descriptor, ruta = tempfile.mkstemp(prefix=f"{clave}_", suffix=os.path.splitext(nombre_archivo)[1])
+                try:
+                    with os.fdopen(descriptor, "wb") as archivo:
+                        escribir(archivo)
+                except BaseException:
+                    _borrar(ruta)
+                    raise
+                listo = (version, ruta, time.perf_counter() - t0)
+            almacen[clave] = listo
+    if listo is None:
+        return False
+    _, ruta, segundos = listo
+    # Descarga diferida: Streamlit llama a la función recién al pulsar el botón
+    st.download_button(etiqueta, data=Path(ruta).read_bytes, file_name=nombre_archivo, mime=mime,
+                       key=f"descargar_{clave}", **kwargs_boton)
+    st.caption(f"⏱️ Generado en {segundos:.2f} s · {os.path.getsize(ruta) / 1024:,.0f} KB")
+    return True
@@ -0,0 +1,70 @@
+# ======================================================================================
+# ARCHIVO: comun/graficos.py
+# Gráficos livianos para el navegador: top-N + "Otros" en treemaps y barras, WebGL en
+# dispersiones grandes y un caché de la figura ya construida por versión de datos y
+# filtro, para no reconstruir ni volver a validar miles de nodos en cada rerun.
+# ======================================================================================
+
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import plotly.express as px
+
+# Nodos que se dibujan uno a uno; el resto se suma en un solo bloque "Otros"
+MAX_NODOS = 150
+# Desde cuántos puntos una dispersión se dibuja con WebGL (Scattergl) y no con SVG
+UMBRAL_WEBGL = 1000
+# Figuras que conserva el caché del proceso (compartido entre sesiones)
+MAX_FIGURAS_CACHE = 64
+
+def top_n_con_otros(df, col_etiqueta, col_valor, n=MAX_NODOS, etiqueta_otros="Otros"):
+    """
+    Las `n` filas de mayor `col_valor` y, si sobran, una fila "Otros (k)" con la suma de
+    las k restantes. Las demás columnas de esa fila quedan vacías.
+    """
+    if len(df) <= n:
+        return df
+    ordenado = df.sort_values(col_valor, ascending=False)
+    resto = ordenado.iloc[n:]
+    otros = pd.DataFrame({col_etiqueta: [f"{etiqueta_otros} ({len(resto):,})"], col_valor: [resto[col_valor].sum()]})
+    return pd.concat([ordenado.iloc[:n], otros], ignore_index=True)
+
+def scatter_liviano(df, umbral=UMBRAL_WEBGL, **kwargs):
+    """px.scatter que pasa a WebGL (Scattergl) con más de `umbral` puntos"""
+    return px.scatter(df, render_mode='webgl' if len(df) > umbral else 'auto', **kwargs)
+
+class CacheFiguras:
+    """
+    LRU de figuras construidas (go.Figure), compartidas entre sesiones: quien las reciba
+    solo las lee (st.plotly_chart las serializa sin modificarlas). La llave es
+    (nombre, versión); la versión debe cambiar con los datos y los filtros.
+    """
+    def __init__(self, max_figuras=MAX_FIGURAS_CACHE):
+        self.max_figuras = max_figuras
+        self._figuras = OrderedDict()
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def figura(self, nombre, version, construir):
+        """Figura de `construir()` (sin argumentos) o la misma ya construida para esa versión"""
+        llave = (nombre, version)
+        with self._candado:
+            fig = self._figuras.get(llave)
+            if fig is not None:
+                self._figuras.move_to_end(llave)
+                self.aciertos += 1
+        if fig is None:
+            fig = construir()
+            with self._candado:
+                self.fallos += 1
+                self._figuras[llave] = fig
+                while len(self._figuras) > self.max_figuras:
+                    self._figuras.popitem(last=False)
+        return fig
+
+CACHE_FIGURAS = CacheFiguras()
+
+def figura_en_cache(nombre, version, construir):
+    return CACHE_FIGURAS.figura(nombre, version, construir)
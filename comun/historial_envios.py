@@ -0,0 +1,156 @@
+# ======================================================================================
+# ARCHIVO: comun/historial_envios.py
+# Historial de envíos del Centro de Conciliación Masiva: tabla SQLite de solo inserción
+# con índices por campaña / fecha / cliente y consultas paginadas filtradas en el motor.
+# ======================================================================================
+
+import os
+
+import pandas as pd
+
+from comun import DIRECTORIO_DATOS
+from comun.sqlite_local import transaccion
+
+RUTA_HISTORIAL = os.path.join(DIRECTORIO_DATOS, "historial_envios.sqlite")
+
+# Columna visible en la página -> columna en la tabla
+COLUMNAS = {
+    "Fecha": "fecha",
+    "Campana": "campana",
+    "Modo": "modo",
+    "Cliente": "cliente",
+    "Destino": "destino",
+    "Correo Cliente": "correo_cliente",
+    "Estado Correo": "estado_correo",
+    "Saldo Vencido": "saldo_vencido",
+    "Resultado": "resultado",
+    "Detalle": "detalle",
+    "Vendedor": "vendedor",
+    "Zona": "zona",
+    "Estrategia": "estrategia",
+}
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS envios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha TEXT NOT NULL,
+    campana TEXT,
+    modo TEXT,
+    cliente TEXT,
+    destino TEXT,
+    correo_cliente TEXT,
+    estado_correo TEXT,
+    saldo_vencido REAL,
+    resultado TEXT,
+    detalle TEXT,
+    vendedor TEXT,
+    zona TEXT,
+    estrategia TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_envios_campana ON envios (campana, fecha);
+CREATE INDEX IF NOT EXISTS ix_envios_fecha ON envios (fecha);
+CREATE INDEX IF NOT EXISTS ix_envios_cliente ON envios (cliente, fecha);
+CREATE TABLE IF NOT EXISTS migraciones (
+    origen TEXT PRIMARY KEY,
+    fecha TEXT NOT NULL,
+    filas INTEGER
+);
+"""
+
+def _conectar(ruta=RUTA_HISTORIAL, inmediata=False):
+    return transaccion(ruta, _ESQUEMA, inmediata)
+
+def _texto(valor):
+    return "" if valor is None or (isinstance(valor, float) and pd.isna(valor)) else str(valor)
+
+def _insertar(con, df_resultados):
+    df = df_resultados.reindex(columns=list(COLUMNAS))
+    filas = [
+        tuple(float(v or 0) if col == "Saldo Vencido" else _texto(v) for col, v in zip(COLUMNAS, fila))
+        for fila in df.itertuples(index=False, name=None)
+    ]
+    columnas = ", ".join(COLUMNAS.values())
+    marcas = ", ".join("?" * len(COLUMNAS))
+    con.executemany(f"INSERT INTO envios ({columnas}) VALUES ({marcas})", filas)
+    return len(filas)
+
+def registrar_envios(df_resultados, ruta=RUTA_HISTORIAL):
+    """Inserta el lote en una sola transacción (todo o nada); nunca reescribe lo anterior"""
+    if df_resultados is None or df_resultados.empty: return 0
+    with _conectar(ruta) as con:
+        return _insertar(con, df_resultados)
+
+def migrar_csv(ruta_csv, ruta=RUTA_HISTORIAL):
+    """
+    Importa una vez el CSV del historial anterior y lo renombra a .migrado. La marca en
+    `migraciones` se consulta y se escribe dentro de la misma transacción BEGIN IMMEDIATE:
+    si dos sesiones arrancan a la vez, solo una importa.
+    """
+    if not os.path.exists(ruta_csv): return 0
+    origen = os.path.basename(ruta_csv)
+    with _conectar(ruta, inmediata=True) as con:
+        if con.execute("SELECT 1 FROM migraciones WHERE origen = ?", (origen,)).fetchone():
+            return 0
+        try:
+            historial = pd.read_csv(ruta_csv)
+        except Exception:
+            return 0  # Ya renombrado por otra sesión, o ilegible: queda para la próxima
+        n = _insertar(con, historial)
+        con.execute("INSERT INTO migraciones (origen, fecha, filas) VALUES (?, datetime('now', 'localtime'), ?)", (origen, n))
+    try:
+        os.replace(ruta_csv, f"{ruta_csv}.migrado")
+    except OSError:
+        pass
+    return n
+
+def _filtros(campana=None, modo=None, resultado=None, cliente=None, desde=None, hasta=None):
+    condiciones, params = [], []
+    for columna, valor in (("campana", campana), ("modo", modo), ("resultado", resultado)):
+        if valor:
+            condiciones.append(f"{columna} = ?")
+            params.append(valor)
+    if cliente:
+        condiciones.append("cliente LIKE ?")
+        params.append(f"%{cliente}%")
+    if desde:
+        condiciones.append("fecha >= ?")
+        params.append(str(desde))
+    if hasta:
+        # Fecha guardada como 'YYYY-MM-DD HH:MM:SS': el día completo de `hasta` entra
+        condiciones.append("fecha < date(?, '+1 day')")
+        params.append(str(hasta))
+    donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return donde, params
+
+def consultar_envios(pagina=0, tamano=100, ruta=RUTA_HISTORIAL, **filtros):
+    """Una página del historial (más reciente primero) con las columnas de la página"""
+    donde, params = _filtros(**filtros)
+    seleccion = ", ".join(f'{col} AS "{visible}"' for visible, col in COLUMNAS.items())
+    with _conectar(ruta) as con:
+        return pd.read_sql_query(
+            f"SELECT {seleccion} FROM envios {donde} ORDER BY fecha DESC, id DESC LIMIT ? OFFSET ?",
+            con, params=params + [int(tamano), int(pagina) * int(tamano)]
+        )
+
+def resumen_envios(ruta=RUTA_HISTORIAL, **filtros):
+    """(registros, enviados, errores) del filtro, contados en SQLite"""
+    donde, params = _filtros(**filtros)
+    with _conectar(ruta) as con:
+        n, ok, error = con.execute(
+            f"SELECT COUNT(*), IFNULL(SUM(resultado = 'Enviado'), 0), IFNULL(SUM(resultado = 'Error'), 0) "
+            f"FROM envios {donde}", params
+        ).fetchone()
+    return n, ok, error
+
+def valores_distintos(columna, ruta=RUTA_HISTORIAL):
+    """Opciones de los filtros (campana / modo / resultado)"""
+    if columna not in ("campana", "modo", "resultado"): raise ValueError(columna)
+    with _conectar(ruta) as con:
+        filas = con.execute(
+            f"SELECT DISTINCT {columna} FROM envios WHERE IFNULL({columna}, '') <> '' ORDER BY {columna}"
+        ).fetchall()
+    return [f[0] for f in filas]
+
+def exportar_envios(ruta=RUTA_HISTORIAL, **filtros):
+    """Todas las filas del filtro (LIMIT -1 = sin tope en SQLite), para la descarga"""
+    return consultar_envios(pagina=0, tamano=-1, ruta=ruta, **filtros)
@@ -0,0 +1,57 @@
+# ======================================================================================
+# ARCHIVO: comun/indice_filtros.py
+# Índice de filtros por snapshot: para cada columna de filtro guarda las opciones ya
+# ordenadas y las posiciones de fila de cada valor. Un filtro es una intersección de
+# arreglos de posiciones + un solo `take`, sin copiar ni comparar toda la cartera.
+# ======================================================================================
+
+import numpy as np
+import pandas as pd
+
+class IndiceFiltros:
+    """Se construye junto con la cartera procesada y vale mientras ese DataFrame no cambie"""
+    def __init__(self, df, columnas):
+        self.n_filas = len(df)
+        self._valores = {}     # columna -> valores distintos ordenados (tabla de la dimensión)
+        self._codigos = {}     # columna -> código de cada fila (-1 = nulo)
+        self._posiciones = {}  # columna -> {valor: posiciones de fila, ascendentes}
+        for col in columnas:
+            codigos, valores = pd.factorize(df[col], sort=True)
+            orden = np.argsort(codigos, kind='stable')
+            cortes = np.searchsorted(codigos[orden], np.arange(len(valores) + 1))
+            self._valores[col] = valores
+            self._codigos[col] = codigos
+            self._posiciones[col] = {
+                valor: orden[cortes[i]:cortes[i + 1]] for i, valor in enumerate(valores)
+            }
+
+    def opciones(self, columna, posiciones=None):
+        """Valores distintos ordenados; con `posiciones`, solo los presentes en esas filas"""
+        valores = self._valores[columna]
+        if posiciones is None:
+            return valores.tolist()
+        codigos = np.unique(self._codigos[columna][posiciones])
+        return valores[codigos[codigos >= 0]].tolist()
+
+    def posiciones(self, **filtros):
+        """Filas que cumplen todos los filtros (columna=valor; None = sin filtro). None si no hay filtro"""
+        resultado = None
+        for col, valor in filtros.items():
+            if valor is None:
+                continue
+            filas = self._posiciones[col].get(valor, np.empty(0, dtype=np.intp))
+            resultado = filas if resultado is None else np.intersect1d(resultado, filas, assume_unique=True)
+        return resultado
+
+    def filtrar(self, df, posiciones=None, **filtros):
+        """
+        Vista filtrada con un solo `take`. Sin filtros devuelve el mismo DataFrame (sin
+        copia): quien lo reciba no debe modificarlo en sitio.
+        """
+        if posiciones is None:
+            posiciones = self.posiciones(**filtros)
+        elif filtros:
+            otras = self.posiciones(**filtros)
+            if otras is not None:
+                posiciones = np.intersect1d(posiciones, otras, assume_unique=True)
+        return df if posiciones is None else df.take(posiciones)
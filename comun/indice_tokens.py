@@ -0,0 +1,127 @@
+# ======================================================================================
+# ARCHIVO: comun/indice_tokens.py
+# Índice invertido token -> NITs con ponderación IDF, uno por snapshot de cartera.
+# ======================================================================================
+
+import os
+import math
+import pickle
+import hashlib
+from collections import defaultdict
+
+import pandas as pd
+
+from comun import DIRECTORIO_DATOS
+
+VERSION_INDICE = 1
+LONGITUD_MINIMA_TOKEN = 4
+# Tokens presentes en demasiados clientes aportan ruido y cuestan mucho al puntuar
+MAX_NITS_POR_TOKEN = 200
+# Índices por snapshot que se conservan en disco (los de uso más reciente)
+MAX_INDICES_DISCO = 3
+
+_INDICES_EN_MEMORIA = {}
+
+def huella_cartera(df_cartera):
+    """Hash estable del snapshot (NIT + nombre normalizado) para versionar el índice"""
+    base = df_cartera[['nit_norm', 'nombre_norm']].astype(str)
+    hashes = pd.util.hash_pandas_object(base, index=False).values
+    return hashlib.sha1(hashes.tobytes()).hexdigest()[:16]
+
+def construir_indice_tokens(df_cartera):
+    """Construcción vectorizada: explode de tokens, frecuencia por NIT e IDF = ln(1 + N / df)"""
+    clientes = df_cartera[['nit_norm', 'nombre_norm']].astype(str).drop_duplicates()
+    n_clientes = max(clientes['nit_norm'].nunique(), 1)
+
+    tokens = clientes.assign(token=clientes['nombre_norm'].str.split()).explode('token')
+    tokens = tokens[tokens['token'].str.len() >= LONGITUD_MINIMA_TOKEN]
+    tokens = tokens[['token', 'nit_norm']].drop_duplicates()
+
+    agrupado = tokens.groupby('token')['nit_norm'].agg(tuple)
+    frecuencia = agrupado.str.len()
+    idf = (1 + n_clientes / frecuencia).apply(math.log)
+
+    return {
+        'version': VERSION_INDICE,
+        'n_clientes': n_clientes,
+        # Puntaje de un token exclusivo de un cliente: umbral natural de aceptación
+        'idf_max': math.log(1 + n_clientes),
+        'tokens': {tok: (float(idf[tok]), nits) for tok, nits in agrupado.items()},
+    }
+
+def podar_indices(directorio=DIRECTORIO_DATOS, conservar=MAX_INDICES_DISCO):
+    """Borra los indice_tokens_*.pkl salvo los `conservar` de uso más reciente (mtime)"""
+    try:
+        archivos = [e for e in os.scandir(directorio) if e.name.startswith("indice_tokens_") and e.name.endswith(".pkl")]
+    except OSError:
+        return 0
+    archivos.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    borrados = 0
+    for entrada in archivos[conservar:]:
+        try:
+            os.remove(entrada.path)
+            borrados += 1
+        except OSError:
+            pass
+    return borrados
+
+def cargar_o_construir_indice(df_cartera, directorio=DIRECTORIO_DATOS):
+    """Devuelve el índice del snapshot: memoria -> disco -> construcción (y se persiste)"""
+    huella = huella_cartera(df_cartera)
+    if huella in _INDICES_EN_MEMORIA:
+        return _INDICES_EN_MEMORIA[huella]
+
+    ruta = os.path.join(directorio, f"indice_tokens_{huella}.pkl")
+    indice = None
+    if os.path.exists(ruta):
+        try:
+            with open(ruta, 'rb') as f:
+                indice = pickle.load(f)
+            if indice.get('version') != VERSION_INDICE:
+                indice = None
+            else:
+                os.utime(ruta)  # Uso reciente: la poda conserva este snapshot
+        except Exception:
+            indice = None
+
+    if indice is None:
+        indice = construir_indice_tokens(df_cartera)
+        try:
+            os.makedirs(directorio, exist_ok=True)
+            tmp = f"{ruta}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                pickle.dump(indice, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, ruta)
+            podar_indices(directorio)
+        except OSError:
+            pass  # Sin disco escribible seguimos con el índice en memoria
+
+    indice['huella'] = huella
+    _INDICES_EN_MEMORIA.clear()
+    _INDICES_EN_MEMORIA[huella] = indice
+    return indice
+
+def rankear_candidatos(txt_norm, indice, top=5):
+    """Puntúa cada NIT por la suma de IDF de los tokens que comparte con el texto"""
+    puntajes = defaultdict(float)
+    coincidencias = defaultdict(list)
+    tabla = indice['tokens']
+    for token in set(txt_norm.split()):
+        entrada = tabla.get(token)
+        if entrada is None: continue
+        idf, nits = entrada
+        if len(nits) > MAX_NITS_POR_TOKEN: continue
+        for nit in nits:
+            puntajes[nit] += idf
+            coincidencias[nit].append(token)
+
+    ranking = sorted(puntajes.items(), key=lambda x: (-x[1], x[0]))[:top]
+    return [(nit, puntaje, sorted(coincidencias[nit])) for nit, puntaje in ranking]
+
+def elegir_candidato(ranking, indice):
+    """Acepta el primero si alcanza el IDF de un token exclusivo y no empata con el segundo"""
+    if not ranking: return None
+    nit, puntaje, tokens = ranking[0]
+    if puntaje + 1e-9 < indice['idf_max']: return None
+    if len(ranking) > 1 and abs(ranking[1][1] - puntaje) < 1e-9: return None
+    return nit, puntaje, tokens
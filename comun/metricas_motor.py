@@ -0,0 +1,91 @@
+# ======================================================================================
+# ARCHIVO: comun/metricas_motor.py
+# Instrumentación del motor: tiempos, aciertos y tamaños de búsqueda por etapa.
+# ======================================================================================
+
+import os
+import json
+from datetime import datetime
+
+import pandas as pd
+
+from comun import DIRECTORIO_DATOS
+
+RUTA_BITACORA = os.path.join(DIRECTORIO_DATOS, "bitacora_motor.jsonl")
+
+ETAPAS = {
+    'memoria': "🧠 Memoria / KB",
+    'nit_texto': "🆔 NIT en Texto",
+    'palabra_clave': "🔑 Palabra Clave",
+    'similitud': "≈ Similitud Nombre",
+    'analisis_deuda': "🧮 Análisis Deuda (subset-sum)",
+    'radar_monto': "💡 Radar Monto",
+}
+
+def nuevas_metricas():
+    return {
+        'filas': 0,
+        'tiempos': {e: 0.0 for e in ETAPAS},
+        'evaluados': {e: 0 for e in ETAPAS},
+        'aciertos': {e: 0 for e in ETAPAS},
+        # Tamaños acumulados de los conjuntos candidatos que revisa cada etapa
+        'candidatos': {'nits_en_texto': 0, 'palabra_clave': 0, 'similitud': 0, 'facturas_cliente': 0, 'radar_monto': 0},
+        'nodos_combinatoria': 0,
+    }
+
+def combinar_metricas(destino, origen):
+    """Suma en destino las métricas de un bloque (los procesos devuelven las suyas)"""
+    destino['filas'] += origen['filas']
+    destino['nodos_combinatoria'] += origen['nodos_combinatoria']
+    for grupo in ('tiempos', 'evaluados', 'aciertos', 'candidatos'):
+        for k, v in origen[grupo].items():
+            destino[grupo][k] = destino[grupo].get(k, 0) + v
+    return destino
+
+def tabla_etapas(metricas):
+    """DataFrame por etapa: evaluados, aciertos, tasa de acierto y tiempo"""
+    filas = []
+    for clave, nombre in ETAPAS.items():
+        evaluados = metricas['evaluados'][clave]
+        aciertos = metricas['aciertos'][clave]
+        segundos = metricas['tiempos'][clave]
+        filas.append({
+            'Etapa': nombre,
+            'Evaluados': evaluados,
+            'Aciertos': aciertos,
+            'Tasa Acierto': aciertos / evaluados if evaluados else 0.0,
+            'Tiempo (s)': segundos,
+            'ms / Evaluado': segundos * 1000 / evaluados if evaluados else 0.0,
+        })
+    return pd.DataFrame(filas)
+
+def registrar_corrida(metricas, contexto, ruta=RUTA_BITACORA):
+    """Agrega una línea JSON a la bitácora local de corridas del motor"""
+    registro = {'fecha': datetime.now().isoformat(timespec='seconds'), **contexto, **metricas}
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    except OSError:
+        pass
+
+def leer_bitacora(ultimas=30, ruta=RUTA_BITACORA):
+    """Resumen de las últimas corridas registradas (una fila por corrida)"""
+    if not os.path.exists(ruta): return pd.DataFrame()
+    with open(ruta, encoding='utf-8') as f:
+        lineas = f.readlines()[-ultimas:]
+    filas = []
+    for linea in lineas:
+        try: r = json.loads(linea)
+        except ValueError: continue
+        identificados = sum(r['aciertos'][e] for e in ('memoria', 'nit_texto', 'palabra_clave', 'similitud'))
+        filas.append({
+            'Fecha': r['fecha'],
+            'Filas': r['filas'],
+            'Procesos': r.get('n_procesos', 1),
+            'Tiempo Total (s)': r.get('segundos_total', 0.0),
+            'Filas / s': r['filas'] / r['segundos_total'] if r.get('segundos_total') else 0.0,
+            '% Identificados': identificados / r['filas'] if r['filas'] else 0.0,
+            'Nodos Combinatoria': r['nodos_combinatoria'],
+        })
+    return pd.DataFrame(filas)
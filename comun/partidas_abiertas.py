@@ -0,0 +1,139 @@
+# ======================================================================================
+# ARCHIVO: comun/partidas_abiertas.py
+# Libro de partidas abiertas del motor: pagos sin cerrar que se arrastran entre días.
+# ======================================================================================
+
+import os
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+
+from comun import DIRECTORIO_DATOS
+from comun.sqlite_local import transaccion
+
+RUTA_LIBRO = os.path.join(DIRECTORIO_DATOS, "partidas_abiertas.sqlite")
+# La sugerencia por monto es solo una pista: sigue abierta hasta que el analista la confirme
+ESTADOS_ABIERTOS = ('⚠️ ABONO / PARCIAL', '❓ NO IDENTIFICADO', '💡 SUGERENCIA MONTO')
+COLUMNAS_MOVIMIENTO = ['ID_Unico', 'FECHA', 'Valor_Banco', 'Texto_Completo', 'Texto_Norm']
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS partidas (
+    id_unico TEXT PRIMARY KEY,
+    fecha TEXT,
+    valor REAL,
+    texto TEXT,
+    texto_norm TEXT,
+    nit TEXT,
+    estado TEXT,
+    abierta INTEGER NOT NULL DEFAULT 1,
+    huella_cartera TEXT,
+    fecha_ingreso TEXT,
+    ultima_revision TEXT,
+    fecha_cierre TEXT,
+    estado_cierre TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_partidas_nit ON partidas (abierta, nit);
+CREATE INDEX IF NOT EXISTS ix_partidas_valor ON partidas (abierta, valor);
+"""
+
+def _conectar(ruta=RUTA_LIBRO):
+    return transaccion(ruta, _ESQUEMA)
+
+def _ahora():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+def huella_snapshot(df_cartera):
+    """
+    Versión de la cartera para el libro: clientes, números e importes de factura. Un corte
+    nuevo con los mismos clientes pero otras facturas o saldos cambia la huella y las
+    partidas abiertas (abonos, sugerencias por monto) se vuelven a intentar.
+    """
+    base = df_cartera[['nit_norm', 'nombre_norm', 'Numero', 'Importe']].astype(str)
+    hashes = pd.util.hash_pandas_object(base, index=False).values
+    return hashlib.sha1(hashes.tobytes()).hexdigest()[:16]
+
+def partidas_pendientes(huella_cartera, excluir_ids=None, ruta=RUTA_LIBRO):
+    """
+    Partidas abiertas aún no revisadas contra este snapshot de cartera, con la forma
+    de df_manual (FECHA, Valor_Banco, Texto_Completo, Texto_Norm, ID_Unico).
+    """
+    with _conectar(ruta) as con:
+        df = pd.read_sql_query(
+            "SELECT id_unico AS ID_Unico, fecha AS FECHA, valor AS Valor_Banco, "
+            "texto AS Texto_Completo, texto_norm AS Texto_Norm "
+            "FROM partidas WHERE abierta = 1 AND IFNULL(huella_cartera, '') <> ? ORDER BY fecha",
+            con, params=(huella_cartera,)
+        )
+    if excluir_ids is not None and len(excluir_ids):
+        df = df[~df['ID_Unico'].isin(set(excluir_ids))]
+    df['FECHA'] = pd.to_datetime(df['FECHA'], errors='coerce')
+    return df.reset_index(drop=True)
+
+def actualizar_libro(df_res, huella_cartera, ruta=RUTA_LIBRO):
+    """
+    Sincroniza el libro con un resultado del motor: abre/actualiza las partidas que siguen
+    sin cerrar y cierra las que ahora cruzaron. Devuelve (abiertas, cerradas).
+    """
+    if df_res.empty: return 0, 0
+    ahora = _ahora()
+    abiertas_mask = df_res['Estado'].isin(ESTADOS_ABIERTOS)
+
+    df_abiertas = df_res[abiertas_mask]
+    filas_abiertas = [
+        (r.ID_Unico, str(r.FECHA), float(r.Valor_Banco), str(r.Texto_Completo), str(r.Texto_Norm),
+         str(r.NIT) if pd.notna(r.NIT) else '', r.Estado, huella_cartera, ahora, ahora)
+        for r in df_abiertas[COLUMNAS_MOVIMIENTO + ['NIT', 'Estado']].itertuples(index=False)
+    ]
+    filas_cerradas = [
+        (ahora, estado, huella_cartera, ahora, id_unico)
+        for id_unico, estado in zip(df_res.loc[~abiertas_mask, 'ID_Unico'], df_res.loc[~abiertas_mask, 'Estado'])
+    ]
+
+    with _conectar(ruta) as con:
+        con.executemany(
+            "INSERT INTO partidas (id_unico, fecha, valor, texto, texto_norm, nit, estado, huella_cartera, fecha_ingreso, ultima_revision) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id_unico) DO UPDATE SET nit = excluded.nit, estado = excluded.estado, abierta = 1, "
+            "huella_cartera = excluded.huella_cartera, ultima_revision = excluded.ultima_revision",
+            filas_abiertas
+        )
+        cur = con.executemany(
+            "UPDATE partidas SET abierta = 0, fecha_cierre = ?, estado_cierre = ?, huella_cartera = ?, ultima_revision = ? "
+            "WHERE id_unico = ? AND abierta = 1",
+            filas_cerradas
+        )
+        cerradas = cur.rowcount
+    return len(filas_abiertas), max(cerradas, 0)
+
+def cerrar_partidas(ids_unicos, motivo='REGISTRADA', ruta=RUTA_LIBRO):
+    """Cierre manual (p.ej. el analista marcó la fila como REGISTRADA al guardar)"""
+    ahora = _ahora()
+    with _conectar(ruta) as con:
+        con.executemany(
+            "UPDATE partidas SET abierta = 0, fecha_cierre = ?, estado_cierre = ? WHERE id_unico = ? AND abierta = 1",
+            [(ahora, motivo, i) for i in ids_unicos]
+        )
+
+def buscar_partidas(nit=None, valor=None, tolerancia=1000, ruta=RUTA_LIBRO):
+    """Consulta indexada de partidas abiertas por NIT y/o monto (± tolerancia)"""
+    condiciones, params = ["abierta = 1"], []
+    if nit:
+        condiciones.append("nit = ?")
+        params.append(str(nit))
+    if valor is not None:
+        condiciones.append("valor BETWEEN ? AND ?")
+        params.extend([valor - tolerancia, valor + tolerancia])
+    with _conectar(ruta) as con:
+        return pd.read_sql_query(
+            f"SELECT id_unico, fecha, valor, texto, nit, estado, fecha_ingreso, ultima_revision "
+            f"FROM partidas WHERE {' AND '.join(condiciones)} ORDER BY fecha",
+            con, params=params
+        )
+
+def resumen_libro(ruta=RUTA_LIBRO):
+    """(número de partidas abiertas, valor total abierto)"""
+    if not os.path.exists(ruta): return 0, 0.0
+    with _conectar(ruta) as con:
+        n, total = con.execute("SELECT COUNT(*), IFNULL(SUM(valor), 0) FROM partidas WHERE abierta = 1").fetchone()
+    return n, total
@@ -0,0 +1,191 @@
+# ======================================================================================
+# ARCHIVO: comun/pdf_conciliacion.py
+# Estado de cuenta PDF del Centro de Conciliación Masiva y su render en paralelo.
+# Vive fuera de pages/ para que los procesos hijos puedan importar sus funciones.
+# ======================================================================================
+
+from datetime import datetime
+
+import pandas as pd
+from fpdf import FPDF
+
+from comun.cache_pdf import cachear_pdf
+from comun.procesos import contexto_pool
+
+COLOR_PRIMARIO = "#B21917"
+COLOR_SECUNDARIO = "#E73537"
+COLOR_TERCIARIO = "#F0833A"
+PORTAL_PAGOS = "https://ferreinoxtiendapintuco.epayco.me/recaudo/ferreinoxrecaudoenlinea/"
+
+VERSION_PDF_CONCILIACION = 2
+
+# Por debajo de este número de clientes no compensa levantar procesos
+MIN_PDFS_PARALELO = 20
+
+def hex_to_rgb(hex_color: str):
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i + 2], 16) for i in (0, 2, 4))
+
+# ======================================================================================
+# --- 1. DOCUMENTO ---
+# ======================================================================================
+
+class PDFEstadoCuenta(FPDF):
+    def header(self):
+        try:
+            self.image("LOGO FERREINOX SAS BIC 2024.png", 10, 8, 72)
+        except Exception:
+            self.set_font("Helvetica", "B", 12)
+            self.cell(72, 10, "FERREINOX S.A.S. BIC", 0, 0, "L")
+
+        self.set_font("Helvetica", "B", 18)
+        self.set_text_color(*hex_to_rgb(COLOR_PRIMARIO))
+        self.cell(0, 10, "Estado de Cuenta", 0, 1, "R")
+        self.set_font("Helvetica", "", 9)
+        self.set_text_color(110, 110, 110)
+        self.cell(0, 7, f"Fecha de generacion: {datetime.now().strftime('%Y-%m-%d')}", 0, 1, "R")
+        self.ln(6)
+
+    def footer(self):
+        self.set_y(-28)
+        self.set_font("Helvetica", "I", 8)
+        self.set_text_color(110, 110, 110)
+        self.multi_cell(
+            0,
+            4,
+            "Este documento soporta la conciliacion de cartera y el control administrativo del cliente.",
+            0,
+            "C",
+        )
+        self.set_font("Helvetica", "B", 9)
+        self.set_text_color(*hex_to_rgb(COLOR_SECUNDARIO))
+        self.cell(0, 5, "Portal de Pagos Ferreinox", 0, 1, "C", link=PORTAL_PAGOS)
+        self.set_font("Helvetica", "I", 8)
+        self.set_text_color(120, 120, 120)
+        self.cell(0, 4, f"Pagina {self.page_no()}", 0, 0, "C")
+
+
+@cachear_pdf("conciliacion_estado_cuenta", VERSION_PDF_CONCILIACION)
+def crear_pdf_cliente(df_cliente: pd.DataFrame, saldo_vencido: float) -> bytes:
+    pdf = PDFEstadoCuenta()
+    pdf.set_auto_page_break(auto=True, margin=30)
+    pdf.add_page()
+
+    if df_cliente.empty:
+        pdf.set_font("Helvetica", "B", 12)
+        pdf.cell(0, 10, "Sin facturas para este cliente.", 0, 1, "C")
+        return bytes(pdf.output())
+
+    fila = df_cliente.iloc[0]
+    rgb_primario = hex_to_rgb(COLOR_PRIMARIO)
+    rgb_terciario = hex_to_rgb(COLOR_TERCIARIO)
+
+    pdf.set_font("Helvetica", "B", 11)
+    pdf.set_text_color(*rgb_primario)
+    pdf.cell(36, 7, "Cliente:", 0, 0)
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Helvetica", "", 11)
+    pdf.cell(0, 7, str(fila.get("nombrecliente", "")), 0, 1)
+
+    pdf.set_font("Helvetica", "B", 11)
+    pdf.set_text_color(*rgb_primario)
+    pdf.cell(36, 7, "NIT:", 0, 0)
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Helvetica", "", 11)
+    pdf.cell(0, 7, str(fila.get("nit", "")), 0, 1)
+
+    pdf.set_font("Helvetica", "B", 11)
+    pdf.set_text_color(*rgb_primario)
+    pdf.cell(36, 7, "Codigo Cliente:", 0, 0)
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Helvetica", "", 11)
+    cod_cliente = fila.get("cod_cliente")
+    cod_texto = str(int(cod_cliente)) if pd.notna(cod_cliente) else "N/A"
+    pdf.cell(0, 7, cod_texto, 0, 1)
+    pdf.ln(4)
+
+    mensaje = (
+        "A continuacion se presenta el detalle consolidado de su estado de cuenta. "
+        "Este envio tiene enfoque de conciliacion administrativa y validacion de saldos, "
+        "facilitando la revision oportuna de la informacion financiera del cliente."
+    )
+    pdf.set_text_color(95, 95, 95)
+    pdf.set_font("Helvetica", "", 10)
+    pdf.multi_cell(0, 5, mensaje, 0, "J")
+    pdf.ln(5)
+
+    pdf.set_font("Helvetica", "B", 10)
+    pdf.set_fill_color(*rgb_primario)
+    pdf.set_text_color(255, 255, 255)
+    pdf.cell(26, 8, "Factura", 1, 0, "C", 1)
+    pdf.cell(28, 8, "Dias Mora", 1, 0, "C", 1)
+    pdf.cell(38, 8, "Fecha Doc.", 1, 0, "C", 1)
+    pdf.cell(38, 8, "Fecha Venc.", 1, 0, "C", 1)
+    pdf.cell(40, 8, "Saldo", 1, 1, "C", 1)
+
+    total = 0
+    pdf.set_font("Helvetica", "", 10)
+    for _, item in df_cliente.sort_values(by=["dias_vencido", "fecha_vencimiento"], ascending=[False, True]).iterrows():
+        total += float(item.get("importe", 0) or 0)
+        if int(item.get("dias_vencido", 0) or 0) > 0:
+            pdf.set_fill_color(255, 245, 238)
+            pdf.set_text_color(*rgb_terciario)
+        else:
+            pdf.set_fill_color(255, 255, 255)
+            pdf.set_text_color(0, 0, 0)
+
+        fecha_doc = item.get("fecha_documento")
+        fecha_venc = item.get("fecha_vencimiento")
+        fecha_doc_txt = fecha_doc.strftime("%d/%m/%Y") if pd.notna(fecha_doc) else "-"
+        fecha_venc_txt = fecha_venc.strftime("%d/%m/%Y") if pd.notna(fecha_venc) else "-"
+        numero = item.get("numero")
+        numero_txt = str(int(numero)) if pd.notna(numero) else "-"
+        dias_txt = str(int(item.get("dias_vencido", 0) or 0))
+
+        pdf.cell(26, 8, numero_txt, 1, 0, "C", 1)
+        pdf.cell(28, 8, dias_txt, 1, 0, "C", 1)
+        pdf.cell(38, 8, fecha_doc_txt, 1, 0, "C", 1)
+        pdf.cell(38, 8, fecha_venc_txt, 1, 0, "C", 1)
+        pdf.cell(40, 8, f"${float(item.get('importe', 0) or 0):,.0f}", 1, 1, "R", 1)
+
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Helvetica", "B", 11)
+    pdf.cell(130, 9, "TOTAL CARTERA", 1, 0, "R")
+    pdf.cell(40, 9, f"${total:,.0f}", 1, 1, "R")
+
+    if saldo_vencido > 0:
+        pdf.set_fill_color(*rgb_primario)
+        pdf.set_text_color(255, 255, 255)
+        pdf.cell(130, 9, "TOTAL VENCIDO", 1, 0, "R", 1)
+        pdf.cell(40, 9, f"${saldo_vencido:,.0f}", 1, 1, "R", 1)
+
+    return bytes(pdf.output())
+
+# ======================================================================================
+# --- 2. PARTICIONES Y RENDER EN PARALELO ---
+# ======================================================================================
+
+def agrupar_por_cliente(df_base: pd.DataFrame) -> dict:
+    """Un solo groupby: cliente_key -> facturas del cliente (en vez de filtrar df_base por cliente)"""
+    if df_base.empty: return {}
+    return {clave: grupo for clave, grupo in df_base.groupby("cliente_key", sort=False)}
+
+def _renderizar(trabajo):
+    clave, df_cliente, saldo_vencido = trabajo
+    return clave, crear_pdf_cliente(df_cliente, saldo_vencido)
+
+def generar_pdfs(pedidos, grupos, n_procesos=1):
+    """
+    Productor de PDFs: genera (clave, pdf_bytes) en el orden de `pedidos`
+    (lista de (clave, cliente_key, saldo_vencido)). Cada pedido viaja con las facturas
+    de su cliente; con n_procesos > 1 el pool renderiza por delante mientras el
+    consumidor (el despacho HTTP) envía.
+    """
+    trabajos = [(clave, grupos.get(cliente_key, pd.DataFrame()), saldo) for clave, cliente_key, saldo in pedidos]
+    if n_procesos > 1 and len(trabajos) >= MIN_PDFS_PARALELO:
+        # generar_pdfs corre en el hilo del ejecutor de campañas: nada de fork (ver comun.procesos)
+        with contexto_pool().Pool(processes=n_procesos) as pool:
+            yield from pool.imap(_renderizar, trabajos, chunksize=4)
+    else:
+        for trabajo in trabajos:
+            yield _renderizar(trabajo)
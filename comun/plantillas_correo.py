@@ -0,0 +1,123 @@
+# ======================================================================================
+# ARCHIVO: comun/plantillas_correo.py
+# Plantillas de correo precompiladas. El HTML (o texto) de cada estrategia se parte una
+# sola vez en tramos fijos y campos; renderizar es unir tramos con los valores del
+# cliente, sin volver a construir el documento. Cada plantilla mide sus renders.
+# ======================================================================================
+
+import re
+import html
+import time
+from collections import deque
+
+import numpy as np
+
+# {{campo}} o {{campo|filtro}}
+PATRON_CAMPO = re.compile(r"\{\{\s*(?P<campo>\w+)(?:\|(?P<filtro>\w+))?\s*\}\}")
+
+FILTROS = {
+    'html': lambda valor: html.escape(str(valor)),
+    'pesos': lambda valor: f"${float(valor):,.0f}",
+    'entero': lambda valor: f"{int(valor)}",
+}
+
+# Renders recientes que se guardan por plantilla para los percentiles
+MAX_MUESTRAS = 2000
+
+_COMPILADAS = {}
+
+def campo(nombre, filtro=None):
+    """Marca de un campo para armar la plantilla con f-strings: campo('cliente', 'html')"""
+    return "{{" + nombre + (f"|{filtro}" if filtro else "") + "}}"
+
+class TiemposRender:
+    """Tiempos por render (segundos) de una plantilla"""
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.muestras = deque(maxlen=MAX_MUESTRAS)
+
+    def registrar(self, segundos):
+        self.n += 1
+        self.total += segundos
+        self.maximo = max(self.maximo, segundos)
+        self.muestras.append(segundos)
+
+    def resumen(self):
+        """Renders, promedio, p95 y máximo en milisegundos"""
+        if not self.n:
+            return {'renders': 0, 'promedio_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'renders': self.n,
+            'promedio_ms': self.total / self.n * 1000,
+            'p95_ms': float(np.percentile(list(self.muestras), 95)) * 1000,
+            'max_ms': self.maximo * 1000,
+        }
+
+class PlantillaCompilada:
+    """
+    Texto con campos, compilado una vez. `patron` debe tener el grupo `campo` (y
+    opcionalmente `filtro`); permite compilar plantillas con otras etiquetas, p.ej.
+    las -etiqueta- de sustitución de SendGrid.
+    """
+    def __init__(self, texto, patron=PATRON_CAMPO):
+        self.fuente = texto
+        self._tramos = []   # Tramos fijos: hay uno más que campos
+        self._campos = []   # (nombre, filtro o None)
+        inicio = 0
+        for m in patron.finditer(texto):
+            self._tramos.append(texto[inicio:m.start()])
+            filtro = m.groupdict().get('filtro')
+            if filtro and filtro not in FILTROS:
+                raise ValueError(f"Filtro desconocido en plantilla: {filtro}")
+            self._campos.append((m.group('campo'), FILTROS.get(filtro) if filtro else None))
+            inicio = m.end()
+        self._tramos.append(texto[inicio:])
+        self.campos = sorted({nombre for nombre, _ in self._campos})
+        self.tiempos = TiemposRender()
+
+    def renderizar(self, valores):
+        """Une los tramos con `valores` (dict campo -> valor). Falta un campo -> KeyError"""
+        t0 = time.perf_counter()
+        partes = [self._tramos[0]]
+        for (nombre, filtro), tramo in zip(self._campos, self._tramos[1:]):
+            valor = valores[nombre]
+            partes.append(filtro(valor) if filtro else str(valor))
+            partes.append(tramo)
+        salida = "".join(partes)
+        self.tiempos.registrar(time.perf_counter() - t0)
+        return salida
+
+def compilar(fuente, patron=PATRON_CAMPO):
+    """
+    Compila una vez por proceso y texto fuente. Los reruns de la página y el ejecutor de
+    campañas reciben la misma instancia, así que los tiempos se acumulan entre ellos.
+    """
+    clave = (fuente, patron.pattern)
+    plantilla = _COMPILADAS.get(clave)
+    if plantilla is None:
+        plantilla = _COMPILADAS.setdefault(clave, PlantillaCompilada(fuente, patron))
+    return plantilla
+
+class PlantillaCorreo:
+    """HTML y texto plano de una misma estrategia, renderizados con los mismos valores"""
+    def __init__(self, html_fuente, texto_fuente, patron=PATRON_CAMPO):
+        self.html = compilar(html_fuente, patron)
+        self.texto = compilar(texto_fuente, patron)
+
+    def renderizar(self, valores):
+        """(html, texto) para un cliente"""
+        return self.html.renderizar(valores), self.texto.renderizar(valores)
+
+def resumen_tiempos(plantillas):
+    """Tabla de tiempos por plantilla: {nombre: PlantillaCompilada | PlantillaCorreo}"""
+    filas = []
+    for nombre, plantilla in plantillas.items():
+        partes = (
+            [("html", plantilla.html), ("texto", plantilla.texto)]
+            if isinstance(plantilla, PlantillaCorreo) else [("html", plantilla)]
+        )
+        for formato, compilada in partes:
+            filas.append({'plantilla': nombre, 'formato': formato, **compilada.tiempos.resumen()})
+    return filas
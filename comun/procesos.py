@@ -0,0 +1,14 @@
+# ======================================================================================
+# ARCHIVO: comun/procesos.py
+# Contexto de los pools de procesos (conciliación, PDFs, paquete ZIP). La app corre en
+# un servidor Streamlit con muchos hilos (sesiones, despacho SendGrid, latidos de
+# campañas): un fork ahí puede heredar un candado que otro hilo tiene tomado y colgar
+# al hijo. Los procesos nacen de un forkserver (spawn donde no existe) y reciben sus
+# datos por argumento o por el initializer del pool, nunca heredando globales.
+# ======================================================================================
+
+import multiprocessing as mp
+
+def contexto_pool():
+    """Contexto 'forkserver', o 'spawn' en plataformas que no lo tienen"""
+    return mp.get_context('forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn')
@@ -0,0 +1,140 @@
+# ======================================================================================
+# ARCHIVO: comun/reporte_excel.py
+# Reportes Excel en streaming (xlsxwriter, constant_memory): las filas se escriben en
+# orden y se vuelcan al archivo a medida que avanzan. Los estilos van por columna y las
+# bandas de mora como formatos condicionales, no celda por celda.
+# ======================================================================================
+
+import io
+import struct
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+# Bandas de días vencido (de la más grave a la más leve): la primera que se cumple gana
+BANDAS_DIAS = [(60, '#FF0000'), (30, '#FFA500'), (0, '#FFF9C4')]
+
+_ORIGEN_EXCEL = pd.Timestamp('1899-12-30')
+
+def _tamano_png(datos):
+    """(ancho, alto) en píxeles leídos del encabezado IHDR; None si no es PNG"""
+    if datos[:8] != b'\x89PNG\r\n\x1a\n':
+        return None
+    return struct.unpack('>II', datos[16:24])
+
+def valores_columna(serie):
+    """
+    (valores, tipo) listos para escribir: fechas como número de serie de Excel (el formato
+    de la columna las muestra), NaN / NaT / inf como None (celda vacía). tipo es 'numero',
+    'texto' o 'mixto' y decide el método de escritura de toda la columna.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        dias = (serie.dt.tz_localize(None) if serie.dt.tz is not None else serie) - _ORIGEN_EXCEL
+        numeros = (dias / pd.Timedelta(days=1)).to_numpy()
+        return np.where(np.isnan(numeros), None, numeros.astype(object)).tolist(), 'numero'
+    arr = serie.to_numpy()
+    if arr.dtype.kind == 'f':
+        return np.where(np.isfinite(arr), arr.astype(object), None).tolist(), 'numero'
+    if arr.dtype.kind in 'iub':
+        return arr.astype(float if arr.dtype.kind == 'b' else arr.dtype).tolist(), 'numero'
+    arr = arr.astype(object)
+    nulos = pd.isna(arr)
+    if nulos.any():
+        arr[nulos] = None
+    valores = arr.tolist()
+    es_texto = pd.api.types.infer_dtype(arr[~nulos], skipna=True) in ('string', 'empty')
+    return valores, 'texto' if es_texto else 'mixto'
+
+class ReporteExcel:
+    """
+    Una hoja escrita de arriba hacia abajo. En constant_memory una fila ya escrita no se
+    puede volver a tocar: anchos y formatos de columna se definen antes de los datos.
+    """
+    def __init__(self, nombre_hoja):
+        self._salida = io.BytesIO()
+        self.libro = xlsxwriter.Workbook(self._salida, {
+            # Sin in_memory: esa opción desactiva constant_memory. Las filas van a un
+            # temporal y solo el .xlsx comprimido queda en memoria.
+            'constant_memory': True,
+            # Textos tal cual: un correo o un "=..." no se vuelven enlace ni fórmula
+            'strings_to_formulas': False,
+            'strings_to_urls': False,
+        })
+        self.hoja = self.libro.add_worksheet(nombre_hoja)
+        self._formatos = {}
+
+    def formato(self, **propiedades):
+        """Formato de xlsxwriter, uno por combinación de propiedades"""
+        clave = tuple(sorted(propiedades.items()))
+        fmt = self._formatos.get(clave)
+        if fmt is None:
+            fmt = self._formatos[clave] = self.libro.add_format(propiedades)
+        return fmt
+
+    def columnas(self, anchos, formatos=None):
+        """Ancho por columna y, opcional, {índice: formato} para las celdas sin formato propio"""
+        formatos = formatos or {}
+        for col, ancho in enumerate(anchos):
+            self.hoja.set_column(col, col, ancho, formatos.get(col))
+
+    def imagen(self, fila, col, ruta, ancho=None, alto=None):
+        """Imagen escalada a ancho x alto píxeles. FileNotFoundError si no existe"""
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+        opciones = {'image_data': io.BytesIO(datos)}
+        tamano = _tamano_png(datos)
+        if tamano and ancho and alto:
+            opciones['x_scale'] = ancho / tamano[0]
+            opciones['y_scale'] = alto / tamano[1]
+        self.hoja.insert_image(fila, col, ruta, opciones)
+
+    def celda(self, fila, col, valor, formato=None):
+        self.hoja.write(fila, col, valor, formato)
+
+    def fila(self, fila, valores, formato=None):
+        self.hoja.write_row(fila, 0, valores, formato)
+
+    def datos(self, df, fila_inicio):
+        """
+        Escribe `df` (sin encabezado) desde `fila_inicio`. Cada columna se convierte en bloque
+        y se escribe con el método de su tipo (sin detectar el tipo celda por celda).
+        Devuelve la última fila escrita (fila_inicio - 1 si está vacío).
+        """
+        metodos = {'numero': self.hoja.write_number, 'texto': self.hoja.write_string, 'mixto': self.hoja.write}
+        columnas, escritores = [], []
+        for col in df.columns:
+            valores, tipo = valores_columna(df[col])
+            columnas.append(valores)
+            escritores.append(metodos[tipo])
+        indices = range(len(escritores))
+        fila = fila_inicio - 1
+        for fila, valores in enumerate(zip(*columnas), fila_inicio):
+            for col in indices:
+                valor = valores[col]
+                if valor is not None:
+                    escritores[col](fila, col, valor)
+        return fila
+
+    def bandas_dias(self, col, primera_fila, ultima_fila, bandas=BANDAS_DIAS):
+        """Relleno por días vencido como formato condicional (una regla por banda)"""
+        if ultima_fila < primera_fila:
+            return
+        for limite, color in bandas:
+            self.hoja.conditional_format(primera_fila, col, ultima_fila, col, {
+                'type': 'cell', 'criteria': '>', 'value': limite, 'stop_if_true': True,
+                'format': self.formato(bg_color=color),
+            })
+
+    def filas_alternas(self, primera_fila, ultima_fila, ultima_col, color):
+        """Franjas de fila (en lugar del estilo de tabla, que constant_memory no admite)"""
+        if ultima_fila < primera_fila:
+            return
+        self.hoja.conditional_format(primera_fila, 0, ultima_fila, ultima_col, {
+            'type': 'formula', 'criteria': '=MOD(ROW(),2)=0', 'format': self.formato(bg_color=color),
+        })
+
+    def cerrar(self):
+        """Cierra el libro y devuelve los bytes del .xlsx"""
+        self.libro.close()
+        return self._salida.getvalue()
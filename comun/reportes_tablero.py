@@ -0,0 +1,255 @@
+# ======================================================================================
+# ARCHIVO: comun/reportes_tablero.py
+# Excel y estado de cuenta PDF del Tablero Principal, y el paquete ZIP con los reportes
+# de todos los vendedores. Vive fuera de la página para que los procesos hijos del
+# paquete puedan importar los generadores.
+# ======================================================================================
+
+import os
+import re
+import zipfile
+import unicodedata
+from datetime import datetime
+
+import pandas as pd
+from fpdf import FPDF
+
+from comun.cache_pdf import cachear_pdf
+from comun.procesos import contexto_pool
+from comun.reporte_excel import ReporteExcel
+
+# Por debajo de este número de archivos no compensa levantar procesos
+MIN_ARCHIVOS_PARALELO = 8
+
+# ======================================================================================
+# --- 1. EXCEL DE CARTERA ---
+# ======================================================================================
+
+def generar_excel_formateado(df: pd.DataFrame):
+    df_export = df[['nombrecliente', 'serie', 'numero', 'fecha_documento', 'fecha_vencimiento', 'importe', 'dias_vencido']].copy()
+    # Fechas como fecha de Excel (se ordenan y filtran) mostradas dd/mm/aaaa
+    for col in ['fecha_documento', 'fecha_vencimiento']: df_export[col] = pd.to_datetime(df_export[col], errors='coerce')
+    reporte = ReporteExcel('Cartera')
+    importe_col_idx, dias_col_idx, formato_moneda = 5, 6, '"$"#,##0'
+    formato_fecha = reporte.formato(num_format='dd/mm/yyyy')
+    reporte.columnas([40, 10, 12, 18, 18, 18, 15], {
+        3: formato_fecha, 4: formato_fecha,
+        importe_col_idx: reporte.formato(num_format=formato_moneda),
+        dias_col_idx: reporte.formato(align='center'),
+    })
+    try:
+        reporte.imagen(0, 0, "LOGO FERREINOX SAS BIC 2024.png", ancho=390, alto=130)
+    except FileNotFoundError: reporte.celda(0, 0, "Logo no encontrado.")
+    # Encabezado en la fila 10 de Excel; datos debajo
+    fila_encabezado = 9
+    formato_encabezado = reporte.formato(bold=True, align='center', valign='vcenter', bg_color='#4F81BD', font_color='#FFFFFF')
+    reporte.fila(fila_encabezado, list(df_export.columns), formato_encabezado)
+    ultima = reporte.datos(df_export, fila_encabezado + 1)
+    reporte.hoja.autofilter(fila_encabezado, 0, ultima, len(df_export.columns) - 1)
+    reporte.bandas_dias(dias_col_idx, fila_encabezado + 1, ultima)
+    reporte.filas_alternas(fila_encabezado + 1, ultima, len(df_export.columns) - 1, '#DCE6F1')
+
+    font_green_bold = reporte.formato(bold=True, font_color='#006400')
+    moneda_green_bold = reporte.formato(bold=True, font_color='#006400', num_format=formato_moneda)
+    first_data_row, last_data_row = fila_encabezado + 1, ultima + 1  # Filas de Excel (base 1)
+    reporte.celda(ultima + 2, 4, "Tu cartera total es de:", font_green_bold)
+    reporte.hoja.write_formula(ultima + 2, 5, f"=SUBTOTAL(9,F{first_data_row}:F{last_data_row})", moneda_green_bold)
+    reporte.celda(ultima + 3, 4, "Facturas vencidas por valor de:", font_green_bold)
+    reporte.hoja.write_formula(ultima + 3, 5, f"=SUMIF(G{first_data_row}:G{last_data_row},\">0\",F{first_data_row}:F{last_data_row})", moneda_green_bold)
+    return reporte.cerrar()
+
+# ======================================================================================
+# --- 2. ESTADO DE CUENTA PDF ---
+# ======================================================================================
+
+class PDF(FPDF):
+    def header(self):
+        try:
+            self.image("LOGO FERREINOX SAS BIC 2024.png", 10, 8, 80)
+        except RuntimeError:
+            self.set_font('Arial', 'B', 12); self.cell(80, 10, 'Logo no encontrado o invalido', 0, 0, 'L')
+        self.set_font('Arial', 'B', 18); self.cell(0, 10, 'Estado de Cuenta', 0, 1, 'R')
+        self.set_font('Arial', 'I', 9); self.cell(0, 10, f'Generado el: {datetime.now().strftime("%Y-%m-%d")}', 0, 1, 'R')
+        self.ln(5); self.set_line_width(0.5); self.set_draw_color(220, 220, 220); self.line(10, 35, 200, 35); self.ln(10)
+
+    def footer(self):
+        self.set_y(-40)
+        self.set_font('Arial', 'I', 9); self.set_text_color(100, 100, 100)
+        self.cell(0, 6, "Para ingresar al portal de pagos, utiliza el NIT como 'usuario' y el Codigo de Cliente como 'codigo unico interno'.", 0, 1, 'C')
+        self.set_font('Arial', 'B', 11); self.set_text_color(0, 0, 0)
+        self.cell(0, 8, 'Realiza tu pago de forma facil y segura aqui:', 0, 1, 'C')
+        self.set_font('Arial', 'BU', 12); self.set_text_color(4, 88, 167)
+        link = "https://ferreinoxtiendapintuco.epayco.me/recaudo/ferreinoxrecaudoenlinea/"
+        self.cell(0, 10, "Portal de Pagos Ferreinox SAS BIC", 0, 1, 'C', link=link)
+
+VERSION_PDF_ESTADO_CUENTA = 2
+
+@cachear_pdf("tablero_estado_cuenta", VERSION_PDF_ESTADO_CUENTA)
+def generar_pdf_estado_cuenta(datos_cliente: pd.DataFrame, total_vencido_cliente: float):
+    pdf = PDF()
+    pdf.set_auto_page_break(auto=True, margin=45)
+    pdf.add_page()
+    if datos_cliente.empty:
+        pdf.set_font('Arial', 'B', 12); pdf.cell(0, 10, 'No se encontraron facturas para este cliente.', 0, 1, 'C')
+        return bytes(pdf.output())
+
+    # --- Paleta institucional del documento ---
+    NAVY = (0, 56, 101)
+    ROJO = (192, 0, 0)
+    AMBAR = (216, 120, 40)
+    GRIS_TX = (110, 110, 110)
+    GRIS_ZEBRA = (245, 247, 250)
+
+    # Ordenamos por días vencido (primero lo más crítico)
+    datos_cliente_ordenados = datos_cliente.sort_values(by='dias_vencido', ascending=False)
+    info_cliente = datos_cliente_ordenados.iloc[0]
+
+    total_importe = float(datos_cliente['importe'].sum())
+
+    # --- Datos del cliente ---
+    cod_cliente_str = str(int(info_cliente['cod_cliente'])) if pd.notna(info_cliente['cod_cliente']) else "N/A"
+    nit_str = str(info_cliente.get('nit', 'N/A')) if pd.notna(info_cliente.get('nit', None)) else "N/A"
+    pdf.set_font('Arial', 'B', 11); pdf.set_text_color(*NAVY); pdf.cell(40, 8, 'Cliente:', 0, 0)
+    pdf.set_font('Arial', '', 11); pdf.set_text_color(0, 0, 0); pdf.cell(0, 8, str(info_cliente['nombrecliente']), 0, 1)
+    pdf.set_font('Arial', 'B', 11); pdf.set_text_color(*NAVY); pdf.cell(40, 8, 'NIT:', 0, 0)
+    pdf.set_font('Arial', '', 11); pdf.set_text_color(0, 0, 0); pdf.cell(60, 8, nit_str, 0, 0)
+    pdf.set_font('Arial', 'B', 11); pdf.set_text_color(*NAVY); pdf.cell(40, 8, 'Codigo de Cliente:', 0, 0)
+    pdf.set_font('Arial', '', 11); pdf.set_text_color(0, 0, 0); pdf.cell(0, 8, cod_cliente_str, 0, 1)
+    pdf.ln(6)
+
+    # --- Mensaje ---
+    pdf.set_font('Arial', '', 10)
+    mensaje = ("Apreciado cliente, a continuación encontrará el detalle de su estado de cuenta a la fecha. "
+               "Le invitamos a revisar los valores y proceder con el pago de las facturas vencidas. "
+               "Puede pagar de forma fácil y segura en nuestro PORTAL DE PAGOS en línea (enlace al final del documento).")
+    pdf.set_text_color(*GRIS_TX); pdf.multi_cell(0, 5, mensaje, 0, 'J'); pdf.set_text_color(0, 0, 0); pdf.ln(4)
+
+    # --- Encabezado de tabla ---
+    w_fact, w_fdoc, w_fven, w_dias, w_imp = 28, 34, 34, 28, 56
+    x_tabla = 15
+
+    def encabezado_tabla():
+        pdf.set_x(x_tabla)
+        pdf.set_font('Arial', 'B', 10); pdf.set_fill_color(*NAVY); pdf.set_text_color(255, 255, 255)
+        pdf.cell(w_fact, 9, 'Factura', 1, 0, 'C', 1)
+        pdf.cell(w_fdoc, 9, 'Fecha Factura', 1, 0, 'C', 1)
+        pdf.cell(w_fven, 9, 'Fecha Venc.', 1, 0, 'C', 1)
+        pdf.cell(w_dias, 9, 'Dias Vencido', 1, 0, 'C', 1)
+        pdf.cell(w_imp, 9, 'Importe', 1, 1, 'C', 1)
+
+    encabezado_tabla()
+
+    def color_dias(d):
+        if d > 60: return (255, 205, 205)
+        if d > 30: return (255, 224, 178)
+        if d > 0:  return (255, 249, 196)
+        return None
+
+    pdf.set_font('Arial', '', 10)
+    for idx, (_, row) in enumerate(datos_cliente_ordenados.iterrows()):
+        # Repite el encabezado si salta de página
+        if pdf.get_y() > 245:
+            pdf.add_page(); encabezado_tabla(); pdf.set_font('Arial', '', 10)
+
+        dias = int(row['dias_vencido']) if pd.notna(row['dias_vencido']) else 0
+        vencida = dias > 0
+        fila_fill = (255, 240, 240) if vencida else ((255, 255, 255) if idx % 2 == 0 else GRIS_ZEBRA)
+        numero_factura_str = str(int(row['numero'])) if pd.notna(row['numero']) else "N/A"
+        fecha_doc_str = row['fecha_documento'].strftime('%d/%m/%Y') if pd.notna(row['fecha_documento']) else ''
+        fecha_ven_str = row['fecha_vencimiento'].strftime('%d/%m/%Y') if pd.notna(row['fecha_vencimiento']) else ''
+
+        pdf.set_x(x_tabla); pdf.set_text_color(0, 0, 0)
+        pdf.set_fill_color(*fila_fill)
+        pdf.cell(w_fact, 8, numero_factura_str, 1, 0, 'C', 1)
+        pdf.cell(w_fdoc, 8, fecha_doc_str, 1, 0, 'C', 1)
+        pdf.cell(w_fven, 8, fecha_ven_str, 1, 0, 'C', 1)
+        # Celda Días Vencido con color por severidad
+        cd = color_dias(dias)
+        if cd is not None:
+            pdf.set_fill_color(*cd); pdf.set_text_color(0, 0, 0)
+            pdf.cell(w_dias, 8, str(dias), 1, 0, 'C', 1)
+        else:
+            pdf.set_fill_color(*fila_fill); pdf.set_text_color(0, 0, 0)
+            pdf.cell(w_dias, 8, 'Al dia', 1, 0, 'C', 1)
+        pdf.set_fill_color(*fila_fill)
+        pdf.cell(w_imp, 8, f"${row['importe']:,.0f}", 1, 1, 'R', 1)
+
+    # --- Totales ---
+    w_label = w_fact + w_fdoc + w_fven + w_dias
+    pdf.set_x(x_tabla); pdf.set_text_color(0, 0, 0)
+    pdf.set_font('Arial', 'B', 10); pdf.set_fill_color(224, 224, 224)
+    pdf.cell(w_label, 9, 'TOTAL ADEUDADO', 1, 0, 'R', 1)
+    pdf.set_fill_color(240, 240, 240)
+    pdf.cell(w_imp, 9, f"${total_importe:,.0f}", 1, 1, 'R', 1)
+
+    if total_vencido_cliente > 0:
+        pdf.set_x(x_tabla)
+        pdf.set_font('Arial', 'B', 10); pdf.set_fill_color(*ROJO); pdf.set_text_color(255, 255, 255)
+        pdf.cell(w_label, 9, 'VALOR TOTAL VENCIDO', 1, 0, 'R', 1)
+        pdf.cell(w_imp, 9, f"${total_vencido_cliente:,.0f}", 1, 1, 'R', 1)
+
+    return bytes(pdf.output())
+
+# ======================================================================================
+# --- 3. PAQUETE DE TODOS LOS VENDEDORES ---
+# ======================================================================================
+
+def nombre_archivo(texto) -> str:
+    """Texto apto para una ruta dentro del ZIP: sin tildes, solo letras, dígitos y _"""
+    texto = unicodedata.normalize('NFD', str(texto).strip().upper())
+    texto = ''.join(c for c in texto if unicodedata.category(c) != 'Mn')
+    return re.sub(r'[^A-Z0-9]+', '_', texto).strip('_') or 'SIN_NOMBRE'
+
+def pedidos_paquete(df: pd.DataFrame, incluir_pdfs=False):
+    """
+    Agrupa la cartera una sola vez. Devuelve (grupos, pedidos): grupos es
+    {llave: facturas} y cada pedido (tipo, llave, ruta_en_zip, vencido) apunta a un grupo.
+    Un Excel por vendedor y, con incluir_pdfs, un PDF por cliente con saldo vencido
+    dentro de la cartera de ese vendedor (lo mismo que se descarga filtrando el tablero).
+    """
+    grupos, pedidos = {}, []
+    if df.empty: return grupos, pedidos
+    for vendedor, df_vendedor in df.groupby('nomvendedor', sort=True):
+        carpeta = nombre_archivo(vendedor)
+        grupos[('vendedor', vendedor)] = df_vendedor
+        pedidos.append(('excel', ('vendedor', vendedor), f"{carpeta}/Cartera_{carpeta}.xlsx", 0.0))
+        if not incluir_pdfs: continue
+        vencido = df_vendedor['importe'].where(df_vendedor['dias_vencido'] > 0, 0).groupby(df_vendedor['nombrecliente']).sum()
+        for cliente, df_cliente in df_vendedor.groupby('nombrecliente', sort=True):
+            if vencido[cliente] <= 0: continue
+            llave = ('cliente', vendedor, cliente)
+            grupos[llave] = df_cliente
+            pedidos.append(('pdf', llave, f"{carpeta}/Estados_Cuenta/Estado_Cuenta_{nombre_archivo(cliente)}.pdf", float(vencido[cliente])))
+    return grupos, pedidos
+
+def _renderizar(trabajo):
+    tipo, df_grupo, ruta, vencido = trabajo
+    if tipo == 'excel':
+        return ruta, generar_excel_formateado(df_grupo)
+    return ruta, generar_pdf_estado_cuenta(df_grupo, vencido)
+
+def generar_paquete_vendedores(df: pd.DataFrame, destino, incluir_pdfs=False, n_procesos=None, al_avanzar=None):
+    """
+    Escribe en `destino` (ruta o archivo binario) un ZIP con el Excel de cada vendedor y,
+    opcionalmente, el estado de cuenta de cada cliente vencido. Cada archivo entra al ZIP
+    apenas sale del pool: en memoria solo están los que van en camino, no el paquete entero.
+    al_avanzar(fraccion) se llama por archivo. Devuelve el número de archivos.
+    """
+    grupos, pedidos = pedidos_paquete(df, incluir_pdfs)
+    n_procesos = n_procesos or os.cpu_count() or 1
+    total = len(pedidos)
+    # Cada trabajo viaja con las facturas de su grupo: el pool no hereda nada del padre
+    trabajos = ((tipo, grupos[llave], ruta, vencido) for tipo, llave, ruta, vencido in pedidos)
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        if n_procesos > 1 and total >= MIN_ARCHIVOS_PARALELO:
+            # Se llama desde el hilo de una sesión de Streamlit: nada de fork (ver comun.procesos)
+            with contexto_pool().Pool(processes=n_procesos) as pool:
+                resultados = pool.imap(_renderizar, trabajos, chunksize=4)
+                for hechos, (ruta, contenido) in enumerate(resultados, 1):
+                    zf.writestr(ruta, contenido)
+                    if al_avanzar: al_avanzar(hechos / total)
+        else:
+            for hechos, trabajo in enumerate(trabajos, 1):
+                zf.writestr(*_renderizar(trabajo))
+                if al_avanzar: al_avanzar(hechos / total)
+    return total
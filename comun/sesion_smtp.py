@@ -0,0 +1,99 @@
+# ======================================================================================
+# ARCHIVO: comun/sesion_smtp.py
+# Sesión SMTP autenticada y reutilizable (Gmail por SSL, igual que yagmail). Un solo
+# login sirve muchos correos; si el servidor cerró la conexión se reconecta sola.
+# Los adjuntos van desde memoria: nada se escribe en disco.
+# ======================================================================================
+
+import time
+import smtplib
+import threading
+from email.message import EmailMessage
+from email.utils import formataddr
+
+HOST_GMAIL = "smtp.gmail.com"
+PUERTO_SSL = 465
+# Gmail corta sesiones inactivas; pasado este tiempo se verifica con NOOP antes de enviar
+SEGUNDOS_VERIFICAR = 60
+TEXTO_ALTERNATIVO = "Este mensaje tiene formato HTML. Ábralo en un cliente de correo compatible."
+
+class SesionSMTP:
+    """Una conexión por proceso (st.cache_resource); el candado serializa los envíos entre sesiones"""
+    def __init__(self, usuario, clave, host=HOST_GMAIL, puerto=PUERTO_SSL, timeout=30, nombre=None):
+        self.usuario = usuario
+        self._clave = clave
+        self.host = host
+        self.puerto = puerto
+        self.timeout = timeout
+        self.nombre = nombre
+        self._smtp = None
+        self._ultimo_uso = 0.0
+        self._lock = threading.Lock()
+        self.logins = 0
+
+    def _conectar(self):
+        self._cerrar_conexion()
+        smtp = smtplib.SMTP_SSL(self.host, self.puerto, timeout=self.timeout)
+        smtp.login(self.usuario, self._clave)
+        self._smtp = smtp
+        self.logins += 1
+
+    def _cerrar_conexion(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _asegurar_conexion(self):
+        if self._smtp is None:
+            self._conectar()
+        elif time.monotonic() - self._ultimo_uso > SEGUNDOS_VERIFICAR:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self._conectar()
+            except (smtplib.SMTPException, OSError):
+                self._conectar()
+
+    def _mensaje(self, destinatario, asunto, cuerpo_html, adjuntos):
+        msg = EmailMessage()
+        msg["From"] = formataddr((self.nombre, self.usuario)) if self.nombre else self.usuario
+        msg["To"] = destinatario
+        msg["Subject"] = asunto
+        msg.set_content(TEXTO_ALTERNATIVO)
+        msg.add_alternative(cuerpo_html, subtype="html")
+        for nombre, contenido, tipo in adjuntos or []:
+            principal, sub = tipo.split("/", 1)
+            msg.add_attachment(contenido, maintype=principal, subtype=sub, filename=nombre)
+        return msg
+
+    def enviar(self, destinatario, asunto, cuerpo_html, adjuntos=None):
+        """
+        Envía un correo; `adjuntos` es una lista de (nombre, bytes, mime). Devuelve (ok, detalle).
+        Una desconexión a mitad de sesión se reintenta una vez con login nuevo.
+        """
+        msg = self._mensaje(destinatario, asunto, cuerpo_html, adjuntos)
+        with self._lock:
+            for intento in range(2):
+                try:
+                    self._asegurar_conexion()
+                    rechazados = self._smtp.send_message(msg)
+                    self._ultimo_uso = time.monotonic()
+                    if rechazados:
+                        return False, f"Rechazado: {', '.join(rechazados)}"
+                    return True, "OK"
+                except (smtplib.SMTPServerDisconnected, smtplib.SMTPSenderRefused, ConnectionError) as exc:
+                    self._smtp = None
+                    if intento: return False, str(exc)
+                except smtplib.SMTPAuthenticationError as exc:
+                    self._smtp = None
+                    return False, f"Autenticacion fallida: {exc}"
+                except (smtplib.SMTPException, OSError) as exc:
+                    self._cerrar_conexion()
+                    return False, str(exc)
+        return False, "Sin conexion SMTP"
+
+    def cerrar(self):
+        with self._lock:
+            self._cerrar_conexion()
@@ -0,0 +1,32 @@
+# ======================================================================================
+# ARCHIVO: comun/sqlite_local.py
+# Conexión corta a las bases SQLite locales (libro de partidas, historial de envíos,
+# campañas): WAL para que varias sesiones lean y escriban a la vez, esquema asegurado al
+# abrir y una transacción por bloque `with`.
+# ======================================================================================
+
+import os
+import sqlite3
+from contextlib import contextmanager
+
+@contextmanager
+def transaccion(ruta, esquema, inmediata=False):
+    """
+    Abre `ruta`, crea el `esquema` si falta y deja el bloque en una transacción: COMMIT al
+    salir, ROLLBACK si hay excepción. Con inmediata=True usa BEGIN IMMEDIATE, que toma el
+    candado de escritura al inicio (leer-y-luego-escribir atómico entre procesos e hilos).
+    """
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    con = sqlite3.connect(ruta, timeout=30, isolation_level=None)
+    try:
+        con.execute("PRAGMA journal_mode=WAL")
+        con.executescript(esquema)
+        con.execute("BEGIN IMMEDIATE" if inmediata else "BEGIN")
+        try:
+            yield con
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+    finally:
+        con.close()
@@ -0,0 +1,93 @@
+# ======================================================================================
+# ARCHIVO: comun/tabla_paginada.py
+# Tablas de detalle paginadas en el servidor: búsqueda y orden se resuelven sobre el
+# snapshot en pandas y al navegador (Arrow) solo viaja la página visible.
+# ======================================================================================
+
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+OPCIONES_FILAS = [25, 50, 100, 250]
+SIN_ORDEN = "(orden original)"
+
+def posiciones_busqueda(df, texto, columnas=None):
+    """Posiciones (iloc) de las filas donde alguna columna de texto contiene `texto` (sin distinguir mayúsculas)"""
+    if not texto:
+        return np.arange(len(df))
+    columnas = columnas or [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])
+                            and not pd.api.types.is_datetime64_any_dtype(df[c])]
+    mascara = np.zeros(len(df), dtype=bool)
+    for col in columnas:
+        mascara |= df[col].astype(str).str.contains(texto, case=False, regex=False, na=False).to_numpy()
+    return np.flatnonzero(mascara)
+
+def ordenar_posiciones(df, posiciones, columna, ascendente=True):
+    """`posiciones` reordenadas por `columna` (orden estable, vacíos al final)"""
+    if columna is None or len(posiciones) == 0:
+        return posiciones
+    valores = df[columna].iloc[posiciones].reset_index(drop=True)
+    try:
+        orden = valores.sort_values(ascending=ascendente, kind='stable', na_position='last').index
+    except TypeError:
+        # Columnas con tipos mezclados: se ordena por su texto
+        orden = valores.astype(str).sort_values(ascending=ascendente, kind='stable').index
+    return posiciones[orden.to_numpy()]
+
+def _posiciones_en_cache(df, clave, version, busqueda, columna, ascendente, columnas_busqueda):
+    """Búsqueda + orden una vez por combinación; cambiar de página solo corta el arreglo"""
+    llave_estado = f"_tabla_paginada_{clave}"
+    firma = (version, busqueda, columna, ascendente) if version is not None else None
+    guardado = st.session_state.get(llave_estado)
+    if firma is not None and guardado is not None and guardado[0] == firma:
+        return guardado[1]
+    posiciones = ordenar_posiciones(df, posiciones_busqueda(df, busqueda, columnas_busqueda), columna, ascendente)
+    if firma is not None:
+        st.session_state[llave_estado] = (firma, posiciones)
+    return posiciones
+
+def pagina_tabla(df, clave, version=None, columnas_busqueda=None, filas_por_pagina=50):
+    """
+    Dibuja buscador, orden y paginador y devuelve (pagina, firma): las filas visibles y una
+    cadena que cambia con la página (útil como key de un st.data_editor). Con `version`
+    (datos + filtros) la búsqueda y el orden se guardan en la sesión entre reruns.
+    """
+    c_buscar, c_orden, c_dir, c_filas = st.columns([3, 2, 1, 1])
+    busqueda = c_buscar.text_input("🔎 Buscar", key=f"{clave}_buscar", placeholder="Texto en cualquier columna...").strip()
+    columna = c_orden.selectbox("Ordenar por", [SIN_ORDEN] + list(df.columns), key=f"{clave}_orden")
+    columna = None if columna == SIN_ORDEN else columna
+    ascendente = c_dir.radio("Dirección", ["↑", "↓"], key=f"{clave}_dir", horizontal=True) == "↑"
+    por_pagina = c_filas.selectbox("Filas", OPCIONES_FILAS, index=OPCIONES_FILAS.index(filas_por_pagina)
+                                   if filas_por_pagina in OPCIONES_FILAS else 1, key=f"{clave}_filas")
+
+    posiciones = _posiciones_en_cache(df, clave, version, busqueda, columna, ascendente, columnas_busqueda)
+    total = len(posiciones)
+    n_paginas = max(1, math.ceil(total / por_pagina))
+
+    # Otra búsqueda, orden o tamaño de página vuelve a la primera página
+    llave_pagina = f"{clave}_pagina"
+    consulta = (busqueda, columna, ascendente, por_pagina)
+    if st.session_state.get(f"{clave}_consulta") != consulta or st.session_state.get(llave_pagina, 1) > n_paginas:
+        st.session_state[f"{clave}_consulta"] = consulta
+        st.session_state[llave_pagina] = 1
+
+    pagina = st.session_state[llave_pagina]
+    inicio = (pagina - 1) * por_pagina
+    visibles = df.iloc[posiciones[inicio:inicio + por_pagina]]
+
+    c_info, c_pagina = st.columns([4, 1])
+    c_pagina.number_input(f"Página (de {n_paginas:,})", min_value=1, max_value=n_paginas, step=1, key=llave_pagina)
+    if total:
+        c_info.caption(f"Filas {inicio + 1:,}–{inicio + len(visibles):,} de {total:,}"
+                       + (f" (filtradas de {len(df):,})" if total != len(df) else ""))
+    else:
+        c_info.caption("Sin filas para la búsqueda.")
+    return visibles, f"{clave}_{hash((version, consulta, pagina)) & 0xFFFFFFFF:08x}"
+
+def tabla_paginada(df, clave, version=None, columnas_busqueda=None, filas_por_pagina=50, **kwargs_dataframe):
+    """st.dataframe de solo la página visible. Devuelve las filas mostradas"""
+    visibles, _ = pagina_tabla(df, clave, version, columnas_busqueda, filas_por_pagina)
+    st.dataframe(visibles, **kwargs_dataframe)
+    return visibles
@@ -7,17 +7,23 @@ import streamlit as st
 import pandas as pd
 import dropbox
 from io import StringIO, BytesIO
+import os
 import re
-import unicodedata
+import time
 from datetime import datetime
-from fuzzywuzzy import fuzz, process
 import gspread
 from gspread_dataframe import set_with_dataframe, get_as_dataframe
 from oauth2client.service_account import ServiceAccountCredentials
 import xlsxwriter
-import itertools
-import hashlib
-from collections import defaultdict
+
+from comun.conciliacion import (
+    normalizar_texto_avanzado, construir_indices, conciliar_movimientos
+)
+from comun.duplicados import detectar_columna_cuenta, calcular_huellas, marcar_duplicados, registrar_movimientos
+from comun.exportacion_diferida import descarga_diferida, huella_datos
+from comun.partidas_abiertas import huella_snapshot, partidas_pendientes, actualizar_libro, cerrar_partidas, resumen_libro
+from comun.metricas_motor import nuevas_metricas, tabla_etapas, registrar_corrida, leer_bitacora
+from comun.tabla_paginada import pagina_tabla
 
 # --- CONFIGURACIÓN DE PÁGINA ---
 st.set_page_config(page_title="Motor Conciliación V19", page_icon="🕵️‍♂️", layout="wide")
@@ -60,42 +66,6 @@ def download_from_dropbox(dbx, path):
         st.error(f"Error descargando {path}: {e}")
         return None
 
-def generar_id_unico(row, index):
-    """Huella digital única para evitar duplicados y rastrear filas"""
-    try:
-        fecha_str = str(row.get('FECHA', ''))
-        val_str = str(row.get('Valor_Banco', 0))
-        txt_str = str(row.get('Texto_Completo', '')).strip()
-        # Incluimos index para asegurar unicidad absoluta en la sesión
-        raw_str = f"{index}_{fecha_str}{val_str}{txt_str}"
-        return hashlib.md5(raw_str.encode('utf-8')).hexdigest()
-    except:
-        return f"ID_ERROR_{index}"
-
-def normalizar_texto_avanzado(texto):
-    """Limpieza profunda para IA y Fuzzy Matching"""
-    if not isinstance(texto, str): return ""
-    texto = texto.upper().strip()
-    texto = ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
-    texto = re.sub(r'[^A-Z0-9\s]', ' ', texto) 
-    
-    palabras_basura = [
-        'PAGO', 'TRANSF', 'TRANSFERENCIA', 'CONSIGNACION', 'ABONO', 'CTA', 'NIT', 
-        'REF', 'FACTURA', 'OFI', 'SUC', 'ACH', 'PSE', 'NOMINA', 'PROVEEDOR', 
-        'COMPRA', 'VENTA', 'VALOR', 'NETO', 'PLANILLA', 'S A', 'SAS', 'LTDA',
-        'COLOMBIA', 'BANCOLOMBIA', 'DAVIVIENDA', 'BBVA', 'BOGOTA', 'OCCIDENTE',
-        'NEQUI', 'DAVIPLATA', 'TRANSACCION', 'ELECTRONICA', 'RECIBIDO', 'DESDE', 'TERCERO',
-        'CONSORCIO', 'UNION', 'TEMPORAL', 'GRP', 'GROUP'
-    ]
-    for p in palabras_basura:
-        texto = re.sub(r'\b' + p + r'\b', ' ', texto)
-    return ' '.join(texto.split())
-
-def extraer_posibles_nits(texto):
-    if not isinstance(texto, str): return []
-    clean_txt = texto.replace('.', '').replace('-', '')
-    return re.findall(r'\b\d{7,11}\b', clean_txt)
-
 def limpiar_moneda_colombiana(val):
     if isinstance(val, (int, float)):
         return float(val) if pd.notnull(val) else 0.0
@@ -309,11 +279,11 @@ def procesar_archivo_manual(uploaded_file):
         mask_zero = df['Valor_Banco'] == 0
         df.loc[mask_zero, 'Valor_Banco'] = df.loc[mask_zero, 'Texto_Completo'].apply(extraer_dinero_de_texto)
         
-        # Index artificial para generar ID único
+        # Huella de contenido (no posicional): el mismo movimiento tiene el mismo ID en cualquier extracto
         df = df.reset_index(drop=True)
-        df['ID_Unico'] = [generar_id_unico(row, idx) for idx, row in df.iterrows()]
+        df['ID_Unico'] = calcular_huellas(df, detectar_columna_cuenta(df.columns))
         
-        return df
+        return marcar_duplicados(df)
     except Exception as e:
         st.error(f"Error procesando archivo manual: {e}")
         return pd.DataFrame()
@@ -322,195 +292,270 @@ def procesar_archivo_manual(uploaded_file):
 # --- 4. LÓGICA OMNISCIENTE ---
 # ======================================================================================
 
-def analizar_deuda_cliente(nombre_cliente, nit_cliente, valor_pago, df_cartera):
-    res = {
-        'Estado': '⚠️ SIN COINCIDENCIA VALOR',
-        'Facturas_Conciliadas': '',
-        'Detalle_Operacion': '',
-        'Diferencia': 0,
-        'Tipo_Ajuste': 'Ninguno',
-        'Impuesto_Est': 0
-    }
-    
-    facturas = df_cartera[df_cartera['nit_norm'] == nit_cliente]
-    if facturas.empty:
-        facturas = df_cartera[df_cartera['NombreCliente'].str.contains(nombre_cliente, case=False, na=False)]
+def motor_omnisciente(df_manual, df_cartera, df_historico, df_kb, n_procesos=1):
+    st.info("🧠 Procesando: Memoria Histórica + Knowledge Base + Cartera...")
+    t_inicio = time.perf_counter()
     
-    if facturas.empty:
-        res['Detalle_Operacion'] = "Cliente identificado por Nombre/NIT, pero no tiene facturas abiertas en cartera."
-        res['Diferencia'] = valor_pago * -1
-        return res
+    # 1. ÍNDICES (Memoria unificada, NITs, Palabras clave, Nombres, Radar Monto)
+    indices = construir_indices(df_cartera, df_historico, df_kb)
+    t_indices = time.perf_counter() - t_inicio
 
-    facturas_list = facturas[['Numero', 'Importe']].to_dict('records')
-    total_deuda = sum(f['Importe'] for f in facturas_list)
-    
-    # 1. MATCH EXACTO TOTAL
-    if abs(valor_pago - total_deuda) < 1000:
-        res['Estado'] = '✅ MATCH EXACTO (TOTAL)'
-        res['Facturas_Conciliadas'] = 'TODAS'
-        res['Detalle_Operacion'] = f"Pago total de {len(facturas_list)} facturas pendientes."
-        return res
+    # 2. ITERACIÓN PARTICIONADA (los bloques vuelven en el orden original)
+    progress_bar = st.progress(0)
+    metricas = nuevas_metricas()
+    resultados = conciliar_movimientos(
+        df_manual.to_dict('records'), indices,
+        n_procesos=n_procesos, al_avanzar=progress_bar.progress, metricas=metricas
+    )
+
+    # 3. INSTRUMENTACIÓN (panel + bitácora local)
+    contexto = {
+        'n_procesos': n_procesos,
+        'filas_cartera': len(df_cartera),
+        'segundos_indices': t_indices,
+        'segundos_total': time.perf_counter() - t_inicio,
+    }
+    registrar_corrida(metricas, contexto)
+    st.session_state['metricas_motor'] = {**contexto, **metricas}
         
-    # 2. MATCH FACTURAS ESPECÍFICAS (Combinatoria)
-    found = False
-    # Probamos combinaciones de 1 a 4 facturas
-    for r in range(1, 5): 
-        if found: break
-        for combo in itertools.combinations(facturas_list, r):
-            suma_combo = sum(c['Importe'] for c in combo)
-            numeros = ", ".join([str(c['Numero']) for c in combo])
-            
-            # Match Exacto de Subconjunto
-            if abs(valor_pago - suma_combo) < 500:
-                res['Estado'] = '✅ FACTURAS ESPECÍFICAS'
-                res['Facturas_Conciliadas'] = numeros
-                res['Detalle_Operacion'] = f"Suma exacta de: {numeros}"
-                found = True
-                break
-            
-            # Match con Descuento Pronto Pago (~3%)
-            if abs(valor_pago - (suma_combo * 0.97)) < 2000:
-                res['Estado'] = '💎 CONCILIADO C/DCTO'
-                res['Facturas_Conciliadas'] = numeros
-                res['Detalle_Operacion'] = f"Posible Dcto Pronto Pago sobre: {numeros}"
-                res['Tipo_Ajuste'] = "Descuento Pronto Pago"
-                found = True
-                break
+    return pd.DataFrame(resultados)
 
-    if found: return res
+def render_metricas_motor():
+    """Panel colapsable con tiempos y tasas de acierto de la última corrida"""
+    metricas = st.session_state.get('metricas_motor')
+    if not metricas: return
+    with st.expander("⏱️ Métricas del Motor (última corrida)", expanded=False):
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Tiempo Total", f"{metricas['segundos_total']:.2f} s")
+        c2.metric("Construcción Índices", f"{metricas['segundos_indices']:.2f} s")
+        c3.metric("Movimientos / s", f"{metricas['filas'] / metricas['segundos_total']:,.0f}" if metricas['segundos_total'] else "-")
+        c4.metric("Nodos Combinatoria", f"{metricas['nodos_combinatoria']:,}")
+
+        st.dataframe(
+            tabla_etapas(metricas), use_container_width=True, hide_index=True,
+            column_config={
+                'Tasa Acierto': st.column_config.ProgressColumn("Tasa Acierto", format="%.0f%%", min_value=0, max_value=1),
+                'Tiempo (s)': st.column_config.NumberColumn(format="%.3f"),
+                'ms / Evaluado': st.column_config.NumberColumn(format="%.2f"),
+            }
+        )
+        st.caption(
+            "Candidatos revisados: "
+            + " · ".join(f"{k.replace('_', ' ')}: {v:,}" for k, v in metricas['candidatos'].items())
+            + f" · Procesos: {metricas['n_procesos']}"
+        )
 
-    # 3. IMPUESTOS
-    base_est = total_deuda / 1.19
-    rete_fuente = base_est * 0.025
-    rete_iva = (base_est * 0.19) * 0.15
-    pago_imptos = total_deuda - rete_fuente - rete_iva
-    
-    if abs(valor_pago - pago_imptos) < 5000:
-        res['Estado'] = '🏢 CONCILIADO (IMPUESTOS)'
-        res['Impuesto_Est'] = rete_fuente + rete_iva
-        res['Detalle_Operacion'] = "Coincide monto total menos retenciones estimadas."
-        res['Facturas_Conciliadas'] = 'TODAS (Probable)'
-        return res
-
-    # 4. ABONO PARCIAL
-    res['Estado'] = '⚠️ ABONO / PARCIAL'
-    res['Diferencia'] = total_deuda - valor_pago
-    res['Detalle_Operacion'] = f"No cruza exacto. Deuda Total: ${total_deuda:,.0f}. Diferencia: ${res['Diferencia']:,.0f}"
-    
-    return res
+        df_bitacora = leer_bitacora()
+        if len(df_bitacora) > 1:
+            st.markdown("**Histórico de corridas**")
+            st.dataframe(df_bitacora, use_container_width=True, hide_index=True)
 
-def motor_omnisciente(df_manual, df_cartera, df_historico, df_kb):
-    st.info("🧠 Procesando: Memoria Histórica + Knowledge Base + Cartera...")
-    
-    # 1. MEMORIA UNIFICADA (Historial + KB)
-    memoria_unificada = {}
-    
-    if not df_kb.empty:
-        for _, row in df_kb.iterrows():
-            try: memoria_unificada[str(row[0]).strip()] = str(row[1]).strip()
-            except: pass
-            
-    if not df_historico.empty:
-        for _, row in df_historico.iterrows():
-            txt = str(row.get('HISTORIA_TEXTO', ''))
-            cli = str(row.get('HISTORIA_CLIENTE', ''))
-            if len(txt) > 5 and cli != '' and cli.lower() != 'nan':
-                memoria_unificada[txt] = cli
-
-    # 2. INDICE PALABRAS CLAVE (Cartera)
-    word_to_nits = defaultdict(set)
-    mapa_nit_nombre = df_cartera.groupby('nit_norm')['NombreCliente'].first().to_dict()
-    
-    for _, row in df_cartera.iterrows():
-        nombre_norm = str(row['nombre_norm'])
-        nit = row['nit_norm']
-        for w in nombre_norm.split():
-            if len(w) > 3: word_to_nits[w].add(nit)
-            
-    unique_keywords = {w: list(ns)[0] for w, ns in word_to_nits.items() if len(ns) == 1}
+def leer_knowledge_base():
+    """Lee la hoja Knowledge_Base de Google Sheets (vacía si no existe)"""
+    df_kb = pd.DataFrame()
+    g_client = connect_to_google_sheets()
+    if g_client:
+        try:
+            sh = g_client.open_by_url(st.secrets["google_sheets"]["sheet_url"])
+            try:
+                df_kb = get_as_dataframe(sh.worksheet("Knowledge_Base"), header=None)
+            except:
+                st.warning("KB vacía, se creará al guardar.")
+        except: pass
+    return df_kb
+
+def ejecutar_y_guardar(df_manual, huella_cartera, n_procesos):
+    """Corre el motor, deja el resultado en sesión y sincroniza el libro de partidas abiertas"""
+    df_res = motor_omnisciente(
+        df_manual, 
+        st.session_state['cartera'], 
+        st.session_state.get('historico', pd.DataFrame()), 
+        leer_knowledge_base(),
+        n_procesos=n_procesos
+    )
+    st.session_state['resultado_final'] = df_res
+    abiertas, cerradas = actualizar_libro(df_res, huella_cartera)
+    st.toast(f"📒 Partidas abiertas: {abiertas} · cerradas en esta corrida: {cerradas}")
+
+@st.fragment
+def seccion_resultados():
+    """Filtros, editor y descargas del resultado (fragmento: editar no vuelve a correr la carga ni la barra lateral)"""
+    df_master = st.session_state['resultado_final']
+    render_metricas_motor()
+
+    # --- FILTROS (SIDEBAR ADICIONAL O EXPANDER) ---
+    with st.expander("🔎 FILTROS AVANZADOS (Mes, Fechas, Estado)", expanded=True):
+        col_f1, col_f2, col_f3, col_f4 = st.columns(4)
+
+        # Filtro Fechas
+        min_date = df_master['FECHA'].min()
+        max_date = df_master['FECHA'].max()
+        date_range = col_f1.date_input("Rango de Fechas", [min_date, max_date])
+
+        # Filtro Estado Conciliación
+        estados_disponibles = sorted(df_master['Estado'].unique())
+        sel_estado = col_f2.multiselect("Estado Conciliación", estados_disponibles, default=estados_disponibles)
+
+        # Filtro Gestión
+        gestiones_disponibles = df_master['Status_Gestion'].unique()
+        sel_gestion = col_f3.multiselect("Estado Gestión", gestiones_disponibles, default=gestiones_disponibles)
+
+        # Filtro Sugerencia IA
+        sugerencias = sorted(df_master['Sugerencia_IA'].astype(str).unique())
+        sel_ia = col_f4.multiselect("Tipo Hallazgo IA", sugerencias, default=sugerencias)
+
+    # APLICAR FILTROS
+    mask_fecha = (df_master['FECHA'].dt.date >= date_range[0]) & (df_master['FECHA'].dt.date <= date_range[1]) if len(date_range) == 2 else True
+    mask_estado = df_master['Estado'].isin(sel_estado)
+    mask_gestion = df_master['Status_Gestion'].isin(sel_gestion)
+    mask_ia = df_master['Sugerencia_IA'].astype(str).isin(sel_ia)
+
+    df_view = df_master[mask_fecha & mask_estado & mask_gestion & mask_ia].copy()
+
+    st.divider()
+
+    # --- KPIS VISUALES ---
+    kpis = {
+        'total': len(df_view),
+        'pendientes': len(df_view[df_view['Status_Gestion'] == 'PENDIENTE']),
+        'monto': df_view['Valor_Banco'].sum()
+    }
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Registros Filtrados", kpis['total'])
+    c2.metric("Pendientes de Gestión", kpis['pendientes'], delta_color="inverse")
+    c3.metric("Monto Total Vista", f"${kpis['monto']:,.0f}")
+
+    # --- EDITOR DE DATOS (AQUÍ ESTÁ LA MEJORA VISUAL) ---
+    st.write("### 📝 Detalle de Conciliación (Edita aquí)")
+    lista_clientes = sorted(st.session_state['cartera']['NombreCliente'].unique().tolist())
+
+    # Configuración de Columnas para máxima visibilidad
+    col_config = {
+        "Status_Gestion": st.column_config.SelectboxColumn("Gestión", options=['PENDIENTE', 'REGISTRADA'], required=True, width="small"),
+        "Cliente_Identificado": st.column_config.SelectboxColumn("Cliente", options=lista_clientes, width="large"),
+        "Valor_Banco": st.column_config.NumberColumn("Valor Pago", format="$ %d", width="small"),
+        "FECHA": st.column_config.DateColumn("Fecha", format="DD/MM/YYYY", width="small"),
+        "NIT": st.column_config.TextColumn("NIT Detectado", width="medium"),
+        "Facturas_Conciliadas": st.column_config.TextColumn("Facturas Cruzadas", width="medium", help="Facturas que suman el valor del pago"),
+        "Detalle_Operacion": st.column_config.TextColumn("Explicación IA", width="large"),
+        "Estado": st.column_config.TextColumn("Estado Match", width="medium"),
+        "Sugerencia_IA": st.column_config.TextColumn("Método Detección", width="medium")
+    }
 
-    # 3. ITERACIÓN
-    resultados = []
-    progress_bar = st.progress(0)
-    
-    for idx, row in df_manual.iterrows():
-        progress_bar.progress((idx + 1) / len(df_manual))
-        
-        item = row.to_dict()
-        txt_norm = row['Texto_Norm']
-        val_pago = row['Valor_Banco']
-        
-        cliente_detectado = None
-        nit_detectado = None
-        metodo_deteccion = ""
-        
-        # A. MEMORIA (Prioridad Absoluta)
-        if txt_norm in memoria_unificada:
-            cliente_detectado = memoria_unificada[txt_norm]
-            metodo_deteccion = "🧠 Memoria / KB"
-            match_nit = df_cartera[df_cartera['NombreCliente'] == cliente_detectado]
-            if not match_nit.empty:
-                nit_detectado = match_nit.iloc[0]['nit_norm']
-        
-        # B. CARTERA (Si no hay memoria)
-        if not cliente_detectado:
-            # B1. NIT en Texto
-            nits_found = extraer_posibles_nits(row['Texto_Completo'])
-            for n in nits_found:
-                if n in mapa_nit_nombre:
-                    nit_detectado = n
-                    cliente_detectado = mapa_nit_nombre[n]
-                    metodo_deteccion = "🆔 NIT encontrado en Texto"
-                    break
-            
-            # B2. Palabra Clave
-            if not cliente_detectado:
-                for palabra in txt_norm.split():
-                    if palabra in unique_keywords:
-                        nit_detectado = unique_keywords[palabra]
-                        cliente_detectado = mapa_nit_nombre[nit_detectado]
-                        metodo_deteccion = f"🔑 Palabra Clave '{palabra}'"
-                        break
-            
-            # B3. Fuzzy
-            if not cliente_detectado:
-                posibles_nombres = df_cartera['nombre_norm'].unique()
-                match, score = process.extractOne(txt_norm, posibles_nombres, scorer=fuzz.token_set_ratio)
-                if score >= 85:
-                    cliente_detectado = df_cartera[df_cartera['nombre_norm'] == match]['NombreCliente'].iloc[0]
-                    nit_detectado = df_cartera[df_cartera['nombre_norm'] == match]['nit_norm'].iloc[0]
-                    metodo_deteccion = f"≈ Similitud Nombre ({score}%)"
-
-        # C. RESULTADO
-        item['Cliente_Identificado'] = cliente_detectado if cliente_detectado else ""
-        item['NIT'] = nit_detectado if nit_detectado else ""
-        item['Sugerencia_IA'] = metodo_deteccion
-        item['Status_Gestion'] = 'PENDIENTE'
-        
-        if cliente_detectado and nit_detectado:
-            analisis = analizar_deuda_cliente(cliente_detectado, nit_detectado, val_pago, df_cartera)
-            item.update(analisis)
-        else:
-            # Radar Monto (Último recurso)
-            match_monto = df_cartera[
-                (df_cartera['Importe'] >= val_pago - 100) & 
-                (df_cartera['Importe'] <= val_pago + 100)
-            ]
-            if not match_monto.empty:
-                cand = match_monto.iloc[0]
-                item['Estado'] = '💡 SUGERENCIA MONTO'
-                item['Sugerencia_IA'] = "Coincidencia solo por Valor"
-                item['Cliente_Identificado'] = cand['NombreCliente'] # Sugerencia visual
-                item['NIT'] = cand['nit_norm']
-                item['Detalle_Operacion'] = f"Monto coincide con Factura {cand['Numero']} de {cand['NombreCliente']}"
-                item['Facturas_Conciliadas'] = str(cand['Numero'])
+    # Seleccionamos y ordenamos las columnas que quieres ver
+    cols_view = [
+        'Status_Gestion', 
+        'FECHA', 
+        'Valor_Banco', 
+        'Cliente_Identificado', 
+        'NIT', 
+        'Facturas_Conciliadas', 
+        'Detalle_Operacion', 
+        'Estado', 
+        'Sugerencia_IA', 
+        'ID_Unico'
+    ]
+
+    # Solo la página visible va al editor (y al navegador); la búsqueda y el orden se hacen aquí
+    pagina, firma_pagina = pagina_tabla(df_view[cols_view], "motor_detalle", version=huella_datos(df_view))
+    edited_df = st.data_editor(
+        pagina, 
+        use_container_width=True, 
+        column_config=col_config, 
+        key=f"editor_filtrado_{firma_pagina}",
+        num_rows="dynamic",
+        height=600
+    )
+
+    # --- SINCRONIZACIÓN DE CAMBIOS ---
+    # Si el usuario edita la página, actualizamos el DF Master usando ID_Unico
+    if not edited_df.equals(pagina):
+        for idx, row in edited_df.iterrows():
+            id_unico = row['ID_Unico']
+            # Actualizar campos clave en el master
+            idx_master = df_master[df_master['ID_Unico'] == id_unico].index
+            if not idx_master.empty:
+                st.session_state['resultado_final'].loc[idx_master, 'Status_Gestion'] = row['Status_Gestion']
+                st.session_state['resultado_final'].loc[idx_master, 'Cliente_Identificado'] = row['Cliente_Identificado']
+
+    # Vista completa con lo editado: master sincronizado + filas agregadas / sin las borradas en la página
+    ids_pagina = set(pagina['ID_Unico'])
+    borrados = ids_pagina - set(edited_df['ID_Unico'])
+    vista_editada = st.session_state['resultado_final'].loc[df_view.index, cols_view]
+    vista_editada = pd.concat([
+        vista_editada[~vista_editada['ID_Unico'].isin(borrados)],
+        edited_df[~edited_df['ID_Unico'].isin(ids_pagina)],
+    ])
+
+    # --- BOTONES DE ACCIÓN ---
+    st.divider()
+    c_excel, c_informe, c_save = st.columns(3)
+
+    with c_excel:
+        # Descarga Operativa
+        descarga_diferida(
+            "💾 Descargar Vista Actual (Operativo)", lambda: generar_excel_operativo(vista_editada),
+            "Conciliacion_Operativa.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            clave="excel_operativo", version=huella_datos(vista_editada), use_container_width=True,
+        )
+
+    with c_informe:
+        # Descarga Gerencial
+        descarga_diferida(
+            "📊 Descargar Informe Gerencial (Mes a Mes)", lambda: generar_reporte_gerencial(st.session_state['resultado_final']),
+            "Reporte_Consolidado_Mensual.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            clave="excel_gerencial_motor", version=huella_datos(st.session_state['resultado_final']), use_container_width=True,
+        )
+
+    with c_save:
+        if st.button("☁️ GUARDAR Y ENTRENAR IA", type="primary", use_container_width=True):
+            g_client = connect_to_google_sheets()
+            if not g_client:
+                st.error("Error conexión Google Sheets.")
             else:
-                item['Estado'] = '❓ NO IDENTIFICADO'
-                item['Detalle_Operacion'] = "Sin coincidencias claras."
+                try:
+                    sh = g_client.open_by_url(st.secrets["google_sheets"]["sheet_url"])
+
+                    # 1. Guardar Maestro
+                    ws_master = sh.worksheet(st.secrets["google_sheets"]["tab_bancos_master"])
+                    df_final_save = st.session_state['resultado_final'].copy()
+                    df_final_save = df_final_save.fillna('')
+                    df_final_save['FECHA'] = df_final_save['FECHA'].astype(str)
+                    ws_master.clear()
+                    set_with_dataframe(ws_master, df_final_save)
+
+                    # Solo lo que quedó guardado cuenta como procesado: si el guardado falla
+                    # o nunca se hace, el mismo archivo puede volver a correrse completo
+                    if 'Origen' in df_final_save.columns:
+                        movs_archivo = df_final_save[df_final_save['Origen'] == "Archivo del día"]
+                        registrar_movimientos(movs_archivo['ID_Unico'], st.session_state.get('archivo_manual', ''))
+
+                    # 2. Entrenar IA (KB)
+                    try: ws_kb = sh.worksheet("Knowledge_Base")
+                    except: ws_kb = sh.add_worksheet(title="Knowledge_Base", rows=1000, cols=2)
+
+                    nuevos_registros = df_final_save[
+                        (df_final_save['Status_Gestion'] == 'REGISTRADA') & 
+                        (df_final_save['Cliente_Identificado'] != '')
+                    ]
+
+                    if not nuevos_registros.empty:
+                        cerrar_partidas(nuevos_registros['ID_Unico'].tolist())
+                        data_kb = []
+                        for _, r in nuevos_registros.iterrows():
+                            txt_norm = normalizar_texto_avanzado(str(r['Texto_Completo']))
+                            cli = str(r['Cliente_Identificado']).strip()
+                            if len(txt_norm) > 5 and cli:
+                                data_kb.append([txt_norm, cli])
+
+                        if data_kb:
+                            ws_kb.append_rows(data_kb)
+                            st.toast(f"🧠 IA aprendió {len(data_kb)} nuevos patrones.")
+
+                    st.success("✅ Guardado Exitoso y Aprendizaje Completado")
+                except Exception as e:
+                    st.error(f"Error guardando: {e}")
 
-        resultados.append(item)
-        
-    return pd.DataFrame(resultados)
 
 # ======================================================================================
 # --- 5. INTERFAZ PRINCIPAL ---
@@ -544,11 +589,34 @@ def main():
         if 'historico' in st.session_state: st.info(f"🧠 Memoria Activa: {len(st.session_state['historico'])}")
         st.divider()
 
+        st.header("⚙️ Rendimiento")
+        cpus = os.cpu_count() or 1
+        n_procesos = st.select_slider(
+            "Procesos paralelos del motor", options=[1, 2, 4, 8],
+            value=max(o for o in [1, 2, 4] if o <= cpus),
+            help="Archivos grandes (fin de mes) se reparten en bloques entre varios núcleos."
+        )
+
     # --- PANEL SUPERIOR: OPERACIÓN ---
     st.subheader("2. Operación Diaria")
     uploaded_file = st.file_uploader("Sube el Archivo Manual Diario (.xlsx)", type=["xlsx"])
 
+    if 'cartera' in st.session_state:
+        huella_cartera = huella_snapshot(st.session_state['cartera'])
+        n_abiertas, valor_abierto = resumen_libro()
+        if n_abiertas:
+            st.caption(f"📒 Partidas abiertas de días anteriores: {n_abiertas} (${valor_abierto:,.0f})")
+
     if uploaded_file and 'cartera' in st.session_state:
+        col_op1, col_op2 = st.columns(2)
+        omitir_duplicados = col_op1.checkbox(
+            "🧬 Omitir movimientos ya procesados en cargas anteriores", value=True,
+            help="Compara FECHA + Valor + Texto + Cuenta contra el registro local de movimientos ya guardados en Sheets."
+        )
+        incluir_abiertas = col_op2.checkbox(
+            "📒 Reintentar partidas abiertas contra esta cartera", value=True,
+            help="Abonos parciales, no identificados y sugerencias por monto sin confirmar de días anteriores que aún no se revisaron con este snapshot."
+        )
         if st.button("🚀 EJECUTAR MOTOR IA (ANÁLISIS COMPLETO)", type="primary", use_container_width=True):
             
             # 1. Leer Manual
@@ -556,180 +624,43 @@ def main():
             if df_manual.empty:
                 st.error("Error leyendo archivo manual.")
                 return
-            
-            # 2. Leer KB Google Sheets
-            df_kb = pd.DataFrame()
-            g_client = connect_to_google_sheets()
-            if g_client:
-                try:
-                    sh = g_client.open_by_url(st.secrets["google_sheets"]["sheet_url"])
-                    try:
-                        df_kb = get_as_dataframe(sh.worksheet("Knowledge_Base"), header=None)
-                    except:
-                        st.warning("KB vacía, se creará al guardar.")
-                except: pass
-            
-            # 3. Correr Motor
-            df_res = motor_omnisciente(
-                df_manual, 
-                st.session_state['cartera'], 
-                st.session_state.get('historico', pd.DataFrame()), 
-                df_kb
-            )
-            st.session_state['resultado_final'] = df_res
+
+            df_dup = df_manual[df_manual['Duplicado']]
+            if not df_dup.empty:
+                st.warning(f"🧬 {len(df_dup)} movimientos ya habían sido cargados en archivos anteriores.")
+                with st.expander("Ver movimientos duplicados"):
+                    st.dataframe(df_dup[['FECHA', 'Valor_Banco', 'Texto_Completo', 'Visto_En']], use_container_width=True, hide_index=True)
+                if omitir_duplicados:
+                    df_manual = df_manual[~df_manual['Duplicado']].reset_index(drop=True)
+            df_manual['Origen'] = "Archivo del día"
+
+            # 2. Arrastre de partidas abiertas (solo las no revisadas con este snapshot)
+            if incluir_abiertas:
+                df_arrastre = partidas_pendientes(huella_cartera, excluir_ids=df_manual['ID_Unico'])
+                if not df_arrastre.empty:
+                    df_arrastre['Origen'] = "📒 Partida abierta"
+                    df_manual = pd.concat([df_manual, df_arrastre], ignore_index=True)
+
+            if df_manual.empty:
+                st.info("Todos los movimientos del archivo ya fueron procesados antes.")
+                return
+
+            ejecutar_y_guardar(df_manual, huella_cartera, n_procesos)
+            # Los movimientos se registran como procesados al guardar en Sheets, no aquí
+            st.session_state['archivo_manual'] = uploaded_file.name
+
+    elif 'cartera' in st.session_state and n_abiertas:
+        if st.button("📒 Reprocesar solo partidas abiertas", use_container_width=True):
+            df_arrastre = partidas_pendientes(huella_cartera)
+            if df_arrastre.empty:
+                st.info("Las partidas abiertas ya fueron revisadas contra esta cartera. Carga un snapshot nuevo para reintentar.")
+            else:
+                df_arrastre['Origen'] = "📒 Partida abierta"
+                ejecutar_y_guardar(df_arrastre, huella_cartera, n_procesos)
 
     # --- SECCIÓN DE RESULTADOS Y FILTROS ---
     if 'resultado_final' in st.session_state:
-        df_master = st.session_state['resultado_final']
-        
-        # --- FILTROS (SIDEBAR ADICIONAL O EXPANDER) ---
-        with st.expander("🔎 FILTROS AVANZADOS (Mes, Fechas, Estado)", expanded=True):
-            col_f1, col_f2, col_f3, col_f4 = st.columns(4)
-            
-            # Filtro Fechas
-            min_date = df_master['FECHA'].min()
-            max_date = df_master['FECHA'].max()
-            date_range = col_f1.date_input("Rango de Fechas", [min_date, max_date])
-            
-            # Filtro Estado Conciliación
-            estados_disponibles = sorted(df_master['Estado'].unique())
-            sel_estado = col_f2.multiselect("Estado Conciliación", estados_disponibles, default=estados_disponibles)
-            
-            # Filtro Gestión
-            gestiones_disponibles = df_master['Status_Gestion'].unique()
-            sel_gestion = col_f3.multiselect("Estado Gestión", gestiones_disponibles, default=gestiones_disponibles)
-            
-            # Filtro Sugerencia IA
-            sugerencias = sorted(df_master['Sugerencia_IA'].astype(str).unique())
-            sel_ia = col_f4.multiselect("Tipo Hallazgo IA", sugerencias, default=sugerencias)
-
-        # APLICAR FILTROS
-        mask_fecha = (df_master['FECHA'].dt.date >= date_range[0]) & (df_master['FECHA'].dt.date <= date_range[1]) if len(date_range) == 2 else True
-        mask_estado = df_master['Estado'].isin(sel_estado)
-        mask_gestion = df_master['Status_Gestion'].isin(sel_gestion)
-        mask_ia = df_master['Sugerencia_IA'].astype(str).isin(sel_ia)
-        
-        df_view = df_master[mask_fecha & mask_estado & mask_gestion & mask_ia].copy()
-        
-        st.divider()
-        
-        # --- KPIS VISUALES ---
-        kpis = {
-            'total': len(df_view),
-            'pendientes': len(df_view[df_view['Status_Gestion'] == 'PENDIENTE']),
-            'monto': df_view['Valor_Banco'].sum()
-        }
-        c1, c2, c3 = st.columns(3)
-        c1.metric("Registros Filtrados", kpis['total'])
-        c2.metric("Pendientes de Gestión", kpis['pendientes'], delta_color="inverse")
-        c3.metric("Monto Total Vista", f"${kpis['monto']:,.0f}")
-
-        # --- EDITOR DE DATOS (AQUÍ ESTÁ LA MEJORA VISUAL) ---
-        st.write("### 📝 Detalle de Conciliación (Edita aquí)")
-        lista_clientes = sorted(st.session_state['cartera']['NombreCliente'].unique().tolist())
-        
-        # Configuración de Columnas para máxima visibilidad
-        col_config = {
-            "Status_Gestion": st.column_config.SelectboxColumn("Gestión", options=['PENDIENTE', 'REGISTRADA'], required=True, width="small"),
-            "Cliente_Identificado": st.column_config.SelectboxColumn("Cliente", options=lista_clientes, width="large"),
-            "Valor_Banco": st.column_config.NumberColumn("Valor Pago", format="$ %d", width="small"),
-            "FECHA": st.column_config.DateColumn("Fecha", format="DD/MM/YYYY", width="small"),
-            "NIT": st.column_config.TextColumn("NIT Detectado", width="medium"),
-            "Facturas_Conciliadas": st.column_config.TextColumn("Facturas Cruzadas", width="medium", help="Facturas que suman el valor del pago"),
-            "Detalle_Operacion": st.column_config.TextColumn("Explicación IA", width="large"),
-            "Estado": st.column_config.TextColumn("Estado Match", width="medium"),
-            "Sugerencia_IA": st.column_config.TextColumn("Método Detección", width="medium")
-        }
-        
-        # Seleccionamos y ordenamos las columnas que quieres ver
-        cols_view = [
-            'Status_Gestion', 
-            'FECHA', 
-            'Valor_Banco', 
-            'Cliente_Identificado', 
-            'NIT', 
-            'Facturas_Conciliadas', 
-            'Detalle_Operacion', 
-            'Estado', 
-            'Sugerencia_IA', 
-            'ID_Unico'
-        ]
-        
-        edited_df = st.data_editor(
-            df_view[cols_view], 
-            use_container_width=True, 
-            column_config=col_config, 
-            key="editor_filtrado",
-            num_rows="dynamic",
-            height=600
-        )
-        
-        # --- SINCRONIZACIÓN DE CAMBIOS ---
-        # Si el usuario edita la vista filtrada, actualizamos el DF Master usando ID_Unico
-        if not edited_df.equals(df_view[cols_view]):
-            for idx, row in edited_df.iterrows():
-                id_unico = row['ID_Unico']
-                # Actualizar campos clave en el master
-                idx_master = df_master[df_master['ID_Unico'] == id_unico].index
-                if not idx_master.empty:
-                    st.session_state['resultado_final'].loc[idx_master, 'Status_Gestion'] = row['Status_Gestion']
-                    st.session_state['resultado_final'].loc[idx_master, 'Cliente_Identificado'] = row['Cliente_Identificado']
-
-        # --- BOTONES DE ACCIÓN ---
-        st.divider()
-        c_excel, c_informe, c_save = st.columns(3)
-        
-        with c_excel:
-            # Descarga Operativa
-            excel_op = generar_excel_operativo(edited_df)
-            st.download_button("💾 Descargar Vista Actual (Operativo)", data=excel_op, file_name="Conciliacion_Operativa.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", use_container_width=True)
-            
-        with c_informe:
-            # Descarga Gerencial
-            excel_mg = generar_reporte_gerencial(st.session_state['resultado_final'])
-            st.download_button("📊 Descargar Informe Gerencial (Mes a Mes)", data=excel_mg, file_name="Reporte_Consolidado_Mensual.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", use_container_width=True)
-            
-        with c_save:
-            if st.button("☁️ GUARDAR Y ENTRENAR IA", type="primary", use_container_width=True):
-                g_client = connect_to_google_sheets()
-                if not g_client:
-                    st.error("Error conexión Google Sheets.")
-                else:
-                    try:
-                        sh = g_client.open_by_url(st.secrets["google_sheets"]["sheet_url"])
-                        
-                        # 1. Guardar Maestro
-                        ws_master = sh.worksheet(st.secrets["google_sheets"]["tab_bancos_master"])
-                        df_final_save = st.session_state['resultado_final'].copy()
-                        df_final_save = df_final_save.fillna('')
-                        df_final_save['FECHA'] = df_final_save['FECHA'].astype(str)
-                        ws_master.clear()
-                        set_with_dataframe(ws_master, df_final_save)
-                        
-                        # 2. Entrenar IA (KB)
-                        try: ws_kb = sh.worksheet("Knowledge_Base")
-                        except: ws_kb = sh.add_worksheet(title="Knowledge_Base", rows=1000, cols=2)
-
-                        nuevos_registros = df_final_save[
-                            (df_final_save['Status_Gestion'] == 'REGISTRADA') & 
-                            (df_final_save['Cliente_Identificado'] != '')
-                        ]
-                        
-                        if not nuevos_registros.empty:
-                            data_kb = []
-                            for _, r in nuevos_registros.iterrows():
-                                txt_norm = normalizar_texto_avanzado(str(r['Texto_Completo']))
-                                cli = str(r['Cliente_Identificado']).strip()
-                                if len(txt_norm) > 5 and cli:
-                                    data_kb.append([txt_norm, cli])
-                            
-                            if data_kb:
-                                ws_kb.append_rows(data_kb)
-                                st.toast(f"🧠 IA aprendió {len(data_kb)} nuevos patrones.")
-                        
-                        st.success("✅ Guardado Exitoso y Aprendizaje Completado")
-                    except Exception as e:
-                        st.error(f"Error guardando: {e}")
+        seccion_resultados()
 
 if __name__ == "__main__":
     main()
@@ -11,7 +11,10 @@ import unicodedata
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from statsmodels.tsa.holtwinters import ExponentialSmoothing
-import plotly.express as px
+
+from comun.exportacion_diferida import huella_datos
+from comun.graficos import figura_en_cache, scatter_liviano
+from comun.indice_filtros import IndiceFiltros
 
 st.set_page_config(page_title="Centro de Comando Histórico", page_icon="🔮", layout="wide")
 
@@ -63,6 +66,11 @@ def cargar_datos_historicos():
         df_historico_unico = pd.merge(df_historico_unico, df_pagadas[['numero', 'dias_de_pago']], on='numero', how='left')
     return df_historico_unico
 
+@st.cache_data
+def cargar_indice_historico():
+    """Vendedores del histórico y sus filas, una vez por snapshot (mismo ciclo que cargar_datos_historicos)."""
+    return IndiceFiltros(cargar_datos_historicos(), ['nomvendedor', 'nomvendedor_norm'])
+
 @st.cache_data
 def calcular_rfm(df: pd.DataFrame):
     snapshot_date = df['fecha_documento'].max() + relativedelta(days=1)
@@ -94,15 +102,16 @@ if df_historico_base.empty:
 st.sidebar.header("Filtros de Análisis")
 acceso_general = st.session_state.get('acceso_general', False)
 vendedor_autenticado = st.session_state.get('vendedor_autenticado', None)
+indice_historico = cargar_indice_historico()
 if acceso_general:
-    vendedores = ["Todos"] + sorted(df_historico_base['nomvendedor'].dropna().unique())
+    vendedores = ["Todos"] + indice_historico.opciones('nomvendedor')
     vendedor_sel_hist = st.sidebar.selectbox("Vendedor:", vendedores)
 else:
     vendedor_sel_hist = vendedor_autenticado
-if vendedor_sel_hist == "Todos":
-    df_historico = df_historico_base.copy()
-else:
-    df_historico = df_historico_base[df_historico_base['nomvendedor_norm'] == normalizar_nombre(vendedor_sel_hist)].copy()
+df_historico = indice_historico.filtrar(
+    df_historico_base,
+    nomvendedor_norm=None if vendedor_sel_hist == "Todos" else normalizar_nombre(vendedor_sel_hist),
+)
 if df_historico.empty:
     st.warning("No hay datos para el vendedor seleccionado."); st.stop()
     
@@ -234,9 +243,12 @@ with tab3:
         st.markdown("#### Visualización de la Base de Clientes")
         plot_data = rfm_data[rfm_data['Monetario'] > 0].copy()
         if not plot_data.empty:
-            fig = px.scatter(plot_data, x='Recencia', y='Frecuencia', size='Monetario', color='Segmento',
-                             hover_name=plot_data.index, size_max=60,
-                             title="Mapa de Clientes por Recencia, Frecuencia y Monto")
+            # Con miles de clientes los puntos van por WebGL; la figura se reutiliza por vendedor y datos
+            fig = figura_en_cache(
+                "rfm_scatter", (vendedor_sel_hist, huella_datos(plot_data, ['Recencia', 'Frecuencia', 'Monetario'])),
+                lambda: scatter_liviano(plot_data, x='Recencia', y='Frecuencia', size='Monetario', color='Segmento',
+                                        hover_name=plot_data.index, size_max=60,
+                                        title="Mapa de Clientes por Recencia, Frecuencia y Monto"))
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No hay clientes con valor monetario positivo para visualizar en el gráfico RFM.")
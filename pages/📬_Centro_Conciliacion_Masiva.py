@@ -1,21 +1,30 @@
-import base64
-import html
-import json
 import os
 import re
-import time
 import unicodedata
-from datetime import datetime
+from datetime import date, datetime
 from io import BytesIO, StringIO
-from urllib import error as urllib_error
-from urllib import request as urllib_request
 
 import dropbox
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 import streamlit.components.v1 as components
-from fpdf import FPDF
+
+from comun.antiguedad import ESCALA_RANGO_MORA, aplicar_antiguedad, clasificar
+from comun.calidad_contacto import PATRON_EMAIL, calidad_contacto, estado_correo
+from comun.campanas_envio import (
+    EjecutorCampanas, cancelar_campana, crear_campana, detalle_campana, listar_campanas,
+    progreso_campana, reintentar_revisados
+)
+from comun.despacho_sendgrid import (
+    ClienteSendGrid, LimitadorTasa, enviar_con_reintentos, payload_sendgrid, resultado_envio
+)
+from comun.exportacion_diferida import descarga_diferida
+from comun.historial_envios import (
+    consultar_envios, exportar_envios, migrar_csv, registrar_envios, resumen_envios, valores_distintos
+)
+from comun.pdf_conciliacion import agrupar_por_cliente, crear_pdf_cliente
+from comun.plantillas_correo import PlantillaCorreo, campo, resumen_tiempos
 
 
 st.set_page_config(
@@ -42,6 +51,7 @@ WHATSAPP_LINEAS = [
     ("Manizales", "310 8501359", "https://wa.me/573108501359"),
     ("Pereira", "314 2087169", "https://wa.me/573142087169"),
 ]
+ESTRATEGIAS_CONCILIACION = ["Conciliacion cordial", "Cierre operativo", "Seguimiento prioritario"]
 HISTORY_FILE = os.path.join(os.path.dirname(__file__), "_historial_conciliacion_envios.csv")
 
 
@@ -172,7 +182,7 @@ st.markdown(
 )
 
 
-EMAIL_REGEX = re.compile(r"^[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}$", re.IGNORECASE)
+EMAIL_REGEX = re.compile(PATRON_EMAIL)
 
 
 def normalizar_nombre(texto: str) -> str:
@@ -206,7 +216,7 @@ def normalizar_email(valor) -> str:
 def email_es_valido(valor: str) -> bool:
     if not valor:
         return False
-    return EMAIL_REGEX.match(valor) is not None
+    return EMAIL_REGEX.fullmatch(valor) is not None
 
 
 def extraer_correos_prueba(texto: str) -> list[str]:
@@ -221,11 +231,6 @@ def extraer_correos_prueba(texto: str) -> list[str]:
     return correos
 
 
-def hex_to_rgb(hex_color: str):
-    hex_color = hex_color.lstrip('#')
-    return tuple(int(hex_color[i:i + 2], 16) for i in (0, 2, 4))
-
-
 def obtener_columna_email(df: pd.DataFrame) -> str:
     for candidate in ["e_mail", "email", "correo", "mail"]:
         if candidate in df.columns:
@@ -317,9 +322,7 @@ def procesar_dataframe_robusto(df_raw: pd.DataFrame) -> pd.DataFrame:
     df["zona"] = df["serie"].apply(asignar_zona_robusta)
     df = df[~df["serie"].str.contains('W|X', case=False, na=False)].copy()
 
-    bins = [-float('inf'), 0, 15, 30, 60, 90, float('inf')]
-    labels = ["Al Dia", "1-15 dias", "16-30 dias", "31-60 dias", "61-90 dias", "+90 dias"]
-    df["rango_mora"] = pd.cut(df["dias_vencido"], bins=bins, labels=labels, right=True)
+    df["rango_mora"] = clasificar(df["dias_vencido"], ESCALA_RANGO_MORA)
     df = df[df["importe"] != 0].copy()
     return asegurar_cliente_key(df)
 
@@ -379,8 +382,9 @@ def construir_resumen_clientes(df: pd.DataFrame) -> pd.DataFrame:
         tel_col = "telefono1"
 
     base = df.copy()
-    base["email_normalizado"] = base[email_col].apply(normalizar_email)
-    base["telefono_normalizado"] = base[tel_col].astype(str).str.replace(r'\D', '', regex=True)
+    contacto = calidad_contacto(base[email_col], base[tel_col])
+    base["email_normalizado"] = contacto["email_normalizado"]
+    base["telefono_normalizado"] = contacto["telefono_e164"]
     base["importe_vencido"] = base["importe"].where(base["dias_vencido"] > 0, 0)
     base["documento_max_vencido"] = base["dias_vencido"].where(base["dias_vencido"] > 0, 0)
     resumen = base.groupby("cliente_key", dropna=False).agg(
@@ -405,26 +409,14 @@ def construir_resumen_clientes(df: pd.DataFrame) -> pd.DataFrame:
         fecha_proximo_vencimiento=("fecha_vencimiento", "min"),
     ).reset_index()
 
-    correos_duplicados = resumen[resumen["correo"] != ""]["correo"].value_counts()
-    set_correos_compartidos = set(correos_duplicados[correos_duplicados > 1].index)
-
-    def clasificar_estado_correo(row):
-        correo = row["correo"]
-        if not correo:
-            return "Sin correo"
-        if not email_es_valido(correo):
-            return "Correo invalido"
-        if correo in set_correos_compartidos:
-            return "Correo compartido"
-        return "Listo"
-
-    resumen["estado_correo"] = resumen.apply(clasificar_estado_correo, axis=1)
+    resumen["estado_correo"] = estado_correo(resumen["correo"])
     resumen["segmento_envio"] = "Conciliacion"
     resumen.loc[resumen["saldo_vencido"] <= 0, "segmento_envio"] = "Informativo"
     resumen.loc[resumen["dias_max_mora"] >= 31, "segmento_envio"] = "Prioritario"
-    resumen["cliente_label"] = resumen.apply(
-        lambda row: f"{row['nombrecliente']} | {row['saldo_vencido']:,.0f} vencido | {row['correo'] or 'sin correo'}",
-        axis=1,
+    resumen["cliente_label"] = (
+        resumen["nombrecliente"].astype(str)
+        + " | " + resumen["saldo_vencido"].map("{:,.0f}".format)
+        + " vencido | " + resumen["correo"].replace("", "sin correo")
     )
     return resumen.sort_values(["saldo_vencido", "saldo_total"], ascending=[False, False]).reset_index(drop=True)
 
@@ -488,162 +480,6 @@ def dataframe_a_excel(dataframes: dict[str, pd.DataFrame]) -> bytes:
     return salida.getvalue()
 
 
-def cargar_historial_envios() -> pd.DataFrame:
-    columnas = [
-        "Fecha", "Campana", "Modo", "Cliente", "Destino", "Correo Cliente", "Estado Correo",
-        "Saldo Vencido", "Resultado", "Detalle", "Vendedor", "Zona", "Estrategia",
-    ]
-    if not os.path.exists(HISTORY_FILE):
-        return pd.DataFrame(columns=columnas)
-    try:
-        historial = pd.read_csv(HISTORY_FILE)
-        for columna in columnas:
-            if columna not in historial.columns:
-                historial[columna] = ""
-        return historial[columnas].copy()
-    except Exception:
-        return pd.DataFrame(columns=columnas)
-
-
-def guardar_historial_envios(df_resultados: pd.DataFrame):
-    if df_resultados.empty:
-        return
-    historial_actual = cargar_historial_envios()
-    historial_nuevo = pd.concat([historial_actual, df_resultados], ignore_index=True)
-    historial_nuevo.to_csv(HISTORY_FILE, index=False)
-
-
-class PDFEstadoCuenta(FPDF):
-    def header(self):
-        try:
-            self.image("LOGO FERREINOX SAS BIC 2024.png", 10, 8, 72)
-        except Exception:
-            self.set_font("Helvetica", "B", 12)
-            self.cell(72, 10, "FERREINOX S.A.S. BIC", 0, 0, "L")
-
-        self.set_font("Helvetica", "B", 18)
-        self.set_text_color(*hex_to_rgb(COLOR_PRIMARIO))
-        self.cell(0, 10, "Estado de Cuenta", 0, 1, "R")
-        self.set_font("Helvetica", "", 9)
-        self.set_text_color(110, 110, 110)
-        self.cell(0, 7, f"Fecha de generacion: {datetime.now().strftime('%Y-%m-%d %H:%M')}", 0, 1, "R")
-        self.ln(6)
-
-    def footer(self):
-        self.set_y(-28)
-        self.set_font("Helvetica", "I", 8)
-        self.set_text_color(110, 110, 110)
-        self.multi_cell(
-            0,
-            4,
-            "Este documento soporta la conciliacion de cartera y el control administrativo del cliente.",
-            0,
-            "C",
-        )
-        self.set_font("Helvetica", "B", 9)
-        self.set_text_color(*hex_to_rgb(COLOR_SECUNDARIO))
-        self.cell(0, 5, "Portal de Pagos Ferreinox", 0, 1, "C", link=PORTAL_PAGOS)
-        self.set_font("Helvetica", "I", 8)
-        self.set_text_color(120, 120, 120)
-        self.cell(0, 4, f"Pagina {self.page_no()}", 0, 0, "C")
-
-
-def crear_pdf_cliente(df_cliente: pd.DataFrame, saldo_vencido: float) -> bytes:
-    pdf = PDFEstadoCuenta()
-    pdf.set_auto_page_break(auto=True, margin=30)
-    pdf.add_page()
-
-    if df_cliente.empty:
-        pdf.set_font("Helvetica", "B", 12)
-        pdf.cell(0, 10, "Sin facturas para este cliente.", 0, 1, "C")
-        return bytes(pdf.output())
-
-    fila = df_cliente.iloc[0]
-    rgb_primario = hex_to_rgb(COLOR_PRIMARIO)
-    rgb_terciario = hex_to_rgb(COLOR_TERCIARIO)
-
-    pdf.set_font("Helvetica", "B", 11)
-    pdf.set_text_color(*rgb_primario)
-    pdf.cell(36, 7, "Cliente:", 0, 0)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Helvetica", "", 11)
-    pdf.cell(0, 7, str(fila.get("nombrecliente", "")), 0, 1)
-
-    pdf.set_font("Helvetica", "B", 11)
-    pdf.set_text_color(*rgb_primario)
-    pdf.cell(36, 7, "NIT:", 0, 0)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Helvetica", "", 11)
-    pdf.cell(0, 7, str(fila.get("nit", "")), 0, 1)
-
-    pdf.set_font("Helvetica", "B", 11)
-    pdf.set_text_color(*rgb_primario)
-    pdf.cell(36, 7, "Codigo Cliente:", 0, 0)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Helvetica", "", 11)
-    cod_cliente = fila.get("cod_cliente")
-    cod_texto = str(int(cod_cliente)) if pd.notna(cod_cliente) else "N/A"
-    pdf.cell(0, 7, cod_texto, 0, 1)
-    pdf.ln(4)
-
-    mensaje = (
-        "A continuacion se presenta el detalle consolidado de su estado de cuenta. "
-        "Este envio tiene enfoque de conciliacion administrativa y validacion de saldos, "
-        "facilitando la revision oportuna de la informacion financiera del cliente."
-    )
-    pdf.set_text_color(95, 95, 95)
-    pdf.set_font("Helvetica", "", 10)
-    pdf.multi_cell(0, 5, mensaje, 0, "J")
-    pdf.ln(5)
-
-    pdf.set_font("Helvetica", "B", 10)
-    pdf.set_fill_color(*rgb_primario)
-    pdf.set_text_color(255, 255, 255)
-    pdf.cell(26, 8, "Factura", 1, 0, "C", 1)
-    pdf.cell(28, 8, "Dias Mora", 1, 0, "C", 1)
-    pdf.cell(38, 8, "Fecha Doc.", 1, 0, "C", 1)
-    pdf.cell(38, 8, "Fecha Venc.", 1, 0, "C", 1)
-    pdf.cell(40, 8, "Saldo", 1, 1, "C", 1)
-
-    total = 0
-    pdf.set_font("Helvetica", "", 10)
-    for _, item in df_cliente.sort_values(by=["dias_vencido", "fecha_vencimiento"], ascending=[False, True]).iterrows():
-        total += float(item.get("importe", 0) or 0)
-        if int(item.get("dias_vencido", 0) or 0) > 0:
-            pdf.set_fill_color(255, 245, 238)
-            pdf.set_text_color(*rgb_terciario)
-        else:
-            pdf.set_fill_color(255, 255, 255)
-            pdf.set_text_color(0, 0, 0)
-
-        fecha_doc = item.get("fecha_documento")
-        fecha_venc = item.get("fecha_vencimiento")
-        fecha_doc_txt = fecha_doc.strftime("%d/%m/%Y") if pd.notna(fecha_doc) else "-"
-        fecha_venc_txt = fecha_venc.strftime("%d/%m/%Y") if pd.notna(fecha_venc) else "-"
-        numero = item.get("numero")
-        numero_txt = str(int(numero)) if pd.notna(numero) else "-"
-        dias_txt = str(int(item.get("dias_vencido", 0) or 0))
-
-        pdf.cell(26, 8, numero_txt, 1, 0, "C", 1)
-        pdf.cell(28, 8, dias_txt, 1, 0, "C", 1)
-        pdf.cell(38, 8, fecha_doc_txt, 1, 0, "C", 1)
-        pdf.cell(38, 8, fecha_venc_txt, 1, 0, "C", 1)
-        pdf.cell(40, 8, f"${float(item.get('importe', 0) or 0):,.0f}", 1, 1, "R", 1)
-
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Helvetica", "B", 11)
-    pdf.cell(130, 9, "TOTAL CARTERA", 1, 0, "R")
-    pdf.cell(40, 9, f"${total:,.0f}", 1, 1, "R")
-
-    if saldo_vencido > 0:
-        pdf.set_fill_color(*rgb_primario)
-        pdf.set_text_color(255, 255, 255)
-        pdf.cell(130, 9, "TOTAL VENCIDO", 1, 0, "R", 1)
-        pdf.cell(40, 9, f"${saldo_vencido:,.0f}", 1, 1, "R", 1)
-
-    return bytes(pdf.output())
-
-
 def construir_texto_asunto(cliente: str, estrategia: str, saldo_vencido: float) -> str:
     if estrategia == "Seguimiento prioritario" and saldo_vencido > 0:
         return f"Revision prioritaria de cartera - {cliente}"
@@ -652,13 +488,7 @@ def construir_texto_asunto(cliente: str, estrategia: str, saldo_vencido: float)
     return f"Conciliacion de cartera Ferreinox - {cliente}"
 
 
-def construir_resumen_bloques(cliente_row: pd.Series) -> str:
-    bloques = [
-        ("Saldo total", f"${cliente_row['saldo_total']:,.0f}"),
-        ("Saldo vencido", f"${cliente_row['saldo_vencido']:,.0f}"),
-        ("Facturas", f"{int(cliente_row['facturas'])}"),
-        ("Max mora", f"{int(cliente_row['dias_max_mora'])} dias"),
-    ]
+def construir_resumen_bloques(bloques: list[tuple[str, str]]) -> str:
     html_bloques = []
     for titulo, valor in bloques:
         html_bloques.append(
@@ -674,15 +504,18 @@ def construir_resumen_bloques(cliente_row: pd.Series) -> str:
     return "".join(html_bloques)
 
 
-def plantilla_correo_conciliacion(cliente_row: pd.Series, estrategia: str) -> str:
-    cliente = html.escape(str(cliente_row["nombrecliente"]))
-    nit = html.escape(str(cliente_row.get("nit", "")))
-    codigo = str(int(cliente_row["cod_cliente"])) if pd.notna(cliente_row["cod_cliente"]) else "N/A"
-    saldo_vencido = float(cliente_row["saldo_vencido"])
-    saldo_total = float(cliente_row["saldo_total"])
-    dias_max = int(cliente_row["dias_max_mora"])
+# Cifras del correo: (titulo, campo de la plantilla)
+BLOQUES_RESUMEN = [
+    ("Saldo total", campo("saldo_total", "pesos")),
+    ("Saldo vencido", campo("saldo_vencido", "pesos")),
+    ("Facturas", campo("facturas", "entero")),
+    ("Max mora", f"{campo('dias_max', 'entero')} dias"),
+]
 
-    if estrategia == "Seguimiento prioritario" and saldo_vencido > 0:
+
+def fuente_correo_conciliacion(estrategia: str, con_vencido: bool) -> str:
+    """HTML de la estrategia con los datos del cliente como campos; se compila una sola vez"""
+    if estrategia == "Seguimiento prioritario" and con_vencido:
         titulo = "Revision prioritaria de cartera"
         subtitulo = (
             "Identificamos saldos vencidos que ameritan una validacion prioritaria para alinear cartera, despacho y continuidad operativa."
@@ -709,13 +542,13 @@ def plantilla_correo_conciliacion(cliente_row: pd.Series, estrategia: str) -> st
 
     titulo_secundario = "Mesa central de cartera Ferreinox"
     bloque_principal = (
-        f"Saldo vencido por validar: <strong>${saldo_vencido:,.0f}</strong>" if saldo_vencido > 0 else
-        f"Saldo total para control: <strong>${saldo_total:,.0f}</strong>"
+        f"Saldo vencido por validar: <strong>{campo('saldo_vencido', 'pesos')}</strong>" if con_vencido else
+        f"Saldo total para control: <strong>{campo('saldo_total', 'pesos')}</strong>"
     )
 
     tono_accion = (
         "Sugerimos validar este corte con su equipo contable y confirmar cualquier novedad de pago, compensacion o cruce en proceso."
-        if saldo_vencido > 0 else
+        if con_vencido else
         "El documento adjunto queda como soporte de control para su cierre administrativo y seguimiento interno."
     )
 
@@ -750,7 +583,7 @@ def plantilla_correo_conciliacion(cliente_row: pd.Series, estrategia: str) -> st
                     </tr>
                     <tr>
                         <td style="padding:32px 36px 10px 36px;">
-                            <div style="font-family:Quicksand,Arial,sans-serif;font-size:19px;color:{COLOR_TEXTO};font-weight:700;">Apreciado cliente, {cliente}</div>
+                            <div style="font-family:Quicksand,Arial,sans-serif;font-size:19px;color:{COLOR_TEXTO};font-weight:700;">Apreciado cliente, {campo('cliente', 'html')}</div>
                             <div style="font-family:Quicksand,Arial,sans-serif;font-size:15px;line-height:1.8;color:#4b5563;margin-top:14px;">
                                 Compartimos su estado de cuenta adjunto como soporte para la conciliacion de cartera. El objetivo es facilitar la verificacion de la informacion, validar diferencias si existen y mantener su expediente financiero al dia.
                             </div>
@@ -760,7 +593,7 @@ def plantilla_correo_conciliacion(cliente_row: pd.Series, estrategia: str) -> st
                         <td style="padding:8px 28px 0 28px;">
                             <table role="presentation" width="100%" cellspacing="0" cellpadding="0">
                                 <tr>
-                                    {construir_resumen_bloques(cliente_row)}
+                                    {construir_resumen_bloques(BLOQUES_RESUMEN)}
                                 </tr>
                             </table>
                         </td>
@@ -795,9 +628,9 @@ def plantilla_correo_conciliacion(cliente_row: pd.Series, estrategia: str) -> st
                                     <td width="48%" valign="top" style="padding-right:12px;">
                                         <table role="presentation" width="100%" cellspacing="0" cellpadding="0" style="background:#faf5ef;border:1px solid #f5dac0;border-radius:18px;">
                                             <tr><td style="padding:18px 20px 8px 20px;font-family:Quicksand,Arial,sans-serif;font-size:13px;color:#7c2d12;font-weight:700;">NIT / Documento</td></tr>
-                                            <tr><td style="padding:0 20px 18px 20px;font-family:Quicksand,Arial,sans-serif;font-size:22px;color:#111827;font-weight:700;">{nit}</td></tr>
+                                            <tr><td style="padding:0 20px 18px 20px;font-family:Quicksand,Arial,sans-serif;font-size:22px;color:#111827;font-weight:700;">{campo('nit', 'html')}</td></tr>
                                             <tr><td style="padding:0 20px 8px 20px;font-family:Quicksand,Arial,sans-serif;font-size:13px;color:#7c2d12;font-weight:700;">Codigo Cliente</td></tr>
-                                            <tr><td style="padding:0 20px 20px 20px;font-family:Quicksand,Arial,sans-serif;font-size:22px;color:#111827;font-weight:700;">{codigo}</td></tr>
+                                            <tr><td style="padding:0 20px 20px 20px;font-family:Quicksand,Arial,sans-serif;font-size:22px;color:#111827;font-weight:700;">{campo('codigo')}</td></tr>
                                         </table>
                                     </td>
                                     <td width="52%" valign="top" style="padding-left:12px;">
@@ -845,24 +678,105 @@ def plantilla_correo_conciliacion(cliente_row: pd.Series, estrategia: str) -> st
 </html>
 """
 
-
-def cuerpo_texto_plano(cliente_row: pd.Series, estrategia: str) -> str:
-    cliente = str(cliente_row["nombrecliente"])
-    saldo_total = float(cliente_row["saldo_total"])
-    saldo_vencido = float(cliente_row["saldo_vencido"])
-    dias_max = int(cliente_row["dias_max_mora"])
+def fuente_texto_plano(estrategia: str) -> str:
     return (
         f"Ferreinox S.A.S. BIC\n\n"
         f"{estrategia}\n\n"
-        f"Cliente: {cliente}\n"
-        f"Saldo total: ${saldo_total:,.0f}\n"
-        f"Saldo vencido: ${saldo_vencido:,.0f}\n"
-        f"Maximo de mora: {dias_max} dias\n"
+        f"Cliente: {campo('cliente')}\n"
+        f"Saldo total: {campo('saldo_total', 'pesos')}\n"
+        f"Saldo vencido: {campo('saldo_vencido', 'pesos')}\n"
+        f"Maximo de mora: {campo('dias_max', 'entero')} dias\n"
         f"Portal de pagos: {PORTAL_PAGOS}\n\n"
         "Adjuntamos el estado de cuenta en PDF para control y conciliacion administrativa."
     )
 
 
+def plantillas_conciliacion() -> dict:
+    """
+    HTML + texto plano por (estrategia, cliente con vencido). El texto fuente se arma en
+    cada rerun; la compilación (y sus tiempos) se reutiliza en todo el proceso.
+    """
+    return {
+        (estrategia, con_vencido): PlantillaCorreo(
+            fuente_correo_conciliacion(estrategia, con_vencido), fuente_texto_plano(estrategia)
+        )
+        for estrategia in ESTRATEGIAS_CONCILIACION for con_vencido in (False, True)
+    }
+
+
+PLANTILLAS_CONCILIACION = plantillas_conciliacion()
+
+
+def valores_correo_conciliacion(cliente_row: pd.Series) -> dict:
+    return {
+        "cliente": cliente_row["nombrecliente"],
+        "nit": cliente_row.get("nit", ""),
+        "codigo": str(int(cliente_row["cod_cliente"])) if pd.notna(cliente_row["cod_cliente"]) else "N/A",
+        "saldo_total": cliente_row["saldo_total"],
+        "saldo_vencido": cliente_row["saldo_vencido"],
+        "facturas": cliente_row["facturas"],
+        "dias_max": cliente_row["dias_max_mora"],
+    }
+
+
+def _plantilla_cliente(valores: dict, estrategia: str) -> PlantillaCorreo:
+    return PLANTILLAS_CONCILIACION[(estrategia, float(valores["saldo_vencido"]) > 0)]
+
+
+def renderizar_correo_conciliacion(cliente_row: pd.Series, estrategia: str) -> tuple[str, str]:
+    """(html, texto plano) del cliente, desde la misma plantilla compilada"""
+    valores = valores_correo_conciliacion(cliente_row)
+    return _plantilla_cliente(valores, estrategia).renderizar(valores)
+
+
+def plantilla_correo_conciliacion(cliente_row: pd.Series, estrategia: str) -> str:
+    valores = valores_correo_conciliacion(cliente_row)
+    return _plantilla_cliente(valores, estrategia).html.renderizar(valores)
+
+
+def cuerpo_texto_plano(cliente_row: pd.Series, estrategia: str) -> str:
+    valores = valores_correo_conciliacion(cliente_row)
+    return _plantilla_cliente(valores, estrategia).texto.renderizar(valores)
+
+
+def tiempos_plantillas_conciliacion() -> pd.DataFrame:
+    """Renders y milisegundos (promedio / p95 / máximo) por plantilla en este proceso"""
+    return pd.DataFrame(resumen_tiempos({
+        f"{estrategia} / {'con vencido' if con_vencido else 'sin vencido'}": plantilla
+        for (estrategia, con_vencido), plantilla in PLANTILLAS_CONCILIACION.items()
+    }))
+
+
+def payload_cliente(
+    from_email: str,
+    from_name: str,
+    to_email: str,
+    subject: str,
+    html_content: str,
+    plain_content: str,
+    attachment_bytes: bytes,
+    attachment_name: str,
+    cliente_row: pd.Series,
+) -> dict:
+    return payload_sendgrid(
+        from_email=from_email,
+        from_name=from_name,
+        to_email=to_email,
+        to_name=str(cliente_row["nombrecliente"]),
+        subject=subject,
+        html_content=html_content,
+        plain_content=plain_content,
+        attachment_bytes=attachment_bytes,
+        attachment_name=attachment_name,
+        custom_args={
+            "cliente": cliente_row["nombrecliente"],
+            "nit": cliente_row.get("nit_clean", ""),
+            "zona": cliente_row.get("zona", ""),
+        },
+        categories=["conciliacion-cartera", "ferreinox"],
+    )
+
+
 def enviar_con_sendgrid(
     api_key: str,
     from_email: str,
@@ -875,55 +789,40 @@ def enviar_con_sendgrid(
     attachment_name: str,
     cliente_row: pd.Series,
 ) -> tuple[bool, str]:
-    payload = {
-        "personalizations": [{
-            "to": [{"email": to_email, "name": str(cliente_row["nombrecliente"])}],
-            "custom_args": {
-                "cliente": str(cliente_row["nombrecliente"]),
-                "nit": str(cliente_row.get("nit_clean", "")),
-                "zona": str(cliente_row.get("zona", "")),
-            },
-        }],
-        "from": {"email": from_email, "name": from_name},
-        "subject": subject,
-        "content": [
-            {"type": "text/plain", "value": plain_content},
-            {"type": "text/html", "value": html_content},
-        ],
-        "attachments": [{
-            "content": base64.b64encode(attachment_bytes).decode("utf-8"),
-            "type": "application/pdf",
-            "filename": attachment_name,
-            "disposition": "attachment",
-        }],
-        "tracking_settings": {
-            "open_tracking": {"enable": True},
-            "click_tracking": {"enable": True, "enable_text": False},
-        },
-        "categories": ["conciliacion-cartera", "ferreinox"],
-    }
-
-    request = urllib_request.Request(
-        url="https://api.sendgrid.com/v3/mail/send",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        method="POST",
+    payload = payload_cliente(
+        from_email, from_name, to_email, subject, html_content, plain_content,
+        attachment_bytes, attachment_name, cliente_row,
     )
-
+    cliente = ClienteSendGrid(api_key)
     try:
-        with urllib_request.urlopen(request, timeout=45) as response:
-            status = response.getcode()
-            if 200 <= status < 300:
-                return True, f"HTTP {status}"
-            return False, f"HTTP {status}"
-    except urllib_error.HTTPError as exc:
-        detalle = exc.read().decode("utf-8", errors="ignore")
-        return False, f"HTTP {exc.code}: {detalle[:220]}"
-    except Exception as exc:
-        return False, str(exc)
+        ok, detalle, _ = enviar_con_reintentos(cliente, LimitadorTasa(0), payload)
+    finally:
+        cliente.cerrar()
+    return ok, detalle
+
+
+def construir_payload_campana(parametros: dict, fila: pd.Series, pdf_bytes: bytes) -> dict:
+    estrategia = parametros["estrategia"]
+    nombre_pdf = f"Estado_Cuenta_{normalizar_nombre(str(fila['nombrecliente'])).replace(' ', '_')}.pdf"
+    cuerpo_html, cuerpo_txt = renderizar_correo_conciliacion(fila, estrategia)
+    return payload_cliente(
+        from_email=parametros["from_email"],
+        from_name=parametros["from_name"],
+        to_email=str(fila["correo"]),
+        subject=construir_texto_asunto(str(fila["nombrecliente"]), estrategia, float(fila["saldo_vencido"])),
+        html_content=cuerpo_html,
+        plain_content=cuerpo_txt,
+        attachment_bytes=pdf_bytes,
+        attachment_name=nombre_pdf,
+        cliente_row=fila,
+    )
+
+
+@st.cache_resource
+def obtener_ejecutor_campanas(api_key: str) -> EjecutorCampanas:
+    # Uno por proceso del servidor: sobrevive a refrescos y sesiones, y al arrancar
+    # retoma las campanas que quedaron a medias
+    return EjecutorCampanas(api_key, construir_payload_campana).iniciar()
 
 
 def render_login():
@@ -968,10 +867,10 @@ def inicializar_estado():
         st.session_state["vendedor_autenticado"] = None
     if "seleccion_clientes_conciliacion" not in st.session_state:
         st.session_state["seleccion_clientes_conciliacion"] = []
-    if "reporte_envio_conciliacion" not in st.session_state:
-        st.session_state["reporte_envio_conciliacion"] = []
-    if "historial_envio_conciliacion" not in st.session_state:
-        st.session_state["historial_envio_conciliacion"] = cargar_historial_envios().to_dict("records")
+    if "historial_migrado" not in st.session_state:
+        # El CSV anterior pasa una sola vez al historial SQLite
+        migrar_csv(HISTORY_FILE)
+        st.session_state["historial_migrado"] = True
 
 
 def aplicar_filtros(df_resumen: pd.DataFrame) -> pd.DataFrame:
@@ -1138,7 +1037,7 @@ def render_preview_tab(df_base: pd.DataFrame, resumen: pd.DataFrame, seleccionad
     cliente_label = st.selectbox("Cliente para vista previa", opciones, key="preview_cliente_conciliacion")
     estrategia = st.selectbox(
         "Estilo del correo",
-        ["Conciliacion cordial", "Cierre operativo", "Seguimiento prioritario"],
+        ESTRATEGIAS_CONCILIACION,
         key="preview_estrategia_conciliacion",
     )
     fila = universo[universo["cliente_label"] == cliente_label].iloc[0]
@@ -1170,7 +1069,7 @@ def render_preview_tab(df_base: pd.DataFrame, resumen: pd.DataFrame, seleccionad
     )
     estrategia_prueba = st.selectbox(
         "Estilo para la prueba",
-        ["Conciliacion cordial", "Cierre operativo", "Seguimiento prioritario"],
+        ESTRATEGIAS_CONCILIACION,
         key="preview_estrategia_prueba_conciliacion",
     )
     correos_prueba = extraer_correos_prueba(correos_prueba_texto)
@@ -1197,8 +1096,7 @@ def render_preview_tab(df_base: pd.DataFrame, resumen: pd.DataFrame, seleccionad
                 progress = st.progress(0)
                 for idx, correo_destino in enumerate(correos_prueba, start=1):
                     asunto = f"[PRUEBA] {construir_texto_asunto(str(fila['nombrecliente']), estrategia_prueba, float(fila['saldo_vencido']))}"
-                    html_prueba = plantilla_correo_conciliacion(fila, estrategia_prueba)
-                    texto_prueba = cuerpo_texto_plano(fila, estrategia_prueba)
+                    html_prueba, texto_prueba = renderizar_correo_conciliacion(fila, estrategia_prueba)
                     nombre_pdf = f"PRUEBA_{normalizar_nombre(str(fila['nombrecliente'])).replace(' ', '_')}.pdf"
                     ok, detalle = enviar_con_sendgrid(
                         api_key=api_key,
@@ -1221,7 +1119,7 @@ def render_preview_tab(df_base: pd.DataFrame, resumen: pd.DataFrame, seleccionad
                         "Correo Cliente": fila["correo"],
                         "Estado Correo": fila["estado_correo"],
                         "Saldo Vencido": float(fila["saldo_vencido"]),
-                        "Resultado": "Enviado" if ok else "Error",
+                        "Resultado": resultado_envio(ok),
                         "Detalle": detalle,
                         "Vendedor": fila["nomvendedor"],
                         "Zona": fila["zona"],
@@ -1230,8 +1128,7 @@ def render_preview_tab(df_base: pd.DataFrame, resumen: pd.DataFrame, seleccionad
                     progress.progress(idx / len(correos_prueba))
 
                 df_prueba = pd.DataFrame(resultados_prueba)
-                guardar_historial_envios(df_prueba)
-                st.session_state["historial_envio_conciliacion"] = cargar_historial_envios().to_dict("records")
+                registrar_envios(df_prueba)
                 total_ok = int(df_prueba["Resultado"].eq("Enviado").sum())
                 if total_ok == len(df_prueba):
                     st.success(f"Prueba completada. {total_ok} correos enviados.")
@@ -1257,8 +1154,13 @@ def render_envio_tab(df_base: pd.DataFrame, seleccionados: pd.DataFrame):
         )
         return
 
+    if st.secrets["sendgrid"].get("api_key", ""):
+        # Arranca (o confirma vivo) el ejecutor: retoma campanas interrumpidas por un reinicio
+        obtener_ejecutor_campanas(st.secrets["sendgrid"]["api_key"])
+
     if seleccionados.empty:
         st.warning("Selecciona clientes en la pestaña de control antes de enviar.")
+        render_campanas_panel()
         return
 
     elegibles = seleccionados[seleccionados["estado_correo"].isin(["Listo", "Correo compartido"])].copy()
@@ -1278,11 +1180,25 @@ def render_envio_tab(df_base: pd.DataFrame, seleccionados: pd.DataFrame):
 
     estrategia = st.selectbox(
         "Estrategia de correo para el lote",
-        ["Conciliacion cordial", "Cierre operativo", "Seguimiento prioritario"],
+        ESTRATEGIAS_CONCILIACION,
         key="estrategia_envio_conciliacion",
     )
     incluir_compartidos = st.toggle("Permitir correos compartidos", value=False)
-    pausa_ms = st.slider("Pausa entre envios (milisegundos)", min_value=0, max_value=1500, value=150, step=50)
+    col_tasa, col_hilos = st.columns(2)
+    envios_por_segundo = col_tasa.slider(
+        "Envios por segundo",
+        min_value=1,
+        max_value=50,
+        value=min(max(int(st.secrets["sendgrid"].get("envios_por_segundo", 10)), 1), 50),
+        help="Limite sostenido segun el plan de SendGrid. Los 429 se reintentan con espera creciente.",
+    )
+    conexiones = col_hilos.slider(
+        "Conexiones simultaneas",
+        min_value=1,
+        max_value=8,
+        value=4,
+        help="Cada conexion se mantiene abierta durante todo el lote (keep-alive).",
+    )
 
     st.markdown('<div class="panel-card">', unsafe_allow_html=True)
     st.markdown('<div class="section-title">Modo prueba de lote</div>', unsafe_allow_html=True)
@@ -1315,17 +1231,17 @@ def render_envio_tab(df_base: pd.DataFrame, seleccionados: pd.DataFrame):
             st.error("La configuracion de SendGrid esta incompleta.")
         else:
             muestra = elegibles[elegibles["cliente_label"].isin(clientes_prueba_lote)].copy().head(3)
+            grupos = agrupar_por_cliente(df_base)
             resultados_prueba_lote = []
             progress = st.progress(0)
             total_iteraciones = max(len(muestra) * len(correos_prueba_lote), 1)
             avance = 0
             for _, fila in muestra.iterrows():
-                df_cliente = df_base[df_base["cliente_key"] == fila["cliente_key"]].copy()
+                df_cliente = grupos.get(fila["cliente_key"], df_base.iloc[0:0])
                 pdf_bytes = crear_pdf_cliente(df_cliente, float(fila["saldo_vencido"]))
                 nombre_pdf = f"PRUEBA_{normalizar_nombre(str(fila['nombrecliente'])).replace(' ', '_')}.pdf"
                 asunto = f"[PRUEBA] {construir_texto_asunto(str(fila['nombrecliente']), estrategia, float(fila['saldo_vencido']))}"
-                cuerpo_html = plantilla_correo_conciliacion(fila, estrategia)
-                cuerpo_txt = cuerpo_texto_plano(fila, estrategia)
+                cuerpo_html, cuerpo_txt = renderizar_correo_conciliacion(fila, estrategia)
                 for correo_destino in correos_prueba_lote:
                     ok, detalle = enviar_con_sendgrid(
                         api_key=api_key,
@@ -1348,7 +1264,7 @@ def render_envio_tab(df_base: pd.DataFrame, seleccionados: pd.DataFrame):
                         "Correo Cliente": fila["correo"],
                         "Estado Correo": fila["estado_correo"],
                         "Saldo Vencido": float(fila["saldo_vencido"]),
-                        "Resultado": "Enviado" if ok else "Error",
+                        "Resultado": resultado_envio(ok),
                         "Detalle": detalle,
                         "Vendedor": fila["nomvendedor"],
                         "Zona": fila["zona"],
@@ -1357,8 +1273,7 @@ def render_envio_tab(df_base: pd.DataFrame, seleccionados: pd.DataFrame):
                     avance += 1
                     progress.progress(avance / total_iteraciones)
             df_prueba_lote = pd.DataFrame(resultados_prueba_lote)
-            guardar_historial_envios(df_prueba_lote)
-            st.session_state["historial_envio_conciliacion"] = cargar_historial_envios().to_dict("records")
+            registrar_envios(df_prueba_lote)
             st.success("Prueba de lote finalizada. Revisa abajo el resultado y luego procede con el envio real.")
             st.dataframe(df_prueba_lote, use_container_width=True, hide_index=True)
     st.markdown('</div>', unsafe_allow_html=True)
@@ -1395,84 +1310,116 @@ def render_envio_tab(df_base: pd.DataFrame, seleccionados: pd.DataFrame):
             st.error("La configuracion de SendGrid esta incompleta.")
             return
 
-        progress = st.progress(0)
-        estado = st.empty()
-        resultados = []
-
-        for idx, (_, fila) in enumerate(elegibles.iterrows(), start=1):
-            estado.info(f"Enviando {idx} de {len(elegibles)}: {fila['nombrecliente']}")
-            df_cliente = df_base[df_base["cliente_key"] == fila["cliente_key"]].copy()
-            pdf_bytes = crear_pdf_cliente(df_cliente, float(fila["saldo_vencido"]))
-            asunto = construir_texto_asunto(str(fila["nombrecliente"]), estrategia, float(fila["saldo_vencido"]))
-            cuerpo_html = plantilla_correo_conciliacion(fila, estrategia)
-            cuerpo_txt = cuerpo_texto_plano(fila, estrategia)
-            nombre_pdf = f"Estado_Cuenta_{normalizar_nombre(str(fila['nombrecliente'])).replace(' ', '_')}.pdf"
-
-            ok, detalle = enviar_con_sendgrid(
-                api_key=api_key,
-                from_email=from_email,
-                from_name=from_name,
-                to_email=str(fila["correo"]),
-                subject=asunto,
-                html_content=cuerpo_html,
-                plain_content=cuerpo_txt,
-                attachment_bytes=pdf_bytes,
-                attachment_name=nombre_pdf,
-                cliente_row=fila,
-            )
+        parametros = {
+            "from_email": from_email,
+            "from_name": from_name,
+            "estrategia": estrategia,
+            "envios_por_segundo": envios_por_segundo,
+            "conexiones": conexiones,
+        }
+        campana_id = crear_campana(nombre_campana, parametros, elegibles, agrupar_por_cliente(df_base))
+        obtener_ejecutor_campanas(api_key).iniciar().despertar()
+        st.session_state["campana_seleccionada"] = campana_id
+        st.success(
+            f"Campana encolada con {len(elegibles)} correos. El envio sigue en segundo plano aunque cierres o refresques la pagina."
+        )
 
-            resultados.append({
-                "Fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "Campana": nombre_campana,
-                "Modo": "Produccion",
-                "Cliente": fila["nombrecliente"],
-                "Destino": fila["correo"],
-                "Correo Cliente": fila["correo"],
-                "Estado Correo": fila["estado_correo"],
-                "Saldo Vencido": float(fila["saldo_vencido"]),
-                "Resultado": "Enviado" if ok else "Error",
-                "Detalle": detalle,
-                "Vendedor": fila["nomvendedor"],
-                "Zona": fila["zona"],
-                "Estrategia": estrategia,
-            })
-            progress.progress(idx / len(elegibles))
-            if pausa_ms:
-                time.sleep(pausa_ms / 1000)
-
-        st.session_state["reporte_envio_conciliacion"] = resultados
-        guardar_historial_envios(pd.DataFrame(resultados))
-        st.session_state["historial_envio_conciliacion"] = cargar_historial_envios().to_dict("records")
-        total_ok = sum(1 for item in resultados if item["Resultado"] == "Enviado")
-        total_error = len(resultados) - total_ok
-        estado.empty()
-        if total_error == 0:
-            st.success(f"Envio finalizado. {total_ok} correos enviados correctamente.")
-        else:
-            st.warning(f"Envio finalizado. Exitosos: {total_ok}. Con error: {total_error}.")
+    render_campanas_panel()
+
+
+ESTADOS_CAMPANA_ACTIVA = ("pendiente", "en_curso")
+SEGUNDOS_REFRESCO_CAMPANA = 3
+
+
+def render_progreso_campana(campana_id: str, en_curso: bool):
+    progreso = progreso_campana(campana_id)
+    total = progreso["total"] or 1
+    terminados = sum(progreso.get(k, 0) for k in ("enviado", "error", "revisar", "cancelado"))
+    st.progress(min(terminados / total, 1.0))
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Estado", progreso["estado"])
+    c2.metric("Enviados", progreso.get("enviado", 0))
+    c3.metric("Errores", progreso.get("error", 0))
+    c4.metric("Por revisar", progreso.get("revisar", 0))
+    if progreso["ultimo_error"]:
+        st.error(f"Ultimo error del ejecutor: {progreso['ultimo_error']}")
+    if progreso.get("revisar", 0):
+        st.warning(
+            "Hay envios interrumpidos sin confirmacion. Verifica en SendGrid si llegaron antes de reintentarlos."
+        )
+    if en_curso and progreso["estado"] not in ESTADOS_CAMPANA_ACTIVA:
+        # Termino mientras se miraba: la pagina completa se actualiza y deja de sondear
+        st.rerun()
+
+
+def render_campanas_panel():
+    campanas = listar_campanas(limite=10)
+    if campanas.empty:
+        return
+    st.markdown('<div class="section-title">Campanas en segundo plano</div>', unsafe_allow_html=True)
+    st.dataframe(
+        campanas.drop(columns=["id", "ultimo_error"]).rename(columns={
+            "nombre": "Campana", "estado": "Estado", "total": "Total", "creada": "Creada",
+            "actualizada": "Actualizada", "enviados": "Enviados", "errores": "Errores",
+            "revisar": "Por revisar", "pendientes": "Pendientes",
+        }),
+        use_container_width=True,
+        hide_index=True,
+    )
 
-    resultados = pd.DataFrame(st.session_state.get("reporte_envio_conciliacion", []))
-    if not resultados.empty:
-        st.markdown('<div class="section-title">Reporte del ultimo despacho</div>', unsafe_allow_html=True)
-        st.dataframe(resultados.style.format({"Saldo Vencido": "${:,.0f}"}), use_container_width=True, hide_index=True)
+    opciones = dict(zip(campanas["id"], campanas["nombre"] + " (" + campanas["creada"] + ")"))
+    seleccion = st.session_state.get("campana_seleccionada")
+    campana_id = st.selectbox(
+        "Campana",
+        list(opciones),
+        index=list(opciones).index(seleccion) if seleccion in opciones else 0,
+        format_func=opciones.get,
+    )
+    progreso = progreso_campana(campana_id)
+    en_curso = progreso["estado"] in ESTADOS_CAMPANA_ACTIVA
+    # Mientras la campana avanza, solo este bloque se refresca solo cada pocos segundos
+    st.fragment(run_every=SEGUNDOS_REFRESCO_CAMPANA if en_curso else None)(render_progreso_campana)(campana_id, en_curso)
+
+    b1, b2 = st.columns(2)
+    if b1.button("Cancelar campana", key="campana_cancelar", disabled=not en_curso):
+        cancelar_campana(campana_id)
+        st.rerun()
+    if b2.button("Reintentar por revisar", key="campana_reintentar", disabled=not progreso.get("revisar", 0)):
+        reintentar_revisados(campana_id)
+        st.session_state["campana_seleccionada"] = campana_id
+        st.rerun()
+
+    detalle = detalle_campana(campana_id)
+    with st.expander("Tiempos de render de plantillas"):
+        st.caption("Acumulado en este servidor desde su arranque: vistas previas, pruebas y campanas.")
+        st.dataframe(
+            tiempos_plantillas_conciliacion().rename(columns={
+                "plantilla": "Plantilla", "formato": "Formato", "renders": "Renders",
+                "promedio_ms": "Promedio (ms)", "p95_ms": "P95 (ms)", "max_ms": "Maximo (ms)",
+            }).style.format({"Promedio (ms)": "{:.3f}", "P95 (ms)": "{:.3f}", "Maximo (ms)": "{:.3f}"}),
+            use_container_width=True,
+            hide_index=True,
+        )
+    with st.expander("Detalle por destinatario"):
+        st.dataframe(detalle, use_container_width=True, hide_index=True)
         st.download_button(
-            "Descargar reporte del envio",
-            data=dataframe_a_excel({"Reporte Envio": resultados}),
+            "Descargar reporte de la campana",
+            data=dataframe_a_excel({"Reporte Envio": detalle}),
             file_name=f"Reporte_Envio_Conciliacion_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            key="campana_descargar",
         )
 
 
 def render_historial_tab():
-    historial = pd.DataFrame(st.session_state.get("historial_envio_conciliacion", []))
     st.markdown('<div class="section-title">Historial de campanas y pruebas</div>', unsafe_allow_html=True)
-    if historial.empty:
+    campanas = ["TODAS"] + valores_distintos("campana")
+    if len(campanas) == 1:
         st.info("Aun no hay historial guardado en este centro de control.")
         return
-
-    campanas = ["TODAS"] + sorted(historial["Campana"].dropna().astype(str).unique().tolist())
-    modos = ["TODOS"] + sorted(historial["Modo"].dropna().astype(str).unique().tolist())
-    resultados = ["TODOS"] + sorted(historial["Resultado"].dropna().astype(str).unique().tolist())
+    modos = ["TODOS"] + valores_distintos("modo")
+    resultados = ["TODOS"] + valores_distintos("resultado")
 
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -1481,26 +1428,48 @@ def render_historial_tab():
         modo_sel = st.selectbox("Modo", modos, key="historial_modo_sel")
     with col3:
         resultado_sel = st.selectbox("Resultado", resultados, key="historial_resultado_sel")
-
-    vista = historial.copy()
-    if campana_sel != "TODAS":
-        vista = vista[vista["Campana"] == campana_sel]
-    if modo_sel != "TODOS":
-        vista = vista[vista["Modo"] == modo_sel]
-    if resultado_sel != "TODOS":
-        vista = vista[vista["Resultado"] == resultado_sel]
+    col4, col5, col6 = st.columns(3)
+    with col4:
+        cliente_txt = st.text_input("Cliente contiene", key="historial_cliente_txt")
+    with col5:
+        rango = st.date_input("Rango de fechas", value=(), key="historial_rango_fechas")
+    with col6:
+        tamano = st.selectbox("Filas por pagina", [50, 100, 250, 500], index=1, key="historial_tamano")
+
+    # Los filtros se resuelven en SQLite; a la pagina solo llega la pagina visible
+    filtros = {
+        "campana": None if campana_sel == "TODAS" else campana_sel,
+        "modo": None if modo_sel == "TODOS" else modo_sel,
+        "resultado": None if resultado_sel == "TODOS" else resultado_sel,
+        "cliente": cliente_txt.strip() or None,
+        "desde": rango[0] if len(rango) > 0 else None,
+        "hasta": rango[1] if len(rango) > 1 else None,
+    }
+    total, enviados, errores = resumen_envios(**filtros)
 
     k1, k2, k3 = st.columns(3)
-    k1.metric("Registros", len(vista))
-    k2.metric("Enviados", int(vista["Resultado"].eq("Enviado").sum()))
-    k3.metric("Errores", int(vista["Resultado"].eq("Error").sum()))
+    k1.metric("Registros", total)
+    k2.metric("Enviados", enviados)
+    k3.metric("Errores", errores)
+    if total == 0:
+        st.info("No hay registros con estos filtros.")
+        return
 
+    paginas = max(1, -(-total // tamano))
+    # La llave depende de los filtros: al cambiarlos se vuelve a la pagina 1
+    pagina = st.number_input(
+        f"Pagina (de {paginas})", min_value=1, max_value=paginas, value=1, step=1,
+        key=f"historial_pagina_{hash(tuple(filtros.items()))}_{tamano}",
+    )
+    vista = consultar_envios(pagina=pagina - 1, tamano=tamano, **filtros)
     st.dataframe(vista.style.format({"Saldo Vencido": "${:,.0f}"}), use_container_width=True, hide_index=True)
-    st.download_button(
-        "Descargar historial completo",
-        data=dataframe_a_excel({"Historial": historial, "Vista filtrada": vista}),
-        file_name=f"Historial_Conciliacion_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    # El Excel de todo el filtro solo se arma al pedirlo; el total cambia con cada envío nuevo
+    descarga_diferida(
+        "Descargar vista filtrada",
+        lambda: dataframe_a_excel({"Historial": exportar_envios(**filtros)}),
+        f"Historial_Conciliacion_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        clave="historial_envios", version=(tuple(map(str, filtros.values())), total),
     )
 
 
@@ -1563,6 +1532,8 @@ def main():
         st.error("No fue posible cargar la cartera. Revisa Dropbox y vuelve a intentar.")
         st.stop()
 
+    # El snapshot en caché se envejece a hoy: la mora no queda congelada en la hora de descarga
+    df_base = aplicar_antiguedad(df_base, date.today(), {"rango_mora": ESCALA_RANGO_MORA})
     df_base = asegurar_cliente_key(df_base)
 
     resumen = construir_resumen_clientes(df_base)
@@ -29,10 +29,14 @@ from datetime import datetime, timedelta
 import dropbox
 import glob
 import urllib.parse
-import urllib.request as urllib_request
-import json
 import zipfile
 
+from comun.calidad_contacto import calidad_contacto, telefonos_whatsapp
+from comun.despacho_sendgrid import (
+    ClienteSendGrid, LimitadorTasa, en_lotes, enviar_con_reintentos, payload_lote, payload_sendgrid
+)
+from comun.plantillas_correo import compilar
+
 # --- LIBRERÍA PARA WORD ---
 try:
     from docx import Document
@@ -913,16 +917,9 @@ def generar_link_wa_activacion(telefono, cliente, cupo_disponible) -> str:
     return f"https://wa.me/{tel}?text={urllib.parse.quote(msg)}"
 
 
-def plantilla_activacion_html(cliente, cupo_disponible, vendedor) -> str:
-    """Correo HTML institucional para campaña de activación de cupos."""
-    nombre = str(cliente).split()[0].title() if cliente and str(cliente).strip() else "Cliente"
-    try:
-        cupo = float(cupo_disponible)
-    except (TypeError, ValueError):
-        cupo = 0
-    cupo_bloque = f"${cupo:,.0f}" if cupo > 0 else "Cupo aprobado"
-    vendedor_txt = str(vendedor).title() if vendedor and str(vendedor).strip() else "tu asesor Ferreinox"
-    return f"""<!doctype html>
+# Etiquetas de sustitucion: las reemplaza SendGrid por destinatario en el envio por lotes
+# o plantilla_activacion_html en el envio individual / vista previa
+PLANTILLA_ACTIVACION_HTML = f"""<!doctype html>
 <html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1.0"></head>
 <body style="margin:0;padding:0;background-color:#FAFAFA;font-family:'Segoe UI',Arial,sans-serif;">
   <table role="presentation" width="100%" cellpadding="0" cellspacing="0" style="background-color:#FAFAFA;padding:24px 0;">
@@ -933,7 +930,7 @@ def plantilla_activacion_html(cliente, cupo_disponible, vendedor) -> str:
           <div style="color:#FFFFFF;font-size:30px;font-weight:800;margin-top:8px;line-height:1.2;">Tu cupo de crédito<br>está listo 🎉</div>
         </td></tr>
         <tr><td style="padding:34px 40px 10px 40px;">
-          <p style="font-size:17px;color:#31333F;margin:0 0 16px 0;">Hola <strong>{nombre}</strong>,</p>
+          <p style="font-size:17px;color:#31333F;margin:0 0 16px 0;">Hola <strong>-nombre-</strong>,</p>
           <p style="font-size:16px;color:#555;line-height:1.6;margin:0 0 24px 0;">
             En Ferreinox valoramos tu confianza. Por eso queremos recordarte que tienes un
             <strong>cupo de crédito aprobado</strong> y disponible para tus compras. ¡Actívalo y llévate hoy lo que necesitas, paga después!
@@ -941,7 +938,7 @@ def plantilla_activacion_html(cliente, cupo_disponible, vendedor) -> str:
           <table role="presentation" width="100%" cellpadding="0" cellspacing="0" style="margin:8px 0 26px 0;">
             <tr><td style="background:#FEF4C0;border:2px dashed #F9B016;border-radius:14px;padding:22px;text-align:center;">
               <div style="font-size:13px;color:#B21917;font-weight:700;letter-spacing:1px;">CUPO DISPONIBLE</div>
-              <div style="font-size:38px;color:#B21917;font-weight:800;margin-top:4px;">{cupo_bloque}</div>
+              <div style="font-size:38px;color:#B21917;font-weight:800;margin-top:4px;">-cupo-</div>
               <div style="font-size:13px;color:#8a6d1a;margin-top:6px;">Listo para usar en tu próxima compra</div>
             </td></tr>
           </table>
@@ -951,7 +948,7 @@ def plantilla_activacion_html(cliente, cupo_disponible, vendedor) -> str:
             <tr><td style="padding:6px 0;font-size:15px;color:#444;">🚚 &nbsp;Compra ahora y paga después, sin trámites</td></tr>
           </table>
           <div style="text-align:center;margin:30px 0 8px 0;">
-            <a href="https://wa.me/{WHATSAPP_CARTERA}?text={urllib.parse.quote('Hola Cartera Ferreinox, quiero activar mi cupo de crédito. Mi empresa es: ' + str(cliente))}"
+            <a href="https://wa.me/{WHATSAPP_CARTERA}?text=-wa_texto-"
                style="background:#388E3C;color:#FFFFFF;text-decoration:none;font-size:16px;font-weight:700;padding:15px 40px;border-radius:30px;display:inline-block;">
                💬 Activar mi cupo con Cartera
             </a>
@@ -961,46 +958,94 @@ def plantilla_activacion_html(cliente, cupo_disponible, vendedor) -> str:
           </p>
         </td></tr>
         <tr><td style="padding:18px 40px 34px 40px;border-top:1px solid #eee;text-align:center;">
-          <p style="font-size:13px;color:#999;margin:14px 0 0 0;">Te atiende: <strong>{vendedor_txt}</strong> · Cartera Ferreinox</p>
+          <p style="font-size:13px;color:#999;margin:14px 0 0 0;">Te atiende: <strong>-vendedor-</strong> · Cartera Ferreinox</p>
           <p style="font-size:12px;color:#bbb;margin:6px 0 0 0;">Ferreinox SAS BIC · Este es un mensaje comercial de tu proveedor de confianza.</p>
         </td></tr>
       </table>
     </td></tr>
   </table>
 </body></html>"""
+ASUNTO_ACTIVACION_TEXTO = "Tu cupo de crédito Ferreinox está listo para usar."
+CATEGORIAS_ACTIVACION = ["activacion-cupo", "covinoc", "ferreinox"]
+
+
+def valores_activacion(cliente, cupo_disponible, vendedor) -> dict:
+    """Valores de las etiquetas de la plantilla de activación para un cliente."""
+    nombre = str(cliente).split()[0].title() if cliente and str(cliente).strip() else "Cliente"
+    try:
+        cupo = float(cupo_disponible)
+    except (TypeError, ValueError):
+        cupo = 0
+    return {
+        "-nombre-": nombre,
+        "-cupo-": f"${cupo:,.0f}" if cupo > 0 else "Cupo aprobado",
+        "-vendedor-": str(vendedor).title() if vendedor and str(vendedor).strip() else "tu asesor Ferreinox",
+        "-wa_texto-": urllib.parse.quote('Hola Cartera Ferreinox, quiero activar mi cupo de crédito. Mi empresa es: ' + str(cliente)),
+    }
+
+
+# Misma plantilla compilada con las etiquetas -campo- como campos: un solo recorrido por render
+PATRON_ETIQUETA_ACTIVACION = re.compile(r"-(?P<campo>nombre|cupo|vendedor|wa_texto)-")
+PLANTILLA_ACTIVACION = compilar(PLANTILLA_ACTIVACION_HTML, PATRON_ETIQUETA_ACTIVACION)
+
+
+def plantilla_activacion_html(cliente, cupo_disponible, vendedor) -> str:
+    """Correo HTML institucional para campaña de activación de cupos."""
+    valores = valores_activacion(cliente, cupo_disponible, vendedor)
+    return PLANTILLA_ACTIVACION.renderizar({etiqueta.strip('-'): valor for etiqueta, valor in valores.items()})
 
 
 def enviar_correo_activacion_sendgrid(api_key, from_email, from_name, to_email,
                                       cliente_nombre, subject, html_content, plain_content):
     """Envía un correo de activación vía SendGrid (mismo motor usado en la app)."""
-    payload = {
-        "personalizations": [{"to": [{"email": to_email, "name": str(cliente_nombre)}]}],
-        "from": {"email": from_email, "name": from_name},
-        "subject": subject,
-        "content": [
-            {"type": "text/plain", "value": plain_content},
-            {"type": "text/html", "value": html_content},
-        ],
-        "tracking_settings": {
-            "open_tracking": {"enable": True},
-            "click_tracking": {"enable": True, "enable_text": False},
-        },
-        "categories": ["activacion-cupo", "covinoc", "ferreinox"],
-    }
-    request = urllib_request.Request(
-        url="https://api.sendgrid.com/v3/mail/send",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-        method="POST",
+    payload = payload_sendgrid(
+        from_email, from_name, to_email, str(cliente_nombre), subject, html_content, plain_content,
+        categories=CATEGORIAS_ACTIVACION,
     )
+    cliente = ClienteSendGrid(api_key)
     try:
-        with urllib_request.urlopen(request, timeout=45) as response:
-            status = response.getcode()
-            if 200 <= status < 300:
-                return True, f"HTTP {status}"
-            return False, f"HTTP {status}"
-    except Exception as e:
-        return False, str(e)
+        ok, detalle, _ = enviar_con_reintentos(cliente, LimitadorTasa(0), payload)
+    finally:
+        cliente.cerrar()
+    return ok, detalle
+
+
+def enviar_activacion_por_lotes(api_key, from_email, from_name, subject, df_mail, al_avanzar=None):
+    """
+    Campaña de activación en bloques de hasta 1.000 destinatarios por petición: una
+    personalization por cliente con sus sustituciones (nombre, cupo, vendedor).
+    Devuelve (enviados, errores) donde errores es una lista de dicts Cliente/Correo/Error.
+    """
+    destinatarios = [
+        {
+            "email": fila.email,
+            "name": str(fila.cliente_final),
+            "sustituciones": valores_activacion(fila.cliente_final, fila.cupo_disponible, fila.vendedor_final),
+            "custom_args": {"documento": fila.documento},
+        }
+        for fila in df_mail[['cliente_final', 'documento', 'email', 'cupo_disponible', 'vendedor_final']].itertuples(index=False)
+    ]
+    cliente = ClienteSendGrid(api_key)
+    limitador = LimitadorTasa(0)
+    enviados, errores, procesados = 0, [], 0
+    try:
+        for lote in en_lotes(destinatarios):
+            payload = payload_lote(
+                from_email, from_name, subject, PLANTILLA_ACTIVACION_HTML, ASUNTO_ACTIVACION_TEXTO,
+                lote, categories=CATEGORIAS_ACTIVACION,
+            )
+            ok, detalle, _ = enviar_con_reintentos(cliente, limitador, payload)
+            if ok:
+                enviados += len(lote)
+            else:
+                # SendGrid acepta o rechaza la petición completa: el bloque entero queda con error
+                errores.extend({'Cliente': d["name"], 'Correo': d["email"], 'Error': detalle} for d in lote)
+            procesados += len(lote)
+            if al_avanzar:
+                al_avanzar(procesados, len(destinatarios), enviados, len(errores))
+    finally:
+        cliente.cerrar()
+    return enviados, errores
 
 
 def to_excel_generico(hojas: dict) -> bytes:
@@ -2678,10 +2723,19 @@ def main():
                     df_camp['vendedor_final'] = df_camp['vendedor_final'].fillna('GESTION INTERNA')
                     df_camp['email'] = df_camp['email'].fillna('').astype(str).str.strip()
                     df_camp['telefono'] = df_camp['telefono'].fillna('').astype(str).str.strip()
-                    df_camp['email_valido'] = df_camp['email'].str.contains('@', na=False)
-                    df_camp['wa_link'] = df_camp.apply(
-                        lambda r: generar_link_wa_activacion(r['telefono'], r['cliente_final'], r['cupo_disponible']), axis=1
-                    )
+                    contacto_camp = calidad_contacto(df_camp['email'], df_camp['telefono'])
+                    df_camp['email'] = contacto_camp['email_normalizado']
+                    df_camp['email_valido'] = contacto_camp['email_valido']
+                    # El link solo se arma para las filas con celular utilizable
+                    con_celular = contacto_camp['telefono_e164'] != ''
+                    df_camp['wa_link'] = None
+                    if con_celular.any():
+                        sub = df_camp.loc[con_celular]
+                        df_camp.loc[con_celular, 'wa_link'] = [
+                            generar_link_wa_activacion(tel, cli, cupo) for tel, cli, cupo in zip(
+                                telefonos_whatsapp(contacto_camp.loc[con_celular, 'telefono_e164']),
+                                sub['cliente_final'], sub['cupo_disponible'])
+                        ]
 
                     # KPIs de la campaña
                     total_no_usan = int(df_camp['documento_norm'].nunique())
@@ -2801,31 +2855,52 @@ def main():
                                 st.info("No hay clientes con correo válido en este filtro para el envío masivo.")
                             else:
                                 confirmar = st.checkbox(f"Confirmo el envío masivo a {len(df_mail)} clientes", key="camp_confirmar")
+                                por_lotes = st.toggle(
+                                    "Envío por lotes (hasta 1.000 clientes por petición a SendGrid)", value=True, key="camp_lotes",
+                                    help="Cada cliente recibe su propio correo con su nombre, cupo y vendedor. Desactívalo para enviar uno por uno."
+                                )
                                 if st.button("🚀 Enviar campaña masiva", type="primary", use_container_width=True, disabled=not confirmar):
                                     barra = st.progress(0.0)
                                     estado_envio = st.empty()
-                                    enviados, fallidos = 0, 0
-                                    errores = []
-                                    total = len(df_mail)
-                                    for i, (_, fila) in enumerate(df_mail.iterrows()):
-                                        html_c = plantilla_activacion_html(fila['cliente_final'], fila['cupo_disponible'], fila['vendedor_final'])
-                                        ok, det = enviar_correo_activacion_sendgrid(
-                                            api_key, from_email, from_name, fila['email'],
-                                            fila['cliente_final'], asunto_mail,
-                                            html_c, "Tu cupo de crédito Ferreinox está listo para usar."
+                                    if por_lotes:
+                                        def avance_lotes(procesados, total, enviados, fallidos):
+                                            barra.progress(procesados / total)
+                                            estado_envio.caption(f"Enviando por lotes... {procesados}/{total} · ✅ {enviados} · ❌ {fallidos}")
+
+                                        enviados, errores = enviar_activacion_por_lotes(
+                                            api_key, from_email, from_name, asunto_mail, df_mail, al_avanzar=avance_lotes
                                         )
-                                        if ok:
-                                            enviados += 1
-                                        else:
-                                            fallidos += 1
-                                            errores.append({'Cliente': fila['cliente_final'], 'Correo': fila['email'], 'Error': det})
-                                        barra.progress((i + 1) / total)
-                                        estado_envio.caption(f"Enviando... {i + 1}/{total} · ✅ {enviados} · ❌ {fallidos}")
-                                    if enviados:
-                                        st.success(f"✅ Campaña finalizada: {enviados} correos enviados.")
-                                    if fallidos:
-                                        st.error(f"❌ {fallidos} correos fallaron.")
-                                        st.dataframe(pd.DataFrame(errores), use_container_width=True, hide_index=True)
+                                        if enviados:
+                                            st.success(f"✅ Campaña finalizada: {enviados} correos aceptados por SendGrid.")
+                                        if errores:
+                                            st.error(f"❌ {len(errores)} correos fallaron.")
+                                            st.dataframe(pd.DataFrame(errores), use_container_width=True, hide_index=True)
+                                    else:
+                                        enviados, fallidos = 0, 0
+                                        errores = []
+                                        total = len(df_mail)
+                                        for i, (_, fila) in enumerate(df_mail.iterrows()):
+                                            html_c = plantilla_activacion_html(fila['cliente_final'], fila['cupo_disponible'], fila['vendedor_final'])
+                                            ok, det = enviar_correo_activacion_sendgrid(
+                                                api_key, from_email, from_name, fila['email'],
+                                                fila['cliente_final'], asunto_mail,
+                                                html_c, "Tu cupo de crédito Ferreinox está listo para usar."
+                                            )
+                                            if ok:
+                                                enviados += 1
+                                            else:
+                                                fallidos += 1
+                                                errores.append({'Cliente': fila['cliente_final'], 'Correo': fila['email'], 'Error': det})
+                                            barra.progress((i + 1) / total)
+                                            estado_envio.caption(f"Enviando... {i + 1}/{total} · ✅ {enviados} · ❌ {fallidos}")
+                                        if enviados:
+                                            st.success(f"✅ Campaña finalizada: {enviados} correos enviados.")
+                                            t_render = PLANTILLA_ACTIVACION.tiempos.resumen()
+                                            st.caption(f"⏱️ Render de plantilla: {t_render['promedio_ms']:.3f} ms promedio · "
+                                                       f"p95 {t_render['p95_ms']:.3f} ms ({t_render['renders']} renders)")
+                                        if fallidos:
+                                            st.error(f"❌ {fallidos} correos fallaron.")
+                                            st.dataframe(pd.DataFrame(errores), use_container_width=True, hide_index=True)
 
                         if not df_mail.empty:
                             df_mail_dl = df_mail.rename(columns={
@@ -10,24 +10,30 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import io
-import os
 import re
 import unicodedata
-from datetime import datetime
+from datetime import date, datetime
 from urllib.parse import quote
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.table import Table, TableStyleInfo
 from openpyxl.drawing.image import Image as XLImage
 from fpdf import FPDF
-import yagmail
-import tempfile
 import glob
 from io import BytesIO, StringIO
 import dropbox # Conexión a Dropbox
 import toml # Para manejo de secretos
 
+from comun.antiguedad import ESCALA_RANGO, aplicar_antiguedad, clasificar
+from comun.cache_pdf import cachear_pdf
+from comun.calidad_contacto import calidad_contacto, telefonos_whatsapp
+from comun.exportacion_diferida import descarga_diferida, huella_datos
+from comun.indice_filtros import IndiceFiltros
+from comun.plantillas_correo import campo, compilar, resumen_tiempos
+from comun.reporte_excel import ReporteExcel
+from comun.sesion_smtp import SesionSMTP
+from comun.tabla_paginada import tabla_paginada
+
 # --- 1. CONFIGURACIÓN DE PÁGINA Y COLORES INSTITUCIONALES ---
 
 st.set_page_config(
@@ -46,6 +52,9 @@ COLOR_FONDO_CLARO = "#FEF4C0"    # Crema (Fondos suaves, Tablas)
 COLOR_BLANCO = "#FFFFFF"
 COLOR_NEGRO = "#000000"
 
+# Columnas que identifican la versión de los datos para las descargas diferidas
+COLUMNAS_VERSION = ['numero', 'importe', 'dias_vencido']
+
 # --- CSS PERSONALIZADO (Tipografía Quicksand) ---
 st.markdown(f"""
 <style>
@@ -203,13 +212,17 @@ def procesar_dataframe_robusto(df_raw):
     df = df[~df['serie'].str.contains('W|X', case=False, na=False)]
 
     # 5. Segmentación estratégica de cartera
-    bins = [-float('inf'), 0, 15, 30, 60, 90, float('inf')]
-    labels = ["🟢 Al Día", "🟡 Prev. (1-15)", "🟠 Riesgo (16-30)", "🔴 Crítico (31-60)", "🚨 Alto Riesgo (61-90)", "⚫ Legal (+90)"]
-    df['Rango'] = pd.cut(df['dias_vencido'], bins=bins, labels=labels, right=True)
+    df['Rango'] = clasificar(df['dias_vencido'], ESCALA_RANGO)
 
     # Limpieza final: Quitar saldos cero
     df = df[df['importe'] != 0].copy()
 
+    # 6. Calidad de contacto (módulo compartido, una vez por snapshot)
+    contacto = calidad_contacto(df.get('email', pd.Series('', index=df.index)),
+                                df.get('telefono1', pd.Series('', index=df.index)))
+    df['email_valido'] = contacto['email_valido']
+    df['telefono_e164'] = contacto['telefono_e164']
+
     return df
 
 @st.cache_data(ttl=600) 
@@ -296,6 +309,21 @@ def cargar_datos_automaticos_dropbox():
     except Exception as e:
         return None, f"Error al cargar datos desde Dropbox: {e}"
 
+# Una entrada por fecha consultada: max_entries acota la memoria
+@st.cache_resource(ttl=600, max_entries=4)
+def cargar_cartera_indexada(al_dia: date = None):
+    """
+    Cartera + índice de filtros (vendedor / rango / zona) construidos sobre el mismo
+    DataFrame: el índice nunca queda desfasado del snapshot que se filtra. Días vencidos
+    y Rango se recalculan a `al_dia` sobre el snapshot en caché. Objeto compartido entre
+    reruns y sesiones (sin copia): de solo lectura.
+    """
+    df, status = cargar_datos_automaticos_dropbox()
+    if df is None:
+        return None, status, None
+    df = aplicar_antiguedad(df, al_dia, {'Rango': ESCALA_RANGO})
+    return df, status, IndiceFiltros(df, ['nomvendedor', 'nomvendedor_norm', 'Rango', 'zona'])
+
 # ======================================================================================
 # 3. INTELIGENCIA DE NEGOCIO (ESTRATEGIA Y FUNCIONES)
 # ======================================================================================
@@ -426,7 +454,7 @@ class PDF(FPDF):
         self.set_text_color(0, 0, 0)
         self.cell(0, 10, 'ESTADO DE CUENTA', 0, 1, 'R')
         self.set_font('Helvetica', 'I', 9)
-        self.cell(0, 10, f'Generado el: {datetime.now().strftime("%Y-%m-%d %H:%M")}', 0, 1, 'R')
+        self.cell(0, 10, f'Generado el: {datetime.now().strftime("%Y-%m-%d")}', 0, 1, 'R')
         self.ln(5)
 
     def footer(self):
@@ -443,6 +471,9 @@ class PDF(FPDF):
         self.set_text_color(128, 128, 128)
         self.cell(0, 5, f'Página {self.page_no()}', 0, 0, 'C')
 
+VERSION_PDF_PERFIL = 2
+
+@cachear_pdf("perfil_estado_cuenta", VERSION_PDF_PERFIL)
 def crear_pdf(df_cliente, total_vencido_cliente):
     """Genera el PDF de estado de cuenta detallado."""
     pdf = PDF()
@@ -522,181 +553,89 @@ def crear_excel_gerencial(df, total, vencido, pct_mora, clientes_mora, csi, anti
     """
     Genera el reporte ejecutivo en Excel (PARA EL TAB 3).
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Resumen Gerencial"
+    reporte = ReporteExcel("Resumen Gerencial")
     
-    # Preparar colores (QUITAR EL #)
-    c_primario = COLOR_PRIMARIO.replace("#", "")
-    c_secundario = COLOR_SECUNDARIO.replace("#", "")
-    c_fondo_claro = COLOR_FONDO_CLARO.replace("#", "")
-    c_blanco = "FFFFFF"
-    
-    # Fuentes Quicksand en Excel
-    font_main = Font(name='Quicksand', size=11)
-    font_header = Font(name='Quicksand', size=11, bold=True, color=c_blanco)
-    font_title = Font(name='Quicksand', size=16, bold=True, color=c_primario)
-    font_kpi_val = Font(name='Quicksand', size=12, bold=True, color=c_primario)
-    
-    fill_blue = PatternFill("solid", fgColor=c_primario)
-    fill_kpi = PatternFill("solid", fgColor=c_fondo_claro)
-    
-    ws['A1'] = "REPORTE GERENCIAL DE CARTERA - FERREINOX"
-    ws['A1'].font = font_title
+    cols = ['nombrecliente', 'nit', 'numero', 'nomvendedor', 'cod_cliente', 'Rango', 'zona', 'dias_vencido', 'importe', 'telefono1', 'email']
+    df_detalle = df[cols].sort_values(by='dias_vencido', ascending=False).reset_index(drop=True)
+
+    # Fuentes Quicksand en Excel (por columna: cubren todas las celdas de datos)
+    font_main = reporte.formato(font_name='Quicksand', font_size=11)
+    font_header = reporte.formato(font_name='Quicksand', font_size=11, bold=True, font_color=COLOR_BLANCO, bg_color=COLOR_PRIMARIO)
+    font_title = reporte.formato(font_name='Quicksand', font_size=16, bold=True, font_color=COLOR_PRIMARIO)
+    formatos_columna = {i: font_main for i in range(len(cols))}
+    formatos_columna[8] = reporte.formato(font_name='Quicksand', font_size=11, num_format='$#,##0')
+    reporte.columnas([35] + [22] * (len(cols) - 1), formatos_columna)
+
+    reporte.celda(0, 0, "REPORTE GERENCIAL DE CARTERA - FERREINOX", font_title)
     
     # KPIs
     kpi_labels = ["Total Cartera", "Total Vencido", "% Mora", "Clientes en Mora", "Antigüedad Prom.", "CSI"]
     kpi_values = [total, vencido, pct_mora / 100, clientes_mora, antiguedad_prom_vencida, csi]
     formats = ['$#,##0', '$#,##0', '0.0%', '0', '0.0', '0.0']
     
-    for i, (lab, val, fmt) in enumerate(zip(kpi_labels, kpi_values, formats)):
-        col_letter = get_column_letter(i+1)
-        c_lab = ws.cell(row=3, column=i+1, value=lab)
-        c_lab.font = font_header; c_lab.fill = fill_blue; c_lab.alignment = Alignment(horizontal='center')
-        ws.column_dimensions[col_letter].width = 20
-        
-        c_val = ws.cell(row=4, column=i+1, value=val)
-        c_val.number_format = fmt
-        c_val.font = font_kpi_val; c_val.fill = fill_kpi; c_val.alignment = Alignment(horizontal='center')
+    reporte.fila(2, kpi_labels, reporte.formato(font_name='Quicksand', font_size=11, bold=True, font_color=COLOR_BLANCO, bg_color=COLOR_PRIMARIO, align='center'))
+    for i, (val, fmt) in enumerate(zip(kpi_values, formats)):
+        reporte.celda(3, i, val, reporte.formato(
+            font_name='Quicksand', font_size=12, bold=True, font_color=COLOR_PRIMARIO,
+            bg_color=COLOR_FONDO_CLARO, align='center', num_format=fmt,
+        ))
 
     # Tabla Detalle
-    ws['A6'] = "DETALLE COMPLETO (Filtrable)"
-    ws['A6'].font = Font(name='Quicksand', size=12, bold=True, color=c_secundario)
-    
-    cols = ['nombrecliente', 'nit', 'numero', 'nomvendedor', 'cod_cliente', 'Rango', 'zona', 'dias_vencido', 'importe', 'telefono1', 'email']
-    df_detalle = df[cols].sort_values(by='dias_vencido', ascending=False).reset_index(drop=True)
-
-    # Headers
-    for col_num, col_name in enumerate(cols, 1):
-        c = ws.cell(row=7, column=col_num, value=col_name.upper().replace('_', ' '))
-        c.fill = fill_blue
-        c.font = font_header
-        
-    # Data
-    for row_num, row_data in enumerate(df_detalle.values, 8):
-        for col_num, val in enumerate(row_data, 1):
-            c = ws.cell(row=row_num, column=col_num, value=val)
-            c.font = font_main
-            if col_num == 9: c.number_format = '$#,##0'
+    reporte.celda(5, 0, "DETALLE COMPLETO (Filtrable)", reporte.formato(font_name='Quicksand', font_size=12, bold=True, font_color=COLOR_SECUNDARIO))
+    reporte.fila(6, [col_name.upper().replace('_', ' ') for col_name in cols], font_header)
+    ultima = reporte.datos(df_detalle, 7)
             
     # Filtros
-    ws.auto_filter.ref = f"A7:{get_column_letter(len(cols))}{len(df_detalle)+7}"
-    for i in range(1, len(cols) + 1):
-        ws.column_dimensions[get_column_letter(i)].width = 22 if i != 1 else 35
-        
-    output = io.BytesIO()
-    wb.save(output)
-    return output.getvalue()
+    reporte.hoja.autofilter(6, 0, max(ultima, 6), len(cols) - 1)
+    return reporte.cerrar()
 
 def crear_excel_cobranza_vencida(df):
     """
     Genera un Excel conciso y gerencial solo con la cartera vencida para gestión.
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Gestión Mora"
-    
-    # 1. Preparar Colores (Sin # para OpenPyXL)
-    c_primario = COLOR_PRIMARIO.replace("#", "")       # Rojo
-    c_fondo_suave = COLOR_FONDO_CLARO.replace("#", "") # Crema
-    c_blanco = "FFFFFF"
-    
-    # 2. Definir Estilos
-    font_titulo = Font(name='Quicksand', size=14, bold=True, color=c_primario)
-    font_header = Font(name='Quicksand', size=11, bold=True, color=c_blanco)
-    font_body = Font(name='Quicksand', size=10, color="000000")
-    font_body_bold = Font(name='Quicksand', size=10, bold=True, color="000000")
+    reporte = ReporteExcel("Gestión Mora")
     
-    fill_header = PatternFill("solid", fgColor=c_primario)
-    fill_zebra = PatternFill("solid", fgColor=c_fondo_suave)
-    
-    border_thin = Border(left=Side(style='thin', color="DDDDDD"), 
-                           right=Side(style='thin', color="DDDDDD"), 
-                           top=Side(style='thin', color="DDDDDD"), 
-                           bottom=Side(style='thin', color="DDDDDD"))
-
-    # 3. Filtrar Data (Solo Vencidos)
-    df_vencidos = df[df['dias_vencido'] > 0].copy()
+    # 1. Filtrar Data (Solo Vencidos)
+    df_vencidos = df[df['dias_vencido'] > 0]
     
     # Seleccionar columnas clave y ordenar
     cols_export = ['nombrecliente', 'nit', 'telefono1', 'numero', 'fecha_vencimiento', 'dias_vencido', 'importe']
     df_export = df_vencidos[cols_export].sort_values(by=['nombrecliente', 'dias_vencido'], ascending=[True, False])
+    df_export['telefono1'] = df_export['telefono1'].astype(str)
     
     # Renombrar para encabezados bonitos
     headers = ["CLIENTE", "NIT", "CONTACTO", "FACTURA #", "VENCIMIENTO", "DÍAS MORA", "SALDO PENDIENTE"]
     
-    # 4. Construcción del Excel
+    # 2. Estilos por columna (borde suave en todas las celdas de la tabla)
+    borde = {'font_name': 'Quicksand', 'border': 1, 'border_color': '#DDDDDD'}
+    font_body = reporte.formato(font_size=10, **borde)
+    font_body_bold = reporte.formato(font_size=10, bold=True, **borde)
+    reporte.columnas([40, 15, 15, 12, 15, 12, 20], {
+        0: font_body_bold,                                           # Cliente (Negrita)
+        1: font_body, 2: font_body, 3: font_body,
+        4: reporte.formato(font_size=10, num_format='DD/MM/YYYY', **borde),  # Fecha
+        5: reporte.formato(font_size=10, align='center', **borde),          # Días Mora (Centrar)
+        6: reporte.formato(font_size=10, bold=True, num_format='$ #,##0', **borde),  # Importe: destacar la deuda
+    })
+    
+    # 3. Construcción del Excel
     
     # Título del Reporte
-    ws['A1'] = "REPORTE DE COBRANZA - CLIENTES EN MORA"
-    ws['A1'].font = font_titulo
-    ws['A2'] = f"Generado el: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-    ws['A2'].font = Font(name='Quicksand', size=9, italic=True)
+    reporte.celda(0, 0, "REPORTE DE COBRANZA - CLIENTES EN MORA", reporte.formato(font_name='Quicksand', font_size=14, bold=True, font_color=COLOR_PRIMARIO))
+    reporte.celda(1, 0, f"Generado el: {datetime.now().strftime('%Y-%m-%d %H:%M')}", reporte.formato(font_name='Quicksand', font_size=9, italic=True))
     
     # Encabezados de Tabla (Fila 4)
-    start_row = 4
-    for col_idx, header in enumerate(headers, 1):
-        cell = ws.cell(row=start_row, column=col_idx, value=header)
-        cell.font = font_header
-        cell.fill = fill_header
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = border_thin
+    start_row = 3
+    reporte.fila(start_row, headers, reporte.formato(
+        font_size=11, bold=True, font_color=COLOR_BLANCO, bg_color=COLOR_PRIMARIO, align='center', valign='vcenter', **borde
+    ))
 
     # Datos
-    current_row = start_row + 1
-    current_client = ""
-    
-    for _, row in df_export.iterrows():
-        # Extracción de valores
-        vals = [
-            row['nombrecliente'],
-            row['nit'],
-            str(row['telefono1']),
-            row['numero'],
-            row['fecha_vencimiento'],
-            row['dias_vencido'],
-            row['importe']
-        ]
-        
-        # Estilo de fila
-        is_new_client = (vals[0] != current_client)
-        current_client = vals[0]
-        
-        for col_idx, value in enumerate(vals, 1):
-            cell = ws.cell(row=current_row, column=col_idx, value=value)
-            cell.font = font_body
-            cell.border = border_thin
-            
-            # Formateos específicos
-            if col_idx == 1: # Cliente (Negrita)
-                cell.font = font_body_bold
-            
-            if col_idx == 5 and isinstance(value, datetime): # Fecha
-                 cell.number_format = 'DD/MM/YYYY'
-            
-            if col_idx == 7: # Importe
-                cell.number_format = '$ #,##0'
-                cell.font = font_body_bold # Destacar la deuda
-            
-            if col_idx == 6: # Días Mora (Centrar)
-                cell.alignment = Alignment(horizontal='center')
-
-            if row['dias_vencido'] > 60:
-                 pass
-
-        current_row += 1
-
-    # Ajuste de Ancho de Columnas
-    widths = [40, 15, 15, 12, 15, 12, 20]
-    for i, w in enumerate(widths, 1):
-        ws.column_dimensions[get_column_letter(i)].width = w
+    ultima = reporte.datos(df_export, start_row + 1)
 
     # Filtros Automáticos
-    ws.auto_filter.ref = f"A{start_row}:{get_column_letter(len(headers))}{current_row-1}"
-    
-    output = io.BytesIO()
-    wb.save(output)
-    return output.getvalue()
+    reporte.hoja.autofilter(start_row, 0, max(ultima, start_row), len(headers) - 1)
+    return reporte.cerrar()
 
 
 # ======================================================================================
@@ -857,9 +796,13 @@ def crear_excel_empleados_detallado(df):
 # ======================================================================================
 # 5. CORREOS Y PLANTILLAS
 # ======================================================================================
-def enviar_correo(destinatario, asunto, cuerpo_html, pdf_bytes):
-    """Envía correo usando yagmail."""
-    tmp_path = ''
+@st.cache_resource
+def obtener_sesion_smtp(email_user, email_pass):
+    """Sesión SMTP compartida: un login reutilizado entre envíos y reconexión automática."""
+    return SesionSMTP(email_user, email_pass)
+
+def enviar_correo(destinatario, asunto, cuerpo_html, pdf_bytes, nombre_pdf="Estado_Cuenta.pdf", mostrar_spinner=True):
+    """Envía correo con el PDF adjunto desde memoria usando la sesión SMTP compartida."""
     try:
         email_user = st.secrets["email_credentials"]["sender_email"]
         email_pass = st.secrets["email_credentials"]["sender_password"]
@@ -871,26 +814,21 @@ def enviar_correo(destinatario, asunto, cuerpo_html, pdf_bytes):
         st.error("⚠️ Correo inválido.")
         return False
 
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(pdf_bytes)
-            tmp_path = tmp.name
-
+    sesion = obtener_sesion_smtp(email_user, email_pass)
+    adjuntos = [(nombre_pdf, pdf_bytes, "application/pdf")]
+    if mostrar_spinner:
         with st.spinner(f"Enviando a {destinatario}..."):
-            yag = yagmail.SMTP(email_user, email_pass)
-            yag.send(to=destinatario, subject=asunto, contents=[cuerpo_html, tmp_path])
-        
-        os.remove(tmp_path)
-        return True
-    except Exception as e:
-        st.error(f"Error enviando correo: {e}")
-        if os.path.exists(tmp_path): os.remove(tmp_path)
-        return False
+            ok, detalle = sesion.enviar(destinatario, asunto, cuerpo_html, adjuntos)
+    else:
+        ok, detalle = sesion.enviar(destinatario, asunto, cuerpo_html, adjuntos)
+    if not ok:
+        st.error(f"Error enviando correo a {destinatario}: {detalle}")
+    return ok
         
 # --- PLANTILLAS HTML ESTILO QUICKSAND ---
 
-def plantilla_correo_vencido(cliente, saldo, dias, nit, cod_cliente, portal_link):
-    dias_max_vencido = int(dias)
+# Se arman con campos y se compilan una vez por proceso: cada correo solo une tramos
+def fuente_correo_vencido():
     return f"""
     <!doctype html>
     <html>
@@ -907,22 +845,22 @@ def plantilla_correo_vencido(cliente, saldo, dias, nit, cod_cliente, portal_link
     </head>
     <body>
         <div class="card">
-            <h1>Hola, {cliente}</h1>
+            <h1>Hola, {campo('cliente')}</h1>
             <p>Te contactamos de <strong>Ferreinox SAS BIC</strong>. Hemos identificado un saldo pendiente en tu cuenta.</p>
             
             <div class="alert-box">
-                Saldo Vencido: ${saldo:,.0f}<br>
-                <span style="font-size:0.8em">Mora Máxima: {dias_max_vencido} días</span>
+                Saldo Vencido: {campo('saldo', 'pesos')}<br>
+                <span style="font-size:0.8em">Mora Máxima: {campo('dias', 'entero')} días</span>
             </div>
             
             <p>Evita inconvenientes en tus despachos gestionando tu pago hoy.</p>
             
             <center>
-                <a href="{portal_link}" class="btn">🚀 Pagar en Línea Ahora</a>
+                <a href="{campo('portal_link')}" class="btn">🚀 Pagar en Línea Ahora</a>
             </center>
             
             <br>
-            <p class="small">NIT: {nit} | Código: {cod_cliente}</p>
+            <p class="small">NIT: {campo('nit')} | Código: {campo('cod_cliente')}</p>
             <hr style="border:0; border-top:1px solid #eee;">
             <p class="small">Si ya pagaste, por favor omite este mensaje.</p>
         </div>
@@ -930,7 +868,7 @@ def plantilla_correo_vencido(cliente, saldo, dias, nit, cod_cliente, portal_link
     </html>
     """
 
-def plantilla_correo_al_dia(cliente, saldo_total):
+def fuente_correo_al_dia():
     return f"""
     <!doctype html>
     <html>
@@ -945,14 +883,14 @@ def plantilla_correo_al_dia(cliente, saldo_total):
     </head>
     <body>
         <div class="card">
-            <h1>¡Gracias, {cliente}!</h1>
+            <h1>¡Gracias, {campo('cliente')}!</h1>
             <p>En <strong>Ferreinox SAS BIC</strong> valoramos tu cumplimiento.</p>
             
             <div class="info-box">
                 🌟 ¡Tu cuenta está al día!
             </div>
             
-            <p>Saldo corriente actual: <strong>${saldo_total:,.0f}</strong></p>
+            <p>Saldo corriente actual: <strong>{campo('saldo_total', 'pesos')}</strong></p>
             <p>Adjuntamos tu estado de cuenta actualizado para tu control administrativo.</p>
             
             <br>
@@ -962,10 +900,125 @@ def plantilla_correo_al_dia(cliente, saldo_total):
     </html>
     """
 
+PLANTILLA_CORREO_VENCIDO = compilar(fuente_correo_vencido())
+PLANTILLA_CORREO_AL_DIA = compilar(fuente_correo_al_dia())
+
+def plantilla_correo_vencido(cliente, saldo, dias, nit, cod_cliente, portal_link):
+    return PLANTILLA_CORREO_VENCIDO.renderizar({
+        'cliente': cliente, 'saldo': saldo, 'dias': dias, 'nit': nit,
+        'cod_cliente': cod_cliente, 'portal_link': portal_link,
+    })
+
+def plantilla_correo_al_dia(cliente, saldo_total):
+    return PLANTILLA_CORREO_AL_DIA.renderizar({'cliente': cliente, 'saldo_total': saldo_total})
+
 # ======================================================================================
 # 6. DASHBOARD PRINCIPAL (MAIN)
 # ======================================================================================
 
+@st.fragment
+def seccion_gestion_1a1(df_view, grp):
+    """Gestión de un cliente y envío en lote (fragmento: elegir cliente no recalcula KPIs ni gráficos)"""
+    sel_cli = st.selectbox("Seleccionar Cliente (Ordenado por Vencido)", [""] + grp['nombrecliente'].tolist())
+
+    if sel_cli:
+        dat = grp[grp['nombrecliente'] == sel_cli].iloc[0]
+        dets = df_view[df_view['nombrecliente'] == sel_cli].sort_values('dias_vencido', ascending=False)
+
+        colA, colB = st.columns([1, 2])
+
+        with colA:
+            st.markdown(f"#### {sel_cli}")
+            st.info(f"Total: ${dat['saldo']:,.0f}")
+
+            if dat['vencido'] > 0:
+                st.markdown(f"<div style='background:{COLOR_FONDO_CLARO}; padding:10px; border-radius:5px; color:{COLOR_PRIMARIO}; font-weight:bold'>Vencido: ${dat['vencido']:,.0f}</div>", unsafe_allow_html=True)
+                st.error(f"Máx Mora: {int(dat['dias_max'])} días")
+            else:
+                st.success("✅ Al Día")
+
+            pdf_bytes = crear_pdf(dets, dat['vencido'])
+            st.download_button("📄 PDF Estado Cuenta", pdf_bytes, f"EC_{sel_cli}.pdf", "application/pdf")
+
+            st.divider()
+            st.markdown("#### 💬 WhatsApp Directo")
+            st.caption("Verifica el número antes de enviar:")
+
+            # --- LÓGICA DE WA EDITABLE ---
+            raw_tel = telefonos_whatsapp(pd.Series([dat['tel_e164']])).iloc[0] # E.164 sin '+'
+            if not raw_tel:
+                raw_tel = re.sub(r'\D', '', str(dat['tel']) if pd.notna(dat['tel']) else "")
+
+            telefono_destino = st.text_input("📱 Celular (Editable):", value=raw_tel, max_chars=15, help="Puedes escribir cualquier número aquí.")
+
+            if telefono_destino:
+                wa_link = generar_link_wa(telefono_destino, sel_cli, dat['vencido'], dat['dias_max'], dat['nit'], dat['cod'])
+
+                if wa_link:
+                    st.markdown(f"""
+                        <a href='{wa_link}' target='_blank' class='wa-link'>
+                        🚀 Enviar Mensaje a {telefono_destino}
+                        </a>
+                    """, unsafe_allow_html=True)
+                else:
+                    st.warning("⚠️ El número ingresado no parece válido (muy corto).")
+            else:
+                st.info("ℹ️ Ingresa un número de celular para generar el enlace.")
+
+        with colB:
+            st.dataframe(dets[['numero', 'dias_vencido', 'fecha_vencimiento', 'importe', 'Rango']].style.format({'importe':'${:,.0f}'}), hide_index=True)
+
+            st.write("#### 📧 Enviar Correo")
+            with st.form("frm_mail"):
+                dest = st.text_input("Email", value=dat['email'])
+                sub_btn = st.form_submit_button("Enviar PDF")
+
+                if sub_btn:
+                    subj = f"Estado de Cuenta - {sel_cli}"
+                    if dat['vencido'] > 0:
+                        body = plantilla_correo_vencido(sel_cli, dat['vencido'], dat['dias_max'], dat['nit'], dat['cod'], "https://ferreinoxtiendapintuco.epayco.me/")
+                    else:
+                        body = plantilla_correo_al_dia(sel_cli, dat['saldo'])
+
+                    if enviar_correo(dest, subj, body, pdf_bytes, f"EC_{sel_cli}.pdf"):
+                        st.success("✅ Enviado correctamente")
+
+    # ---- ENVÍO A TODOS LOS CLIENTES FILTRADOS (misma sesión SMTP) ----
+    with st.expander(f"📨 Enviar estado de cuenta a todos los clientes filtrados ({len(grp)})"):
+        solo_vencidos = st.checkbox("Solo clientes con saldo vencido", value=True, key="lote_solo_vencidos")
+        lote = grp[grp['vencido'] > 0] if solo_vencidos else grp
+        lote = lote[lote['email_valido']]
+        st.caption(f"{len(lote)} clientes con correo válido recibirán su PDF. Se usa una sola sesión SMTP para todo el lote.")
+        confirmar_lote = st.checkbox(f"Confirmo el envío a {len(lote)} clientes", key="lote_confirmar")
+        if st.button("📨 Enviar a todos", disabled=not confirmar_lote or lote.empty, key="lote_enviar"):
+            barra = st.progress(0.0)
+            estado_lote = st.empty()
+            detalles_por_cliente = {nombre: g for nombre, g in df_view.groupby('nombrecliente', sort=False)}
+            resultados_lote = []
+            for i, fila in enumerate(lote.itertuples(index=False), start=1):
+                dets_cli = detalles_por_cliente[fila.nombrecliente].sort_values('dias_vencido', ascending=False)
+                pdf_cli = crear_pdf(dets_cli, fila.vencido)
+                if fila.vencido > 0:
+                    body = plantilla_correo_vencido(fila.nombrecliente, fila.vencido, fila.dias_max, fila.nit, fila.cod, "https://ferreinoxtiendapintuco.epayco.me/")
+                else:
+                    body = plantilla_correo_al_dia(fila.nombrecliente, fila.saldo)
+                ok = enviar_correo(str(fila.email).strip(), f"Estado de Cuenta - {fila.nombrecliente}", body,
+                                   pdf_cli, f"EC_{fila.nombrecliente}.pdf", mostrar_spinner=False)
+                resultados_lote.append({'Cliente': fila.nombrecliente, 'Email': fila.email, 'Vencido': fila.vencido,
+                                        'Resultado': '✅ Enviado' if ok else '❌ Error'})
+                barra.progress(i / len(lote))
+                estado_lote.caption(f"Enviando {i}/{len(lote)}: {fila.nombrecliente}")
+            estado_lote.empty()
+            df_lote = pd.DataFrame(resultados_lote)
+            enviados_lote = int((df_lote['Resultado'] == '✅ Enviado').sum())
+            st.success(f"✅ {enviados_lote} de {len(df_lote)} correos enviados.")
+            st.dataframe(df_lote.style.format({'Vencido': '${:,.0f}'}), hide_index=True, use_container_width=True)
+            tiempos = pd.DataFrame(resumen_tiempos({'Vencido': PLANTILLA_CORREO_VENCIDO, 'Al día': PLANTILLA_CORREO_AL_DIA}))
+            st.caption("⏱️ Render de plantillas: " + " · ".join(
+                f"{t.plantilla} {t.promedio_ms:.3f} ms prom. ({t.renders} renders)" for t in tiempos.itertuples()
+            ))
+
+
 def main():
     # --- AUTENTICACIÓN ---
     if 'authentication_status' not in st.session_state:
@@ -1016,10 +1069,13 @@ def main():
         st.divider()
         if st.button("🔄 Recargar Dropbox", type="primary"):
             st.cache_data.clear()
+            cargar_cartera_indexada.clear()
             st.rerun()
 
     # --- CARGA DATOS ---
-    df, status = cargar_datos_automaticos_dropbox()
+    al_dia = st.sidebar.date_input("📅 Ver cartera al", value=date.today(), format="DD/MM/YYYY",
+                                   help="Días vencidos y rangos calculados a esta fecha desde el vencimiento de cada factura.")
+    df, status, indice = cargar_cartera_indexada(al_dia)
     st.sidebar.caption(status)
     if df is None: st.stop()
 
@@ -1028,22 +1084,22 @@ def main():
     
     # Filtro Vendedor
     if st.session_state['acceso_general']:
-        opts = ["TODOS"] + sorted(df['nomvendedor'].unique().tolist())
+        opts = ["TODOS"] + indice.opciones('nomvendedor')
         sel_vend = st.sidebar.selectbox("Vendedor:", opts)
-        df_view = df if sel_vend == "TODOS" else df[df['nomvendedor_norm'] == normalizar_nombre(sel_vend)]
+        vend_norm = None if sel_vend == "TODOS" else normalizar_nombre(sel_vend)
     else:
-        df_view = df[df['nomvendedor_norm'] == normalizar_nombre(st.session_state['vendedor_autenticado'])]
+        vend_norm = normalizar_nombre(st.session_state['vendedor_autenticado'])
         st.sidebar.info("Vista Vendedor")
 
     # Filtro Rango
     rangos = ["TODOS"] + df['Rango'].cat.categories.tolist()
     sel_rango = st.sidebar.selectbox("Antigüedad:", rangos)
-    if sel_rango != "TODOS": df_view = df_view[df_view['Rango'] == sel_rango]
+    filas = indice.posiciones(nomvendedor_norm=vend_norm, Rango=None if sel_rango == "TODOS" else sel_rango)
 
-    # Filtro Zona
-    zonas = ["TODAS"] + sorted(df_view['zona'].unique().tolist())
+    # Filtro Zona (solo las zonas presentes tras vendedor y rango)
+    zonas = ["TODAS"] + indice.opciones('zona', filas)
     sel_zona = st.sidebar.selectbox("Zona:", zonas)
-    if sel_zona != "TODAS": df_view = df_view[df_view['zona'] == sel_zona]
+    df_view = indice.filtrar(df, filas, zona=None if sel_zona == "TODAS" else sel_zona)
 
     if df_view.empty:
         st.warning("Sin datos para los filtros seleccionados.")
@@ -1078,13 +1134,11 @@ def main():
         with col_header_1:
             st.subheader("🎯 Gestión de Cobro Directo")
         with col_header_2:
-            excel_mora_bytes = crear_excel_cobranza_vencida(df_view)
-            st.download_button(
-                label="💾 Descargar Listado Mora (Excel)",
-                data=excel_mora_bytes,
-                file_name=f"Gestion_Mora_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                key="btn_descarga_mora"
+            descarga_diferida(
+                "💾 Descargar Listado Mora (Excel)", lambda: crear_excel_cobranza_vencida(df_view),
+                f"Gestion_Mora_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                clave="btn_descarga_mora", version=huella_datos(df_view, COLUMNAS_VERSION),
             )
         # --------------------------------------------------
 
@@ -1100,73 +1154,14 @@ def main():
                 vencido=('importe_vencido', 'sum'),
                 dias_max=('dias_vencido', 'max'),
                 tel=('telefono1', 'first'),
+                tel_e164=('telefono_e164', 'first'),
                 email=('email', 'first'),
+                email_valido=('email_valido', 'first'),
                 nit=('nit', 'first'),
                 cod=('cod_cliente', 'first')
             ).sort_values('vencido', ascending=False).reset_index()
             
-            sel_cli = st.selectbox("Seleccionar Cliente (Ordenado por Vencido)", [""] + grp['nombrecliente'].tolist())
-            
-            if sel_cli:
-                dat = grp[grp['nombrecliente'] == sel_cli].iloc[0]
-                dets = df_view[df_view['nombrecliente'] == sel_cli].sort_values('dias_vencido', ascending=False)
-                
-                colA, colB = st.columns([1, 2])
-                
-                with colA:
-                    st.markdown(f"#### {sel_cli}")
-                    st.info(f"Total: ${dat['saldo']:,.0f}")
-                    
-                    if dat['vencido'] > 0:
-                        st.markdown(f"<div style='background:{COLOR_FONDO_CLARO}; padding:10px; border-radius:5px; color:{COLOR_PRIMARIO}; font-weight:bold'>Vencido: ${dat['vencido']:,.0f}</div>", unsafe_allow_html=True)
-                        st.error(f"Máx Mora: {int(dat['dias_max'])} días")
-                    else:
-                        st.success("✅ Al Día")
-                        
-                    pdf_bytes = crear_pdf(dets, dat['vencido'])
-                    st.download_button("📄 PDF Estado Cuenta", pdf_bytes, f"EC_{sel_cli}.pdf", "application/pdf")
-                    
-                    st.divider()
-                    st.markdown("#### 💬 WhatsApp Directo")
-                    st.caption("Verifica el número antes de enviar:")
-                    
-                    # --- LÓGICA DE WA EDITABLE ---
-                    raw_tel = str(dat['tel']) if pd.notna(dat['tel']) else ""
-                    raw_tel = re.sub(r'\D', '', raw_tel) # Solo dejar dígitos
-                    
-                    telefono_destino = st.text_input("📱 Celular (Editable):", value=raw_tel, max_chars=15, help="Puedes escribir cualquier número aquí.")
-                    
-                    if telefono_destino:
-                        wa_link = generar_link_wa(telefono_destino, sel_cli, dat['vencido'], dat['dias_max'], dat['nit'], dat['cod'])
-                        
-                        if wa_link:
-                            st.markdown(f"""
-                                <a href='{wa_link}' target='_blank' class='wa-link'>
-                                🚀 Enviar Mensaje a {telefono_destino}
-                                </a>
-                            """, unsafe_allow_html=True)
-                        else:
-                            st.warning("⚠️ El número ingresado no parece válido (muy corto).")
-                    else:
-                        st.info("ℹ️ Ingresa un número de celular para generar el enlace.")
-
-                with colB:
-                    st.dataframe(dets[['numero', 'dias_vencido', 'fecha_vencimiento', 'importe', 'Rango']].style.format({'importe':'${:,.0f}'}), hide_index=True)
-                    
-                    st.write("#### 📧 Enviar Correo")
-                    with st.form("frm_mail"):
-                        dest = st.text_input("Email", value=dat['email'])
-                        sub_btn = st.form_submit_button("Enviar PDF")
-                        
-                        if sub_btn:
-                            subj = f"Estado de Cuenta - {sel_cli}"
-                            if dat['vencido'] > 0:
-                                body = plantilla_correo_vencido(sel_cli, dat['vencido'], dat['dias_max'], dat['nit'], dat['cod'], "https://ferreinoxtiendapintuco.epayco.me/")
-                            else:
-                                body = plantilla_correo_al_dia(sel_cli, dat['saldo'])
-                                
-                            if enviar_correo(dest, subj, body, pdf_bytes):
-                                st.success("✅ Enviado correctamente")
+            seccion_gestion_1a1(df_view, grp)
 
     # --- TAB 2: ESTRATEGIA ---
     with tab2:
@@ -1221,18 +1216,17 @@ def main():
     with tab3:
         st.subheader("📥 Exportación")
         # CORRECCIÓN: variable 'antiguedad_prom_vencida' unificada
-        excel_bytes = crear_excel_gerencial(df_view, total, vencido, pct, cli_mora, csi, antiguedad_prom_vencida)
-        
-        st.download_button(
-            "💾 Descargar Reporte Gerencial (Excel)", 
-            excel_bytes, 
+        descarga_diferida(
+            "💾 Descargar Reporte Gerencial (Excel)",
+            lambda: crear_excel_gerencial(df_view, total, vencido, pct, cli_mora, csi, antiguedad_prom_vencida),
             f"Cartera_{datetime.now().strftime('%Y%m%d')}.xlsx",
             "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            type="primary"
+            clave="excel_gerencial", version=huella_datos(df_view, COLUMNAS_VERSION),
+            type="primary",
         )
         
         st.subheader("Datos Crudos")
-        st.dataframe(df_view, height=300)
+        tabla_paginada(df_view, "perfil_datos_crudos", version=(vend_norm, sel_rango, sel_zona, huella_datos(df_view, COLUMNAS_VERSION)), height=300)
 
     # --- TAB 4: EMPLEADOS (CON EXCEL DE NÓMINA INTEGRADO) ---
     with tab4:
@@ -1244,13 +1238,11 @@ def main():
         with col_t4_2:
             st.write("") # Espaciador
             # --- NUEVO BOTÓN PARA DESCARGAR EL EXCEL DE EMPLEADOS ---
-            excel_empleados_bytes = crear_excel_empleados_detallado(df)
-            st.download_button(
-                label="💾 Descargar Reporte Nómina (Excel)",
-                data=excel_empleados_bytes,
-                file_name=f"Reporte_Nomina_Empleados_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                key="btn_descarga_nomina"
+            descarga_diferida(
+                "💾 Descargar Reporte Nómina (Excel)", lambda: crear_excel_empleados_detallado(df),
+                f"Reporte_Nomina_Empleados_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                clave="btn_descarga_nomina", version=huella_datos(df, COLUMNAS_VERSION + ['es_empleado']),
             )
         
         st.divider()
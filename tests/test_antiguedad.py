@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+
+from comun.antiguedad import ESCALA_EDAD, ESCALA_RANGO, clasificar
+
+
+def test_clasificar_igual_que_pd_cut():
+    dias = [-5, 0, 1, 15, 16, 30, 31, 60, 61, 90, 91, 400]
+    cortes, etiquetas = ESCALA_RANGO
+    esperado = pd.cut(dias, bins=[-np.inf, *cortes, np.inf], labels=list(etiquetas), right=True)
+    assert list(clasificar(dias, ESCALA_RANGO)) == list(esperado)
+
+
+def test_clasificar_sin_dias_queda_sin_categoria():
+    resultado = clasificar(pd.Series([np.nan, 10, np.nan, 200]), ESCALA_EDAD)
+    assert pd.isna(resultado[0]) and pd.isna(resultado[2])
+    assert resultado[1] == '1-15 días'
+    assert resultado[3] == 'Más de 60 días'
@@ -5,24 +5,28 @@ import streamlit as st
 import pandas as pd
 import toml
 import os
-from io import BytesIO, StringIO
+from io import StringIO
 import plotly.express as px
 import plotly.graph_objects as go
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment
-from openpyxl.utils import get_column_letter
-from openpyxl.drawing.image import Image as XLImage
-from openpyxl.worksheet.table import Table, TableStyleInfo
 import unicodedata
 import re
-from datetime import datetime
-from fpdf import FPDF
+from datetime import date, datetime
 import yagmail
 from urllib.parse import quote
 import tempfile
 import dropbox
 import glob
 
+from comun.antiguedad import ESCALA_EDAD, aplicar_antiguedad, clasificar, corregir_fechas_corte
+from comun.cubo_kpi import (
+    clientes_pareto, construir_cubo, filtrar_cubo, importe_por_edad, kpis_cubo, vencido_por_cliente
+)
+from comun.exportacion_diferida import descarga_diferida, descarga_diferida_en_disco, huella_datos
+from comun.graficos import figura_en_cache, top_n_con_otros
+from comun.indice_filtros import IndiceFiltros
+from comun.reportes_tablero import generar_excel_formateado, generar_pdf_estado_cuenta, generar_paquete_vendedores
+from comun.tabla_paginada import tabla_paginada
+
 # --- CONFIGURACIÓN DE PÁGINA ---
 st.set_page_config(
     page_title="Tablero Principal",
@@ -81,14 +85,27 @@ def cargar_datos_desde_dropbox():
             ]
 
             df = pd.read_csv(StringIO(contenido_csv), header=None, names=nombres_columnas_originales, sep='|', engine='python')
+            # Fecha de corte: última modificación del archivo en Dropbox (hoy si no viene)
+            modificado = getattr(metadata, 'server_modified', None)
+            df['snapshot_date'] = pd.Timestamp(modificado or datetime.now()).normalize()
             return df
     except Exception as e:
         st.error(f"Error al cargar datos desde Dropbox: {e}")
         return pd.DataFrame()
 
+def fecha_corte_archivo(ruta: str):
+    """
+    Cartera_2025_07.xlsx / Cartera_2025-01.xlsx -> último día de ese mes (NaT si no trae fecha).
+    Solo identifica el corte: su fecha real (p. ej. Cartera_2025_07 calculada al 08/08/2025)
+    la pone preparar_cartera a partir de los datos.
+    """
+    m = re.search(r'Cartera_(\d{4})[_-](\d{1,2})', os.path.basename(ruta))
+    if not m: return pd.NaT
+    return pd.Period(year=int(m.group(1)), month=int(m.group(2)), freq='M').to_timestamp(how='end').normalize()
+
 @st.cache_data
 def cargar_datos_historicos():
-    """Busca y carga todos los archivos Excel históricos locales."""
+    """Busca y carga todos los archivos Excel históricos locales (cada uno con su snapshot_date)."""
     archivos_historicos = glob.glob("Cartera_*.xlsx")
     if not archivos_historicos:
         return pd.DataFrame()
@@ -100,6 +117,7 @@ def cargar_datos_historicos():
             if not df_hist.empty:
                 if "Total" in str(df_hist.iloc[-1, 0]):
                     df_hist = df_hist.iloc[:-1]
+                df_hist['snapshot_date'] = fecha_corte_archivo(archivo)
                 lista_de_dataframes.append(df_hist)
         except Exception as e:
             st.warning(f"No se pudo leer el archivo histórico {archivo}: {e}")
@@ -108,22 +126,13 @@ def cargar_datos_historicos():
         return pd.concat(lista_de_dataframes, ignore_index=True)
     return pd.DataFrame()
 
-@st.cache_data
-def cargar_y_procesar_datos():
+def preparar_cartera(df_crudo: pd.DataFrame) -> pd.DataFrame:
     """
-    Orquesta la carga de datos, los combina, limpia duplicados y procesa.
+    Nombres de columna normalizados, tipos, sin series W/X y procesar_cartera. El
+    snapshot_date de cada corte pasa a ser la fecha a la que se calcularon sus días vencidos.
     """
-    df_dropbox = cargar_datos_desde_dropbox()
-    df_historico = cargar_datos_historicos()
-
-    df_combinado = pd.concat([df_dropbox, df_historico], ignore_index=True)
-
-    if df_combinado.empty:
-        st.error("No se pudieron cargar datos de ninguna fuente. La aplicación no puede continuar.")
-        st.stop()
-
-    df_combinado = df_combinado.loc[:, ~df_combinado.columns.duplicated()]
-    df_renamed = df_combinado.rename(columns=lambda x: normalizar_nombre(x).lower().replace(' ', '_'))
+    df_crudo = df_crudo.loc[:, ~df_crudo.columns.duplicated()]
+    df_renamed = df_crudo.rename(columns=lambda x: normalizar_nombre(x).lower().replace(' ', '_'))
     df_renamed = df_renamed.loc[:, ~df_renamed.columns.duplicated()]
 
     df_renamed['serie'] = df_renamed['serie'].astype(str)
@@ -132,38 +141,85 @@ def cargar_y_procesar_datos():
 
     df_filtrado = df_renamed[~df_renamed['serie'].str.contains('W|X', case=False, na=False)]
 
-    return procesar_cartera(df_filtrado)
+    return corregir_fechas_corte(procesar_cartera(df_filtrado))
+
+@st.cache_data
+def cargar_y_procesar_datos():
+    """
+    Cartera vigente: solo el snapshot de Dropbox. Los Excel históricos no se leen aquí;
+    si Dropbox falla se usa el corte local más reciente para no dejar el tablero vacío.
+    """
+    df_actual = cargar_datos_desde_dropbox()
+
+    if df_actual.empty:
+        archivos = sorted(glob.glob("Cartera_*.xlsx"), key=fecha_corte_archivo)
+        if archivos:
+            ultimo = archivos[-1]
+            st.warning(f"Dropbox no disponible: se muestra el corte local {os.path.basename(ultimo)}.")
+            df_actual = pd.read_excel(ultimo)
+            if not df_actual.empty and "Total" in str(df_actual.iloc[-1, 0]):
+                df_actual = df_actual.iloc[:-1]
+            df_actual['snapshot_date'] = fecha_corte_archivo(ultimo)
+
+    if df_actual.empty:
+        st.error("No se pudieron cargar datos de ninguna fuente. La aplicación no puede continuar.")
+        st.stop()
+
+    return preparar_cartera(df_actual)
+
+@st.cache_data
+def cargar_historico_procesado():
+    """Cortes históricos (Cartera_*.xlsx) procesados igual que la cartera vigente; solo bajo demanda."""
+    df_historico = cargar_datos_historicos()
+    if df_historico.empty:
+        return df_historico
+    return preparar_cartera(df_historico)
+
+# Cartera, índice y cubo se sirven como objetos compartidos (cache_resource): cada rerun
+# recibe el mismo objeto sin despicklear una copia. Son de solo lectura para quien los use.
+# Cada fecha consultada en "Ver cartera al" es una entrada: max_entries acota la memoria.
+@st.cache_resource(ttl=600, max_entries=4)
+def cargar_cartera(al_dia: date = None):
+    """
+    Cartera vigente con su antigüedad calculada a `al_dia` (hoy si no se indica). Los cortes
+    históricos nunca entran aquí: sumarlos repetiría los saldos de cada corte en los KPIs.
+    """
+    return aplicar_antiguedad(cargar_y_procesar_datos(), al_dia, {'edad_cartera': ESCALA_EDAD})
+
+@st.cache_resource(ttl=600, max_entries=4)
+def cargar_indice_filtros(al_dia: date = None):
+    """Opciones del sidebar y filas por valor de cada filtro, sobre la misma cartera que filtra."""
+    return IndiceFiltros(cargar_cartera(al_dia), ['nomvendedor', 'nomvendedor_norm', 'zona', 'poblacion'])
+
+@st.cache_resource(ttl=600, max_entries=4)
+def cargar_cubo_kpi(al_dia: date = None):
+    """Cubo de KPI del snapshot (mismo ciclo de vida que cargar_cartera)."""
+    return construir_cubo(cargar_cartera(al_dia))
+
+@st.cache_data
+def cargar_evolucion_cortes():
+    """
+    Saldo total y vencido por corte (snapshot_date) y dimensión de filtro: corte vigente +
+    cortes históricos, cada uno con los días vencidos de su propia fecha. Solo bajo demanda.
+    """
+    cortes = pd.concat([cargar_y_procesar_datos(), cargar_historico_procesado()], ignore_index=True)
+    cortes['vencido'] = cortes['importe'].where(cortes['dias_vencido'] > 0, 0)
+    return (cortes.groupby(['snapshot_date', 'nomvendedor_norm', 'zona', 'poblacion'], observed=True, dropna=False)
+                  [['importe', 'vencido']].sum().reset_index())
 
 
 # ======================================================================================
-# --- CLASE PDF Y FUNCIONES AUXILIARES ---
+# --- FUNCIONES AUXILIARES ---
 # ======================================================================================
-class PDF(FPDF):
-    def header(self):
-        try:
-            self.image("LOGO FERREINOX SAS BIC 2024.png", 10, 8, 80)
-        except RuntimeError:
-            self.set_font('Arial', 'B', 12); self.cell(80, 10, 'Logo no encontrado o invalido', 0, 0, 'L')
-        self.set_font('Arial', 'B', 18); self.cell(0, 10, 'Estado de Cuenta', 0, 1, 'R')
-        self.set_font('Arial', 'I', 9); self.cell(0, 10, f'Generado el: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}', 0, 1, 'R')
-        self.ln(5); self.set_line_width(0.5); self.set_draw_color(220, 220, 220); self.line(10, 35, 200, 35); self.ln(10)
-
-    def footer(self):
-        self.set_y(-40)
-        self.set_font('Arial', 'I', 9); self.set_text_color(100, 100, 100)
-        self.cell(0, 6, "Para ingresar al portal de pagos, utiliza el NIT como 'usuario' y el Codigo de Cliente como 'codigo unico interno'.", 0, 1, 'C')
-        self.set_font('Arial', 'B', 11); self.set_text_color(0, 0, 0)
-        self.cell(0, 8, 'Realiza tu pago de forma facil y segura aqui:', 0, 1, 'C')
-        self.set_font('Arial', 'BU', 12); self.set_text_color(4, 88, 167)
-        link = "https://ferreinoxtiendapintuco.epayco.me/recaudo/ferreinoxrecaudoenlinea/"
-        self.cell(0, 10, "Portal de Pagos Ferreinox SAS BIC", 0, 1, 'C', link=link)
-
 def normalizar_nombre(nombre: str) -> str:
     if not isinstance(nombre, str): return ""
     nombre = nombre.upper().strip().replace('.', '')
     nombre = ''.join(c for c in unicodedata.normalize('NFD', nombre) if unicodedata.category(c) != 'Mn')
     return ' '.join(nombre.split())
 
+# Columnas que identifican la versión de los datos para las descargas diferidas
+COLUMNAS_VERSION = ['numero', 'importe', 'dias_vencido']
+
 ZONAS_SERIE = { "PEREIRA": [155, 189, 158, 439], "MANIZALES": [157, 238], "ARMENIA": [156] }
 
 def procesar_cartera(df: pd.DataFrame) -> pd.DataFrame:
@@ -182,157 +238,9 @@ def procesar_cartera(df: pd.DataFrame) -> pd.DataFrame:
             if set(numeros_en_celda) & set(series_clave_str): return zona
         return "OTRAS ZONAS"
     df_proc['zona'] = df_proc['serie'].apply(asignar_zona_robusta)
-    bins = [-float('inf'), 0, 15, 30, 60, float('inf')]; labels = ['Al día', '1-15 días', '16-30 días', '31-60 días', 'Más de 60 días']
-    df_proc['edad_cartera'] = pd.cut(df_proc['dias_vencido'], bins=bins, labels=labels, right=True)
+    df_proc['edad_cartera'] = clasificar(df_proc['dias_vencido'], ESCALA_EDAD)
     return df_proc
 
-def generar_excel_formateado(df: pd.DataFrame):
-    output = BytesIO()
-    df_export = df[['nombrecliente', 'serie', 'numero', 'fecha_documento', 'fecha_vencimiento', 'importe', 'dias_vencido']].copy()
-    for col in ['fecha_documento', 'fecha_vencimiento']: df_export[col] = pd.to_datetime(df_export[col], errors='coerce').dt.strftime('%d/%m/%Y')
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df_export.to_excel(writer, index=False, sheet_name='Cartera', startrow=9)
-        wb, ws = writer.book, writer.sheets['Cartera']
-        try:
-            img = XLImage("LOGO FERREINOX SAS BIC 2024.png"); img.anchor = 'A1'; img.width = 390; img.height = 130
-            ws.add_image(img)
-        except FileNotFoundError: ws['A1'] = "Logo no encontrado."
-        fill_red, fill_orange, fill_yellow = PatternFill(start_color='FF0000', end_color='FF0000', fill_type='solid'), PatternFill(start_color='FFA500', end_color='FFA500', fill_type='solid'), PatternFill(start_color='FFF9C4', end_color='FFF9C4', fill_type='solid')
-        font_bold, font_green_bold = Font(bold=True), Font(bold=True, color="006400")
-        first_data_row, last_data_row = 10, ws.max_row
-        tab = Table(displayName="CarteraVendedor", ref=f"A{first_data_row-1}:G{last_data_row}")
-        tab.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False, showLastColumn=False, showRowStripes=True, showColumnStripes=False)
-        ws.add_table(tab)
-        for i, ancho in enumerate([40, 10, 12, 18, 18, 18, 15], 1): ws.column_dimensions[get_column_letter(i)].width = ancho
-        importe_col_idx, dias_col_idx, formato_moneda = 6, 7, '"$"#,##0'
-        for row_idx, row in enumerate(ws.iter_rows(min_row=first_data_row, max_row=last_data_row), start=first_data_row):
-            if row_idx == first_data_row:
-                for cell in row:
-                    cell.font = font_bold
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                continue
-            row[importe_col_idx - 1].number_format = formato_moneda
-            dias_cell = row[dias_col_idx - 1]
-            try:
-                dias = int(dias_cell.value)
-                if dias > 60: dias_cell.fill = fill_red
-                elif dias > 30: dias_cell.fill = fill_orange
-                elif dias > 0: dias_cell.fill = fill_yellow
-            except (ValueError, TypeError):
-                pass
-            dias_cell.alignment = Alignment(horizontal='center')
-
-        ws[f"E{last_data_row + 2}"] = "Tu cartera total es de:"; ws[f"E{last_data_row + 2}"].font = font_green_bold
-        ws[f"F{last_data_row + 2}"] = f"=SUBTOTAL(9,F{first_data_row}:F{last_data_row})"; ws[f"F{last_data_row + 2}"].number_format = formato_moneda; ws[f"F{last_data_row + 2}"].font = font_green_bold
-        ws[f"E{last_data_row + 3}"] = "Facturas vencidas por valor de:"; ws[f"E{last_data_row + 3}"].font = font_green_bold
-        ws[f"F{last_data_row + 3}"] = f"=SUMIF(G{first_data_row}:G{last_data_row},\">0\",F{first_data_row}:F{last_data_row})"; ws[f"F{last_data_row + 3}"].number_format = formato_moneda; ws[f"F{last_data_row + 3}"].font = font_green_bold
-    return output.getvalue()
-
-def generar_pdf_estado_cuenta(datos_cliente: pd.DataFrame, total_vencido_cliente: float):
-    pdf = PDF()
-    pdf.set_auto_page_break(auto=True, margin=45)
-    pdf.add_page()
-    if datos_cliente.empty:
-        pdf.set_font('Arial', 'B', 12); pdf.cell(0, 10, 'No se encontraron facturas para este cliente.', 0, 1, 'C')
-        return bytes(pdf.output())
-
-    # --- Paleta institucional del documento ---
-    NAVY = (0, 56, 101)
-    ROJO = (192, 0, 0)
-    AMBAR = (216, 120, 40)
-    GRIS_TX = (110, 110, 110)
-    GRIS_ZEBRA = (245, 247, 250)
-
-    # Ordenamos por días vencido (primero lo más crítico)
-    datos_cliente_ordenados = datos_cliente.sort_values(by='dias_vencido', ascending=False)
-    info_cliente = datos_cliente_ordenados.iloc[0]
-
-    total_importe = float(datos_cliente['importe'].sum())
-
-    # --- Datos del cliente ---
-    cod_cliente_str = str(int(info_cliente['cod_cliente'])) if pd.notna(info_cliente['cod_cliente']) else "N/A"
-    nit_str = str(info_cliente.get('nit', 'N/A')) if pd.notna(info_cliente.get('nit', None)) else "N/A"
-    pdf.set_font('Arial', 'B', 11); pdf.set_text_color(*NAVY); pdf.cell(40, 8, 'Cliente:', 0, 0)
-    pdf.set_font('Arial', '', 11); pdf.set_text_color(0, 0, 0); pdf.cell(0, 8, str(info_cliente['nombrecliente']), 0, 1)
-    pdf.set_font('Arial', 'B', 11); pdf.set_text_color(*NAVY); pdf.cell(40, 8, 'NIT:', 0, 0)
-    pdf.set_font('Arial', '', 11); pdf.set_text_color(0, 0, 0); pdf.cell(60, 8, nit_str, 0, 0)
-    pdf.set_font('Arial', 'B', 11); pdf.set_text_color(*NAVY); pdf.cell(40, 8, 'Codigo de Cliente:', 0, 0)
-    pdf.set_font('Arial', '', 11); pdf.set_text_color(0, 0, 0); pdf.cell(0, 8, cod_cliente_str, 0, 1)
-    pdf.ln(6)
-
-    # --- Mensaje ---
-    pdf.set_font('Arial', '', 10)
-    mensaje = ("Apreciado cliente, a continuación encontrará el detalle de su estado de cuenta a la fecha. "
-               "Le invitamos a revisar los valores y proceder con el pago de las facturas vencidas. "
-               "Puede pagar de forma fácil y segura en nuestro PORTAL DE PAGOS en línea (enlace al final del documento).")
-    pdf.set_text_color(*GRIS_TX); pdf.multi_cell(0, 5, mensaje, 0, 'J'); pdf.set_text_color(0, 0, 0); pdf.ln(4)
-
-    # --- Encabezado de tabla ---
-    w_fact, w_fdoc, w_fven, w_dias, w_imp = 28, 34, 34, 28, 56
-    x_tabla = 15
-
-    def encabezado_tabla():
-        pdf.set_x(x_tabla)
-        pdf.set_font('Arial', 'B', 10); pdf.set_fill_color(*NAVY); pdf.set_text_color(255, 255, 255)
-        pdf.cell(w_fact, 9, 'Factura', 1, 0, 'C', 1)
-        pdf.cell(w_fdoc, 9, 'Fecha Factura', 1, 0, 'C', 1)
-        pdf.cell(w_fven, 9, 'Fecha Venc.', 1, 0, 'C', 1)
-        pdf.cell(w_dias, 9, 'Dias Vencido', 1, 0, 'C', 1)
-        pdf.cell(w_imp, 9, 'Importe', 1, 1, 'C', 1)
-
-    encabezado_tabla()
-
-    def color_dias(d):
-        if d > 60: return (255, 205, 205)
-        if d > 30: return (255, 224, 178)
-        if d > 0:  return (255, 249, 196)
-        return None
-
-    pdf.set_font('Arial', '', 10)
-    for idx, (_, row) in enumerate(datos_cliente_ordenados.iterrows()):
-        # Repite el encabezado si salta de página
-        if pdf.get_y() > 245:
-            pdf.add_page(); encabezado_tabla(); pdf.set_font('Arial', '', 10)
-
-        dias = int(row['dias_vencido']) if pd.notna(row['dias_vencido']) else 0
-        vencida = dias > 0
-        fila_fill = (255, 240, 240) if vencida else ((255, 255, 255) if idx % 2 == 0 else GRIS_ZEBRA)
-        numero_factura_str = str(int(row['numero'])) if pd.notna(row['numero']) else "N/A"
-        fecha_doc_str = row['fecha_documento'].strftime('%d/%m/%Y') if pd.notna(row['fecha_documento']) else ''
-        fecha_ven_str = row['fecha_vencimiento'].strftime('%d/%m/%Y') if pd.notna(row['fecha_vencimiento']) else ''
-
-        pdf.set_x(x_tabla); pdf.set_text_color(0, 0, 0)
-        pdf.set_fill_color(*fila_fill)
-        pdf.cell(w_fact, 8, numero_factura_str, 1, 0, 'C', 1)
-        pdf.cell(w_fdoc, 8, fecha_doc_str, 1, 0, 'C', 1)
-        pdf.cell(w_fven, 8, fecha_ven_str, 1, 0, 'C', 1)
-        # Celda Días Vencido con color por severidad
-        cd = color_dias(dias)
-        if cd is not None:
-            pdf.set_fill_color(*cd); pdf.set_text_color(0, 0, 0)
-            pdf.cell(w_dias, 8, str(dias), 1, 0, 'C', 1)
-        else:
-            pdf.set_fill_color(*fila_fill); pdf.set_text_color(0, 0, 0)
-            pdf.cell(w_dias, 8, 'Al dia', 1, 0, 'C', 1)
-        pdf.set_fill_color(*fila_fill)
-        pdf.cell(w_imp, 8, f"${row['importe']:,.0f}", 1, 1, 'R', 1)
-
-    # --- Totales ---
-    w_label = w_fact + w_fdoc + w_fven + w_dias
-    pdf.set_x(x_tabla); pdf.set_text_color(0, 0, 0)
-    pdf.set_font('Arial', 'B', 10); pdf.set_fill_color(224, 224, 224)
-    pdf.cell(w_label, 9, 'TOTAL ADEUDADO', 1, 0, 'R', 1)
-    pdf.set_fill_color(240, 240, 240)
-    pdf.cell(w_imp, 9, f"${total_importe:,.0f}", 1, 1, 'R', 1)
-
-    if total_vencido_cliente > 0:
-        pdf.set_x(x_tabla)
-        pdf.set_font('Arial', 'B', 10); pdf.set_fill_color(*ROJO); pdf.set_text_color(255, 255, 255)
-        pdf.cell(w_label, 9, 'VALOR TOTAL VENCIDO', 1, 0, 'R', 1)
-        pdf.cell(w_imp, 9, f"${total_vencido_cliente:,.0f}", 1, 1, 'R', 1)
-
-    return bytes(pdf.output())
-
 def generar_analisis_cartera(kpis: dict):
     comentarios = []
     if kpis['porcentaje_vencido'] > 30: comentarios.append(f"<li>🔴 **Alerta Crítica:** El <b>{kpis['porcentaje_vencido']:.1f}%</b> de la cartera está vencida. Requiere acciones inmediatas.</li>")
@@ -384,6 +292,8 @@ def main():
 
         if st.button("🔄 Recargar Datos (Dropbox + Locales)"):
             st.cache_data.clear()
+            for cargador in (cargar_cartera, cargar_indice_filtros, cargar_cubo_kpi):
+                cargador.clear()
             st.success("Caché limpiado. Recargando todos los datos...")
             st.rerun()
 
@@ -398,38 +308,57 @@ def main():
                     del st.session_state[key]
                 st.rerun()
 
-        cartera_procesada = cargar_y_procesar_datos()
+        # Solo la cartera vigente; los cortes históricos se leen si alguien los pide
+        incluir_historico = st.sidebar.toggle(
+            "🗂️ Incluir cortes históricos", value=False,
+            help="Agrega la pestaña de evolución por corte con los archivos Cartera_*.xlsx locales (más lento). "
+                 "KPIs, gráficos y detalle son siempre del corte vigente."
+        )
+        # La antigüedad se recalcula a esta fecha sobre el snapshot en caché (sin recargar)
+        al_dia = st.sidebar.date_input(
+            "📅 Ver cartera al", value=date.today(), format="DD/MM/YYYY",
+            help="Días vencidos y rangos de antigüedad calculados a esta fecha desde el vencimiento de cada factura."
+        )
+        cartera_procesada = cargar_cartera(al_dia)
+        indice = cargar_indice_filtros(al_dia)
+        evolucion = cargar_evolucion_cortes() if incluir_historico else None
+        if 'snapshot_date' in cartera_procesada.columns:
+            cortes = cartera_procesada['snapshot_date'].dropna()
+            if not cortes.empty:
+                st.sidebar.caption(f"Corte vigente: {cortes.max():%d/%m/%Y}" + (f" · {evolucion['snapshot_date'].nunique()} cortes" if incluir_historico else ""))
 
         st.sidebar.title("Filtros")
         if st.session_state['acceso_general']:
-            vendedores_en_excel_display = ["Todos"] + sorted(cartera_procesada['nomvendedor'].dropna().unique())
+            vendedores_en_excel_display = ["Todos"] + indice.opciones('nomvendedor')
             vendedor_sel = st.sidebar.selectbox("Filtrar por Vendedor:", vendedores_en_excel_display)
         else:
             vendedor_sel = st.session_state['vendedor_autenticado']
 
-        zonas_disponibles = ["Todas las Zonas"] + sorted(cartera_procesada['zona'].dropna().unique())
+        zonas_disponibles = ["Todas las Zonas"] + indice.opciones('zona')
         zona_sel = st.sidebar.selectbox("Filtrar por Zona:", zonas_disponibles)
 
-        poblaciones_disponibles = ["Todas"] + sorted(cartera_procesada['poblacion'].dropna().unique())
+        poblaciones_disponibles = ["Todas"] + indice.opciones('poblacion')
         poblacion_sel = st.sidebar.selectbox("Filtrar por Población:", poblaciones_disponibles)
 
-        cartera_filtrada = cartera_procesada.copy()
-        if vendedor_sel != "Todos":
-            cartera_filtrada = cartera_filtrada[cartera_filtrada['nomvendedor_norm'] == normalizar_nombre(vendedor_sel)]
-        if zona_sel != "Todas las Zonas":
-            cartera_filtrada = cartera_filtrada[cartera_filtrada['zona'] == zona_sel]
-        if poblacion_sel != "Todas":
-            cartera_filtrada = cartera_filtrada[cartera_filtrada['poblacion'] == poblacion_sel]
+        filtros = {
+            'nomvendedor_norm': None if vendedor_sel == "Todos" else normalizar_nombre(vendedor_sel),
+            'zona': None if zona_sel == "Todas las Zonas" else zona_sel,
+            'poblacion': None if poblacion_sel == "Todas" else poblacion_sel,
+        }
+        # KPIs y gráficos salen del cubo preagregado; las facturas solo para detalle y gestión
+        cubo_filtrado = filtrar_cubo(cargar_cubo_kpi(al_dia), **filtros)
 
-        if cartera_filtrada.empty:
+        if cubo_filtrado.empty:
             st.warning(f"No se encontraron datos para los filtros seleccionados."); st.stop()
 
-        total_cartera = cartera_filtrada['importe'].sum()
-        cartera_vencida_df = cartera_filtrada[cartera_filtrada['dias_vencido'] > 0]
-        total_vencido = cartera_vencida_df['importe'].sum()
-        porcentaje_vencido = (total_vencido / total_cartera) * 100 if total_cartera > 0 else 0
-        csi = (cartera_vencida_df['importe'] * cartera_vencida_df['dias_vencido']).sum() / total_cartera if total_cartera > 0 else 0
-        antiguedad_prom_vencida = (cartera_vencida_df['importe'] * cartera_vencida_df['dias_vencido']).sum() / total_vencido if total_vencido > 0 else 0
+        cartera_filtrada = indice.filtrar(cartera_procesada, **filtros)
+
+        kpis = kpis_cubo(cubo_filtrado)
+        total_cartera = kpis['total_cartera']
+        total_vencido = kpis['total_vencido']
+        porcentaje_vencido = kpis['porcentaje_vencido']
+        csi = kpis['csi']
+        antiguedad_prom_vencida = kpis['antiguedad_prom_vencida']
 
         st.header("Indicadores Clave de Rendimiento (KPIs)")
         kpi_row1 = st.columns(3)
@@ -448,12 +377,13 @@ def main():
             st.markdown(analisis, unsafe_allow_html=True)
         st.markdown("---")
 
-        tab1, tab2, tab3 = st.tabs(["📊 Visión General de la Cartera", "👥 Análisis por Cliente", "📑 Detalle Completo"])
+        nombres_tabs = ["📊 Visión General de la Cartera", "👥 Análisis por Cliente", "📑 Detalle Completo"]
+        tab1, tab2, tab3, *tab_cortes = st.tabs(nombres_tabs + (["🗂️ Evolución por Corte"] if incluir_historico else []))
         with tab1:
             st.subheader("Distribución de Cartera por Antigüedad")
             col_grafico, col_tabla_resumen = st.columns([2, 1])
             with col_grafico:
-                df_edades = cartera_filtrada.groupby('edad_cartera', observed=True)['importe'].sum().reset_index()
+                df_edades = importe_por_edad(cubo_filtrado)
                 color_map_edades = {'Al día': PALETA_COLORES['exito_verde'], '1-15 días': PALETA_COLORES['alerta_amarillo'], '16-30 días': PALETA_COLORES['alerta_naranja'], '31-60 días': 'darkorange', 'Más de 60 días': PALETA_COLORES['alerta_rojo']}
                 fig = px.bar(df_edades, x='edad_cartera', y='importe', text_auto='.2s', title='Monto de Cartera por Rango de Días', labels={'edad_cartera': 'Antigüedad', 'importe': 'Monto Total'}, color='edad_cartera', color_discrete_map=color_map_edades)
                 fig.update_layout(showlegend=False)
@@ -468,19 +398,21 @@ def main():
             col_pareto, col_treemap = st.columns(2)
             with col_treemap:
                 st.markdown("**Visualización de Cartera Vencida por Cliente (Treemap)**")
-                df_clientes_vencidos = cartera_vencida_df.groupby('nombrecliente')['importe'].sum().reset_index()
-                df_clientes_vencidos = df_clientes_vencidos[df_clientes_vencidos['importe'] > 0]
-                fig_treemap = px.treemap(df_clientes_vencidos, path=[px.Constant("Clientes con Deuda Vencida"), 'nombrecliente'], values='importe', title='Haga clic en un recuadro para explorar', color_continuous_scale='Reds', color='importe')
-                fig_treemap.update_layout(margin = dict(t=50, l=25, r=25, b=25))
+                client_debt = vencido_por_cliente(cubo_filtrado)
+                df_clientes_vencidos = client_debt[client_debt > 0].reset_index()
+                def construir_treemap():
+                    # Los clientes fuera del top se suman en un solo recuadro "Otros clientes"
+                    df_treemap = top_n_con_otros(df_clientes_vencidos, 'nombrecliente', 'importe', etiqueta_otros="Otros clientes")
+                    fig = px.treemap(df_treemap, path=[px.Constant("Clientes con Deuda Vencida"), 'nombrecliente'], values='importe', title='Haga clic en un recuadro para explorar', color_continuous_scale='Reds', color='importe')
+                    fig.update_layout(margin = dict(t=50, l=25, r=25, b=25))
+                    return fig
+
+                fig_treemap = figura_en_cache("treemap_vencidos", (tuple(filtros.items()), huella_datos(df_clientes_vencidos)), construir_treemap)
                 st.plotly_chart(fig_treemap, use_container_width=True)
             with col_pareto:
                 st.markdown("**Clientes Clave (Principio de Pareto)**")
-                client_debt = cartera_vencida_df.groupby('nombrecliente')['importe'].sum().sort_values(ascending=False)
                 if not client_debt.empty:
-                    client_debt_cumsum = client_debt.cumsum()
-                    total_debt_vencida = client_debt.sum()
-                    pareto_limit = total_debt_vencida * 0.80
-                    pareto_clients_df = client_debt.to_frame().iloc[0:len(client_debt_cumsum[client_debt_cumsum <= pareto_limit]) + 1]
+                    pareto_clients_df = clientes_pareto(client_debt, 0.80).to_frame()
                     num_total_clientes_deuda = len(client_debt)
                     num_clientes_pareto = len(pareto_clients_df)
                     porcentaje_clientes_pareto = (num_clientes_pareto / num_total_clientes_deuda) * 100 if num_total_clientes_deuda > 0 else 0
@@ -493,162 +425,215 @@ def main():
                     st.info("No hay cartera vencida para analizar.")
         with tab3:
             st.subheader(f"Detalle Completo: {vendedor_sel} / {zona_sel} / {poblacion_sel}")
-            st.download_button(label="📥 Descargar Reporte en Excel", data=generar_excel_formateado(cartera_filtrada), file_name=f'Cartera_{normalizar_nombre(vendedor_sel)}_{zona_sel}_{poblacion_sel}.xlsx', mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+            version_detalle = (tuple(filtros.items()), huella_datos(cartera_filtrada, COLUMNAS_VERSION))
+            descarga_diferida(
+                "📥 Descargar Reporte en Excel", lambda: generar_excel_formateado(cartera_filtrada),
+                f'Cartera_{normalizar_nombre(vendedor_sel)}_{zona_sel}_{poblacion_sel}.xlsx',
+                'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                clave="excel_detalle",
+                version=version_detalle,
+            )
             columnas_disponibles = cartera_filtrada.columns
             columnas_a_ocultar_existentes = [col for col in ['provincia', 'telefono1', 'telefono2', 'entidad_autoriza', 'e_mail', 'descuento', 'cupo_aprobado', 'nomvendedor_norm', 'zona'] if col in columnas_disponibles]
             cartera_para_mostrar = cartera_filtrada.drop(columns=columnas_a_ocultar_existentes, errors='ignore')
-            st.dataframe(cartera_para_mostrar, use_container_width=True, hide_index=True)
+            tabla_paginada(cartera_para_mostrar, "tablero_detalle", version=version_detalle, use_container_width=True, hide_index=True)
+
+            if st.session_state['acceso_general']:
+                st.markdown("---")
+                st.subheader("📦 Paquete de Reportes de Todos los Vendedores")
+                st.caption("Un ZIP con el Excel de cada vendedor sobre la cartera vigente completa (sin los filtros del panel ni cortes históricos).")
+                incluir_pdfs = st.checkbox("Incluir el estado de cuenta PDF de cada cliente con saldo vencido", key="paquete_incluir_pdfs")
+
+                def generar_paquete(archivo):
+                    barra = st.progress(0.0, text="Generando reportes...")
+                    # El ZIP se arma en disco a medida que llegan los archivos del pool y ahí se queda
+                    generar_paquete_vendedores(cartera_procesada, archivo, incluir_pdfs=incluir_pdfs,
+                                               al_avanzar=lambda f: barra.progress(f, text=f"Generando reportes... {f:.0%}"))
+                    barra.empty()
+
+                descarga_diferida_en_disco(
+                    "📥 Descargar Paquete (ZIP)", generar_paquete,
+                    f"Reportes_Vendedores_{datetime.now():%Y%m%d}.zip", 'application/zip',
+                    clave="paquete_vendedores",
+                    version=(incluir_pdfs, huella_datos(cartera_procesada, COLUMNAS_VERSION)),
+                )
+
+        if tab_cortes:
+            with tab_cortes[0]:
+                # Cada corte se suma por separado: nunca se mezclan saldos de fechas distintas
+                por_corte = (filtrar_cubo(evolucion, **filtros).groupby('snapshot_date')[['importe', 'vencido']].sum()
+                             .reset_index().sort_values('snapshot_date'))
+                st.subheader("Cartera Total y Vencida por Corte")
+                st.caption("Cada corte con los días vencidos a su propia fecha; los filtros del panel aplican a todos los cortes.")
+                fig = px.line(por_corte, x='snapshot_date', y=['importe', 'vencido'], markers=True,
+                              labels={'snapshot_date': 'Corte', 'value': 'Monto', 'variable': ''})
+                st.plotly_chart(fig, use_container_width=True)
+                por_corte['% Vencido'] = (por_corte['vencido'] / por_corte['importe'].where(por_corte['importe'] != 0) * 100).fillna(0).map('{:.1f}%'.format)
+                por_corte['snapshot_date'] = por_corte['snapshot_date'].dt.strftime('%d/%m/%Y')
+                por_corte[['importe', 'vencido']] = por_corte[['importe', 'vencido']].apply(lambda s: s.map('${:,.0f}'.format))
+                st.dataframe(por_corte.rename(columns={'snapshot_date': 'Corte', 'importe': 'Cartera Total', 'vencido': 'Cartera Vencida'}),
+                             use_container_width=True, hide_index=True)
 
         st.markdown("---")
         st.header("⚙️ Herramientas de Gestión")
-        st.subheader("Generar y Enviar Estado de Cuenta por Cliente")
-        lista_clientes = sorted(cartera_filtrada['nombrecliente'].dropna().unique())
-        if not lista_clientes:
-            st.warning("No hay clientes para mostrar con los filtros actuales.")
-        else:
-            cliente_seleccionado = st.selectbox("Busca y selecciona un cliente para gestionar su cuenta:", [""] + lista_clientes, format_func=lambda x: 'Selecciona un cliente...' if x == "" else x, key="cliente_selector")
-
-            if cliente_seleccionado:
-                datos_cliente_seleccionado = cartera_filtrada[cartera_filtrada['nombrecliente'] == cliente_seleccionado].copy()
-                info_cliente_raw = datos_cliente_seleccionado.iloc[0]
-                correo_cliente = info_cliente_raw.get('e_mail', 'Correo no disponible')
-                telefono_raw = str(info_cliente_raw.get('telefono1', ''))
-                telefono_cliente = telefono_raw.split('.')[0] if '.' in telefono_raw else telefono_raw
-                nit_cliente = str(info_cliente_raw.get('nit', 'N/A'))
-                cod_cliente = str(int(info_cliente_raw['cod_cliente'])) if pd.notna(info_cliente_raw['cod_cliente']) else "N/A"
+        seccion_gestion_cliente(cartera_filtrada)
+
+
+@st.fragment
+def seccion_gestion_cliente(cartera_filtrada: pd.DataFrame):
+    """
+    Estado de cuenta, correo y WhatsApp de un cliente. Es un fragmento: elegir cliente o
+    editar el correo vuelve a correr solo esta sección, no los KPIs, gráficos ni el detalle.
+    """
+    st.subheader("Generar y Enviar Estado de Cuenta por Cliente")
+    lista_clientes = sorted(cartera_filtrada['nombrecliente'].dropna().unique())
+    if not lista_clientes:
+        st.warning("No hay clientes para mostrar con los filtros actuales.")
+    else:
+        cliente_seleccionado = st.selectbox("Busca y selecciona un cliente para gestionar su cuenta:", [""] + lista_clientes, format_func=lambda x: 'Selecciona un cliente...' if x == "" else x, key="cliente_selector")
+
+        if cliente_seleccionado:
+            datos_cliente_seleccionado = cartera_filtrada[cartera_filtrada['nombrecliente'] == cliente_seleccionado].copy()
+            info_cliente_raw = datos_cliente_seleccionado.iloc[0]
+            correo_cliente = info_cliente_raw.get('e_mail', 'Correo no disponible')
+            telefono_raw = str(info_cliente_raw.get('telefono1', ''))
+            telefono_cliente = telefono_raw.split('.')[0] if '.' in telefono_raw else telefono_raw
+            nit_cliente = str(info_cliente_raw.get('nit', 'N/A'))
+            cod_cliente = str(int(info_cliente_raw['cod_cliente'])) if pd.notna(info_cliente_raw['cod_cliente']) else "N/A"
                 
-                portal_link = "https://ferreinoxtiendapintuco.epayco.me/recaudo/ferreinoxrecaudoenlinea/"
+            portal_link = "https://ferreinoxtiendapintuco.epayco.me/recaudo/ferreinoxrecaudoenlinea/"
 
-                st.write(f"**Facturas para {cliente_seleccionado}:**")
-                st.dataframe(datos_cliente_seleccionado[['numero', 'fecha_documento', 'fecha_vencimiento', 'dias_vencido', 'importe']], use_container_width=True, hide_index=True)
+            st.write(f"**Facturas para {cliente_seleccionado}:**")
+            st.dataframe(datos_cliente_seleccionado[['numero', 'fecha_documento', 'fecha_vencimiento', 'dias_vencido', 'importe']], use_container_width=True, hide_index=True)
 
-                total_cartera_cliente = datos_cliente_seleccionado['importe'].sum()
-                facturas_vencidas_cliente = datos_cliente_seleccionado[datos_cliente_seleccionado['dias_vencido'] > 0]
-                total_vencido_cliente = facturas_vencidas_cliente['importe'].sum()
+            total_cartera_cliente = datos_cliente_seleccionado['importe'].sum()
+            facturas_vencidas_cliente = datos_cliente_seleccionado[datos_cliente_seleccionado['dias_vencido'] > 0]
+            total_vencido_cliente = facturas_vencidas_cliente['importe'].sum()
 
-                summary_cols = st.columns(2)
-                summary_cols[0].metric("🔥 Cartera Vencida del Cliente", f"${total_vencido_cliente:,.0f}")
-                summary_cols[1].metric("💰 Cartera Total del Cliente", f"${total_cartera_cliente:,.0f}")
+            summary_cols = st.columns(2)
+            summary_cols[0].metric("🔥 Cartera Vencida del Cliente", f"${total_vencido_cliente:,.0f}")
+            summary_cols[1].metric("💰 Cartera Total del Cliente", f"${total_cartera_cliente:,.0f}")
 
-                pdf_bytes = generar_pdf_estado_cuenta(datos_cliente_seleccionado, total_vencido_cliente)
+            pdf_bytes = generar_pdf_estado_cuenta(datos_cliente_seleccionado, total_vencido_cliente)
 
-                st.download_button(label="📄 Descargar Estado de Cuenta (PDF)", data=pdf_bytes, file_name=f"Estado_Cuenta_{normalizar_nombre(cliente_seleccionado).replace(' ', '_')}.pdf", mime="application/pdf")
-                st.markdown("---")
-                col_email, col_whatsapp = st.columns(2)
-
-                with col_email:
-                    st.subheader("✉️ Enviar por Correo Electrónico")
-                    email_destino = st.text_input("Verificar o modificar correo:", value=correo_cliente)
-
-                    if st.button("📧 Enviar Correo con Estado de Cuenta"):
-                        if not email_destino or email_destino == 'Correo no disponible' or '@' not in email_destino:
-                            st.error("Dirección de correo no válida o no disponible.")
-                        else:
-                            try:
-                                sender_email = st.secrets["email_credentials"]["sender_email"]
-                                sender_password = st.secrets["email_credentials"]["sender_password"]
-
-                                if total_vencido_cliente > 0:
-                                    dias_max_vencido = int(facturas_vencidas_cliente['dias_vencido'].max())
-                                    asunto = f"Recordatorio de Saldo Pendiente – {cliente_seleccionado}"
-                                    # --- [INICIO] NUEVA PLANTILLA HTML - CLIENTES CON DEUDA ---
-                                    cuerpo_html = f"""
-                                    <!doctype html><html xmlns="http://www.w3.org/1999/xhtml" xmlns:v="urn:schemas-microsoft-com:vml" xmlns:o="urn:schemas-microsoft-com:office:office"><head><title>Recordatorio Amistoso de Saldo Vencido - Ferreinox</title><meta http-equiv="X-UA-Compatible" content="IE=edge"><meta http-equiv="Content-Type" content="text/html; charset=UTF-8"><meta name="viewport" content="width=device-width,initial-scale=1"><style type="text/css">#outlook a {{ padding:0; }}
-                                                  body {{ margin:0;padding:0;-webkit-text-size-adjust:100%;-ms-text-size-adjust:100%; }}
-                                                  table, td {{ border-collapse:collapse;mso-table-lspace:0pt;mso-table-rspace:0pt; }}
-                                                  img {{ border:0;height:auto;line-height:100%; outline:none;text-decoration:none;-ms-interpolation-mode:bicubic; }}
-                                                  p {{ display:block;margin:13px 0; }}</style><link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet" type="text/css"><style type="text/css">@import url(https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap);</style><style type="text/css">@media only screen and (min-width:480px) {{
-                                                      .mj-column-per-100 {{ width:100% !important; max-width: 100%; }}
-                                                      .mj-column-per-50 {{ width:50% !important; max-width: 50%; }}
-                                                    }}</style><style media="screen and (min-width:480px)">.moz-text-html .mj-column-per-100 {{ width:100% !important; max-width: 100%; }}
-                                                   .moz-text-html .mj-column-per-50 {{ width:50% !important; max-width: 50%; }}</style><style type="text/css"></style><style type="text/css">.greeting-strong {{
-                                                        color: #1e40af;
-                                                        font-weight: 600;
-                                                      }}
-                                                      .whatsapp-button table {{
-                                                        width: 100% !important;
-                                                      }}</style></head><body style="word-spacing:normal;background-color:#f3f4f6;"><div style="background-color:#f3f4f6;"><div class="email-container" style="background:#FFFFFF;background-color:#FFFFFF;margin:0px auto;border-radius:24px;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#FFFFFF;background-color:#FFFFFF;width:100%;border-radius:24px;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:0;text-align:center;"><div style="background:#1e3a8a;background-color:#1e3a8a;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#1e3a8a;background-color:#1e3a8a;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:30px 30px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:28px;font-weight:700;line-height:1.6;text-align:center;color:#ffffff;">Recordatorio de Saldo Pendiente</div></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:40px 40px 20px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="left" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:18px;font-weight:500;line-height:1.6;text-align:left;color:#374151;">Hola, <span class="greeting-strong">{cliente_seleccionado}</span> 👋</div></td></tr><tr><td align="left" style="font-size:0px;padding:10px 25px;padding-bottom:20px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:left;color:#6b7280;">Te contactamos de parte de <strong>Ferreinox SAS BIC</strong> para recordarte amablemente sobre tu estado de cuenta. Hemos identificado un saldo vencido y te invitamos a revisarlo.</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 0;word-break:break-word;"><p style="border-top:solid 2px #3b82f6;font-size:1px;margin:0px auto;width:100%;"></p></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:10px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="background-color:#fee2e2;border-radius:20px;vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:25px 0 10px 0;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:48px;line-height:1.6;text-align:center;color:#374151;">⚠️</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:24px;font-weight:700;line-height:1.6;text-align:center;color:#991b1b;">Valor Total Vencido</div></td></tr><tr><td align="center" style="font-size:0px;padding:5px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:40px;font-weight:700;line-height:1.6;text-align:center;color:#991b1b;">${total_vencido_cliente:,.0f}</div></td></tr><tr><td align="center" style="font-size:0px;padding:5px 25px 30px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:center;color:#b91c1c;">Tu factura más antigua tiene <strong>{dias_max_vencido} días</strong> de vencimiento.</div></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:20px 40px;text-align:center;"><div class="mj-column-per-50 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:middle;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="background-color:#f8fafc;border-radius:16px;vertical-align:middle;" width="100%"><tbody><tr><td align="left" style="font-size:0px;padding:20px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:700;line-height:1.2;text-align:left;color:#334155;">NIT/CC</div><div style="font-family:Inter, -apple-system, sans-serif;font-size:20px;font-weight:700;line-height:1.2;text-align:left;color:#1e293b;">{nit_cliente}</div></td></tr><tr><td align="left" style="font-size:0px;padding:20px;padding-top:0;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:700;line-height:1.2;text-align:left;color:#334155;">CÓDIGO INTERNO</div><div style="font-family:Inter, -apple-system, sans-serif;font-size:20px;font-weight:700;line-height:1.2;text-align:left;color:#1e293b;">{cod_cliente}</div></td></tr></tbody></table></div><div class="mj-column-per-50 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:middle;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:middle;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:500;line-height:1.6;text-align:center;color:#475569;">Usa estos datos en nuestro portal de pagos.</div></td></tr><tr><td align="center" vertical-align="middle" style="font-size:0px;padding:10px 25px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#16a34a" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:16px 25px;background:#16a34a;" valign="middle"><a href="{portal_link}" style="display:inline-block;background:#16a34a;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:600;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:16px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">🚀 Realizar Pago</a></td></tr></table></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:20px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" width="100%"><tbody><tr><td style="background-color:#f8fafc;border-left:5px solid #3b82f6;border-radius:16px;vertical-align:top;padding:20px;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" width="100%"><tbody><tr><td align="left" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:500;line-height:1.6;text-align:left;color:#475569;">💡 <strong>Nota:</strong> Si ya realizaste el pago, por favor omite este mensaje. Para tu control, hemos adjuntado tu estado de cuenta en PDF.</div></td></tr></tbody></table></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#1f2937;background-color:#1f2937;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#1f2937;background-color:#1f2937;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:30px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:18px;font-weight:600;line-height:1.6;text-align:center;color:#ffffff;">Área de Cartera y Recaudos</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;padding-bottom:20px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:center;color:#e5e7eb;"><strong>Líneas de Atención WhatsApp</strong></div></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573165219904" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Armenia: 316 5219904</a></td></tr></table></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;padding-top:12px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573108501359" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Manizales: 310 8501359</a></td></tr></table></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;padding-top:12px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573142087169" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Pereira: 314 2087169</a></td></tr></table></td></tr><tr><td align="center" style="font-size:0px;padding:30px 0 20px 0;word-break:break-word;"><p style="border-top:solid 1px #4b5563;font-size:1px;margin:0px auto;width:100%;"></p></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:14px;line-height:1.6;text-align:center;color:#9ca3af;">© 2025 Ferreinox SAS BIC - Todos los derechos reservados</div></td></tr></tbody></table></div></td></tr></tbody></table></div></td></tr></tbody></table></div></div></body></html>
-                                    """
-                                    # --- [FIN] NUEVA PLANTILLA HTML - CLIENTES CON DEUDA ---
-                                else:
-                                    asunto = f"Tu Estado de Cuenta Actualizado - {cliente_seleccionado}"
-                                    # --- [INICIO] NUEVA PLANTILLA HTML - CLIENTES AL DÍA ---
-                                    cuerpo_html = f"""
-                                    <!doctype html><html xmlns="http://www.w3.org/1999/xhtml" xmlns:v="urn:schemas-microsoft-com:vml" xmlns:o="urn:schemas-microsoft-com:office:office"><head><title>Tu Estado de Cuenta Actualizado - Ferreinox</title><meta http-equiv="X-UA-Compatible" content="IE=edge"><meta http-equiv="Content-Type" content="text/html; charset=UTF-8"><meta name="viewport" content="width=device-width,initial-scale=1"><style type="text/css">#outlook a {{ padding:0; }}
-                                                  body {{ margin:0;padding:0;-webkit-text-size-adjust:100%;-ms-text-size-adjust:100%; }}
-                                                  table, td {{ border-collapse:collapse;mso-table-lspace:0pt;mso-table-rspace:0pt; }}
-                                                  img {{ border:0;height:auto;line-height:100%; outline:none;text-decoration:none;-ms-interpolation-mode:bicubic; }}
-                                                  p {{ display:block;margin:13px 0; }}</style><link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet" type="text/css"><style type="text/css">@import url(https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap);</style><style type="text/css">@media only screen and (min-width:480px) {{
-                                                      .mj-column-per-100 {{ width:100% !important; max-width: 100%; }}
-                                                    }}</style><style media="screen and (min-width:480px)">.moz-text-html .mj-column-per-100 {{ width:100% !important; max-width: 100%; }}</style><style type="text/css"></style><style type="text/css">.greeting-strong {{
-                                                        color: #1e40af;
-                                                        font-weight: 600;
-                                                      }}
-                                                      .whatsapp-button table {{
-                                                        /* Hacemos que los botones de WhatsApp ocupen todo el ancho */
-                                                        width: 100% !important;
-                                                      }}</style></head><body style="word-spacing:normal;background-color:#f3f4f6;"><div style="background-color:#f3f4f6;"><div class="email-container" style="background:#FFFFFF;background-color:#FFFFFF;margin:0px auto;border-radius:24px;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#FFFFFF;background-color:#FFFFFF;width:100%;border-radius:24px;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:0;text-align:center;"><div style="background:#1e3a8a;background-color:#1e3a8a;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#1e3a8a;background-color:#1e3a8a;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:30px 30px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:28px;font-weight:700;line-height:1.6;text-align:center;color:#ffffff;">Estado de Cuenta Actualizado</div></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:40px 40px 20px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="left" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:18px;font-weight:500;line-height:1.6;text-align:left;color:#374151;">Hola, <span class="greeting-strong">{cliente_seleccionado}</span> ✨</div></td></tr><tr><td align="left" style="font-size:0px;padding:10px 25px;padding-bottom:20px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:left;color:#6b7280;">Recibe un cordial saludo del equipo de <strong>Ferreinox SAS BIC</strong>.</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 0;word-break:break-word;"><p style="border-top:solid 2px #3b82f6;font-size:1px;margin:0px auto;width:100%;"></p></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:10px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="background-color:#10b981;border-radius:20px;vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:25px 0 10px 0;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:48px;line-height:1.6;text-align:center;color:#374151;">🎉</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:24px;font-weight:700;line-height:1.6;text-align:center;color:#ffffff;">¡Felicitaciones!</div></td></tr><tr><td align="center" style="font-size:0px;padding:5px 25px 30px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:center;color:#ffffff;">Tu cuenta no presenta saldos vencidos.<br>Agradecemos enormemente tu puntualidad y excelente gestión de pagos.</div></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:20px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" width="100%"><tbody><tr><td style="background-color:#f8fafc;border-left:5px solid #3b82f6;border-radius:16px;vertical-align:top;padding:20px;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" width="100%"><tbody><tr><td align="left" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:500;line-height:1.6;text-align:left;color:#475569;">📄 Para tu control y referencia, hemos adjuntado tu estado de cuenta completo en formato PDF a este correo electrónico.</div></td></tr></tbody></table></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#1f2937;background-color:#1f2937;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#1f2937;background-color:#1f2937;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:30px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:18px;font-weight:600;line-height:1.6;text-align:center;color:#ffffff;">Área de Cartera y Recaudos</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;padding-bottom:20px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:center;color:#e5e7eb;"><strong>Líneas de Atención WhatsApp</strong></div></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573165219904" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Armenia: 316 5219904</a></td></tr></table></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;padding-top:12px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573108501359" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Manizales: 310 8501359</a></td></tr></table></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;padding-top:12px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573142087169" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Pereira: 314 2087169</a></td></tr></table></td></tr><tr><td align="center" style="font-size:0px;padding:30px 0 20px 0;word-break:break-word;"><p style="border-top:solid 1px #4b5563;font-size:1px;margin:0px auto;width:100%;"></p></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:14px;line-height:1.6;text-align:center;color:#9ca3af;">© 2025 Ferreinox SAS BIC - Todos los derechos reservados</div></td></tr></tbody></table></div></td></tr></tbody></table></div></td></tr></tbody></table></div></div></body></html>
-                                    """
-                                    # --- [FIN] NUEVA PLANTILLA HTML - CLIENTES AL DÍA ---
+            st.download_button(label="📄 Descargar Estado de Cuenta (PDF)", data=pdf_bytes, file_name=f"Estado_Cuenta_{normalizar_nombre(cliente_seleccionado).replace(' ', '_')}.pdf", mime="application/pdf")
+            st.markdown("---")
+            col_email, col_whatsapp = st.columns(2)
+
+            with col_email:
+                st.subheader("✉️ Enviar por Correo Electrónico")
+                email_destino = st.text_input("Verificar o modificar correo:", value=correo_cliente)
+
+                if st.button("📧 Enviar Correo con Estado de Cuenta"):
+                    if not email_destino or email_destino == 'Correo no disponible' or '@' not in email_destino:
+                        st.error("Dirección de correo no válida o no disponible.")
+                    else:
+                        try:
+                            sender_email = st.secrets["email_credentials"]["sender_email"]
+                            sender_password = st.secrets["email_credentials"]["sender_password"]
+
+                            if total_vencido_cliente > 0:
+                                dias_max_vencido = int(facturas_vencidas_cliente['dias_vencido'].max())
+                                asunto = f"Recordatorio de Saldo Pendiente – {cliente_seleccionado}"
+                                # --- [INICIO] NUEVA PLANTILLA HTML - CLIENTES CON DEUDA ---
+                                cuerpo_html = f"""
+                                <!doctype html><html xmlns="http://www.w3.org/1999/xhtml" xmlns:v="urn:schemas-microsoft-com:vml" xmlns:o="urn:schemas-microsoft-com:office:office"><head><title>Recordatorio Amistoso de Saldo Vencido - Ferreinox</title><meta http-equiv="X-UA-Compatible" content="IE=edge"><meta http-equiv="Content-Type" content="text/html; charset=UTF-8"><meta name="viewport" content="width=device-width,initial-scale=1"><style type="text/css">#outlook a {{ padding:0; }}
+                                              body {{ margin:0;padding:0;-webkit-text-size-adjust:100%;-ms-text-size-adjust:100%; }}
+                                              table, td {{ border-collapse:collapse;mso-table-lspace:0pt;mso-table-rspace:0pt; }}
+                                              img {{ border:0;height:auto;line-height:100%; outline:none;text-decoration:none;-ms-interpolation-mode:bicubic; }}
+                                              p {{ display:block;margin:13px 0; }}</style><link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet" type="text/css"><style type="text/css">@import url(https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap);</style><style type="text/css">@media only screen and (min-width:480px) {{
+                                                  .mj-column-per-100 {{ width:100% !important; max-width: 100%; }}
+                                                  .mj-column-per-50 {{ width:50% !important; max-width: 50%; }}
+                                                }}</style><style media="screen and (min-width:480px)">.moz-text-html .mj-column-per-100 {{ width:100% !important; max-width: 100%; }}
+                                               .moz-text-html .mj-column-per-50 {{ width:50% !important; max-width: 50%; }}</style><style type="text/css"></style><style type="text/css">.greeting-strong {{
+                                                    color: #1e40af;
+                                                    font-weight: 600;
+                                                  }}
+                                                  .whatsapp-button table {{
+                                                    width: 100% !important;
+                                                  }}</style></head><body style="word-spacing:normal;background-color:#f3f4f6;"><div style="background-color:#f3f4f6;"><div class="email-container" style="background:#FFFFFF;background-color:#FFFFFF;margin:0px auto;border-radius:24px;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#FFFFFF;background-color:#FFFFFF;width:100%;border-radius:24px;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:0;text-align:center;"><div style="background:#1e3a8a;background-color:#1e3a8a;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#1e3a8a;background-color:#1e3a8a;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:30px 30px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:28px;font-weight:700;line-height:1.6;text-align:center;color:#ffffff;">Recordatorio de Saldo Pendiente</div></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:40px 40px 20px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="left" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:18px;font-weight:500;line-height:1.6;text-align:left;color:#374151;">Hola, <span class="greeting-strong">{cliente_seleccionado}</span> 👋</div></td></tr><tr><td align="left" style="font-size:0px;padding:10px 25px;padding-bottom:20px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:left;color:#6b7280;">Te contactamos de parte de <strong>Ferreinox SAS BIC</strong> para recordarte amablemente sobre tu estado de cuenta. Hemos identificado un saldo vencido y te invitamos a revisarlo.</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 0;word-break:break-word;"><p style="border-top:solid 2px #3b82f6;font-size:1px;margin:0px auto;width:100%;"></p></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:10px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="background-color:#fee2e2;border-radius:20px;vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:25px 0 10px 0;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:48px;line-height:1.6;text-align:center;color:#374151;">⚠️</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:24px;font-weight:700;line-height:1.6;text-align:center;color:#991b1b;">Valor Total Vencido</div></td></tr><tr><td align="center" style="font-size:0px;padding:5px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:40px;font-weight:700;line-height:1.6;text-align:center;color:#991b1b;">${total_vencido_cliente:,.0f}</div></td></tr><tr><td align="center" style="font-size:0px;padding:5px 25px 30px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:center;color:#b91c1c;">Tu factura más antigua tiene <strong>{dias_max_vencido} días</strong> de vencimiento.</div></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:20px 40px;text-align:center;"><div class="mj-column-per-50 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:middle;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="background-color:#f8fafc;border-radius:16px;vertical-align:middle;" width="100%"><tbody><tr><td align="left" style="font-size:0px;padding:20px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:700;line-height:1.2;text-align:left;color:#334155;">NIT/CC</div><div style="font-family:Inter, -apple-system, sans-serif;font-size:20px;font-weight:700;line-height:1.2;text-align:left;color:#1e293b;">{nit_cliente}</div></td></tr><tr><td align="left" style="font-size:0px;padding:20px;padding-top:0;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:700;line-height:1.2;text-align:left;color:#334155;">CÓDIGO INTERNO</div><div style="font-family:Inter, -apple-system, sans-serif;font-size:20px;font-weight:700;line-height:1.2;text-align:left;color:#1e293b;">{cod_cliente}</div></td></tr></tbody></table></div><div class="mj-column-per-50 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:middle;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:middle;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:500;line-height:1.6;text-align:center;color:#475569;">Usa estos datos en nuestro portal de pagos.</div></td></tr><tr><td align="center" vertical-align="middle" style="font-size:0px;padding:10px 25px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#16a34a" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:16px 25px;background:#16a34a;" valign="middle"><a href="{portal_link}" style="display:inline-block;background:#16a34a;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:600;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:16px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">🚀 Realizar Pago</a></td></tr></table></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:20px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" width="100%"><tbody><tr><td style="background-color:#f8fafc;border-left:5px solid #3b82f6;border-radius:16px;vertical-align:top;padding:20px;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" width="100%"><tbody><tr><td align="left" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:500;line-height:1.6;text-align:left;color:#475569;">💡 <strong>Nota:</strong> Si ya realizaste el pago, por favor omite este mensaje. Para tu control, hemos adjuntado tu estado de cuenta en PDF.</div></td></tr></tbody></table></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#1f2937;background-color:#1f2937;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#1f2937;background-color:#1f2937;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:30px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:18px;font-weight:600;line-height:1.6;text-align:center;color:#ffffff;">Área de Cartera y Recaudos</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;padding-bottom:20px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:center;color:#e5e7eb;"><strong>Líneas de Atención WhatsApp</strong></div></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573165219904" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Armenia: 316 5219904</a></td></tr></table></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;padding-top:12px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573108501359" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Manizales: 310 8501359</a></td></tr></table></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;padding-top:12px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573142087169" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Pereira: 314 2087169</a></td></tr></table></td></tr><tr><td align="center" style="font-size:0px;padding:30px 0 20px 0;word-break:break-word;"><p style="border-top:solid 1px #4b5563;font-size:1px;margin:0px auto;width:100%;"></p></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:14px;line-height:1.6;text-align:center;color:#9ca3af;">© 2025 Ferreinox SAS BIC - Todos los derechos reservados</div></td></tr></tbody></table></div></td></tr></tbody></table></div></td></tr></tbody></table></div></div></body></html>
+                                """
+                                # --- [FIN] NUEVA PLANTILLA HTML - CLIENTES CON DEUDA ---
+                            else:
+                                asunto = f"Tu Estado de Cuenta Actualizado - {cliente_seleccionado}"
+                                # --- [INICIO] NUEVA PLANTILLA HTML - CLIENTES AL DÍA ---
+                                cuerpo_html = f"""
+                                <!doctype html><html xmlns="http://www.w3.org/1999/xhtml" xmlns:v="urn:schemas-microsoft-com:vml" xmlns:o="urn:schemas-microsoft-com:office:office"><head><title>Tu Estado de Cuenta Actualizado - Ferreinox</title><meta http-equiv="X-UA-Compatible" content="IE=edge"><meta http-equiv="Content-Type" content="text/html; charset=UTF-8"><meta name="viewport" content="width=device-width,initial-scale=1"><style type="text/css">#outlook a {{ padding:0; }}
+                                              body {{ margin:0;padding:0;-webkit-text-size-adjust:100%;-ms-text-size-adjust:100%; }}
+                                              table, td {{ border-collapse:collapse;mso-table-lspace:0pt;mso-table-rspace:0pt; }}
+                                              img {{ border:0;height:auto;line-height:100%; outline:none;text-decoration:none;-ms-interpolation-mode:bicubic; }}
+                                              p {{ display:block;margin:13px 0; }}</style><link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet" type="text/css"><style type="text/css">@import url(https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap);</style><style type="text/css">@media only screen and (min-width:480px) {{
+                                                  .mj-column-per-100 {{ width:100% !important; max-width: 100%; }}
+                                                }}</style><style media="screen and (min-width:480px)">.moz-text-html .mj-column-per-100 {{ width:100% !important; max-width: 100%; }}</style><style type="text/css"></style><style type="text/css">.greeting-strong {{
+                                                    color: #1e40af;
+                                                    font-weight: 600;
+                                                  }}
+                                                  .whatsapp-button table {{
+                                                    /* Hacemos que los botones de WhatsApp ocupen todo el ancho */
+                                                    width: 100% !important;
+                                                  }}</style></head><body style="word-spacing:normal;background-color:#f3f4f6;"><div style="background-color:#f3f4f6;"><div class="email-container" style="background:#FFFFFF;background-color:#FFFFFF;margin:0px auto;border-radius:24px;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#FFFFFF;background-color:#FFFFFF;width:100%;border-radius:24px;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:0;text-align:center;"><div style="background:#1e3a8a;background-color:#1e3a8a;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#1e3a8a;background-color:#1e3a8a;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:30px 30px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:28px;font-weight:700;line-height:1.6;text-align:center;color:#ffffff;">Estado de Cuenta Actualizado</div></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:40px 40px 20px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="left" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:18px;font-weight:500;line-height:1.6;text-align:left;color:#374151;">Hola, <span class="greeting-strong">{cliente_seleccionado}</span> ✨</div></td></tr><tr><td align="left" style="font-size:0px;padding:10px 25px;padding-bottom:20px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:left;color:#6b7280;">Recibe un cordial saludo del equipo de <strong>Ferreinox SAS BIC</strong>.</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 0;word-break:break-word;"><p style="border-top:solid 2px #3b82f6;font-size:1px;margin:0px auto;width:100%;"></p></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:10px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="background-color:#10b981;border-radius:20px;vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:25px 0 10px 0;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:48px;line-height:1.6;text-align:center;color:#374151;">🎉</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:24px;font-weight:700;line-height:1.6;text-align:center;color:#ffffff;">¡Felicitaciones!</div></td></tr><tr><td align="center" style="font-size:0px;padding:5px 25px 30px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:center;color:#ffffff;">Tu cuenta no presenta saldos vencidos.<br>Agradecemos enormemente tu puntualidad y excelente gestión de pagos.</div></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#ffffff;background-color:#ffffff;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#ffffff;background-color:#ffffff;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:20px 40px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" width="100%"><tbody><tr><td style="background-color:#f8fafc;border-left:5px solid #3b82f6;border-radius:16px;vertical-align:top;padding:20px;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" width="100%"><tbody><tr><td align="left" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;font-weight:500;line-height:1.6;text-align:left;color:#475569;">📄 Para tu control y referencia, hemos adjuntado tu estado de cuenta completo en formato PDF a este correo electrónico.</div></td></tr></tbody></table></td></tr></tbody></table></div></td></tr></tbody></table></div><div style="background:#1f2937;background-color:#1f2937;margin:0px auto;max-width:600px;"><table align="center" border="0" cellpadding="0" cellspacing="0" role="presentation" style="background:#1f2937;background-color:#1f2937;width:100%;"><tbody><tr><td style="direction:ltr;font-size:0px;padding:30px;text-align:center;"><div class="mj-column-per-100 mj-outlook-group-fix" style="font-size:0px;text-align:left;direction:ltr;display:inline-block;vertical-align:top;width:100%;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="vertical-align:top;" width="100%"><tbody><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:18px;font-weight:600;line-height:1.6;text-align:center;color:#ffffff;">Área de Cartera y Recaudos</div></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;padding-bottom:20px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:16px;line-height:1.6;text-align:center;color:#e5e7eb;"><strong>Líneas de Atención WhatsApp</strong></div></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573165219904" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Armenia: 316 5219904</a></td></tr></table></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;padding-top:12px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573108501359" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Manizales: 310 8501359</a></td></tr></table></td></tr><tr><td align="center" vertical-align="middle" class="whatsapp-button" style="font-size:0px;padding:10px 25px;padding-top:12px;word-break:break-word;"><table border="0" cellpadding="0" cellspacing="0" role="presentation" style="border-collapse:separate;line-height:100%;"><tr><td align="center" bgcolor="#25d366" role="presentation" style="border:none;border-radius:12px;cursor:auto;mso-padding-alt:10px 25px;background:#25d366;" valign="middle"><a href="https://wa.me/573142087169" style="display:inline-block;background:#25d366;color:#ffffff;font-family:Inter, -apple-system, sans-serif;font-size:13px;font-weight:500;line-height:120%;margin:0;text-decoration:none;text-transform:none;padding:10px 25px;mso-padding-alt:0px;border-radius:12px;" target="_blank">📱 Pereira: 314 2087169</a></td></tr></table></td></tr><tr><td align="center" style="font-size:0px;padding:30px 0 20px 0;word-break:break-word;"><p style="border-top:solid 1px #4b5563;font-size:1px;margin:0px auto;width:100%;"></p></td></tr><tr><td align="center" style="font-size:0px;padding:10px 25px;word-break:break-word;"><div style="font-family:Inter, -apple-system, sans-serif;font-size:14px;line-height:1.6;text-align:center;color:#9ca3af;">© 2025 Ferreinox SAS BIC - Todos los derechos reservados</div></td></tr></tbody></table></div></td></tr></tbody></table></div></td></tr></tbody></table></div></div></body></html>
+                                """
+                                # --- [FIN] NUEVA PLANTILLA HTML - CLIENTES AL DÍA ---
                                 
-                                with st.spinner(f"Enviando correo a {email_destino}..."):
-                                    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                                        tmp.write(pdf_bytes)
-                                        tmp_path = tmp.name
+                            with st.spinner(f"Enviando correo a {email_destino}..."):
+                                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+                                    tmp.write(pdf_bytes)
+                                    tmp_path = tmp.name
 
-                                    try:
-                                        yag = yagmail.SMTP(sender_email, sender_password)
+                                try:
+                                    yag = yagmail.SMTP(sender_email, sender_password)
                                         
-                                        contenidos_correo = [cuerpo_html, tmp_path]
+                                    contenidos_correo = [cuerpo_html, tmp_path]
                                         
-                                        yag.send(
-                                            to=email_destino,
-                                            subject=asunto,
-                                            contents=contenidos_correo
-                                        )
-                                        st.success(f"¡Correo enviado exitosamente a {email_destino}!")
+                                    yag.send(
+                                        to=email_destino,
+                                        subject=asunto,
+                                        contents=contenidos_correo
+                                    )
+                                    st.success(f"¡Correo enviado exitosamente a {email_destino}!")
                                         
-                                    finally:
-                                        if os.path.exists(tmp_path):
-                                            os.remove(tmp_path)
+                                finally:
+                                    if os.path.exists(tmp_path):
+                                        os.remove(tmp_path)
                                 
-                            except Exception as e:
-                                st.error(f"Error al enviar el correo: {e}")
-
-                with col_whatsapp:
-                    st.subheader("📲 Enviar por WhatsApp")
-                    numero_completo_para_mostrar = f"+57{telefono_cliente}" if telefono_cliente else "+57"
-                    numero_destino_wa = st.text_input("Verificar o modificar número de WhatsApp:", value=numero_completo_para_mostrar, key="whatsapp_input")
-
-                    if not facturas_vencidas_cliente.empty:
-                        total_vencido_cliente_wa = facturas_vencidas_cliente['importe'].sum()
-                        dias_max_vencido = int(facturas_vencidas_cliente['dias_vencido'].max())
-                        mensaje_whatsapp = (
-                            f"👋 ¡Hola {cliente_seleccionado}! Te saludamos desde Ferreinox SAS BIC.\n\n"
-                            f"Te recordamos que tienes un saldo vencido de *${total_vencido_cliente_wa:,.0f}*. La factura más antigua tiene *{dias_max_vencido} días* de vencida.\n\n"
-                            f"Para ponerte al día, puedes usar nuestro Portal de Pagos:\n"
-                            f"🔗 {portal_link}\n\n"
-                            f"Tus datos de acceso son:\n"
-                            f"👤 *Usuario (NIT):* {nit_cliente}\n"
-                            f"🔑 *Código Único:* {cod_cliente}\n\n"
-                            f"Hemos enviado el estado de cuenta detallado a tu correo. ¡Agradecemos tu pronta gestión!"
-                        )
-                    else:
-                        total_cartera_cliente_wa = datos_cliente_seleccionado['importe'].sum()
-                        mensaje_whatsapp = (
-                            f"👋 ¡Hola {cliente_seleccionado}! Te saludamos desde Ferreinox SAS BIC.\n\n"
-                            f"¡Felicitaciones! Tu cuenta está al día. Tu saldo total es de *${total_cartera_cliente_wa:,.0f}*.\n\n"
-                            f"Hemos enviado tu estado de cuenta al correo para tu referencia.\n\n"
-                            f"¡Gracias por tu confianza!"
-                        )
-
-                    mensaje_codificado = quote(mensaje_whatsapp)
-                    numero_limpio = re.sub(r'\D', '', numero_destino_wa)
-                    if numero_limpio:
-                        url_whatsapp = f"https://wa.me/{numero_limpio}?text={mensaje_codificado}"
-                        st.markdown(f'<a href="{url_whatsapp}" target="_blank" class="button">📱 Enviar a WhatsApp ({numero_destino_wa})</a>', unsafe_allow_html=True)
-                    else:
-                        st.warning("Ingresa un número de teléfono válido para habilitar el botón de WhatsApp.")
+                        except Exception as e:
+                            st.error(f"Error al enviar el correo: {e}")
+
+            with col_whatsapp:
+                st.subheader("📲 Enviar por WhatsApp")
+                numero_completo_para_mostrar = f"+57{telefono_cliente}" if telefono_cliente else "+57"
+                numero_destino_wa = st.text_input("Verificar o modificar número de WhatsApp:", value=numero_completo_para_mostrar, key="whatsapp_input")
+
+                if not facturas_vencidas_cliente.empty:
+                    total_vencido_cliente_wa = facturas_vencidas_cliente['importe'].sum()
+                    dias_max_vencido = int(facturas_vencidas_cliente['dias_vencido'].max())
+                    mensaje_whatsapp = (
+                        f"👋 ¡Hola {cliente_seleccionado}! Te saludamos desde Ferreinox SAS BIC.\n\n"
+                        f"Te recordamos que tienes un saldo vencido de *${total_vencido_cliente_wa:,.0f}*. La factura más antigua tiene *{dias_max_vencido} días* de vencida.\n\n"
+                        f"Para ponerte al día, puedes usar nuestro Portal de Pagos:\n"
+                        f"🔗 {portal_link}\n\n"
+                        f"Tus datos de acceso son:\n"
+                        f"👤 *Usuario (NIT):* {nit_cliente}\n"
+                        f"🔑 *Código Único:* {cod_cliente}\n\n"
+                        f"Hemos enviado el estado de cuenta detallado a tu correo. ¡Agradecemos tu pronta gestión!"
+                    )
+                else:
+                    total_cartera_cliente_wa = datos_cliente_seleccionado['importe'].sum()
+                    mensaje_whatsapp = (
+                        f"👋 ¡Hola {cliente_seleccionado}! Te saludamos desde Ferreinox SAS BIC.\n\n"
+                        f"¡Felicitaciones! Tu cuenta está al día. Tu saldo total es de *${total_cartera_cliente_wa:,.0f}*.\n\n"
+                        f"Hemos enviado tu estado de cuenta al correo para tu referencia.\n\n"
+                        f"¡Gracias por tu confianza!"
+                    )
+
+                mensaje_codificado = quote(mensaje_whatsapp)
+                numero_limpio = re.sub(r'\D', '', numero_destino_wa)
+                if numero_limpio:
+                    url_whatsapp = f"https://wa.me/{numero_limpio}?text={mensaje_codificado}"
+                    st.markdown(f'<a href="{url_whatsapp}" target="_blank" class="button">📱 Enviar a WhatsApp ({numero_destino_wa})</a>', unsafe_allow_html=True)
+                else:
+                    st.warning("Ingresa un número de teléfono válido para habilitar el botón de WhatsApp.")
+
 
 if __name__ == '__main__':
     main()